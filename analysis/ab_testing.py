@@ -1,8 +1,66 @@
 import streamlit as st
 import numpy as np
 import pandas as pd
+import logging
+from concurrent.futures import ProcessPoolExecutor
 from scipy import stats
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Below this many resampled observations the process pool costs more than it saves
+PARALLEL_MIN_WORK = 5_000_000
+
+# Columns returned by run_ab_tests_batch after the metric/segment key columns
+BATCH_RESULT_COLUMNS = [
+    'control_mean', 'treatment_mean', 'difference', 'percent_change', 'cohens_d',
+    't_statistic', 'p_value', 'p_value_adjusted', 'significant', 'ci_lower', 'ci_upper',
+    'control_size', 'treatment_size', 'power_achieved'
+]
+
+
+def adjust_p_values(p_values: np.ndarray, method: Optional[str] = 'holm') -> np.ndarray:
+    """Multiple-comparison correction: 'bonferroni', 'holm', 'fdr_bh' (Benjamini-Hochberg) or None"""
+    p = np.asarray(p_values, dtype=np.float64)
+    if method is None or p.size == 0:
+        return p.copy()
+    
+    adjusted = np.full_like(p, np.nan)
+    valid = ~np.isnan(p)
+    pv = p[valid]
+    m = len(pv)
+    order = np.argsort(pv)
+    ranked = pv[order]
+    
+    if method == 'bonferroni':
+        result = np.minimum(pv * m, 1.0)
+    elif method == 'holm':
+        stepped = np.maximum.accumulate(ranked * (m - np.arange(m)))
+        result = np.empty(m)
+        result[order] = np.minimum(stepped, 1.0)
+    elif method == 'fdr_bh':
+        stepped = np.minimum.accumulate((ranked * m / np.arange(1, m + 1))[::-1])[::-1]
+        result = np.empty(m)
+        result[order] = np.minimum(stepped, 1.0)
+    else:
+        raise ValueError(f"Unknown multiple-comparison correction '{method}'")
+    
+    adjusted[valid] = result
+    return adjusted
+
+
+def _bootstrap_chunk(tests: List[Tuple[np.ndarray, np.ndarray]], n_bootstrap: int, alpha: float,
+                     seed: np.random.SeedSequence) -> np.ndarray:
+    """Percentile CIs of the mean difference for a chunk of (control, treatment) value arrays"""
+    rng = np.random.default_rng(seed)
+    intervals = np.full((len(tests), 2), np.nan)
+    for i, (control, treatment) in enumerate(tests):
+        if len(control) == 0 or len(treatment) == 0:
+            continue
+        control_means = control[rng.integers(0, len(control), (n_bootstrap, len(control)))].mean(axis=1)
+        treatment_means = treatment[rng.integers(0, len(treatment), (n_bootstrap, len(treatment)))].mean(axis=1)
+        intervals[i] = np.percentile(treatment_means - control_means, [100 * alpha / 2, 100 * (1 - alpha / 2)])
+    return intervals
 
 class ABTestingFramework:
     def __init__(self, alpha=0.05, power=0.8):
@@ -81,22 +139,152 @@ class ABTestingFramework:
         t_crit = stats.t.ppf(1 - self.alpha/2, df)
         
         # Power calculation
-        power = 1 - stats.t.cdf(t_crit, df, ncp) + stats.t.cdf(-t_crit, df, ncp)
+        power = 1 - stats.t.cdf(t_crit, df, ncp) + stats.t.cdf(-t_crit, df, ncp)  # Works elementwise for batches
         
         return power
     
     def compare_algorithms(self, baseline_results: Dict[str, List[float]], 
                           new_algorithm_results: Dict[str, List[float]]) -> Dict:
         """Compare multiple metrics between algorithms"""
+        metrics = [metric for metric in baseline_results.keys() if metric in new_algorithm_results]
+        if not metrics:
+            return {}
+        
+        # NEW: All metrics in one batched test (no correction, matching per-metric run_ab_test)
+        parts = []
+        for group, results in (('control', baseline_results), ('treatment', new_algorithm_results)):
+            for metric in metrics:
+                values = np.asarray(results[metric], dtype=np.float64)
+                parts.append(pd.DataFrame({'metric': metric, 'group': group, 'value': values}))
+        batch = self.run_ab_tests_batch(pd.concat(parts, ignore_index=True), correction=None)
+        
         comparison_results = {}
+        for row in batch.itertuples(index=False):
+            comparison_results[row.metric] = {
+                'metric_name': row.metric,
+                'control_mean': row.control_mean,
+                'treatment_mean': row.treatment_mean,
+                'difference': row.difference,
+                'percent_change': row.percent_change,
+                'cohens_d': row.cohens_d,
+                't_statistic': row.t_statistic,
+                'p_value': row.p_value,
+                'significant': row.significant,
+                'confidence_interval': (row.ci_lower, row.ci_upper),
+                'control_size': int(row.control_size),
+                'treatment_size': int(row.treatment_size),
+                'power_achieved': row.power_achieved
+            }
+        
+        return {metric: comparison_results[metric] for metric in metrics if metric in comparison_results}
+    
+    def run_ab_tests_batch(self, observations: pd.DataFrame, segment_columns: Sequence[str] = (),
+                           metric_column: str = 'metric', group_column: str = 'group',
+                           value_column: str = 'value', control_label='control', treatment_label='treatment',
+                           correction: Optional[str] = 'holm', n_bootstrap: int = 0,
+                           max_workers: Optional[int] = None, seed: int = 42) -> pd.DataFrame:
+        """
+        NEW: Pooled-variance t-tests for every metric x segment at once from long-format observations
+        
+        Each row of observations is one value of one metric for one unit in the control or treatment
+        group; segment_columns (e.g. vendor, store, cluster) split each metric further. Tests come from
+        grouped counts, sums and sums of squares. p-values are corrected across all tests, and
+        with n_bootstrap > 0 percentile CIs are added (in a process pool for large inputs).
+        """
+        keys = [metric_column] + list(segment_columns)
+        frame = observations[observations[group_column].isin([control_label, treatment_label])]
+        if frame.empty:
+            return pd.DataFrame(columns=keys + BATCH_RESULT_COLUMNS)
+        
+        # Shift each metric by its mean first so the sum-of-squares variance stays numerically stable
+        values = frame[value_column].astype(np.float64)
+        shift = values.groupby(frame[metric_column]).transform('mean')
+        grouped = pd.DataFrame({'n': 1.0, 'sum': values - shift, 'sum_sq': (values - shift) ** 2, 'shift': shift})
+        grouped[keys] = frame[keys]
+        grouped['treated'] = (frame[group_column] == treatment_label).to_numpy()
+        stats_frame = grouped.groupby(keys + ['treated'], sort=True, dropna=False).agg(
+            n=('n', 'sum'), total=('sum', 'sum'), total_sq=('sum_sq', 'sum'), shift=('shift', 'first')
+        ).unstack('treated')
+        if ('n', False) not in stats_frame.columns or ('n', True) not in stats_frame.columns:
+            return pd.DataFrame(columns=keys + BATCH_RESULT_COLUMNS)
+        stats_frame = stats_frame.dropna(subset=[('n', False), ('n', True)])
+        if stats_frame.empty:
+            return pd.DataFrame(columns=keys + BATCH_RESULT_COLUMNS)
+        
+        def side(treated: bool):
+            n = stats_frame[('n', treated)].to_numpy()
+            mean = stats_frame[('total', treated)].to_numpy() / n
+            with np.errstate(divide='ignore', invalid='ignore'):
+                # A single observation has no spread (and contributes no degrees of freedom)
+                var = np.where(n > 1, (stats_frame[('total_sq', treated)].to_numpy() - n * mean * mean) / (n - 1),
+                               0.0)
+            return n, mean + stats_frame[('shift', treated)].to_numpy(), np.maximum(var, 0.0)
+        
+        n1, control_mean, control_var = side(False)
+        n2, treatment_mean, treatment_var = side(True)
+        df = n1 + n2 - 2
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            pooled_std = np.sqrt(((n1 - 1) * control_var + (n2 - 1) * treatment_var) / df)
+            diff_mean = treatment_mean - control_mean
+            cohens_d = diff_mean / pooled_std
+            se_diff = pooled_std * np.sqrt(1 / n1 + 1 / n2)
+            t_stat = diff_mean / se_diff
+            p_value = 2 * stats.t.sf(np.abs(t_stat), df)
+            margin_error = stats.t.ppf(1 - self.alpha / 2, df) * se_diff
+            percent_change = np.where(control_mean != 0, diff_mean / control_mean * 100, 0.0)
+        
+        p_adjusted = adjust_p_values(p_value, correction)
+        results = stats_frame.index.to_frame(index=False)
+        results['control_mean'] = control_mean
+        results['treatment_mean'] = treatment_mean
+        results['difference'] = diff_mean
+        results['percent_change'] = percent_change
+        results['cohens_d'] = cohens_d
+        results['t_statistic'] = t_stat
+        results['p_value'] = p_value
+        results['p_value_adjusted'] = p_adjusted
+        results['significant'] = p_adjusted < self.alpha
+        results['ci_lower'] = diff_mean - margin_error
+        results['ci_upper'] = diff_mean + margin_error
+        results['control_size'] = n1.astype(int)
+        results['treatment_size'] = n2.astype(int)
+        results['power_achieved'] = self._calculate_achieved_power(cohens_d, n1, n2)
+        
+        if n_bootstrap > 0:
+            intervals = self._bootstrap_intervals(frame, keys, group_column, value_column, treatment_label,
+                                                  stats_frame.index, n_bootstrap, max_workers, seed)
+            results['bootstrap_ci_lower'] = intervals[:, 0]
+            results['bootstrap_ci_upper'] = intervals[:, 1]
+        
+        return results
+    
+    def _bootstrap_intervals(self, frame: pd.DataFrame, keys: List[str], group_column: str, value_column: str,
+                             treatment_label, test_index: pd.Index, n_bootstrap: int,
+                             max_workers: Optional[int], seed: int) -> np.ndarray:
+        """Bootstrap CIs per test, chunked over tests and spread across processes for large inputs"""
+        samples = {
+            key: group[value_column].to_numpy(dtype=np.float64)
+            for key, group in frame.groupby(keys + [frame[group_column] == treatment_label], sort=False, dropna=False)
+        }
+        as_key = (lambda key: key if isinstance(key, tuple) else (key,))
+        empty = np.zeros(0)
+        tests = [(samples.get(as_key(key) + (False,), empty), samples.get(as_key(key) + (True,), empty))
+                 for key in test_index]
+        
+        n_chunks = max(1, min(len(tests), 4 * (max_workers or 4)))
+        bounds = np.linspace(0, len(tests), n_chunks + 1).astype(int)
+        seeds = np.random.SeedSequence(seed).spawn(n_chunks)
+        chunks = [tests[lo:hi] for lo, hi in zip(bounds[:-1], bounds[1:])]
         
-        for metric in baseline_results.keys():
-            if metric in new_algorithm_results:
-                test_result = self.run_ab_test(
-                    baseline_results[metric],
-                    new_algorithm_results[metric],
-                    metric
-                )
-                comparison_results[metric] = test_result
+        if max_workers != 1 and n_chunks > 1 and len(frame) * n_bootstrap >= PARALLEL_MIN_WORK:
+            try:
+                with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                    parts = list(executor.map(_bootstrap_chunk, chunks, [n_bootstrap] * n_chunks,
+                                              [self.alpha] * n_chunks, seeds))
+                return np.vstack(parts)
+            except Exception as e:
+                logger.warning(f"Parallel bootstrap failed, running inline: {e}")
         
-        return comparison_results
+        return np.vstack([_bootstrap_chunk(chunk, n_bootstrap, self.alpha, chunk_seed)
+                          for chunk, chunk_seed in zip(chunks, seeds)])
@@ -1,81 +1,149 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-from typing import Dict, List, Tuple
-from datetime import datetime, timedelta
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Tuple, Optional
+from numpy.lib.stride_tricks import sliding_window_view
+
+from analysis.forecast_models import MovingAverageForecaster
+
+logger = logging.getLogger(__name__)
+
+# Below this many product-windows the process pool costs more than it saves
+PARALLEL_MIN_WORK = 50_000
+
+
+def forecast_batch(model, history: np.ndarray, horizon: int) -> np.ndarray:
+    """
+    products x horizon forecasts from a products x days history matrix.
+    Models with forecast_batch run in one call; legacy models with forecast(series, horizon) run per row.
+    """
+    if hasattr(model, 'forecast_batch'):
+        return np.asarray(model.forecast_batch(history, horizon), dtype=np.float64)
+    forecasts = np.zeros((history.shape[0], horizon))
+    for i, row in enumerate(history):
+        predicted = np.asarray(model.forecast(pd.Series(row), horizon), dtype=np.float64)[:horizon]
+        forecasts[i, :len(predicted)] = predicted
+    return forecasts
+
+
+def _evaluate_windows(block: np.ndarray, first_window: int, training_window: int, forecast_horizon: int,
+                      step_days: int, min_observed_days: int, model) -> Tuple[np.ndarray, ...]:
+    """
+    Evaluate every window in a day-slice of the product x day matrix
+
+    Returns (product_index, window_index, actual, predicted) for products with enough
+    observed sale days in both the training and test part of the window.
+    """
+    windows = sliding_window_view(block, training_window + forecast_horizon, axis=1)[:, ::step_days]
+    products, window_ids, actuals, predictions = [], [], [], []
+
+    for w in range(windows.shape[1]):
+        train = windows[:, w, :training_window]
+        test = windows[:, w, training_window:]
+        valid = np.nonzero(
+            (np.count_nonzero(train, axis=1) >= min_observed_days) &
+            (np.count_nonzero(test, axis=1) >= min_observed_days)
+        )[0]
+        if len(valid) == 0:
+            continue
+        predicted = forecast_batch(model, train[valid], forecast_horizon).sum(axis=1)
+        products.append(valid)
+        window_ids.append(np.full(len(valid), first_window + w))
+        actuals.append(test[valid].sum(axis=1))
+        predictions.append(predicted)
+
+    if not products:
+        empty = np.zeros(0)
+        return empty.astype(np.int64), empty.astype(np.int64), empty, empty
+    return (np.concatenate(products), np.concatenate(window_ids),
+            np.concatenate(actuals), np.concatenate(predictions))
+
 
 class BacktestingEngine:
-    def __init__(self, forecast_horizon=30, training_window=90):
+    def __init__(self, forecast_horizon=30, training_window=90, step_days=7, max_workers: Optional[int] = None):
         self.forecast_horizon = forecast_horizon
         self.training_window = training_window
-    
-    def walk_forward_validation(self, sales_data: pd.DataFrame, 
-                               forecasting_model) -> Dict[str, float]:
-        """Perform walk-forward validation"""
-        results = []
-        
-        # Sort by date
-        sales_data = sales_data.sort_values('created_at')
-        start_date = sales_data['created_at'].min()
-        end_date = sales_data['created_at'].max()
-        
-        # Create daily aggregated data
-        daily_sales = sales_data.groupby([
-            sales_data['created_at'].dt.date, 'product_id'
-        ])['quantity'].sum().reset_index()
-        
-        current_date = start_date + timedelta(days=self.training_window)
-        
-        while current_date + timedelta(days=self.forecast_horizon) <= end_date:
-            # Training period
-            train_end = current_date
-            train_start = train_end - timedelta(days=self.training_window)
-            
-            # Test period  
-            test_start = current_date + timedelta(days=1)
-            test_end = test_start + timedelta(days=self.forecast_horizon)
-            
-            # Get training data
-            train_data = daily_sales[
-                (daily_sales['created_at'] >= train_start) & 
-                (daily_sales['created_at'] <= train_end)
-            ]
-            
-            # Get test data (actual sales)
-            test_data = daily_sales[
-                (daily_sales['created_at'] >= test_start) & 
-                (daily_sales['created_at'] <= test_end)
+        self.step_days = step_days  # Weekly steps
+        self.min_observed_days = 7  # Minimum sale days in both train and test periods
+        self.max_workers = max_workers
+
+    def build_daily_matrix(self, sales_data: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray, pd.DatetimeIndex]:
+        """Dense product x day quantity matrix over the full date range (days without sales are 0)"""
+        days = sales_data['created_at'].dt.floor('D')
+        daily = sales_data.groupby(['product_id', days])['quantity'].sum()
+        product_ids = daily.index.get_level_values(0).unique().sort_values()
+        dates = pd.date_range(days.min(), days.max(), freq='D')
+
+        matrix = np.zeros((len(product_ids), len(dates)))
+        rows = product_ids.get_indexer(daily.index.get_level_values(0))
+        cols = dates.get_indexer(daily.index.get_level_values(1))
+        matrix[rows, cols] = daily.to_numpy(dtype=np.float64)
+        return matrix, product_ids.to_numpy(), dates
+
+    def walk_forward_results(self, sales_data: pd.DataFrame, forecasting_model=None) -> pd.DataFrame:
+        """One row per (product, window) with actual and predicted totals over the forecast horizon"""
+        columns = ['product_id', 'test_start', 'actual', 'predicted', 'error', 'percentage_error']
+        if sales_data.empty:
+            return pd.DataFrame(columns=columns)
+
+        matrix, product_ids, dates = self.build_daily_matrix(sales_data)
+        return self.results_from_matrix(matrix, product_ids, dates, forecasting_model)
+
+    def results_from_matrix(self, matrix: np.ndarray, product_ids: np.ndarray, dates: pd.DatetimeIndex,
+                            forecasting_model=None) -> pd.DataFrame:
+        """walk_forward_results on a prebuilt daily matrix (lets several models share one matrix)"""
+        columns = ['product_id', 'test_start', 'actual', 'predicted', 'error', 'percentage_error']
+        model = forecasting_model or MovingAverageForecaster()
+        window_length = self.training_window + self.forecast_horizon
+        n_windows = (len(dates) - window_length) // self.step_days + 1 if len(dates) >= window_length else 0
+        if n_windows <= 0:
+            return pd.DataFrame(columns=columns)
+
+        product_idx, window_idx, actual, predicted = self._run(matrix, n_windows, model)
+        order = np.lexsort((window_idx, product_idx))
+        product_idx, window_idx, actual, predicted = (product_idx[order], window_idx[order],
+                                                      actual[order], predicted[order])
+        error = np.abs(actual - predicted)
+        return pd.DataFrame({
+            'product_id': product_ids[product_idx],
+            'test_start': dates[window_idx * self.step_days + self.training_window],
+            'actual': actual,
+            'predicted': predicted,
+            'error': error,
+            'percentage_error': error / np.maximum(actual, 1) * 100
+        })
+
+    def _run(self, matrix: np.ndarray, n_windows: int, model) -> Tuple[np.ndarray, ...]:
+        """Spread groups of windows across a process pool; each task gets only its day-slice"""
+        window_length = self.training_window + self.forecast_horizon
+        args = (self.training_window, self.forecast_horizon, self.step_days, self.min_observed_days, model)
+
+        if self.max_workers != 1 and n_windows > 1 and matrix.shape[0] * n_windows >= PARALLEL_MIN_WORK:
+            n_groups = min(n_windows, 4 * (self.max_workers or 4))
+            bounds = np.linspace(0, n_windows, n_groups + 1).astype(int)
+            tasks = [
+                (matrix[:, lo * self.step_days:(hi - 1) * self.step_days + window_length], lo)
+                for lo, hi in zip(bounds[:-1], bounds[1:]) if hi > lo
             ]
-            
-            # Make predictions for each product
-            for product_id in train_data['product_id'].unique():
-                product_train = train_data[train_data['product_id'] == product_id]
-                product_test = test_data[test_data['product_id'] == product_id]
-                
-                if len(product_train) >= 7 and len(product_test) >= 7:  # Minimum data
-                    # Generate forecast
-                    train_series = product_train.set_index('created_at')['quantity']
-                    predicted = forecasting_model.forecast(train_series, self.forecast_horizon)
-                    
-                    # Calculate actual
-                    actual = product_test['quantity'].sum()
-                    predicted_total = sum(predicted)
-                    
-                    results.append({
-                        'product_id': product_id,
-                        'test_start': test_start,
-                        'actual': actual,
-                        'predicted': predicted_total,
-                        'error': abs(actual - predicted_total),
-                        'percentage_error': abs(actual - predicted_total) / max(actual, 1) * 100
-                    })
-            
-            # Move window forward
-            current_date += timedelta(days=7)  # Weekly steps
-        
+            try:
+                with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+                    futures = [executor.submit(_evaluate_windows, block, lo, *args) for block, lo in tasks]
+                    parts = [future.result() for future in futures]
+                return tuple(np.concatenate(arrays) for arrays in zip(*parts))
+            except Exception as e:
+                logger.warning(f"Parallel backtest failed, running inline: {e}")
+
+        return _evaluate_windows(matrix, 0, *args)
+
+    def walk_forward_validation(self, sales_data: pd.DataFrame,
+                               forecasting_model=None) -> Dict[str, float]:
+        """Perform walk-forward validation"""
+
+        results_df = self.walk_forward_results(sales_data, forecasting_model)
+
         # Calculate aggregate metrics
-        results_df = pd.DataFrame(results)
-        
         if len(results_df) > 0:
             metrics = {
                 'mae': results_df['error'].mean(),
@@ -87,30 +155,19 @@ class BacktestingEngine:
             }
         else:
             metrics = {'error': 'Insufficient data for backtesting'}
-        
+
         return metrics
-    
+
     def _calculate_hit_rate(self, results_df: pd.DataFrame) -> float:
         """Calculate directional accuracy (hit rate)"""
-        # Compare predicted vs actual direction from previous period
-        # This would need historical baseline for comparison
-        correct_direction = 0
-        total_comparisons = 0
-        
-        for product_id in results_df['product_id'].unique():
-            product_results = results_df[results_df['product_id'] == product_id].sort_values('test_start')
-            
-            for i in range(1, len(product_results)):
-                current = product_results.iloc[i]
-                previous = product_results.iloc[i-1]
-                
-                actual_direction = current['actual'] - previous['actual']
-                predicted_direction = current['predicted'] - previous['predicted']
-                
-                if (actual_direction >= 0 and predicted_direction >= 0) or \
-                   (actual_direction < 0 and predicted_direction < 0):
-                    correct_direction += 1
-                
-                total_comparisons += 1
-        
+        # Compare predicted vs actual direction from each product's previous tested window
+        ordered = results_df.sort_values(['product_id', 'test_start'], kind='stable')
+        same_product = ordered['product_id'].to_numpy()[1:] == ordered['product_id'].to_numpy()[:-1]
+
+        actual_direction = np.diff(ordered['actual'].to_numpy(dtype=np.float64))[same_product]
+        predicted_direction = np.diff(ordered['predicted'].to_numpy(dtype=np.float64))[same_product]
+
+        correct_direction = int(((actual_direction >= 0) == (predicted_direction >= 0)).sum())
+        total_comparisons = len(actual_direction)
+
         return correct_direction / max(total_comparisons, 1) * 100
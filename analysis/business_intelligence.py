@@ -8,77 +8,188 @@ from typing import Dict, List, Tuple, Any, Optional
 import numpy as np
 import logging
 from models.data_models import UserProfile, ProductInsight, SeasonalInsight
+from models.insight_table import InsightTable
+from pending_orders.pending_index import PendingInventoryIndex
+from analysis.seasonality import SeasonalProfile, build_seasonal_profile, MONTH_NAMES
+from analysis.incremental import ProductResultCache, SESSION_KEY, sales_fingerprints, row_fingerprints
+from utils import progress, tracing
 
 logger = logging.getLogger(__name__)
 
 class EnhancedBusinessIntelligenceEngine:
     """Enhanced BI engine with user-specific configurations - FIXED VERSION"""
     
-    def __init__(self, user_profile: UserProfile, brand_lead_times: Dict[str, int]):
+    def __init__(self, user_profile: UserProfile, brand_lead_times: Dict[str, int],
+                 state: Optional[Dict[str, Any]] = None, pending_orders: Optional[List] = None):
         self.user_profile = user_profile
         self.brand_lead_times = brand_lead_times
         self.default_lead_time = user_profile.default_lead_time if user_profile else 14
+        self.pending_index: Optional[PendingInventoryIndex] = None
+        self.seasonal_profile: Optional[SeasonalProfile] = None
+        
+        # NEW: Headless runs pass their own state mapping and pending orders; the UI defaults to session state
+        self.state = state
+        self.pending_orders = pending_orders
+        
+        # NEW: One service-level optimizer per engine; vendor service levels and z-scores are cached
+        try:
+            from analysis.service_level_optimizer import ServiceLevelOptimizer
+            self.service_optimizer = ServiceLevelOptimizer(
+                vendor_service_levels=getattr(user_profile, 'vendor_service_levels', None)
+            )
+        except ImportError:
+            self.service_optimizer = None
+        
+        # NEW: Demand-pattern cluster per product, plus optional per-cluster overrides
+        # (cluster -> service level target, cluster -> forecast model registry name)
+        self.demand_clusters: Dict[int, int] = {}
+        self.cluster_service_levels: Dict[int, float] = dict(getattr(user_profile, 'cluster_service_levels', None) or {})
+        self.cluster_forecast_models: Dict[int, str] = dict(getattr(user_profile, 'cluster_forecast_models', None) or {})
     
     def get_lead_time_for_brand(self, brand: str) -> int:
         """Get lead time for specific brand, fallback to default"""
         return self.brand_lead_times.get(brand, self.default_lead_time)
     
+    def cluster_for_product(self, product_id) -> Optional[int]:
+        """Demand-pattern cluster of a product from the last analysis run"""
+        try:
+            return self.demand_clusters.get(int(product_id))
+        except (TypeError, ValueError):
+            return None
+    
+    def _assign_demand_clusters(self, orders_df: pd.DataFrame) -> Dict[int, int]:
+        """Incrementally cluster products by demand pattern; only new or changed products are refit"""
+        
+        if orders_df is None or orders_df.empty:
+            return {}
+        
+        # FIXED: Clusters only feed the per-cluster overrides; skip the work when none are configured
+        if not self.cluster_service_levels and not self.cluster_forecast_models:
+            return {}
+        
+        try:
+            from analysis.demand_clustering import assign_demand_clusters
+            shop_key = getattr(self.user_profile, 'shop_name', None) if self.user_profile else None
+            return assign_demand_clusters(orders_df, shop_key)
+        except ImportError:
+            logger.warning("Demand clustering not available (scikit-learn missing)")
+        except Exception as e:
+            logger.warning(f"Demand clustering failed, continuing without clusters: {e}")
+        return {}
+    
     def analyze_comprehensive_performance(
         self, 
         recent_orders_df: pd.DataFrame, 
         historical_orders_df: pd.DataFrame, 
         inventory_df: pd.DataFrame,
         cached_historical_df: pd.DataFrame = None
-    ) -> Tuple[List[ProductInsight], List[SeasonalInsight], Dict]:
+    ) -> Tuple[InsightTable, List[SeasonalInsight], Dict]:
         """
         FIXED: Comprehensive analysis with proper daily_demand calculation
+        
+        Product insights are returned as a columnar InsightTable; iterating it
+        yields row views with the same attributes as ProductInsight.
         """
         
         if recent_orders_df.empty and historical_orders_df.empty and (cached_historical_df is None or cached_historical_df.empty):
-            return [], [], {}
+            return InsightTable.empty(), [], {}
         
-        st.info("🧠 **Running Advanced Business Intelligence Analysis...**")
+        progress.info("🧠 **Running Advanced Business Intelligence Analysis...**")
         
-        with st.spinner("Analyzing trends and generating insights..."):
+        with progress.stage("Analyzing trends and generating insights..."):
             
             try:
-                # Step 1: Analyze recent performance
-                recent_analysis = self._analyze_period_performance(recent_orders_df, "recent")
+                # Step 0: Demand-pattern clusters (per-cluster forecasting and service levels)
+                cluster_source = cached_historical_df if cached_historical_df is not None and not cached_historical_df.empty else historical_orders_df
+                with tracing.span('demand_clusters', rows=len(cluster_source)):
+                    self.demand_clusters = self._assign_demand_clusters(cluster_source)
                 
-                # Step 2: Analyze historical baseline - FIXED to use cached data
+                # Step 2 input: historical baseline - FIXED to use cached data
                 if cached_historical_df is not None and not cached_historical_df.empty:
-                    st.info("📚 Using cached historical data for trend analysis...")
-                    historical_analysis = self._analyze_period_performance(cached_historical_df, "historical")
+                    progress.info("📚 Using cached historical data for trend analysis...")
                     seasonal_data = cached_historical_df
                 else:
-                    historical_analysis = self._analyze_period_performance(historical_orders_df, "historical")
                     seasonal_data = historical_orders_df
                 
+                # Step 1: Analyze recent performance (includes forecasting); the recent window is too
+                # short to backtest, so its forecast models are selected on the historical data
+                with tracing.span('recent_performance_and_forecast', rows=len(recent_orders_df)):
+                    recent_analysis = self._analyze_period_performance(recent_orders_df, "recent", seasonal_data)
+                
+                # Step 2: Analyze historical baseline
+                with tracing.span('historical_performance_and_forecast', rows=len(seasonal_data)):
+                    historical_analysis = self._analyze_period_performance(seasonal_data, "historical")
+                
                 # Step 3: Combine with inventory data
-                inventory_analysis = self._analyze_inventory_status(inventory_df)
+                with tracing.span('inventory_status', rows=len(inventory_df)):
+                    inventory_analysis = self._analyze_inventory_status(inventory_df)
+                
+                # Step 3.5: Pre-aggregate pending orders once for all per-product lookups
+                self.pending_index = self._build_pending_index()
+                
+                # Step 3.6: Per-product seasonal indices (cached by historical data content)
+                with tracing.span('seasonal_profile'):
+                    self.seasonal_profile = build_seasonal_profile(seasonal_data)
+                
+                # Inputs shared by every product; a change here invalidates all cached results
+                result_cache = self._get_result_cache()
+                if result_cache is not None:
+                    result_cache.set_context((
+                        datetime.now().date(),
+                        self.default_lead_time,
+                        self.seasonal_profile.key if self.seasonal_profile is not None else None,
+                        tuple(sorted(self.cluster_service_levels.items())),
+                        tuple(sorted(self.service_optimizer.vendor_service_levels.items())) if self.service_optimizer else (),
+                        tuple(sorted(self.cluster_forecast_models.items()))
+                    ))
                 
                 # Step 4: Generate product insights
-                product_insights = self._generate_product_insights(
-                    recent_analysis, historical_analysis, inventory_analysis
-                )
+                with tracing.span('product_insights'):
+                    product_insights = self._generate_product_insights(
+                        recent_analysis, historical_analysis, inventory_analysis
+                    )
+                    tracing.set_attrs(rows=len(product_insights))
                 
                 # Step 5: Seasonal analysis
-                seasonal_insights = self._analyze_seasonality(seasonal_data)
+                with tracing.span('seasonality'):
+                    seasonal_insights = self._analyze_seasonality(seasonal_data)
                 
                 # Step 6: Business summary metrics
-                summary_metrics = self._calculate_summary_metrics(
-                    recent_orders_df, seasonal_data, product_insights
-                )
+                with tracing.span('summary_metrics'):
+                    summary_metrics = self._calculate_summary_metrics(
+                        recent_orders_df, seasonal_data, product_insights
+                    )
                 
             except Exception as e:
-                st.error(f"❌ Error in comprehensive analysis: {e}")
+                progress.error(f"❌ Error in comprehensive analysis: {e}")
                 logger.error(f"Comprehensive analysis failed: {e}")
-                return [], [], {}
+                return InsightTable.empty(), [], {}
         
         return product_insights, seasonal_insights, summary_metrics
     
-    def _analyze_period_performance(self, orders_df: pd.DataFrame, period_name: str) -> pd.DataFrame:
-        """FIXED: Analyze performance for a specific time period with proper daily_demand calculation"""
+    def _select_forecast_models(self, sales_data: Optional[pd.DataFrame]) -> Dict[int, str]:
+        """Backtest-selected forecast model per product; products without enough history are left out"""
+        
+        if sales_data is None or sales_data.empty:
+            return {}
+        
+        try:
+            from analysis.model_selection import ForecastModelSelector
+            selection = ForecastModelSelector().select(sales_data)
+            tested = selection[selection['windows'] > 0]
+            return dict(zip(tested['product_id'].astype(int), tested['model']))
+        except ImportError:
+            logger.warning("Forecast model selection not available")
+        except Exception as e:
+            logger.warning(f"Forecast model selection failed, using Holt-Winters: {e}")
+        return {}
+    
+    def _analyze_period_performance(self, orders_df: pd.DataFrame, period_name: str,
+                                    selection_data: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+        """
+        FIXED: Analyze performance for a specific time period with proper daily_demand calculation.
+        Forecast models are chosen per product by backtesting selection_data (default: orders_df).
+        """
         
         if orders_df.empty:
             return pd.DataFrame()
@@ -113,33 +224,65 @@ class EnhancedBusinessIntelligenceEngine:
             # FIXED: Add forecasting with better error handling
             try:
                 from analysis.demand_forecasting import AdvancedDemandForecaster
+                from analysis.forecast_models import get_model
                 forecaster = AdvancedDemandForecaster()
                 
-                # Initialize forecasting columns
-                analysis['forecast_daily_demand'] = analysis['daily_demand']
-                analysis['demand_volatility'] = 0.0
+                # NEW: Reuse forecasts for products whose sales slice is unchanged since the last run
+                cache = self._get_result_cache()
+                fingerprints = sales_fingerprints(orders_df) if cache is not None else {}
+                product_rows = orders_df.groupby('product_id').indices
+                
+                # NEW: Per-product model from backtesting; cluster overrides take precedence and
+                # products that could not be backtested keep Holt-Winters
+                with tracing.span('forecast_model_selection'):
+                    selected_models = self._select_forecast_models(
+                        selection_data if selection_data is not None else orders_df
+                    )
+                period_days = pd.date_range(orders_df['created_at'].min().floor('D'),
+                                            orders_df['created_at'].max().floor('D'), freq='D').date
+                
+                forecast_values = analysis['daily_demand'].to_numpy(dtype=float).copy()
+                volatility_values = np.zeros(len(analysis))
                 
-                for idx, row in analysis.iterrows():
+                for pos, (product_id, daily_demand) in enumerate(zip(analysis['product_id'], analysis['daily_demand'])):
+                    fingerprint = fingerprints.get(int(product_id))
+                    model_name = (self.cluster_forecast_models.get(self.cluster_for_product(product_id))
+                                  or selected_models.get(int(product_id)))
+                    if model_name:
+                        fingerprint = (fingerprint, model_name)
+                    if cache is not None:
+                        cached = cache.get_forecast(period_name, int(product_id), fingerprint)
+                        if cached is not None:
+                            forecast_values[pos], volatility_values[pos] = cached
+                            continue
                     try:
                         # Get time series data for this product
-                        product_orders = orders_df[orders_df['product_id'] == row['product_id']]
+                        product_orders = orders_df.iloc[product_rows[product_id]]
                         if len(product_orders) >= 14:  # Minimum data requirement
                             daily_sales = product_orders.groupby(product_orders['created_at'].dt.date)['quantity'].sum()
                             if len(daily_sales) >= 7:  # Additional safety check
-                                forecasts = forecaster.holt_winters_forecast(daily_sales.values, 30)
-                                analysis.loc[idx, 'forecast_daily_demand'] = np.mean(forecasts) if forecasts else row['daily_demand']
-                                analysis.loc[idx, 'demand_volatility'] = np.std(daily_sales.values) if len(daily_sales) > 1 else 0
-                            else:
-                                analysis.loc[idx, 'forecast_daily_demand'] = row['daily_demand']
-                                analysis.loc[idx, 'demand_volatility'] = 0
-                        else:
-                            analysis.loc[idx, 'forecast_daily_demand'] = row['daily_demand']
-                            analysis.loc[idx, 'demand_volatility'] = 0
+                                if model_name:
+                                    # Registry models are backtested on dense daily series (no-sale days are 0)
+                                    dense_sales = daily_sales.reindex(period_days, fill_value=0)
+                                    forecasts = list(get_model(model_name).forecast_batch(dense_sales.values, 30)[0])
+                                else:
+                                    forecasts = forecaster.holt_winters_forecast(daily_sales.values, 30)
+                                forecast_values[pos] = np.mean(forecasts) if forecasts else daily_demand
+                                volatility_values[pos] = np.std(daily_sales.values) if len(daily_sales) > 1 else 0
                     except Exception as forecast_error:
                         # Fallback to basic calculation if forecasting fails
-                        analysis.loc[idx, 'forecast_daily_demand'] = row['daily_demand']
-                        analysis.loc[idx, 'demand_volatility'] = 0
-                        logger.warning(f"Forecasting failed for product {row['product_id']}: {forecast_error}")
+                        forecast_values[pos] = daily_demand
+                        volatility_values[pos] = 0
+                        logger.warning(f"Forecasting failed for product {product_id}: {forecast_error}")
+                    
+                    if cache is not None:
+                        cache.put_forecast(period_name, int(product_id), fingerprint,
+                                           float(forecast_values[pos]), float(volatility_values[pos]))
+                
+                analysis['forecast_daily_demand'] = forecast_values
+                analysis['demand_volatility'] = volatility_values
+                if cache is not None:
+                    cache.retain(analysis['product_id'].astype(int), period=period_name)
                         
             except ImportError:
                 # Fallback if forecasting module not available
@@ -167,7 +310,7 @@ class EnhancedBusinessIntelligenceEngine:
             
         except Exception as e:
             logger.error(f"Error in period performance analysis: {e}")
-            st.error(f"❌ Error analyzing {period_name} performance: {e}")
+            progress.error(f"❌ Error analyzing {period_name} performance: {e}")
             return pd.DataFrame()
     
     def _analyze_inventory_status(self, inventory_df: pd.DataFrame) -> pd.DataFrame:
@@ -194,7 +337,7 @@ class EnhancedBusinessIntelligenceEngine:
             
         except Exception as e:
             logger.error(f"Error in inventory analysis: {e}")
-            st.error(f"❌ Error analyzing inventory: {e}")
+            progress.error(f"❌ Error analyzing inventory: {e}")
             return pd.DataFrame()
     
     def _generate_product_insights(
@@ -202,7 +345,7 @@ class EnhancedBusinessIntelligenceEngine:
         recent_df: pd.DataFrame, 
         historical_df: pd.DataFrame, 
         inventory_df: pd.DataFrame
-    ) -> List[ProductInsight]:
+    ) -> InsightTable:
         """FIXED: Generate comprehensive product insights with proper error handling"""
         
         insights = []
@@ -226,35 +369,145 @@ class EnhancedBusinessIntelligenceEngine:
                 combined = historical_df.copy()
                 combined.columns = [col + '_historical' if col != 'product_id' else col for col in combined.columns]
             else:
-                return insights
+                return InsightTable.empty()
             
             # Merge with inventory
             if not inventory_df.empty:
                 combined = combined.merge(inventory_df, on='product_id', how='left')
             
-            # Generate insights for each product
-            for _, row in combined.iterrows():
+            # NEW: Only recompute products whose inputs changed since the last run
+            combined = combined.reset_index(drop=True)
+            cache = self._get_result_cache()
+            dirty_positions = list(range(len(combined)))
+            fingerprints = None
+            if cache is not None:
+                fingerprints = self._product_input_fingerprints(combined)
+                dirty_positions = []
+                for pos, (product_id, fingerprint) in enumerate(zip(combined['product_id'], fingerprints)):
+                    cached = cache.get_insight(product_id, fingerprint) if pd.notna(product_id) else None
+                    if cached is not None:
+                        insights.append(cached)
+                    else:
+                        dirty_positions.append(pos)
+            
+            # NEW: Newsvendor stock targets for all changed products in one vectorized call
+            dirty = combined.iloc[dirty_positions]
+            optimal_stock = self._batch_optimal_stock(dirty)
+            
+            # Generate insights for each changed product
+            for pos, row in dirty.iterrows():
                 try:
-                    insight = self._create_product_insight(row)
+                    insight = self._create_product_insight(row, optimal_stock.get(pos))
                     if insight:
                         insights.append(insight)
+                        if cache is not None:
+                            cache.put_insight(row['product_id'], fingerprints[pos], insight)
                 except Exception as e:
                     logger.error(f"Error creating insight for product {row.get('product_id')}: {e}")
                     continue
             
-            # Sort by priority and performance
-            insights.sort(key=lambda x: (
-                {'CRITICAL': 4, 'HIGH': 3, 'MEDIUM': 2, 'LOW': 1}[x.reorder_priority],
-                x.recent_daily_demand
-            ), reverse=True)
+            if cache is not None:
+                cache.retain(combined['product_id'].dropna())
+                logger.info(f"Incremental analysis: {cache.stats()}")
+            
+            # Store columnar and sort by priority and performance
+            return InsightTable.from_insights(insights).sort_by_priority()
             
         except Exception as e:
             logger.error(f"Error generating product insights: {e}")
-            st.error(f"❌ Error generating insights: {e}")
+            progress.error(f"❌ Error generating insights: {e}")
         
-        return insights
+        return InsightTable.from_insights(insights)
+    
+    def _batch_optimal_stock(self, frame: pd.DataFrame) -> Dict[int, float]:
+        """
+        Optimal stock level per row position, computed for the whole frame at once.
+        Rows whose inputs are missing are left out and fall back to the per-product path.
+        """
+        
+        if self.service_optimizer is None or frame.empty:
+            return {}
+        
+        try:
+            def numeric(column: str) -> np.ndarray:
+                if column not in frame.columns:
+                    return np.zeros(len(frame))
+                return pd.to_numeric(frame[column], errors='coerce').to_numpy(dtype=np.float64)
+            
+            recent_daily = numeric('daily_demand_recent')
+            historical_daily = numeric('daily_demand_historical')
+            empty = pd.Series([None] * len(frame), index=frame.index)
+            vendors = [
+                self._resolve_vendor(recent, historical, inventory)
+                for recent, historical, inventory in zip(
+                    frame.get('vendor_recent', empty), frame.get('vendor_historical', empty), frame.get('vendor', empty)
+                )
+            ]
+            lead_times = np.array([self.get_lead_time_for_brand(v) for v in vendors], dtype=np.float64)
+            
+            seasonal = np.ones(len(frame))
+            if self.seasonal_profile is not None:
+                seasonal = np.array([
+                    self.seasonal_profile.forecast_factor(pid, int(lt)) if pd.notna(pid) else 1.0
+                    for pid, lt in zip(frame['product_id'], lead_times)
+                ])
+            forecast_daily = recent_daily * seasonal
+            demand_std = np.where(historical_daily > 0, historical_daily * 0.3, forecast_daily * 0.5)
+            
+            service_levels = self.service_optimizer.service_levels_for_vendors(vendors)
+            if self.cluster_service_levels:
+                # Per-cluster targets override the vendor level for products in that cluster
+                cluster_levels = np.array([
+                    self.cluster_service_levels.get(self.cluster_for_product(pid), np.nan)
+                    for pid in frame['product_id']
+                ], dtype=np.float64)
+                service_levels = np.where(np.isnan(cluster_levels), service_levels, cluster_levels)
+            
+            optimal = self.service_optimizer.calculate_optimal_stock_batch(
+                forecast_daily, demand_std, lead_times,
+                service_levels,
+                holding_cost_per_unit=1.0, stockout_cost_per_unit=10.0
+            )['optimal_stock_level']
+            
+            return {pos: float(value) for pos, value in zip(frame.index, optimal) if np.isfinite(value)}
+            
+        except Exception as e:
+            logger.warning(f"Batch service-level computation failed, using per-product path: {e}")
+            return {}
+    
+    @staticmethod
+    def _resolve_vendor(*candidates) -> str:
+        """First non-empty vendor among the recent/historical/inventory columns"""
+        vendor = 'Unknown'
+        for candidate in candidates:
+            if candidate:
+                vendor = str(candidate)
+                break
+        return 'Unknown' if vendor in ['nan', 'None', 'null'] else vendor
+    
+    def _service_level_for_product(self, product_id, brand: str) -> float:
+        """Cluster service level for the product when configured, else the vendor's level"""
+        cluster_level = self.cluster_service_levels.get(self.cluster_for_product(product_id))
+        if cluster_level is not None:
+            return cluster_level
+        return self.service_optimizer.service_level_for_vendor(brand)
     
-    def _create_product_insight(self, row) -> Optional[ProductInsight]:
+    def _optimal_stock_level(self, daily_demand: float, historical_daily: float, lead_time: int, brand: str,
+                             product_id=None) -> float:
+        """Per-product newsvendor stock level, used when no batch value was precomputed"""
+        if self.service_optimizer is None:
+            raise ImportError("Service level optimizer not available")
+        optimal_data = self.service_optimizer.calculate_optimal_stock(
+            daily_demand=daily_demand,
+            demand_std=historical_daily * 0.3 if historical_daily > 0 else daily_demand * 0.5,
+            lead_time=lead_time,
+            holding_cost_per_unit=1.0,
+            stockout_cost_per_unit=10.0,
+            service_level=self._service_level_for_product(product_id, brand)
+        )
+        return optimal_data['optimal_stock_level']
+    
+    def _create_product_insight(self, row, optimal_stock: Optional[float] = None) -> Optional[ProductInsight]:
         """FIXED: Create individual product insight with pending orders support"""
         
         try:
@@ -285,9 +538,7 @@ class EnhancedBusinessIntelligenceEngine:
             if description in ['nan', 'None', 'null']:
                 description = 'No description'
             
-            vendor = str(row.get('vendor_recent') or row.get('vendor_historical') or row.get('vendor') or 'Unknown')
-            if vendor in ['nan', 'None', 'null']:
-                vendor = 'Unknown'
+            vendor = self._resolve_vendor(row.get('vendor_recent'), row.get('vendor_historical'), row.get('vendor'))
             
             # Calculate velocity change
             if historical_daily > 0 and recent_daily > 0:
@@ -354,25 +605,32 @@ class EnhancedBusinessIntelligenceEngine:
             # Inventory calculations
             days_until_stockout = int(current_inventory / recent_daily) if recent_daily > 0 else 999
             
-            # NEW: Check if pending orders are included in analysis
-            analysis_includes_pending = getattr(st.session_state, 'analysis_includes_pending', False)
-            
-            # NEW: Calculate pending inventory for this product if available
+            # NEW: Calculate pending inventory for this product if pending orders are included
             pending_inventory = 0
-            if analysis_includes_pending:
+            if self.pending_index:
                 pending_inventory = self._calculate_pending_inventory_for_product(style_number)
             
+            # NEW: Scale demand by the product's seasonal index over the coming lead time
+            seasonal_factor = 1.0
+            if self.seasonal_profile is not None:
+                seasonal_factor = self.seasonal_profile.forecast_factor(product_id, self.get_lead_time_for_brand(vendor))
+            forecast_daily = recent_daily * seasonal_factor
+            
             # Calculate reorder recommendation - USE PENDING-AWARE METHOD IF PENDING ORDERS EXIST
             if pending_inventory > 0:
                 reorder_priority, recommended_qty, reorder_timing, reasoning = self._calculate_reorder_recommendation_with_pending(
-                    trend_classification, recent_daily, recent_total, current_inventory, 
-                    pending_inventory, days_until_stockout, velocity_change, historical_daily, vendor
+                    trend_classification, forecast_daily, recent_total, current_inventory, 
+                    pending_inventory, days_until_stockout, velocity_change, historical_daily, vendor,
+                    optimal_stock, product_id
                 )
             else:
                 reorder_priority, recommended_qty, reorder_timing, reasoning = self._calculate_reorder_recommendation_improved(
-                    trend_classification, recent_daily, recent_total, current_inventory, 
-                    days_until_stockout, velocity_change, historical_daily, vendor
+                    trend_classification, forecast_daily, recent_total, current_inventory, 
+                    days_until_stockout, velocity_change, historical_daily, vendor,
+                    optimal_stock, product_id
                 )
+            if abs(seasonal_factor - 1.0) >= 0.05:
+                reasoning += f" Seasonal demand factor {seasonal_factor:.2f}x applied."
             
             return ProductInsight(
                 product_id=int(product_id),
@@ -403,24 +661,75 @@ class EnhancedBusinessIntelligenceEngine:
             logger.error(f"Failed to create insight for product {row.get('product_id', 'unknown')}: {e}")
             return None
 
+    def _state(self):
+        """State carried between runs: the given mapping, else Streamlit session state"""
+        return self.state if self.state is not None else st.session_state
+    
+    def _get_result_cache(self) -> Optional[ProductResultCache]:
+        """Per-session cache of per-product results from previous analysis runs"""
+        
+        try:
+            state = self._state()
+            cache = state.get(SESSION_KEY)
+            if not isinstance(cache, ProductResultCache):
+                cache = ProductResultCache()
+                state[SESSION_KEY] = cache
+            return cache
+        except Exception as e:
+            logger.warning(f"Result cache unavailable, running full analysis: {e}")
+            return None
+    
+    def _product_input_fingerprints(self, combined: pd.DataFrame) -> list:
+        """
+        Fingerprint each product's inputs: its merged sales/inventory row plus the pending
+        quantity and lead time for every style/vendor the row could resolve to
+        """
+        parts = [row_fingerprints(combined)]
+        
+        for col in ('style_number_recent', 'style_number_historical', 'style_number'):
+            if col in combined.columns:
+                if self.pending_index:
+                    parts.append(combined[col].astype(str).map(self.pending_index.quantity_for_style).to_numpy())
+        
+        for col in ('vendor_recent', 'vendor_historical', 'vendor'):
+            if col in combined.columns:
+                parts.append(combined[col].astype(str).map(self.get_lead_time_for_brand).to_numpy())
+        
+        if self.cluster_service_levels:
+            parts.append(combined['product_id'].map(self.cluster_for_product).astype(object).to_numpy())
+        
+        return list(zip(*[part.tolist() for part in parts]))
+    
+    def _build_pending_index(self) -> Optional[PendingInventoryIndex]:
+        """Index session pending orders by style/variant/location when the analysis includes them"""
+        
+        try:
+            if self.pending_orders is not None:
+                pending_orders_data = self.pending_orders
+            elif not self._state().get('analysis_includes_pending', False):
+                return None
+            else:
+                pending_orders_data = self._state().get('pending_orders', [])
+            if not pending_orders_data:
+                return None
+            
+            return PendingInventoryIndex.build(pending_orders_data)
+            
+        except Exception as e:
+            logger.warning(f"Error indexing pending orders: {e}")
+            return None
+    
     def _calculate_pending_inventory_for_product(self, style_number: str) -> int:
         """Calculate total pending inventory for a specific product style"""
         
         try:
-            # Get pending orders from session state
-            pending_orders_data = st.session_state.get('pending_orders', [])
+            if self.pending_index is None:
+                self.pending_index = self._build_pending_index()
             
-            if not pending_orders_data:
+            if not self.pending_index:
                 return 0
             
-            total_pending = 0
-            
-            for order_data in pending_orders_data:
-                if str(order_data.get('style_number', '')) == str(style_number):
-                    quantity = int(order_data.get('quantity', 0))
-                    total_pending += quantity
-            
-            return total_pending
+            return self.pending_index.quantity_for_style(style_number)
             
         except Exception as e:
             logger.warning(f"Error calculating pending inventory for {style_number}: {e}")
@@ -435,7 +744,9 @@ class EnhancedBusinessIntelligenceEngine:
         days_until_stockout: int, 
         velocity_change: float,
         historical_daily: float,
-        brand: str = "Unknown"
+        brand: str = "Unknown",
+        optimal_stock: Optional[float] = None,
+        product_id=None
     ) -> Tuple[str, int, str, str]:
         """FIXED: Calculate smart reorder recommendations with brand-specific lead times"""
         
@@ -443,18 +754,11 @@ class EnhancedBusinessIntelligenceEngine:
             # Use brand-specific lead time
             lead_time = self.get_lead_time_for_brand(brand)
             
-            # Use service level optimizer if available
+            # Use service level optimizer if available (precomputed in batch when possible)
             try:
-                from analysis.service_level_optimizer import ServiceLevelOptimizer
-                optimizer = ServiceLevelOptimizer()
-                optimal_data = optimizer.calculate_optimal_stock(
-                    daily_demand=daily_demand,
-                    demand_std=historical_daily * 0.3 if historical_daily > 0 else daily_demand * 0.5,
-                    lead_time=lead_time,
-                    holding_cost_per_unit=1.0,
-                    stockout_cost_per_unit=10.0
-                )
-                base_qty = optimal_data['optimal_stock_level']
+                if optimal_stock is None:
+                    optimal_stock = self._optimal_stock_level(daily_demand, historical_daily, lead_time, brand, product_id)
+                base_qty = optimal_stock
             except (ImportError, Exception):
                 # Fallback calculation if optimizer not available
                 base_qty = max(1, daily_demand * lead_time * 1.5)  # 1.5x lead time demand
@@ -547,111 +851,43 @@ class EnhancedBusinessIntelligenceEngine:
             return 'LOW', 1, 'Monitor', f"Error in calculation: {str(e)}"
     
     def _analyze_seasonality(self, historical_orders_df: pd.DataFrame) -> List[SeasonalInsight]:
-        """FIXED: Analyze seasonal patterns with proper error handling"""
+        """Monthly seasonal patterns from the per-product seasonal index profile"""
         
         if historical_orders_df is None or historical_orders_df.empty:
             return []
         
         try:
-            # Create a copy to avoid modifying original data
-            df_copy = historical_orders_df.copy()
-            
-            # Ensure created_at is datetime
-            if not pd.api.types.is_datetime64_any_dtype(df_copy['created_at']):
-                df_copy['created_at'] = pd.to_datetime(df_copy['created_at'])
-            
-            # Remove any rows with invalid dates
-            df_copy = df_copy.dropna(subset=['created_at'])
-            
-            if df_copy.empty or 'quantity' not in df_copy.columns:
-                return []
-            
-            # Add month column
-            df_copy['month'] = df_copy['created_at'].dt.month
-            
-            # Calculate monthly metrics
-            monthly_stats = df_copy.groupby('month').agg({
-                'quantity': 'sum',
-                'created_at': 'count'
-            }).reset_index()
-            
-            # Only proceed if we have data for multiple months
-            if len(monthly_stats) < 2:
+            profile = self.seasonal_profile if self.seasonal_profile is not None else build_seasonal_profile(historical_orders_df)
+            if profile is None:
                 return []
             
-            # Calculate daily averages per month
-            days_per_month = {1: 31, 2: 28, 3: 31, 4: 30, 5: 31, 6: 30, 
-                            7: 31, 8: 31, 9: 30, 10: 31, 11: 30, 12: 31}
+            # Store-wide multiplier of each month's daily demand vs the average month
+            store_daily = profile.store_daily
+            overall_avg = store_daily.mean()
+            multipliers = store_daily / overall_avg if overall_avg > 0 else pd.Series(1.0, index=store_daily.index)
             
-            monthly_stats['avg_daily_demand'] = monthly_stats['quantity'] / monthly_stats['month'].map(days_per_month)
-            
-            # Calculate seasonal multipliers
-            overall_avg = monthly_stats['avg_daily_demand'].mean()
-            if overall_avg > 0:
-                monthly_stats['seasonal_multiplier'] = monthly_stats['avg_daily_demand'] / overall_avg
-            else:
-                monthly_stats['seasonal_multiplier'] = 1.0
-            
-            # Generate seasonal insights
             seasonal_insights = []
-            month_names = {1: 'January', 2: 'February', 3: 'March', 4: 'April', 
-                          5: 'May', 6: 'June', 7: 'July', 8: 'August', 
-                          9: 'September', 10: 'October', 11: 'November', 12: 'December'}
-            
-            for _, row in monthly_stats.iterrows():
-                month = row['month']
-                
-                # Get seasonally elevated products for this month
-                elevated_products = []
-                
-                # Calculate product elevation if we have proper data
-                if 'Style Number' in df_copy.columns and 'Description' in df_copy.columns:
-                    month_data = df_copy[df_copy['month'] == month]
-                    month_data_clean = month_data[
-                        month_data['Style Number'].notna() & 
-                        (month_data['Style Number'] != '') &
-                        month_data['Description'].notna() & 
-                        (month_data['Description'] != '')
-                    ]
-                    
-                    if not month_data_clean.empty:
-                        # Get top products for this month
-                        month_products = month_data_clean.groupby(['Style Number', 'Description', 'product_id']).agg({
-                            'quantity': 'sum'
-                        }).reset_index().sort_values('quantity', ascending=False).head(5)
-                        
-                        for _, product_row in month_products.iterrows():
-                            elevated_products.append({
-                                'style_number': str(product_row['Style Number']),
-                                'description': str(product_row['Description'])[:50] + "..." if len(str(product_row['Description'])) > 50 else str(product_row['Description']),
-                                'product_id': int(product_row['product_id']),
-                                'quantity': int(product_row['quantity']),
-                                'seasonal_elevation': 1.5,  # Simplified for now
-                                'daily_avg_month': float(product_row['quantity'] / days_per_month[month]),
-                                'daily_avg_overall': float(product_row['quantity'] / 365)  # Simplified
-                            })
-                
-                insight = SeasonalInsight(
+            for month in profile.months:
+                seasonal_insights.append(SeasonalInsight(
                     month=month,
-                    month_name=month_names[month],
-                    avg_daily_demand=float(row['avg_daily_demand']),
-                    peak_products=elevated_products,
-                    seasonal_multiplier=float(row['seasonal_multiplier'])
-                )
-                seasonal_insights.append(insight)
+                    month_name=MONTH_NAMES[month],
+                    avg_daily_demand=float(store_daily[month]),
+                    peak_products=profile.peak_products(month, k=5),
+                    seasonal_multiplier=float(multipliers[month])
+                ))
             
             return seasonal_insights
             
         except Exception as e:
             logger.error(f"Seasonality analysis failed: {e}")
-            st.error(f"❌ Error in seasonal analysis: {e}")
+            progress.error(f"❌ Error in seasonal analysis: {e}")
             return []
     
     def _calculate_summary_metrics(
         self, 
         recent_orders_df: pd.DataFrame, 
         historical_orders_df: pd.DataFrame, 
-        insights: List[ProductInsight]
+        insights: InsightTable
     ) -> Dict:
         """FIXED: Calculate high-level business metrics with error handling"""
         
@@ -691,20 +927,22 @@ class EnhancedBusinessIntelligenceEngine:
                 if historical_daily_revenue > 0:
                     summary['revenue_growth_rate'] = ((recent_daily_revenue - historical_daily_revenue) / historical_daily_revenue) * 100
             
-            # Insights summary
+            # Insights summary - vectorized over the insight columns
             if insights:
-                summary['trending_up_count'] = len([i for i in insights if 'Trending Up' in i.trend_classification])
-                summary['declining_count'] = len([i for i in insights if 'Declining' in i.trend_classification])
-                summary['critical_reorders'] = len([i for i in insights if i.reorder_priority == 'CRITICAL'])
-                summary['high_priority_reorders'] = len([i for i in insights if i.reorder_priority == 'HIGH'])
+                table = InsightTable.coerce(insights)
+                stockout_days = table.column('days_until_stockout')
+                
+                summary['trending_up_count'] = int(table.contains_mask('trend_classification', 'Trending Up', case=True).sum())
+                summary['declining_count'] = int(table.contains_mask('trend_classification', 'Declining', case=True).sum())
+                summary['critical_reorders'] = table.count(reorder_priority='CRITICAL')
+                summary['high_priority_reorders'] = table.count(reorder_priority='HIGH')
                 
-                stockout_days = [i.days_until_stockout for i in insights if i.days_until_stockout < 999]
-                summary['avg_days_until_stockout'] = sum(stockout_days) / len(stockout_days) if stockout_days else 999
-                summary['inventory_at_risk'] = len([i for i in insights if i.days_until_stockout <= 30])
+                summary['avg_days_until_stockout'] = table.mean('days_until_stockout', stockout_days < 999, default=999)
+                summary['inventory_at_risk'] = int((stockout_days <= 30).sum())
         
         except Exception as e:
             logger.error(f"Summary metrics calculation failed: {e}")
-            st.error(f"❌ Error calculating summary metrics: {e}")
+            progress.error(f"❌ Error calculating summary metrics: {e}")
         
         return summary
     
@@ -718,7 +956,9 @@ class EnhancedBusinessIntelligenceEngine:
         days_until_stockout: int, 
         velocity_change: float,
         historical_daily: float,
-        brand: str = "Unknown"
+        brand: str = "Unknown",
+        optimal_stock: Optional[float] = None,
+        product_id=None
     ) -> Tuple[str, int, str, str]:
         """ENHANCED: Calculate smart reorder recommendations accounting for pending orders"""
         
@@ -730,18 +970,11 @@ class EnhancedBusinessIntelligenceEngine:
             projected_inventory = current_inventory + pending_inventory
             projected_days_until_stockout = int(projected_inventory / daily_demand) if daily_demand > 0 else 999
             
-            # Use service level optimizer if available
+            # Use service level optimizer if available (precomputed in batch when possible)
             try:
-                from analysis.service_level_optimizer import ServiceLevelOptimizer
-                optimizer = ServiceLevelOptimizer()
-                optimal_data = optimizer.calculate_optimal_stock(
-                    daily_demand=daily_demand,
-                    demand_std=historical_daily * 0.3 if historical_daily > 0 else daily_demand * 0.5,
-                    lead_time=lead_time,
-                    holding_cost_per_unit=1.0,
-                    stockout_cost_per_unit=10.0
-                )
-                base_qty = max(0, optimal_data['optimal_stock_level'] - pending_inventory)  # Reduce by pending
+                if optimal_stock is None:
+                    optimal_stock = self._optimal_stock_level(daily_demand, historical_daily, lead_time, brand, product_id)
+                base_qty = max(0, optimal_stock - pending_inventory)  # Reduce by pending
             except (ImportError, Exception):
                 # Fallback calculation accounting for pending orders
                 target_inventory = max(1, daily_demand * lead_time * 1.5)
@@ -0,0 +1,177 @@
+"""
+Incremental Demand Clustering
+MiniBatchKMeans demand-pattern clusters persisted per shop. Features cover a fixed trailing
+window that only advances with the data's latest week, and each run only feeds products whose
+own sales in that window changed through partial_fit; unchanged products keep their cluster.
+"""
+import logging
+import os
+import pickle
+import threading
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.preprocessing import StandardScaler
+
+from analysis.model_store import MODEL_DIR, shop_model_dir
+
+logger = logging.getLogger(__name__)
+
+CLUSTER_FILE = "demand_clusters.pkl"
+CLUSTER_WINDOW_WEEKS = 52   # Trailing window of whole weeks the demand features are computed over
+
+_clusterers: Dict[str, 'IncrementalDemandClusterer'] = {}
+_clusterers_lock = threading.Lock()
+
+
+def get_demand_clusterer(shop_key: Optional[str], n_clusters: int = 5) -> 'IncrementalDemandClusterer':
+    """Process-wide clusterer for a shop, loaded from disk on first use"""
+    key = str(shop_key or 'default')
+    with _clusterers_lock:
+        clusterer = _clusterers.get(key)
+        if clusterer is None or clusterer.n_clusters != n_clusters:
+            clusterer = IncrementalDemandClusterer.load(key, n_clusters)
+            _clusterers[key] = clusterer
+        return clusterer
+
+
+class IncrementalDemandClusterer:
+    """Per-shop MiniBatchKMeans over demand features with incremental assignment"""
+
+    def __init__(self, shop_key: str, n_clusters: int = 5, batch_size: int = 1024,
+                 random_state: int = 42, model_dir: Optional[str] = MODEL_DIR):
+        self.shop_key = shop_key
+        self.n_clusters = n_clusters
+        self.batch_size = batch_size
+        self.model_dir = model_dir
+        self.kmeans = MiniBatchKMeans(n_clusters=n_clusters, batch_size=batch_size,
+                                      random_state=random_state, n_init=3)
+        self.scaler = StandardScaler()
+        self.is_fitted = False
+        self.clusters: Dict[int, int] = {}
+        self.fingerprints: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, shop_key: str, n_clusters: int = 5, model_dir: Optional[str] = MODEL_DIR) -> 'IncrementalDemandClusterer':
+        path = os.path.join(shop_model_dir(shop_key, model_dir), CLUSTER_FILE) if model_dir else None
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'rb') as f:
+                    clusterer = pickle.load(f)
+                if isinstance(clusterer, cls) and clusterer.n_clusters == n_clusters:
+                    clusterer.model_dir = model_dir
+                    clusterer._lock = threading.Lock()
+                    return clusterer
+            except Exception as e:
+                logger.warning(f"Could not load demand clusters for shop, starting fresh: {e}")
+        return cls(shop_key, n_clusters, model_dir=model_dir)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('_lock', None)
+        return state
+
+    def save(self):
+        if not self.model_dir:
+            return
+        directory = shop_model_dir(self.shop_key, self.model_dir)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            tmp_path = os.path.join(directory, CLUSTER_FILE + '.tmp')
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, os.path.join(directory, CLUSTER_FILE))
+        except Exception as e:
+            logger.warning(f"Could not persist demand clusters: {e}")
+
+    def update(self, product_ids: Sequence, features: np.ndarray, retain_only: bool = True,
+               fingerprints: Optional[Sequence] = None) -> Dict[int, int]:
+        """
+        Fit and assign only products whose fingerprints are new or changed (by default a hash of
+        the feature rows). Returns the full product -> cluster mapping for product_ids.
+        """
+        features = np.asarray(features, dtype=np.float64)
+        product_ids = [int(pid) for pid in product_ids]
+        if fingerprints is None:
+            # Row fingerprints detect products whose demand features moved since the last run
+            fingerprints = pd.util.hash_pandas_object(pd.DataFrame(np.round(features, 9)), index=False).to_numpy()
+
+        with self._lock:
+            changed = [i for i, (pid, fp) in enumerate(zip(product_ids, fingerprints))
+                       if self.fingerprints.get(pid) != int(fp) or pid not in self.clusters]
+
+            if changed:
+                X = np.nan_to_num(features[changed])
+                if self._partial_fit(X):
+                    assigned = self.kmeans.predict(self.scaler.transform(X))
+                    for i, cluster in zip(changed, assigned):
+                        self.clusters[product_ids[i]] = int(cluster)
+                        self.fingerprints[product_ids[i]] = int(fingerprints[i])
+
+            if retain_only:
+                keep = set(product_ids)
+                self.clusters = {pid: c for pid, c in self.clusters.items() if pid in keep}
+                self.fingerprints = {pid: fp for pid, fp in self.fingerprints.items() if pid in keep}
+
+            if changed:
+                self.save()
+            logger.info(f"Demand clustering: {len(changed)} of {len(product_ids)} products (re)assigned")
+            return {pid: self.clusters[pid] for pid in product_ids if pid in self.clusters}
+
+    def _partial_fit(self, X: np.ndarray) -> bool:
+        """Feed rows through the scaler and MiniBatchKMeans in batch_size chunks"""
+        if not self.is_fitted and len(X) < self.n_clusters:
+            return False  # Not enough products to seed the clusters yet
+        self.scaler.partial_fit(X)
+        scaled = self.scaler.transform(X)
+        for start in range(0, len(scaled), self.batch_size):
+            self.kmeans.partial_fit(scaled[start:start + self.batch_size])
+            self.is_fitted = True
+        return True
+
+    def cluster_of(self, product_id) -> Optional[int]:
+        return self.clusters.get(int(product_id))
+
+    def cluster_sizes(self) -> Dict[int, int]:
+        return pd.Series(list(self.clusters.values()), dtype=int).value_counts().sort_index().to_dict()
+
+
+def trailing_window(orders_df: pd.DataFrame, weeks: int = CLUSTER_WINDOW_WEEKS) -> pd.DatetimeIndex:
+    """Days of the last `weeks` whole weeks up to the week of the latest order"""
+    last_day = orders_df['created_at'].max().floor('D')
+    week_end = last_day + pd.Timedelta(days=6 - last_day.dayofweek)
+    return pd.date_range(end=week_end, periods=weeks * 7, freq='D')
+
+
+def assign_demand_clusters(orders_df: pd.DataFrame, shop_key: Optional[str], n_clusters: int = 5) -> Dict[int, int]:
+    """Daily sales over the trailing window -> demand features -> incremental cluster assignment"""
+    if orders_df.empty:
+        return {}
+
+    from analysis.ml_pattern_detector import MLPatternDetector
+
+    # FIXED: Features cover a fixed-length window anchored to the data's latest week instead of
+    # the full min..max range, so a product's features only move when its own sales do
+    dates = trailing_window(orders_df)
+    days = orders_df['created_at'].dt.floor('D')
+    in_window = (days >= dates[0]).to_numpy()
+    daily = orders_df[in_window].groupby(['product_id', days[in_window]])['quantity'].sum()
+    if daily.empty:
+        return {}
+    product_ids = daily.index.get_level_values(0).unique().sort_values()
+
+    matrix = np.zeros((len(product_ids), len(dates)))
+    rows = product_ids.get_indexer(daily.index.get_level_values(0))
+    cols = dates.get_indexer(daily.index.get_level_values(1))
+    matrix[rows, cols] = daily.to_numpy(dtype=np.float64)
+
+    # Per-product fingerprint of its own (day, quantity) sales in the window, independent of row order
+    row_hashes = pd.util.hash_pandas_object(daily.reset_index(), index=False).to_numpy()
+    fingerprints = pd.Series(row_hashes, copy=False).groupby(rows).sum().to_numpy()
+
+    features = MLPatternDetector().extract_features_batch(matrix)
+    return get_demand_clusterer(shop_key, n_clusters).update(product_ids.to_numpy(), features,
+                                                             fingerprints=fingerprints)
@@ -0,0 +1,324 @@
+"""
+Headless Analysis Engine
+The full fetch -> process -> inventory -> business-intelligence pipeline without any UI calls.
+Progress goes to a pluggable sink (utils.progress); the Streamlit page, a CLI or a worker
+process each supply their own. analyze() replays the analysis from saved inputs.
+"""
+import hashlib
+import logging
+import os
+import pickle
+import time
+from dataclasses import asdict, dataclass, field, is_dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+from analysis.business_intelligence import EnhancedBusinessIntelligenceEngine
+from models.data_models import UserProfile
+from models.insight_table import InsightTable
+from utils import progress, tracing
+from utils.data_processing import process_orders_fast, create_inventory_dataframe_fast
+from utils.stage_cache import content_hash, estimate_size
+
+logger = logging.getLogger(__name__)
+
+# Safe mode keeps runs small enough to debug
+SAFE_MODE_RECENT_LIMIT = 100
+SAFE_MODE_HISTORICAL_LIMIT = 200
+TEST_MODE_PRODUCTS = 50
+
+RESULTS_DIR = os.path.join(".sharpstock_cache", "results")
+RESULT_FILE = "latest.pkl"
+
+
+class AnalysisError(Exception):
+    """A pipeline step failed in a way that leaves nothing to analyze"""
+
+
+@dataclass
+class AnalysisOptions:
+    recent_start: datetime
+    recent_end: datetime
+    historical_years: int = 2
+    use_cache: bool = True
+    test_mode: bool = False   # Top TEST_MODE_PRODUCTS products only
+    safe_mode: bool = False   # Cap order counts
+
+
+@dataclass
+class AnalysisInputs:
+    """Everything analyze() needs; saved to disk so a run can be replayed offline"""
+    recent_orders_df: pd.DataFrame
+    historical_orders_df: pd.DataFrame
+    inventory_df: pd.DataFrame
+    cached_historical_df: Optional[pd.DataFrame] = None
+    pending_orders: Optional[List] = None
+    _data_version: Optional[str] = field(default=None, init=False, repr=False, compare=False)
+
+    def data_version(self) -> str:
+        """Content hash of the order, inventory and pending-order data; computed once per inputs"""
+        if getattr(self, '_data_version', None) is None:
+            pending = pd.DataFrame([asdict(order) if is_dataclass(order) else dict(order)
+                                    for order in self.pending_orders or []]).astype(str)
+            self._data_version = content_hash(self.recent_orders_df, self.historical_orders_df, self.inventory_df,
+                                              self.cached_historical_df, pending)
+        return self._data_version
+
+    def save(self, path: str):
+        with open(path, 'wb') as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path: str) -> 'AnalysisInputs':
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+
+@dataclass
+class AnalysisResult:
+    insights: InsightTable
+    seasonal_insights: List
+    summary_metrics: Dict
+    inputs: AnalysisInputs
+    location_config: Dict[int, str]
+    demand_clusters: Dict[int, int] = field(default_factory=dict)
+    duration: float = 0.0
+    completed_at: datetime = field(default_factory=datetime.now)
+    trace: List[Dict] = field(default_factory=list)   # utils.tracing span records of this run
+
+    def session_values(self) -> Dict[str, Any]:
+        """The session-state keys the UI pages read after an analysis"""
+        return {
+            'insights': self.insights,
+            'seasonal_insights': self.seasonal_insights,
+            'summary_metrics': self.summary_metrics,
+            'recent_orders_df': self.inputs.recent_orders_df,
+            'historical_orders_df': self.inputs.historical_orders_df,
+            'inventory_df': self.inputs.inventory_df,
+            'analysis_duration': self.duration,
+            'data_fetched': True,
+            'location_config': self.location_config,
+            'analysis_trace': self.trace,
+            'analysis_data_version': self.inputs.data_version(),
+        }
+
+    def memory_size(self) -> int:
+        """Approximate in-memory size of the insights and frames"""
+        inputs = self.inputs
+        values = (self.insights, inputs.recent_orders_df, inputs.historical_orders_df,
+                  inputs.inventory_df, inputs.cached_historical_df)
+        return sum(estimate_size(value) for value in values if value is not None)
+
+
+class AnalysisEngine:
+    """
+    Runs the analysis pipeline for one shop
+
+    sink receives progress (None = current/default sink), state carries per-product result
+    caches between runs (None = Streamlit session state), stage_cache memoizes expensive stages.
+    """
+
+    def __init__(self, profile: UserProfile, location_config: Dict[int, str],
+                 brand_lead_times: Optional[Dict[str, int]] = None,
+                 sink: Optional[progress.ProgressSink] = None,
+                 state: Optional[Dict[str, Any]] = None, stage_cache=None):
+        self.profile = profile
+        self.location_config = location_config
+        self.brand_lead_times = brand_lead_times or {}
+        self.sink = sink
+        self.state = state
+        self.stage_cache = stage_cache
+
+    def run(self, client, options: AnalysisOptions, user_id: Optional[str] = None,
+            db_manager=None, pending_orders: Optional[List] = None) -> AnalysisResult:
+        """Fetch from Shopify, build the analysis inputs and analyze them"""
+        tracer = tracing.Tracer()
+        with progress.use_sink(self.sink or progress.get_sink()), tracing.use_tracer(tracer):
+            start_time = time.time()
+            with tracing.span('analysis_run', counters=getattr(client, 'request_totals', None)):
+                inputs = self.fetch_inputs(client, options, user_id, db_manager, pending_orders)
+                result = self.analyze(inputs)
+            result.duration = time.time() - start_time
+            result.trace = tracer.records()
+            return result
+
+    def fetch_inputs(self, client, options: AnalysisOptions, user_id: Optional[str] = None,
+                     db_manager=None, pending_orders: Optional[List] = None) -> AnalysisInputs:
+        request_totals = getattr(client, 'request_totals', None)
+        
+        # Step 1: Orders (historical orders come from the database cache when available)
+        with tracing.span('fetch_orders', counters=request_totals):
+            try:
+                recent_orders, historical_orders = client.fetch_comprehensive_orders(
+                    options.recent_start, options.recent_end,
+                    use_cache=options.use_cache, user_id=user_id, db_manager=db_manager,
+                    historical_years=options.historical_years
+                )
+            except Exception as e:
+                raise AnalysisError(f"Failed to fetch order data: {e}") from e
+            tracing.set_attrs(rows=len(recent_orders or []) + len(historical_orders or []))
+
+        if options.safe_mode:
+            if recent_orders and len(recent_orders) > SAFE_MODE_RECENT_LIMIT:
+                recent_orders = recent_orders[:SAFE_MODE_RECENT_LIMIT]
+                progress.info(f"🛡️ Safe mode: Limited to {SAFE_MODE_RECENT_LIMIT} recent orders")
+            if historical_orders and len(historical_orders) > SAFE_MODE_HISTORICAL_LIMIT:
+                historical_orders = historical_orders[:SAFE_MODE_HISTORICAL_LIMIT]
+                progress.info(f"🛡️ Safe mode: Limited to {SAFE_MODE_HISTORICAL_LIMIT} historical orders")
+
+        if not recent_orders and not historical_orders:
+            raise AnalysisError("No order data found for analysis. Try adjusting your date range or check your API connection.")
+
+        # Step 2: Process orders
+        recent_orders_df = self._process_orders(recent_orders, "recent")
+        historical_orders_df = self._process_orders(historical_orders, "historical")
+        frames = [df for df in (recent_orders_df, historical_orders_df) if not df.empty]
+        all_orders_df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+        if all_orders_df.empty:
+            raise AnalysisError("No valid order data after processing")
+
+        # Step 3: Products to analyze
+        if options.test_mode:
+            product_ids = all_orders_df.groupby('product_id')['quantity'].sum().sort_values(ascending=False).head(TEST_MODE_PRODUCTS).index.tolist()
+            progress.info(f"⚡ Quick test mode: Analyzing top {TEST_MODE_PRODUCTS} products")
+        else:
+            product_ids = all_orders_df['product_id'].unique().tolist()
+
+        # Step 4: Variants, inventory and pending orders
+        variants_data, inventory_levels = {}, {}
+        with tracing.span('fetch_variants_and_inventory', counters=request_totals, rows=len(product_ids)):
+            try:
+                variants_data, inventory_levels = client.fetch_variants_and_inventory(product_ids)
+            except Exception as e:
+                progress.warning(f"⚠️ Error fetching variants/inventory: {e}")
+
+        inventory_df = pd.DataFrame()
+        with tracing.span('create_inventory_dataframe_fast'):
+            try:
+                inventory_df = self._memoize('inventory_dataframe', create_inventory_dataframe_fast,
+                                             all_orders_df, variants_data, inventory_levels, self.location_config)
+            except Exception as e:
+                progress.warning(f"⚠️ Error creating inventory dataframe: {e}")
+            tracing.set_attrs(rows=len(inventory_df))
+
+        if pending_orders:
+            try:
+                from pending_orders.pending_order_manager import PendingOrderManager
+                progress.info(f"📦 Including {len(pending_orders)} pending order items in analysis...")
+                inventory_df = PendingOrderManager(self.profile, self.location_config).project_inventory(inventory_df, pending_orders)
+            except Exception as e:
+                progress.warning(f"⚠️ Error integrating pending orders: {e}")
+
+        cached_historical_df = None
+        if options.use_cache and user_id and db_manager:
+            with tracing.span('load_cached_historical'):
+                try:
+                    cached_historical_df = db_manager.load_cached_historical_data(user_id, options.historical_years)
+                except Exception as e:
+                    logger.warning(f"Historical cache unavailable: {e}")
+                if cached_historical_df is not None:
+                    tracing.set_attrs(rows=len(cached_historical_df))
+
+        return AnalysisInputs(recent_orders_df, historical_orders_df, inventory_df, cached_historical_df, pending_orders)
+
+    def analyze(self, inputs: AnalysisInputs) -> AnalysisResult:
+        """Business-intelligence analysis of prepared inputs (no network access)"""
+        with progress.use_sink(self.sink or progress.get_sink()):
+            start_time = time.time()
+            bi_engine = EnhancedBusinessIntelligenceEngine(
+                self.profile, self.brand_lead_times, state=self.state,
+                pending_orders=list(inputs.pending_orders) if inputs.pending_orders else []
+            )
+
+            def run_bi(data_version: str):
+                # data_version only keys the memo; clusters are memoized with the result
+                result = bi_engine.analyze_comprehensive_performance(
+                    inputs.recent_orders_df, inputs.historical_orders_df, inputs.inventory_df,
+                    inputs.cached_historical_df
+                )
+                return (*result, dict(bi_engine.demand_clusters))
+
+            insights, seasonal_insights, summary_metrics, demand_clusters = InsightTable.empty(), [], {}, {}
+            try:
+                # FIXED: Key on the data version plus every engine input read outside the data
+                # (lead times, profile overrides, shop, locations, today's date)
+                profile = self.profile
+                analysis_state = (
+                    self.brand_lead_times,
+                    self.location_config,
+                    getattr(profile, 'shop_name', None),
+                    getattr(profile, 'default_lead_time', None),
+                    getattr(profile, 'vendor_service_levels', None) or {},
+                    getattr(profile, 'cluster_service_levels', None) or {},
+                    getattr(profile, 'cluster_forecast_models', None) or {},
+                    datetime.now().date()
+                )
+                with tracing.span('business_intelligence'):
+                    insights, seasonal_insights, summary_metrics, demand_clusters = self._memoize(
+                        'bi_analysis', run_bi, inputs.data_version(),
+                        key_extra=analysis_state,
+                        should_cache=lambda result: len(result[0]) > 0
+                    )
+                    tracing.set_attrs(rows=len(insights))
+            except Exception as e:
+                progress.warning(f"⚠️ Error in BI analysis: {e}")
+
+            return AnalysisResult(
+                insights=InsightTable.coerce(insights),
+                seasonal_insights=seasonal_insights,
+                summary_metrics=summary_metrics,
+                inputs=inputs,
+                location_config=self.location_config,
+                demand_clusters=dict(demand_clusters),
+                duration=time.time() - start_time
+            )
+
+    def _process_orders(self, orders: List[Dict], period_name: str) -> pd.DataFrame:
+        if not orders:
+            return pd.DataFrame()
+        with tracing.span('process_orders_fast', period=period_name):
+            try:
+                orders_df = self._memoize('process_orders', process_orders_fast, orders, self.location_config)
+            except Exception as e:
+                progress.warning(f"⚠️ Error processing {period_name} orders: {e}")
+                orders_df = pd.DataFrame()
+            tracing.set_attrs(rows=len(orders_df))
+            return orders_df
+
+    def _memoize(self, stage: str, func, *args, key_extra: Any = None, should_cache=None):
+        if self.stage_cache is None:
+            return func(*args)
+        return self.stage_cache.memoize(stage, func, *args, key_extra=key_extra, should_cache=should_cache)
+
+
+def _result_path(user_id: str, results_dir: str = RESULTS_DIR) -> str:
+    return os.path.join(results_dir, hashlib.sha1(str(user_id).encode()).hexdigest()[:16], RESULT_FILE)
+
+
+def save_result(user_id: str, result: AnalysisResult, results_dir: str = RESULTS_DIR) -> bool:
+    """Persist a user's latest analysis so the UI can open on it without re-running"""
+    path = _result_path(user_id, results_dir)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + '.tmp', 'wb') as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + '.tmp', path)
+        return True
+    except Exception as e:
+        logger.warning(f"Could not persist analysis result: {e}")
+        return False
+
+
+def load_result(user_id: str, results_dir: str = RESULTS_DIR) -> Optional[AnalysisResult]:
+    """A user's latest persisted analysis, if any"""
+    path = _result_path(user_id, results_dir)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    except Exception as e:
+        logger.warning(f"Could not load persisted analysis result: {e}")
+        return None
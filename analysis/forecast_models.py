@@ -0,0 +1,183 @@
+"""
+Forecast Model Registry
+Batched demand forecasting models sharing one fit/forecast API over products x days matrices
+"""
+from typing import Dict, List, Type
+
+import numpy as np
+
+# Registered model classes, keyed by name
+MODEL_REGISTRY: Dict[str, Type['ForecastModel']] = {}
+
+
+def register_model(cls: Type['ForecastModel']) -> Type['ForecastModel']:
+    """Class decorator adding a model to the registry"""
+    MODEL_REGISTRY[cls.name] = cls
+    return cls
+
+
+def get_model(name: str, **params) -> 'ForecastModel':
+    if name not in MODEL_REGISTRY:
+        raise KeyError(f"Unknown forecast model '{name}'. Available: {', '.join(available_models())}")
+    return MODEL_REGISTRY[name](**params)
+
+
+def available_models() -> List[str]:
+    """Registered model names, cheapest first"""
+    return sorted(MODEL_REGISTRY, key=lambda name: MODEL_REGISTRY[name].cost)
+
+
+class ForecastModel:
+    """
+    Base class for batched forecasters
+
+    fit() takes a products x days history (a 1-D series is treated as one product);
+    forecast() returns products x horizon non-negative daily forecasts.
+    """
+
+    name = 'base'
+    cost = 0  # Relative runtime; the selector prefers cheaper models when accuracy is tied
+
+    def fit(self, history) -> 'ForecastModel':
+        history = np.asarray(history, dtype=np.float64)
+        self.history_ = history[None, :] if history.ndim == 1 else history
+        return self
+
+    def forecast(self, horizon: int) -> np.ndarray:
+        raise NotImplementedError
+
+    def forecast_batch(self, history, horizon: int) -> np.ndarray:
+        """fit + forecast in one call (the protocol BacktestingEngine uses)"""
+        return self.fit(history).forecast(horizon)
+
+
+@register_model
+class NaiveForecaster(ForecastModel):
+    """Last observed day repeated over the horizon"""
+
+    name = 'naive'
+    cost = 0
+
+    def forecast(self, horizon: int) -> np.ndarray:
+        return np.repeat(np.maximum(0.0, self.history_[:, -1:]), horizon, axis=1)
+
+
+@register_model
+class SeasonalNaiveForecaster(ForecastModel):
+    """Last full season (default: last week) repeated over the horizon"""
+
+    name = 'seasonal_naive'
+    cost = 1
+
+    def __init__(self, period: int = 7):
+        self.period = period
+
+    def forecast(self, horizon: int) -> np.ndarray:
+        n_days = self.history_.shape[1]
+        period = min(self.period, n_days)
+        columns = n_days - period + (np.arange(horizon) % period)
+        return np.maximum(0.0, self.history_[:, columns])
+
+
+@register_model
+class MovingAverageForecaster(ForecastModel):
+    """Trailing mean of the last `window` days, flat over the horizon"""
+
+    name = 'moving_average'
+    cost = 2
+
+    def __init__(self, window: int = 28):
+        self.window = window
+
+    def forecast(self, horizon: int) -> np.ndarray:
+        level = self.history_[:, -self.window:].mean(axis=1)
+        return np.repeat(np.maximum(0.0, level)[:, None], horizon, axis=1)
+
+
+@register_model
+class CrostonForecaster(ForecastModel):
+    """Croston's method for intermittent demand: smoothed demand size over smoothed interval"""
+
+    name = 'croston'
+    cost = 3
+
+    def __init__(self, alpha: float = 0.1):
+        self.alpha = alpha
+
+    def forecast(self, horizon: int) -> np.ndarray:
+        history = self.history_
+        n_products = history.shape[0]
+        size = np.zeros(n_products)
+        interval = np.ones(n_products)
+        since_demand = np.zeros(n_products)
+        started = np.zeros(n_products, dtype=bool)
+
+        for day in range(history.shape[1]):
+            since_demand += 1
+            demand = history[:, day]
+            has_demand = demand > 0
+            update = has_demand & started
+            first = has_demand & ~started
+            size = np.where(update, size + self.alpha * (demand - size), np.where(first, demand, size))
+            interval = np.where(update, interval + self.alpha * (since_demand - interval),
+                                np.where(first, since_demand, interval))
+            started |= has_demand
+            since_demand[has_demand] = 0
+
+        rate = np.where(started, size / np.maximum(interval, 1e-9), 0.0)
+        return np.repeat(np.maximum(0.0, rate)[:, None], horizon, axis=1)
+
+
+@register_model
+class HoltWintersForecaster(ForecastModel):
+    """Triple exponential smoothing (additive trend, multiplicative weekly season), batched over products"""
+
+    name = 'holt_winters'
+    cost = 4
+
+    def __init__(self, alpha: float = 0.3, beta: float = 0.1, gamma: float = 0.1, seasonality_period: int = 7):
+        self.alpha = alpha
+        self.beta = beta
+        self.gamma = gamma
+        self.seasonality_period = seasonality_period
+
+    def forecast(self, horizon: int) -> np.ndarray:
+        return holt_winters_batch(self.history_, horizon, self.alpha, self.beta, self.gamma, self.seasonality_period)
+
+
+def holt_winters_batch(data: np.ndarray, periods_ahead: int, alpha: float = 0.3, beta: float = 0.1,
+                       gamma: float = 0.1, period: int = 7) -> np.ndarray:
+    """
+    Holt-Winters forecasts for every row of a products x days matrix.
+    Rows shorter than two seasons get their mean; zero levels/seasons fall back to a neutral season.
+    """
+    data = np.asarray(data, dtype=np.float64)
+    n_products, n_days = data.shape
+    if n_days < 2 * period:
+        mean = data.mean(axis=1) if n_days else np.zeros(n_products)
+        return np.repeat(np.maximum(0.0, mean)[:, None], periods_ahead, axis=1)
+
+    def safe_ratio(numerator, denominator):
+        return np.where(denominator > 0, numerator / np.where(denominator > 0, denominator, 1.0), 1.0)
+
+    # Initialize components
+    level = data[:, :period].mean(axis=1)
+    trend = (data[:, period:2 * period].mean(axis=1) - level) / period
+    seasonals = np.ones((n_products, n_days))
+    seasonals[:, :period] = safe_ratio(data[:, :period], level[:, None])
+
+    # Apply smoothing; each day uses the seasonal index from one season earlier
+    for i in range(period, n_days):
+        previous_season = seasonals[:, i - period]
+        deseasonalized = np.where(previous_season > 0, data[:, i] / np.where(previous_season > 0, previous_season, 1.0), data[:, i])
+        new_level = alpha * deseasonalized + (1 - alpha) * (level + trend)
+        trend = beta * (new_level - level) + (1 - beta) * trend
+        level = new_level
+        seasonals[:, i] = np.where(level > 0, gamma * safe_ratio(data[:, i], level) + (1 - gamma) * previous_season,
+                                   previous_season)
+
+    # Generate forecasts from the last full season of seasonal indices
+    steps = np.arange(1, periods_ahead + 1)
+    season = seasonals[:, n_days - period + (steps - 1) % period]
+    forecasts = (level[:, None] + steps[None, :] * trend[:, None]) * season
+    return np.where(forecasts > 0, forecasts, 0.0)  # Ensure non-negative (NaN -> 0)
@@ -0,0 +1,96 @@
+"""
+Incremental Re-analysis Cache
+Keeps per-product analysis results keyed by fingerprints of their inputs so a re-run
+only recomputes products whose sales, inventory, pending quantity or lead time changed
+"""
+import logging
+from typing import Any, Dict, Hashable, Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from models.data_models import ProductInsight
+
+logger = logging.getLogger(__name__)
+
+SESSION_KEY = 'bi_result_cache'
+
+# Columns of a product's sales slice that feed the per-product forecast
+SALES_FINGERPRINT_COLUMNS = ['product_id', 'created_at', 'quantity', 'total_value']
+
+
+class ProductResultCache:
+    """Per-product forecasts and insights from previous analysis runs"""
+
+    def __init__(self):
+        self.context_key: Optional[Hashable] = None
+        self.forecasts: Dict[Tuple[str, int], Tuple[Hashable, float, float]] = {}
+        self.insights: Dict[int, Tuple[Hashable, ProductInsight]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def set_context(self, context_key: Hashable):
+        """Drop cached insights when an input shared by all products changes"""
+        if context_key != self.context_key:
+            # Forecasts depend only on each product's sales slice and survive context changes
+            self.insights.clear()
+            self.context_key = context_key
+        self.hits = 0
+        self.misses = 0
+
+    def get_forecast(self, period: str, product_id: int, fingerprint: Hashable) -> Optional[Tuple[float, float]]:
+        entry = self.forecasts.get((period, product_id))
+        if entry is not None and entry[0] == fingerprint:
+            return entry[1], entry[2]
+        return None
+
+    def put_forecast(self, period: str, product_id: int, fingerprint: Hashable, forecast: float, volatility: float):
+        self.forecasts[(period, product_id)] = (fingerprint, forecast, volatility)
+
+    def get_insight(self, product_id: int, fingerprint: Hashable) -> Optional[ProductInsight]:
+        entry = self.insights.get(product_id)
+        if entry is not None and entry[0] == fingerprint:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        return None
+
+    def put_insight(self, product_id: int, fingerprint: Hashable, insight: ProductInsight):
+        self.insights[product_id] = (fingerprint, insight)
+
+    def retain(self, product_ids: Iterable[int], period: Optional[str] = None):
+        """Forget products that are no longer part of the analysis"""
+        keep = set(product_ids)
+        if period is None:
+            self.insights = {pid: entry for pid, entry in self.insights.items() if pid in keep}
+        else:
+            self.forecasts = {
+                key: entry for key, entry in self.forecasts.items()
+                if key[0] != period or key[1] in keep
+            }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'cached_products': len(self.insights),
+            'cached_forecasts': len(self.forecasts),
+            'reused': self.hits,
+            'recomputed': self.misses
+        }
+
+
+def sales_fingerprints(orders_df: pd.DataFrame) -> Dict[int, Tuple[int, int]]:
+    """{product_id: (row count, combined row hash)} over each product's sales slice"""
+    if orders_df is None or orders_df.empty:
+        return {}
+    columns = [c for c in SALES_FINGERPRINT_COLUMNS if c in orders_df.columns]
+    row_hashes = pd.util.hash_pandas_object(orders_df[columns], index=False).to_numpy()
+    # Sum of row hashes is order-independent; uint64 overflow wraps, which is fine for a hash
+    grouped = pd.Series(row_hashes, dtype=np.uint64).groupby(orders_df['product_id'].to_numpy())
+    sums = grouped.sum()
+    counts = grouped.size()
+    return {int(pid): (int(counts[pid]), int(sums[pid])) for pid in sums.index}
+
+
+def row_fingerprints(df: pd.DataFrame) -> np.ndarray:
+    """One hash per row over all columns, independent of column order"""
+    return pd.util.hash_pandas_object(df[sorted(df.columns)], index=False).to_numpy()
@@ -1,102 +1,201 @@
 import streamlit as st
 import numpy as np
 import pandas as pd
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.cluster import KMeans
 from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import classification_report
+from collections import OrderedDict
+
+from utils.stage_cache import content_hash
+
+N_FEATURES = 10
+MIN_SERIES_LENGTH = 14
+_FEATURE_CACHE_SIZE = 16
+_feature_cache: 'OrderedDict[str, np.ndarray]' = OrderedDict()
+
+
+def _matrix_features(sales: np.ndarray) -> np.ndarray:
+    """
+    mean, std, skew, kurtosis, slope, weekly seasonality strength, momentum,
+    activity ratio, peak ratio and IQR per row (pandas-compatible skew/kurtosis)
+    """
+    n_rows, n = sales.shape
+    features = np.zeros((n_rows, N_FEATURES))
+    if n < MIN_SERIES_LENGTH or n_rows == 0:
+        return features  # Zeros for insufficient data
+    
+    mean = sales.mean(axis=1)
+    centered = sales - mean[:, None]
+    squared = centered * centered  # Products instead of ** keep this on the fast multiply path
+    m2 = squared.sum(axis=1)
+    m3 = (squared * centered).sum(axis=1)
+    m4 = (squared * squared).sum(axis=1)
+    m2 = np.where(np.abs(m2) < 1e-14, 0.0, m2)  # Treat floating-point noise as zero variance
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        skew = (n * (n - 1) ** 0.5 / (n - 2)) * (m3 / m2 ** 1.5)
+        kurt = (n * (n + 1) * (n - 1) * m4) / ((n - 2) * (n - 3) * m2 ** 2) - 3 * (n - 1) ** 2 / ((n - 2) * (n - 3))
+    
+    # Linear trend: closed-form least-squares slope against day index
+    x = np.arange(n) - (n - 1) / 2
+    slope = centered @ x / (x @ x)
+    
+    # Weekly seasonality: spread of the per-weekday means
+    weekday = np.eye(7)[np.arange(n) % 7]
+    weekly_strength = (sales @ weekday / weekday.sum(axis=0)).std(axis=1)
+    
+    mid_point = n // 2
+    momentum = sales[:, mid_point:].mean(axis=1) / np.maximum(sales[:, :mid_point].mean(axis=1), 1)
+    q75, q25 = np.percentile(sales, [75, 25], axis=1)
+    
+    features[:, 0] = mean
+    features[:, 1] = np.sqrt(m2 / (n - 1))
+    features[:, 2] = np.where(m2 == 0, 0.0, skew)
+    features[:, 3] = np.where(m2 == 0, 0.0, kurt)
+    features[:, 4] = slope
+    features[:, 5] = weekly_strength
+    features[:, 6] = momentum
+    features[:, 7] = (sales > 0).sum(axis=1) / n
+    features[:, 8] = sales.max(axis=1) / np.maximum(mean, 1)
+    features[:, 9] = q75 - q25
+    return features
+
+TREND_MODEL_NAME = 'trend_classifier'
 
 class MLPatternDetector:
-    def __init__(self):
+    def __init__(self, shop_key: Optional[str] = None):
         self.trend_classifier = RandomForestClassifier(n_estimators=100, random_state=42)
         self.demand_clusterer = KMeans(n_clusters=5, random_state=42)
         self.scaler = StandardScaler()
         self.is_fitted = False
+        # NEW: With a shop_key, fitted models are persisted and reloaded through the shop's model store
+        self.shop_key = shop_key
+        self.model_version: Optional[str] = None
+        self._load_attempted = False
+    
+    def _model_store(self):
+        if self.shop_key is None:
+            return None
+        from analysis.model_store import get_model_store
+        return get_model_store(self.shop_key)
     
     def extract_features(self, sales_series: pd.Series) -> np.array:
         """Extract time series features for ML models"""
-        if len(sales_series) < 14:
-            return np.zeros(10)  # Return zeros for insufficient data
-        
-        features = []
-        
-        # Rolling statistics
-        features.append(sales_series.mean())  # Average
-        features.append(sales_series.std())   # Volatility
-        features.append(sales_series.skew())  # Skewness
-        features.append(sales_series.kurt())  # Kurtosis
-        
-        # Trend features
-        x = np.arange(len(sales_series))
-        slope = np.polyfit(x, sales_series.values, 1)[0]
-        features.append(slope)  # Linear trend
-        
-        # Seasonality (weekly)
-        if len(sales_series) >= 14:
-            weekly_pattern = []
-            for day in range(7):
-                day_sales = sales_series.iloc[day::7]
-                weekly_pattern.append(day_sales.mean() if len(day_sales) > 0 else 0)
-            features.append(np.std(weekly_pattern))  # Weekly seasonality strength
-        else:
-            features.append(0)
-        
-        # Recent vs historical comparison
-        mid_point = len(sales_series) // 2
-        recent_avg = sales_series.iloc[mid_point:].mean()
-        historical_avg = sales_series.iloc[:mid_point].mean()
-        features.append(recent_avg / max(historical_avg, 1))  # Recent momentum
-        
-        # Additional statistical features
-        features.append(len(sales_series[sales_series > 0]) / len(sales_series))  # Activity ratio
-        features.append(sales_series.max() / max(sales_series.mean(), 1))  # Peak ratio
-        features.append(np.percentile(sales_series, 75) - np.percentile(sales_series, 25))  # IQR
-        
-        return np.array(features)
+        return self.extract_features_batch(np.asarray(sales_series, dtype=float)[None, :])[0]
+    
+    def extract_features_batch(self, sales_matrix: np.ndarray) -> np.ndarray:
+        """
+        NEW: Features for every row of a products x days matrix in one pass of NumPy reductions.
+        Cached per data version (content hash of the matrix).
+        """
+        sales_matrix = np.asarray(sales_matrix, dtype=float)
+        key = content_hash(sales_matrix)
+        if key in _feature_cache:
+            _feature_cache.move_to_end(key)
+            return _feature_cache[key].copy()
+        
+        features = _matrix_features(sales_matrix)
+        _feature_cache[key] = features
+        while len(_feature_cache) > _FEATURE_CACHE_SIZE:
+            _feature_cache.popitem(last=False)
+        return features.copy()
+    
+    def extract_features_for_series(self, all_sales_data: Dict[int, pd.Series]) -> Tuple[List[int], np.ndarray]:
+        """Features for a dict of series; equal-length series are stacked and extracted together"""
+        product_ids = list(all_sales_data.keys())
+        features = np.zeros((len(product_ids), N_FEATURES))
+        
+        by_length: Dict[int, List[int]] = {}
+        for pos, sales_series in enumerate(all_sales_data.values()):
+            by_length.setdefault(len(sales_series), []).append(pos)
+        
+        series_list = list(all_sales_data.values())
+        for length, positions in by_length.items():
+            if length == 0:
+                continue
+            matrix = np.vstack([np.asarray(series_list[pos], dtype=float) for pos in positions])
+            features[positions] = self.extract_features_batch(matrix)
+        
+        return product_ids, features
     
     def train_trend_classifier(self, training_data: List[Tuple[pd.Series, str]]):
         """Train the trend classification model"""
-        X = []
-        y = []
+        series = {i: sales_series for i, (sales_series, _) in enumerate(training_data)}
+        _, X = self.extract_features_for_series(series)
+        y = [trend_label for _, trend_label in training_data]
         
-        for sales_series, trend_label in training_data:
-            features = self.extract_features(sales_series)
-            X.append(features)
-            y.append(trend_label)
+        # NEW: Reuse the stored model when this exact training set was fitted before
+        store = self._model_store()
+        data_hash = content_hash(X, np.asarray(y, dtype=object))
+        if store is not None and self._load_trend_model(store, data_hash):
+            return store.metadata(TREND_MODEL_NAME, data_hash).get('score', 0.0)
         
-        X = np.array(X)
+        # FIXED: Fit fresh estimators - a loaded model is the store's shared instance and must not be refitted
+        self.trend_classifier = RandomForestClassifier(n_estimators=100, random_state=42)
+        self.scaler = StandardScaler()
         X_scaled = self.scaler.fit_transform(X)
         
         self.trend_classifier.fit(X_scaled, y)
         self.is_fitted = True
         
-        return self.trend_classifier.score(X_scaled, y)
+        score = self.trend_classifier.score(X_scaled, y)
+        if store is not None:
+            store.save(TREND_MODEL_NAME, data_hash,
+                       {'classifier': self.trend_classifier, 'scaler': self.scaler},
+                       score=float(score), n_samples=len(y))
+            self.model_version = data_hash
+        return score
+    
+    def load_trend_classifier(self) -> bool:
+        """Lazily load the shop's newest stored trend model (once per detector)"""
+        if self.is_fitted:
+            return True
+        if self._load_attempted:
+            return False
+        self._load_attempted = True
+        store = self._model_store()
+        return store is not None and self._load_trend_model(store, None)
+    
+    def _load_trend_model(self, store, data_hash: Optional[str]) -> bool:
+        # Loaded estimators are shared with every detector of the shop: predict only, never fit
+        artifact = store.load(TREND_MODEL_NAME, data_hash)
+        if artifact is None:
+            return False
+        self.trend_classifier = artifact['classifier']
+        self.scaler = artifact['scaler']
+        self.model_version = data_hash or store.metadata(TREND_MODEL_NAME)['data_hash']
+        self.is_fitted = True
+        return True
     
     def predict_trend(self, sales_series: pd.Series) -> Tuple[str, float]:
         """Predict trend classification and confidence"""
-        if not self.is_fitted:
-            return "Unknown", 0.0
-        
-        features = self.extract_features(sales_series).reshape(1, -1)
-        features_scaled = self.scaler.transform(features)
-        
-        prediction = self.trend_classifier.predict(features_scaled)[0]
-        confidence = np.max(self.trend_classifier.predict_proba(features_scaled))
-        
-        return prediction, confidence
+        labels, confidence = self.predict_trend_batch(np.asarray(sales_series, dtype=float)[None, :])
+        return labels[0], float(confidence[0])
     
-    def cluster_demand_patterns(self, all_sales_data: Dict[int, pd.Series]) -> Dict[int, int]:
-        """Cluster products by demand patterns"""
-        features_matrix = []
-        product_ids = []
-        
-        for product_id, sales_series in all_sales_data.items():
-            features = self.extract_features(sales_series)
-            features_matrix.append(features)
-            product_ids.append(product_id)
-        
-        features_matrix = np.array(features_matrix)
+    def predict_trend_batch(self, sales_matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """NEW: Trend label and confidence for every row of a products x days matrix in one predict_proba call"""
+        sales_matrix = np.asarray(sales_matrix, dtype=float)
+        n_rows = sales_matrix.shape[0]
+        if not self.load_trend_classifier() or n_rows == 0:
+            return np.full(n_rows, "Unknown", dtype=object), np.zeros(n_rows)
+        
+        features_scaled = self.scaler.transform(self.extract_features_batch(sales_matrix))
+        probabilities = self.trend_classifier.predict_proba(features_scaled)
+        best = probabilities.argmax(axis=1)
+        
+        return self.trend_classifier.classes_[best], probabilities[np.arange(n_rows), best]
+    
+    def cluster_demand_patterns(self, all_sales_data: Dict[int, pd.Series], shop_key: Optional[str] = None) -> Dict[int, int]:
+        """
+        Cluster products by demand patterns
+        With a shop_key, uses the shop's persisted MiniBatchKMeans and only refits new or changed products.
+        """
+        product_ids, features_matrix = self.extract_features_for_series(all_sales_data)
+        if shop_key is not None:
+            from analysis.demand_clustering import get_demand_clusterer
+            return get_demand_clusterer(shop_key, self.demand_clusterer.n_clusters).update(product_ids, features_matrix)
         features_scaled = StandardScaler().fit_transform(features_matrix)
         
         clusters = self.demand_clusterer.fit_predict(features_scaled)
@@ -0,0 +1,124 @@
+"""
+Automatic Forecast Model Selection
+Backtests every registered model over the catalog and picks the most accurate one per product,
+preferring cheaper models when accuracy is tied. Choices are cached per sales-data version.
+"""
+import logging
+from collections import OrderedDict
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from analysis.backtesting import BacktestingEngine
+from analysis.forecast_models import MODEL_REGISTRY, available_models, get_model
+from utils.stage_cache import content_hash
+
+logger = logging.getLogger(__name__)
+
+_SELECTION_CACHE_SIZE = 8
+_selection_cache: 'OrderedDict[str, pd.DataFrame]' = OrderedDict()
+
+
+class ForecastModelSelector:
+    """Per-product model choice from walk-forward backtest error"""
+
+    def __init__(self, candidates: Optional[Sequence[str]] = None, forecast_horizon: int = 30,
+                 training_window: int = 90, step_days: int = 7, tolerance: float = 0.02,
+                 default_model: str = 'moving_average', max_workers: Optional[int] = None):
+        # Candidates are kept cheapest first so ties resolve to the cheaper model
+        names = list(candidates) if candidates else available_models()
+        self.candidates = sorted(names, key=lambda name: MODEL_REGISTRY[name].cost)
+        self.tolerance = tolerance  # Relative MAE within which models count as tied
+        self.default_model = default_model
+        self.backtester = BacktestingEngine(forecast_horizon, training_window, step_days, max_workers)
+
+    def select(self, sales_data: pd.DataFrame) -> pd.DataFrame:
+        """
+        One row per product with the chosen model, its backtest MAE and the number of windows tested.
+        Products without enough history get the default model.
+        """
+        if sales_data.empty:
+            return pd.DataFrame(columns=['product_id', 'model', 'mae', 'windows'])
+
+        key = self._cache_key(sales_data)
+        if key in _selection_cache:
+            _selection_cache.move_to_end(key)
+            return _selection_cache[key].copy()
+
+        matrix, product_ids, dates = self.backtester.build_daily_matrix(sales_data)
+        selection = self._select_from_matrix(matrix, product_ids, dates)
+
+        _selection_cache[key] = selection
+        while len(_selection_cache) > _SELECTION_CACHE_SIZE:
+            _selection_cache.popitem(last=False)
+        return selection.copy()
+
+    def model_errors(self, matrix: np.ndarray, product_ids: np.ndarray, dates: pd.DatetimeIndex) -> pd.DataFrame:
+        """products x models mean absolute backtest error (NaN where a product was never tested)"""
+        errors = {}
+        windows = None
+        for name in self.candidates:
+            results = self.backtester.results_from_matrix(matrix, product_ids, dates, get_model(name))
+            grouped = results.groupby('product_id')['error']
+            errors[name] = grouped.mean()
+            # Window eligibility does not depend on the model, so every model tests the same windows
+            windows = grouped.size() if windows is None else windows
+        index = pd.Index(product_ids, name='product_id')
+        frame = pd.DataFrame(errors, columns=self.candidates).reindex(index)
+        frame['windows'] = (windows if windows is not None else pd.Series(dtype=int)).reindex(index).fillna(0).astype(int)
+        return frame
+
+    def _select_from_matrix(self, matrix: np.ndarray, product_ids: np.ndarray, dates: pd.DatetimeIndex) -> pd.DataFrame:
+        frame = self.model_errors(matrix, product_ids, dates)
+        errors = frame[self.candidates].to_numpy(dtype=np.float64)
+        tested = ~np.isnan(errors).all(axis=1)
+
+        best = np.nanmin(np.where(tested[:, None], errors, 0.0), axis=1)
+        tied = errors <= best[:, None] * (1 + self.tolerance) + 1e-9
+        choice = np.argmax(tied, axis=1)  # First tied model in cost order = cheapest
+
+        models = np.where(tested, np.asarray(self.candidates, dtype=object)[choice], self.default_model)
+        mae = np.where(tested, errors[np.arange(len(errors)), choice], np.nan)
+        selection = pd.DataFrame({
+            'product_id': product_ids,
+            'model': models,
+            'mae': mae,
+            'windows': frame['windows'].to_numpy()
+        })
+        logger.info(f"Forecast model selection: {selection['model'].value_counts().to_dict()}")
+        return selection
+
+    def forecast(self, sales_data: pd.DataFrame, horizon: int = 30) -> pd.DataFrame:
+        """Forecast each product with its selected model; models run once per group of products"""
+        if sales_data.empty:
+            return pd.DataFrame(columns=['product_id', 'model', 'forecast_total', 'forecast_daily'])
+
+        selection = self.select(sales_data)
+        matrix, product_ids, _ = self.backtester.build_daily_matrix(sales_data)
+        models = selection.set_index('product_id')['model'].reindex(product_ids).fillna(self.default_model).to_numpy()
+
+        totals = np.zeros(len(product_ids))
+        for name in pd.unique(models):
+            rows = np.nonzero(models == name)[0]
+            totals[rows] = get_model(name).forecast_batch(matrix[rows], horizon).sum(axis=1)
+
+        return pd.DataFrame({
+            'product_id': product_ids,
+            'model': models,
+            'forecast_total': totals,
+            'forecast_daily': totals / max(1, horizon)
+        })
+
+    def _cache_key(self, sales_data: pd.DataFrame) -> str:
+        backtester = self.backtester
+        return content_hash(
+            sales_data[['product_id', 'created_at', 'quantity']].reset_index(drop=True),
+            tuple(self.candidates), self.tolerance, self.default_model,
+            (backtester.forecast_horizon, backtester.training_window, backtester.step_days,
+             backtester.min_observed_days)
+        )
+
+
+def clear_selection_cache():
+    _selection_cache.clear()
@@ -0,0 +1,153 @@
+"""
+ML Model Store
+Fitted models (classifiers, scalers, clusterers) persisted to local disk per shop, versioned
+by the hash of their training data. Artifacts load lazily on first use and stay in memory.
+"""
+import hashlib
+import json
+import logging
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+MODEL_DIR = os.path.join(".sharpstock_cache", "models")
+
+# Bump when a stored artifact's layout changes so older versions are ignored
+MODEL_FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+
+_stores: Dict[str, 'ModelStore'] = {}
+_stores_lock = threading.Lock()
+
+
+def get_model_store(shop_key: Optional[str]) -> 'ModelStore':
+    """Process-wide model store for a shop, shared by all of that shop's sessions"""
+    key = str(shop_key or 'default')
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = ModelStore(key)
+            _stores[key] = store
+        return store
+
+
+def shop_model_dir(shop_key: str, model_dir: str = MODEL_DIR) -> str:
+    return os.path.join(model_dir, hashlib.sha1(shop_key.encode()).hexdigest()[:16])
+
+
+def _library_version() -> str:
+    # Pickled sklearn estimators are only safe to load with the version that fitted them
+    try:
+        import sklearn
+        return sklearn.__version__
+    except ImportError:
+        return ''
+
+
+class ModelStore:
+    """Versioned on-disk artifacts: <shop>/<name>/<data hash>.pkl plus a manifest per name"""
+
+    def __init__(self, shop_key: str, model_dir: str = MODEL_DIR, max_versions: int = 5, memory_slots: int = 8):
+        self.shop_key = shop_key
+        self.directory = shop_model_dir(shop_key, model_dir)
+        self.max_versions = max_versions
+        self.memory_slots = memory_slots
+        self._loaded: 'OrderedDict[tuple, Any]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def save(self, name: str, data_hash: str, artifact: Any, **metadata) -> Optional[str]:
+        """Persist an artifact as the newest version of name; returns its path"""
+        directory = os.path.join(self.directory, name)
+        path = os.path.join(directory, f"{data_hash}.pkl")
+        with self._lock:
+            try:
+                os.makedirs(directory, exist_ok=True)
+                tmp_path = path + '.tmp'
+                with open(tmp_path, 'wb') as f:
+                    pickle.dump(artifact, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_path, path)
+
+                entry = dict(metadata, data_hash=data_hash, saved_at=time.time(),
+                             format_version=MODEL_FORMAT_VERSION, library_version=_library_version())
+                versions = [v for v in self._read_manifest(name) if v['data_hash'] != data_hash] + [entry]
+                for stale in versions[:-self.max_versions]:
+                    self._remove_file(os.path.join(directory, f"{stale['data_hash']}.pkl"))
+                self._write_manifest(name, versions[-self.max_versions:])
+
+                self._remember((name, data_hash), artifact)
+                return path
+            except Exception as e:
+                logger.warning(f"Could not persist model '{name}': {e}")
+                return None
+
+    def load(self, name: str, data_hash: Optional[str] = None) -> Optional[Any]:
+        """Artifact for an exact training-data hash, or the newest compatible version when None"""
+        with self._lock:
+            entry = self._find(name, data_hash)
+            if entry is None:
+                return None
+            key = (name, entry['data_hash'])
+            if key in self._loaded:
+                self._loaded.move_to_end(key)
+                return self._loaded[key]
+            try:
+                with open(os.path.join(self.directory, name, f"{entry['data_hash']}.pkl"), 'rb') as f:
+                    artifact = pickle.load(f)
+            except Exception as e:
+                logger.warning(f"Could not load model '{name}' ({entry['data_hash'][:8]}): {e}")
+                return None
+            self._remember(key, artifact)
+            return artifact
+
+    def metadata(self, name: str, data_hash: Optional[str] = None) -> Optional[dict]:
+        with self._lock:
+            return self._find(name, data_hash)
+
+    def versions(self, name: str) -> List[dict]:
+        """Manifest entries for name, oldest first"""
+        with self._lock:
+            return self._read_manifest(name)
+
+    def _find(self, name: str, data_hash: Optional[str]) -> Optional[dict]:
+        library_version = _library_version()
+        for entry in reversed(self._read_manifest(name)):
+            if entry.get('format_version') != MODEL_FORMAT_VERSION or entry.get('library_version') != library_version:
+                continue
+            if data_hash is None or entry['data_hash'] == data_hash:
+                return entry
+        return None
+
+    def _remember(self, key: tuple, artifact: Any):
+        self._loaded[key] = artifact
+        self._loaded.move_to_end(key)
+        while len(self._loaded) > self.memory_slots:
+            self._loaded.popitem(last=False)
+
+    def _read_manifest(self, name: str) -> List[dict]:
+        path = os.path.join(self.directory, name, MANIFEST_FILE)
+        if not os.path.exists(path):
+            return []
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"Unreadable model manifest for '{name}': {e}")
+            return []
+
+    def _write_manifest(self, name: str, versions: List[dict]):
+        path = os.path.join(self.directory, name, MANIFEST_FILE)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(versions, f, default=str)
+        os.replace(path + '.tmp', path)
+
+    @staticmethod
+    def _remove_file(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
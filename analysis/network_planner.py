@@ -0,0 +1,356 @@
+"""
+Multi-Echelon Network Replenishment Planner
+Decides, for every variant and store, whether to transfer, reorder or hold by solving one
+min-cost LP over the whole store network (holding + stockout + transfer + reorder cost).
+Variants are stacked into block-diagonal sparse LPs and solved in chunks with HiGHS.
+"""
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.optimize import linprog
+
+from analysis.transfer_lp import lane_cost_matrix
+
+logger = logging.getLogger(__name__)
+
+# Variants per LP; each variant adds L*(L-1) + 4L variables
+DEFAULT_CHUNK_SIZE = 500
+
+ACTION_TRANSFER_IN = 'TRANSFER_IN'
+ACTION_TRANSFER_OUT = 'TRANSFER_OUT'
+ACTION_REORDER = 'REORDER'
+ACTION_HOLD = 'HOLD'
+
+
+def solve_network_plan(
+    on_hand: np.ndarray,
+    pending: np.ndarray,
+    lead_time_demand: np.ndarray,
+    targets: np.ndarray,
+    lane_costs: np.ndarray,
+    stockout_cost: float,
+    holding_cost: float,
+    reorder_cost: float,
+    min_transfer: int = 2,
+    chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Jointly optimal transfers and reorders for many variants at once
+
+    Per variant and store j, with a_j = on_hand + pending + transfers in - transfers out:
+        lead-time shortage  s1_j >= lead_time_demand_j - a_j         (only transfers arrive in time)
+        cycle shortage      s2_j >= target_j - a_j - reorder_j
+        excess              e_j  >= a_j + reorder_j - target_j
+        transfers out of j  <= on_hand_j
+    minimizing lane cost * transfers + reorder_cost * reorders + stockout_cost * (s1 + s2) + holding_cost * e.
+
+    Args:
+        on_hand, pending, lead_time_demand, targets: variants x locations arrays
+        lane_costs: locations x locations per-unit transfer cost
+
+    Returns:
+        (flows, reorders): variants x locations x locations units moved from i to j,
+        and variants x locations units to reorder
+    """
+    on_hand = np.floor(np.maximum(0.0, np.asarray(on_hand, dtype=np.float64)))
+    pending = np.maximum(0.0, np.asarray(pending, dtype=np.float64))
+    lead_time_demand = np.asarray(lead_time_demand, dtype=np.float64)
+    targets = np.ceil(np.asarray(targets, dtype=np.float64) - 1e-9)
+    n_variants, n_locations = on_hand.shape
+
+    flows = np.zeros((n_variants, n_locations, n_locations), dtype=np.int64)
+    reorders = np.zeros((n_variants, n_locations), dtype=np.int64)
+    if n_variants == 0 or n_locations == 0:
+        return flows, reorders
+
+    # Variants already at or above target everywhere can only hold
+    position = on_hand + pending
+    active = np.nonzero((targets - position > 0).any(axis=1))[0]
+    if len(active) == 0:
+        return flows, reorders
+
+    lane_from, lane_to = np.nonzero(~np.eye(n_locations, dtype=bool))
+    A_block = _variant_block(n_locations, lane_from, lane_to)
+    c_block = np.concatenate([
+        lane_costs[lane_from, lane_to],
+        np.full(n_locations, reorder_cost),
+        np.full(n_locations, stockout_cost),
+        np.full(n_locations, stockout_cost),
+        np.full(n_locations, holding_cost)
+    ])
+
+    n_lanes = len(lane_from)
+    for start in range(0, len(active), max(1, chunk_size)):
+        chunk = active[start:start + chunk_size]
+        b = np.concatenate([
+            on_hand[chunk],
+            position[chunk] - lead_time_demand[chunk],
+            position[chunk] - targets[chunk],
+            targets[chunk] - position[chunk]
+        ], axis=1)
+        solution = _solve_chunk(A_block, c_block, b)
+        if solution is None:
+            chunk_flows, chunk_reorders = _fallback_chunk(on_hand[chunk], position[chunk], targets[chunk],
+                                                          lane_from, lane_to, lane_costs, stockout_cost)
+        else:
+            # Round transfers down so sources never go negative, reorders up to cover the target
+            chunk_flows = np.floor(solution[:, :n_lanes] + 1e-6).astype(np.int64)
+            chunk_reorders = np.ceil(solution[:, n_lanes:n_lanes + n_locations] - 1e-6).astype(np.int64)
+        flows[chunk[:, None], lane_from[None, :], lane_to[None, :]] = chunk_flows
+        reorders[chunk] = chunk_reorders
+
+    # Lanes below the minimum transfer are dropped; the destination reorders those units instead
+    dropped = np.where(flows < min_transfer, flows, 0)
+    reorders += dropped.sum(axis=1)
+    flows -= dropped
+    return flows, reorders
+
+
+def _variant_block(n_locations: int, lane_from: np.ndarray, lane_to: np.ndarray) -> sparse.csr_matrix:
+    """Constraint matrix for one variant; variables are [lanes, reorder, s1, s2, excess]"""
+    n_lanes = len(lane_from)
+    L = n_locations
+    lanes = np.arange(n_lanes)
+    reorder, s1, s2, excess = (slice(n_lanes + k * L, n_lanes + (k + 1) * L) for k in range(4))
+    identity = np.eye(L)
+
+    # Net inflow per location as a function of lane flows
+    net_in = np.zeros((L, n_lanes))
+    net_in[lane_to, lanes] += 1.0
+    net_in[lane_from, lanes] -= 1.0
+
+    block = np.zeros((4 * L, n_lanes + 4 * L))
+    block[lane_from, lanes] = 1.0                       # transfers out <= on hand
+    block[L:2 * L, :n_lanes] = -net_in                  # lead-time shortage
+    block[L:2 * L, s1] = -identity
+    block[2 * L:3 * L, :n_lanes] = -net_in              # cycle shortage
+    block[2 * L:3 * L, reorder] = -identity
+    block[2 * L:3 * L, s2] = -identity
+    block[3 * L:, :n_lanes] = net_in                    # excess over target
+    block[3 * L:, reorder] = identity
+    block[3 * L:, excess] = -identity
+    return sparse.csr_matrix(block)
+
+
+def _solve_chunk(A_block: sparse.csr_matrix, c_block: np.ndarray, b: np.ndarray) -> Optional[np.ndarray]:
+    """Block-diagonal LP for a chunk of variants; returns variants x variables"""
+    n_variants = b.shape[0]
+    A_ub = sparse.kron(sparse.identity(n_variants, format='csr'), A_block, format='csr')
+    try:
+        result = linprog(np.tile(c_block, n_variants), A_ub=A_ub, b_ub=b.ravel(),
+                         bounds=(0, None), method='highs-ds')
+    except Exception as e:
+        logger.warning(f"Network LP failed, falling back to greedy plan: {e}")
+        return None
+    if result.status != 0:
+        logger.warning(f"Network LP did not solve ({result.message}), falling back to greedy plan")
+        return None
+    return result.x.reshape(n_variants, -1)
+
+
+def _fallback_chunk(on_hand: np.ndarray, position: np.ndarray, targets: np.ndarray,
+                    lane_from: np.ndarray, lane_to: np.ndarray, lane_costs: np.ndarray,
+                    stockout_cost: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Cheapest-lane transfers from excess stores, then reorder whatever shortfall remains"""
+    supply = np.minimum(on_hand, np.maximum(0.0, position - targets))
+    need = np.maximum(0.0, targets - position)
+    flows = np.zeros((on_hand.shape[0], len(lane_from)), dtype=np.int64)
+    lane_cost = lane_costs[lane_from, lane_to]
+    for lane in np.argsort(lane_cost, kind='stable'):
+        if lane_cost[lane] >= stockout_cost:
+            break
+        qty = np.floor(np.minimum(supply[:, lane_from[lane]], need[:, lane_to[lane]]))
+        flows[:, lane] = qty
+        supply[:, lane_from[lane]] -= qty
+        need[:, lane_to[lane]] -= qty
+    return flows, np.ceil(need).astype(np.int64)
+
+
+def network_plan_cost(on_hand: np.ndarray, pending: np.ndarray, lead_time_demand: np.ndarray,
+                      targets: np.ndarray, flows: np.ndarray, reorders: np.ndarray,
+                      lane_costs: np.ndarray, stockout_cost: float, holding_cost: float,
+                      reorder_cost: float) -> Dict[str, float]:
+    """Cost breakdown of a plan under the same model the LP minimizes"""
+    after = np.asarray(on_hand, dtype=np.float64) + pending - flows.sum(axis=2) + flows.sum(axis=1)
+    targets = np.ceil(np.asarray(targets, dtype=np.float64) - 1e-9)
+    lead_time_short = np.maximum(0.0, lead_time_demand - after).sum()
+    cycle_short = np.maximum(0.0, targets - after - reorders).sum()
+    excess = np.maximum(0.0, after + reorders - targets).sum()
+    costs = {
+        'transfer_cost': float((flows * lane_costs[None, :, :]).sum()),
+        'reorder_cost': float(reorders.sum() * reorder_cost),
+        'stockout_cost': float((lead_time_short + cycle_short) * stockout_cost),
+        'holding_cost': float(excess * holding_cost),
+    }
+    costs['total_cost'] = sum(costs.values())
+    return costs
+
+
+class NetworkReplenishmentPlanner:
+    """Joint transfer / reorder / hold decisions for every variant across all store locations"""
+
+    def __init__(self, location_config: Dict[int, str], brand_lead_times: Optional[Dict[str, int]] = None,
+                 default_lead_time: int = 14, transfer_costs: Optional[Dict[Tuple[str, str], float]] = None):
+        self.location_config = location_config
+        self.locations = list(location_config.values())
+        self.brand_lead_times = brand_lead_times or {}
+        self.default_lead_time = default_lead_time
+        if transfer_costs is None:
+            from analysis.transfer_analysis import TransferOptimizer
+            transfer_costs = TransferOptimizer().transfer_costs
+        self.transfer_costs = transfer_costs
+        self.service_level = 0.95
+        self.review_period_days = 14  # Days of demand a reorder should cover beyond its lead time
+        self.stockout_cost_per_unit = 8.0
+        self.holding_cost_per_unit_per_day = 0.003
+        self.reorder_cost_per_unit = 0.5  # Handling/freight premium of reordering vs. using store stock
+        self.min_transfer_qty = 2
+        self.chunk_size = DEFAULT_CHUNK_SIZE
+
+    def plan(self, orders_df: pd.DataFrame, inventory_df: pd.DataFrame, analysis_days: int = 30,
+             pending_index=None, inventory_includes_pending: bool = False) -> Dict[str, Any]:
+        """
+        Build the network plan
+
+        inventory_includes_pending: inventory_df was already projected with pending_index
+        (PendingOrderManager.project_inventory); pending units are taken back out of on-hand.
+
+        Returns a dict with 'decisions' (one row per variant x location with the chosen action),
+        'transfers' (one row per lane with units moved) and 'summary' (counts and cost breakdown).
+        """
+        try:
+            variants = inventory_df.reset_index(drop=True)
+            on_hand = self._inventory_matrix(variants)
+            pending = self._pending_matrix(variants, pending_index)
+            if inventory_includes_pending:
+                on_hand = np.maximum(0.0, on_hand - pending)
+            daily_demand, demand_std = self._demand_matrices(variants, orders_df, analysis_days)
+            lead_times = self._lead_times(variants)
+
+            from analysis.service_level_optimizer import ServiceLevelOptimizer
+            z_score = ServiceLevelOptimizer(self.service_level).z_score
+            cover_days = lead_times + self.review_period_days
+            lead_time_demand = daily_demand * lead_times[:, None]
+            targets = daily_demand * cover_days[:, None] + z_score * demand_std * np.sqrt(cover_days)[:, None]
+
+            lane_costs = lane_cost_matrix(self.locations, self.transfer_costs, default_cost=1.0)
+            holding_cost = self.holding_cost_per_unit_per_day * float(np.mean(cover_days)) if len(cover_days) else 0.0
+            flows, reorders = solve_network_plan(
+                on_hand, pending, lead_time_demand, targets, lane_costs,
+                self.stockout_cost_per_unit, holding_cost, self.reorder_cost_per_unit,
+                self.min_transfer_qty, self.chunk_size
+            )
+
+            decisions = self._decisions_frame(variants, on_hand, pending, daily_demand, targets, flows, reorders)
+            transfers = self._transfers_frame(variants, flows, lane_costs)
+            costs = network_plan_cost(on_hand, pending, lead_time_demand, targets, flows, reorders,
+                                      lane_costs, self.stockout_cost_per_unit, holding_cost,
+                                      self.reorder_cost_per_unit)
+            hold_flows = np.zeros_like(flows)
+            hold_costs = network_plan_cost(on_hand, pending, lead_time_demand, targets, hold_flows,
+                                           np.zeros_like(reorders), lane_costs, self.stockout_cost_per_unit,
+                                           holding_cost, self.reorder_cost_per_unit)
+
+            summary = {
+                'variants': len(variants),
+                'locations': len(self.locations),
+                'actions': decisions['action'].value_counts().to_dict() if not decisions.empty else {},
+                'units_transferred': int(flows.sum()),
+                'units_reordered': int(reorders.sum()),
+                'plan_cost': costs,
+                'hold_everything_cost': hold_costs['total_cost'],
+            }
+            return {'decisions': decisions, 'transfers': transfers, 'summary': summary}
+
+        except Exception as e:
+            logger.error(f"Network replenishment planning failed: {e}")
+            return {'decisions': pd.DataFrame(), 'transfers': pd.DataFrame(), 'summary': {}}
+
+    def _inventory_matrix(self, variants: pd.DataFrame) -> np.ndarray:
+        columns = [f'inventory_{name.lower()}' for name in self.locations]
+        return (variants.reindex(columns=columns).apply(pd.to_numeric, errors='coerce')
+                .fillna(0).clip(lower=0).to_numpy(dtype=np.float64))
+
+    def _pending_matrix(self, variants: pd.DataFrame, pending_index) -> np.ndarray:
+        """Pending units per variant and store, matched exactly as inventory projection matches them"""
+        pending = np.zeros((len(variants), len(self.locations)))
+        if not pending_index:
+            return pending
+
+        additions, _, _, _ = pending_index.inventory_additions(variants)
+        for j, name in enumerate(self.locations):
+            added = additions.get(f'inventory_{name.lower()}')
+            if added is not None:
+                pending[:, j] = added
+        return pending
+
+    def _demand_matrices(self, variants: pd.DataFrame, orders_df: pd.DataFrame,
+                         analysis_days: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Mean and std of daily demand per variant and store over the analysis window"""
+        shape = (len(variants), len(self.locations))
+        if orders_df.empty or 'variant_id' not in variants.columns:
+            return np.zeros(shape), np.zeros(shape)
+
+        cutoff = orders_df['created_at'].max() - pd.Timedelta(days=analysis_days)
+        recent = orders_df[orders_df['created_at'] >= cutoff]
+        daily = (recent.assign(day=recent['created_at'].dt.floor('D'))
+                 .groupby(['variant_id', 'Store Location', 'day'])['quantity'].sum())
+        grouped = pd.DataFrame({'total': daily, 'squares': daily ** 2}).groupby(level=[0, 1]).sum()
+
+        def as_matrix(series: pd.Series) -> np.ndarray:
+            return (series.unstack(fill_value=0)
+                    .reindex(index=variants['variant_id'], columns=self.locations, fill_value=0)
+                    .fillna(0).to_numpy(dtype=np.float64))
+
+        days = max(1, analysis_days)
+        mean = as_matrix(grouped['total']) / days
+        variance = np.maximum(0.0, as_matrix(grouped['squares']) / days - mean ** 2)
+        return mean, np.sqrt(variance)
+
+    def _lead_times(self, variants: pd.DataFrame) -> np.ndarray:
+        if 'vendor' not in variants.columns:
+            return np.full(len(variants), float(self.default_lead_time))
+        return (variants['vendor'].map(self.brand_lead_times)
+                .fillna(self.default_lead_time).to_numpy(dtype=np.float64))
+
+    def _decisions_frame(self, variants: pd.DataFrame, on_hand: np.ndarray, pending: np.ndarray,
+                         daily_demand: np.ndarray, targets: np.ndarray, flows: np.ndarray,
+                         reorders: np.ndarray) -> pd.DataFrame:
+        """One row per variant x location; transfers take precedence over reorders in the action label"""
+        n_variants, n_locations = on_hand.shape
+        transfer_in = flows.sum(axis=1)
+        transfer_out = flows.sum(axis=2)
+        action = np.select(
+            [transfer_in > 0, transfer_out > 0, reorders > 0],
+            [ACTION_TRANSFER_IN, ACTION_TRANSFER_OUT, ACTION_REORDER],
+            default=ACTION_HOLD
+        )
+
+        info_columns = [c for c in ['product_id', 'variant_id', 'style_number', 'description',
+                                    'vendor', 'variant_title'] if c in variants.columns]
+        decisions = variants[info_columns].loc[np.repeat(np.arange(n_variants), n_locations)].reset_index(drop=True)
+        decisions['location'] = np.tile(self.locations, n_variants)
+        decisions['on_hand'] = on_hand.ravel().astype(np.int64)
+        decisions['pending'] = pending.ravel().astype(np.int64)
+        decisions['daily_demand'] = daily_demand.ravel()
+        decisions['target_stock'] = np.ceil(targets.ravel() - 1e-9).astype(np.int64)
+        decisions['transfer_in'] = transfer_in.ravel()
+        decisions['transfer_out'] = transfer_out.ravel()
+        decisions['reorder_qty'] = reorders.ravel()
+        decisions['projected_stock'] = (on_hand + pending - transfer_out + transfer_in + reorders).ravel().astype(np.int64)
+        decisions['action'] = action.ravel()
+        return decisions
+
+    def _transfers_frame(self, variants: pd.DataFrame, flows: np.ndarray, lane_costs: np.ndarray) -> pd.DataFrame:
+        rows, from_idx, to_idx = np.nonzero(flows)
+        info_columns = [c for c in ['product_id', 'variant_id', 'style_number', 'variant_title']
+                        if c in variants.columns]
+        transfers = variants[info_columns].iloc[rows].reset_index(drop=True)
+        transfers['from_location'] = np.asarray(self.locations, dtype=object)[from_idx]
+        transfers['to_location'] = np.asarray(self.locations, dtype=object)[to_idx]
+        transfers['quantity'] = flows[rows, from_idx, to_idx]
+        transfers['transfer_cost'] = transfers['quantity'] * lane_costs[from_idx, to_idx]
+        return transfers
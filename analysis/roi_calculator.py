@@ -1,7 +1,9 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
+
+from models.insight_table import InsightTable
 
 class ROICalculator:
     def __init__(self, holding_cost_rate=0.25, gross_margin_rate=0.40):
@@ -15,35 +17,28 @@ class ROICalculator:
                                                unit_costs: Dict[str, float]) -> Dict:
         """Calculate savings from inventory optimization"""
         
-        total_baseline_value = 0
-        total_optimized_value = 0
-        savings_by_product = {}
-        
-        for product_id in baseline_inventory.keys():
-            baseline_units = baseline_inventory.get(product_id, 0)
-            optimized_units = optimized_inventory.get(product_id, 0)
-            unit_cost = unit_costs.get(product_id, 0)
-            
-            baseline_value = baseline_units * unit_cost
-            optimized_value = optimized_units * unit_cost
-            
-            total_baseline_value += baseline_value
-            total_optimized_value += optimized_value
-            
-            # Daily savings for this product
-            inventory_reduction = baseline_value - optimized_value
-            daily_savings = inventory_reduction * self.daily_holding_rate
-            annual_savings = daily_savings * 365
-            
-            savings_by_product[product_id] = {
-                'inventory_reduction_units': baseline_units - optimized_units,
-                'inventory_reduction_value': inventory_reduction,
-                'annual_holding_savings': annual_savings
-            }
+        product_ids = list(baseline_inventory.keys())
+        baseline_units = np.array([baseline_inventory.get(pid, 0) for pid in product_ids], dtype=np.float64)
+        optimized_units = np.array([optimized_inventory.get(pid, 0) for pid in product_ids], dtype=np.float64)
+        unit_cost = np.array([unit_costs.get(pid, 0) for pid in product_ids], dtype=np.float64)
         
-        total_inventory_reduction = total_baseline_value - total_optimized_value
+        savings = self.holding_savings(baseline_units, optimized_units, unit_cost)
+        total_baseline_value = float((baseline_units * unit_cost).sum())
+        total_inventory_reduction = float(savings['inventory_reduction_value'].sum())
         total_annual_savings = total_inventory_reduction * self.holding_cost_rate
         
+        savings_by_product = {
+            pid: {
+                'inventory_reduction_units': units,
+                'inventory_reduction_value': value,
+                'annual_holding_savings': annual
+            }
+            for pid, units, value, annual in zip(
+                product_ids, savings['inventory_reduction_units'].tolist(),
+                savings['inventory_reduction_value'].tolist(), savings['annual_holding_savings'].tolist()
+            )
+        }
+        
         return {
             'total_inventory_reduction_value': total_inventory_reduction,
             'total_annual_holding_savings': total_annual_savings,
@@ -51,35 +46,166 @@ class ROICalculator:
             'roi_percentage': (total_annual_savings / max(total_baseline_value, 1)) * 100
         }
     
+    def holding_savings(self, baseline_units: np.ndarray, optimized_units: np.ndarray,
+                        unit_cost: np.ndarray) -> Dict[str, np.ndarray]:
+        """NEW: Per-product inventory reduction and annual holding savings as arrays"""
+        reduction_units = baseline_units - optimized_units
+        reduction_value = reduction_units * unit_cost
+        return {
+            'inventory_reduction_units': reduction_units,
+            'inventory_reduction_value': reduction_value,
+            'annual_holding_savings': reduction_value * self.daily_holding_rate * 365
+        }
+    
+    def stockout_savings(self, units_prevented: np.ndarray, selling_price: np.ndarray) -> Dict[str, np.ndarray]:
+        """NEW: Per-product revenue and gross margin kept by prevented stockouts as arrays"""
+        revenue_saved = units_prevented * selling_price
+        return {
+            'revenue_saved': revenue_saved,
+            'gross_margin_saved': revenue_saved * self.gross_margin_rate
+        }
+    
     def calculate_stockout_prevention_savings(self,
                                            prevented_stockouts: Dict[str, int],
                                            unit_selling_prices: Dict[str, float]) -> Dict:
         """Calculate savings from preventing stockouts"""
         
-        total_prevented_revenue = 0
-        total_gross_margin_saved = 0
-        savings_by_product = {}
-        
-        for product_id, units_prevented in prevented_stockouts.items():
-            selling_price = unit_selling_prices.get(product_id, 0)
-            revenue_saved = units_prevented * selling_price
-            gross_margin_saved = revenue_saved * self.gross_margin_rate
-            
-            total_prevented_revenue += revenue_saved
-            total_gross_margin_saved += gross_margin_saved
-            
-            savings_by_product[product_id] = {
+        product_ids = list(prevented_stockouts.keys())
+        units = list(prevented_stockouts.values())
+        selling_price = np.array([unit_selling_prices.get(pid, 0) for pid in product_ids], dtype=np.float64)
+        
+        savings = self.stockout_savings(np.asarray(units, dtype=np.float64), selling_price)
+        savings_by_product = {
+            pid: {
                 'units_prevented': units_prevented,
-                'revenue_saved': revenue_saved,
-                'gross_margin_saved': gross_margin_saved
+                'revenue_saved': revenue,
+                'gross_margin_saved': margin
             }
+            for pid, units_prevented, revenue, margin in zip(
+                product_ids, units, savings['revenue_saved'].tolist(), savings['gross_margin_saved'].tolist()
+            )
+        }
         
         return {
-            'total_revenue_saved': total_prevented_revenue,
-            'total_gross_margin_saved': total_gross_margin_saved,
+            'total_revenue_saved': float(savings['revenue_saved'].sum()),
+            'total_gross_margin_saved': float(savings['gross_margin_saved'].sum()),
             'savings_by_product': savings_by_product
         }
     
+    def roi_from_insights(self, insights, inventory_df: Optional[pd.DataFrame] = None,
+                          orders_df: Optional[pd.DataFrame] = None,
+                          unit_costs: Optional[Dict[int, float]] = None,
+                          target_days_of_supply: int = 30) -> Dict:
+        """
+        NEW: ROI straight from the analysis tables, one array operation per component
+        
+        Per product: stock above target_days_of_supply of recent demand is the holding saving, and
+        demand that would go unmet before the reorder lands (recommended_qty caps it) is the
+        prevented stockout. Products roll up by vendor and, using per-store inventory columns and
+        store sales, by store.
+        """
+        table = InsightTable.coerce(insights)
+        if len(table) == 0:
+            return {'products': pd.DataFrame(), 'by_vendor': pd.DataFrame(), 'by_store': pd.DataFrame(), 'totals': {}}
+        
+        def column(name: str) -> np.ndarray:
+            return table.column(name).astype(np.float64)
+        
+        product_ids = table.column('product_id')
+        daily_demand = column('recent_daily_demand')
+        current = np.maximum(column('current_inventory'), 0.0)
+        
+        # Selling price from realised revenue (recent, else historical); cost from margin unless given
+        with np.errstate(divide='ignore', invalid='ignore'):
+            recent_price = column('recent_revenue') / column('recent_total_sales')
+            historical_price = column('historical_revenue') / column('historical_total_sales')
+        selling_price = np.where(np.isfinite(recent_price) & (recent_price > 0), recent_price,
+                                 np.where(np.isfinite(historical_price), historical_price, 0.0))
+        unit_cost = selling_price * (1 - self.gross_margin_rate)
+        if unit_costs:
+            given = pd.Series(unit_costs, dtype=np.float64).reindex(product_ids).to_numpy()
+            unit_cost = np.where(np.isnan(given), unit_cost, given)
+        
+        target_units = np.ceil(daily_demand * target_days_of_supply)
+        optimized = np.minimum(current, target_units)
+        holding = self.holding_savings(current, optimized, unit_cost)
+        
+        shortfall_days = np.maximum(0.0, target_days_of_supply - np.maximum(column('days_until_stockout'), 0.0))
+        units_prevented = np.minimum(column('recommended_qty'), np.ceil(daily_demand * shortfall_days))
+        units_prevented = np.maximum(units_prevented, 0.0)
+        stockout = self.stockout_savings(units_prevented, selling_price)
+        
+        products = pd.DataFrame({
+            'product_id': product_ids,
+            'vendor': table.column('vendor'),
+            'unit_cost': unit_cost,
+            'selling_price': selling_price,
+            'inventory_value': current * unit_cost,
+            'excess_units': holding['inventory_reduction_units'],
+            'excess_value': holding['inventory_reduction_value'],
+            'annual_holding_savings': holding['annual_holding_savings'],
+            'units_prevented': units_prevented,
+            'revenue_saved': stockout['revenue_saved'],
+            'gross_margin_saved': stockout['gross_margin_saved'],
+        })
+        products['total_savings'] = products['annual_holding_savings'] + products['gross_margin_saved']
+        
+        value_columns = ['inventory_value', 'excess_value', 'annual_holding_savings',
+                         'units_prevented', 'revenue_saved', 'gross_margin_saved', 'total_savings']
+        by_vendor = products.groupby('vendor', sort=False)[value_columns].sum()
+        by_vendor = by_vendor.sort_values('total_savings', ascending=False).reset_index()
+        
+        totals = {name: float(products[name].sum()) for name in value_columns}
+        totals['roi_percentage'] = totals['annual_holding_savings'] / max(totals['inventory_value'], 1) * 100
+        
+        return {
+            'products': products,
+            'by_vendor': by_vendor,
+            'by_store': self._store_rollup(products, inventory_df, orders_df),
+            'totals': totals
+        }
+    
+    def _store_rollup(self, products: pd.DataFrame, inventory_df: Optional[pd.DataFrame],
+                      orders_df: Optional[pd.DataFrame]) -> pd.DataFrame:
+        """
+        Split product savings across stores: holding savings by each store's share of the product's
+        stock, prevented stockouts by each store's share of its sales (stock share without orders)
+        """
+        if inventory_df is None or inventory_df.empty or 'product_id' not in inventory_df.columns:
+            return pd.DataFrame()
+        
+        store_columns = [c for c in inventory_df.columns if c.startswith('inventory_') and c != 'total_inventory']
+        if not store_columns:
+            return pd.DataFrame()
+        # Store keys as in the inventory columns (lowercase, spaces as underscores); orders match them below
+        stores = [c[len('inventory_'):].lower().replace(' ', '_') for c in store_columns]
+        
+        stock = inventory_df.groupby('product_id')[store_columns].sum().clip(lower=0)
+        stock = stock.reindex(products['product_id']).fillna(0).to_numpy(dtype=np.float64)
+        stock_total = stock.sum(axis=1, keepdims=True)
+        stock_share = np.where(stock_total > 0, stock / np.maximum(stock_total, 1e-12), 1.0 / len(stores))
+        
+        sales_share = stock_share
+        if orders_df is not None and not orders_df.empty and 'Store Location' in orders_df.columns:
+            store_keys = orders_df['Store Location'].astype(str).str.lower().str.replace(' ', '_', regex=False)
+            sales = orders_df.assign(store=store_keys).pivot_table(
+                index='product_id', columns='store', values='quantity', aggfunc='sum', fill_value=0
+            ).reindex(index=products['product_id'], columns=stores).fillna(0).to_numpy(dtype=np.float64)
+            totals = sales.sum(axis=1, keepdims=True)
+            sales_share = np.where(totals > 0, sales / np.maximum(totals, 1e-12), stock_share)
+        
+        holding = products['annual_holding_savings'].to_numpy()[:, None] * stock_share
+        margin = products['gross_margin_saved'].to_numpy()[:, None] * sales_share
+        by_store = pd.DataFrame({
+            'store': [store.replace('_', ' ').title() for store in stores],
+            'inventory_value': (products['inventory_value'].to_numpy()[:, None] * stock_share).sum(axis=0),
+            'annual_holding_savings': holding.sum(axis=0),
+            'revenue_saved': (products['revenue_saved'].to_numpy()[:, None] * sales_share).sum(axis=0),
+            'gross_margin_saved': margin.sum(axis=0),
+        })
+        by_store['total_savings'] = by_store['annual_holding_savings'] + by_store['gross_margin_saved']
+        return by_store.sort_values('total_savings', ascending=False).reset_index(drop=True)
+    
     def calculate_forecast_accuracy_value(self,
                                         baseline_mape: float,
                                         improved_mape: float,
@@ -150,4 +276,34 @@ class ROICalculator:
             'business_case': self._generate_business_case_text(total_annual_savings, roi_percentage, payback_period_months)
         }
     
-   
\ No newline at end of file
+    def generate_roi_report_from_insights(self, insights, inventory_df: Optional[pd.DataFrame] = None,
+                                          orders_df: Optional[pd.DataFrame] = None,
+                                          implementation_costs: float = 50000,
+                                          target_days_of_supply: int = 30) -> Dict:
+        """NEW: generate_comprehensive_roi_report from the analysis tables instead of hand-built dicts"""
+        roi = self.roi_from_insights(insights, inventory_df, orders_df, target_days_of_supply=target_days_of_supply)
+        total_annual_savings = roi['totals'].get('total_savings', 0.0)
+        
+        net_benefit = total_annual_savings - implementation_costs
+        roi_percentage = (net_benefit / implementation_costs) * 100 if implementation_costs else 0.0
+        payback_period_months = implementation_costs / (total_annual_savings / 12) if total_annual_savings > 0 else float('inf')
+        
+        return {
+            'executive_summary': {
+                'total_annual_savings': total_annual_savings,
+                'implementation_costs': implementation_costs,
+                'net_annual_benefit': net_benefit,
+                'roi_percentage': roi_percentage,
+                'payback_period_months': payback_period_months
+            },
+            'detailed_savings': roi,
+            'business_case': self._generate_business_case_text(total_annual_savings, roi_percentage, payback_period_months)
+        }
+    
+    def _generate_business_case_text(self, total_annual_savings: float, roi_percentage: float,
+                                     payback_period_months: float) -> str:
+        """One-paragraph business case for the ROI summary"""
+        return (
+            f"Optimized inventory planning is projected to save ${total_annual_savings:,.0f} per year, "
+            f"a {roi_percentage:.0f}% return with a payback period of {payback_period_months:.1f} months."
+        )
@@ -0,0 +1,216 @@
+"""
+Seasonal Index Engine
+Per-product monthly seasonal indices computed in one grouped pass, normalized by the
+calendar days the sales history actually covers (leap years and partial months included)
+"""
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+MONTH_NAMES = {1: 'January', 2: 'February', 3: 'March', 4: 'April',
+               5: 'May', 6: 'June', 7: 'July', 8: 'August',
+               9: 'September', 10: 'October', 11: 'November', 12: 'December'}
+
+# A product needs this many units in a month before it can be listed as a peak product,
+# otherwise single sales in quiet months dominate the index ranking
+MIN_PEAK_MONTH_UNITS = 2
+
+# Products with less history than this keep a neutral forecast factor
+MIN_FACTOR_UNITS = 20
+FACTOR_BOUNDS = (0.5, 2.0)
+
+# Profiles are cached by a content hash of the historical sales they were built from
+_PROFILE_CACHE_SIZE = 8
+_profile_cache: 'OrderedDict[Tuple, SeasonalProfile]' = OrderedDict()
+
+
+class SeasonalProfile:
+    """Monthly seasonal indices for every product in a sales history"""
+
+    def __init__(self, month_days: pd.Series, quantity: pd.DataFrame, metadata: pd.DataFrame,
+                 product_days: Optional[np.ndarray] = None):
+        # month_days: calendar days covered per month (summed across years)
+        # quantity: products x months unit totals
+        # product_days: products x months days covered since each product's first sale
+        #               (defaults to the store-wide month_days for every product)
+        self.month_days = month_days
+        self.months = [int(m) for m in month_days.index]
+        self.quantity = quantity
+        self.metadata = metadata
+        self.key: Optional[Tuple] = None
+
+        days = month_days.to_numpy(dtype=np.float64)
+        qty = quantity.to_numpy(dtype=np.float64)
+        self.total_days = float(days.sum())
+        self.product_totals = pd.Series(qty.sum(axis=1), index=quantity.index)
+        active_days = np.broadcast_to(days, qty.shape) if product_days is None else np.asarray(product_days, dtype=np.float64)
+
+        # FIXED: Daily rate per product/month relative to the product's own daily rate over its
+        # active span (first sale onwards); months before the first sale have no data and index 1.0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            monthly_rate = np.where(active_days > 0, qty / active_days, 0.0)
+            overall_rate = qty.sum(axis=1, keepdims=True) / np.maximum(active_days.sum(axis=1, keepdims=True), 1.0)
+            index = np.where((overall_rate > 0) & (active_days > 0), monthly_rate / overall_rate, 1.0)
+        self.monthly_rate = pd.DataFrame(monthly_rate, index=quantity.index, columns=self.months)
+        self.overall_rate = pd.Series(overall_rate[:, 0], index=quantity.index)
+        self.index = pd.DataFrame(index, index=quantity.index, columns=self.months)
+
+        # Store-wide monthly demand
+        self.store_daily = pd.Series(qty.sum(axis=0) / days, index=self.months)
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.index.memory_usage(deep=False).sum() + self.quantity.memory_usage(deep=False).sum())
+
+    def peak_products(self, month: int, k: int = 5) -> List[Dict[str, Any]]:
+        """Top-k products by seasonal index for a month"""
+        if month not in self.index.columns or self.metadata.empty:
+            return []
+
+        month_qty = self.quantity[month].to_numpy()
+        scores = self.index[month].to_numpy(dtype=np.float64).copy()
+        eligible = (month_qty >= MIN_PEAK_MONTH_UNITS) & self.quantity.index.isin(self.metadata.index)
+        scores[~eligible] = -np.inf
+
+        n_eligible = int(eligible.sum())
+        if n_eligible == 0:
+            return []
+        k = min(k, n_eligible)
+        candidates = np.argpartition(-scores, k - 1)[:k]
+        # Highest index first, ties broken by month volume
+        order = candidates[np.lexsort((-month_qty[candidates], -scores[candidates]))]
+
+        peaks = []
+        for pos in order:
+            product_id = self.quantity.index[pos]
+            meta = self.metadata.loc[product_id]
+            description = str(meta['Description'])
+            peaks.append({
+                'style_number': str(meta['Style Number']),
+                'description': description[:50] + "..." if len(description) > 50 else description,
+                'product_id': int(product_id),
+                'quantity': int(month_qty[pos]),
+                'seasonal_elevation': float(scores[pos]),
+                'daily_avg_month': float(self.monthly_rate.iat[pos, self.months.index(month)]),
+                'daily_avg_overall': float(self.overall_rate.iat[pos])
+            })
+        return peaks
+
+    def forecast_factor(self, product_id, horizon_days: int, as_of: Optional[datetime] = None) -> float:
+        """
+        Average seasonal index over the next horizon_days, weighted by days per month.
+        Returns 1.0 for products without enough history or months the history does not cover.
+        """
+        try:
+            product_id = int(product_id)
+        except (TypeError, ValueError):
+            return 1.0
+        if product_id not in self.index.index or self.product_totals[product_id] < MIN_FACTOR_UNITS:
+            return 1.0
+
+        start = pd.Timestamp(as_of or datetime.now()).normalize()
+        horizon = pd.date_range(start, periods=max(int(horizon_days), 1), freq='D')
+        row = self.index.loc[product_id]
+        factor = float(row.reindex(horizon.month).fillna(1.0).mean())
+        return float(np.clip(factor, *FACTOR_BOUNDS))
+
+
+def build_seasonal_profile(orders_df: pd.DataFrame) -> Optional[SeasonalProfile]:
+    """Build (or fetch from cache) the seasonal profile for a sales history"""
+    if orders_df is None or orders_df.empty or 'quantity' not in orders_df.columns:
+        return None
+
+    columns = [c for c in ('product_id', 'created_at', 'quantity', 'Style Number', 'Description') if c in orders_df.columns]
+    if 'product_id' not in columns or 'created_at' not in columns:
+        return None
+
+    df = orders_df[columns]
+    created = df['created_at']
+    if not pd.api.types.is_datetime64_any_dtype(created):
+        created = pd.to_datetime(created, errors='coerce')
+    if getattr(created.dt, 'tz', None) is not None:
+        created = created.dt.tz_localize(None)
+    valid = created.notna().to_numpy()
+    if not valid.any():
+        return None
+    df = df[valid]
+    created = created[valid]
+
+    key = _fingerprint(df, created)
+    cached = _profile_cache.get(key)
+    if cached is not None:
+        _profile_cache.move_to_end(key)
+        return cached
+
+    try:
+        profile = _compute_profile(df, created)
+    except Exception as e:
+        logger.error(f"Seasonal profile build failed: {e}")
+        return None
+
+    if profile is not None:
+        profile.key = key
+        _profile_cache[key] = profile
+        while len(_profile_cache) > _PROFILE_CACHE_SIZE:
+            _profile_cache.popitem(last=False)
+    return profile
+
+
+def clear_profile_cache():
+    _profile_cache.clear()
+
+
+def _fingerprint(df: pd.DataFrame, created: pd.Series) -> Tuple:
+    hashed = pd.util.hash_pandas_object(
+        pd.DataFrame({'product_id': df['product_id'].to_numpy(),
+                      'created_at': created.to_numpy(),
+                      'quantity': df['quantity'].to_numpy()}),
+        index=False
+    )
+    return (len(df), int(hashed.sum()), created.min(), created.max())
+
+
+def _compute_profile(df: pd.DataFrame, created: pd.Series) -> Optional[SeasonalProfile]:
+    # Calendar days covered per (year, month), clipped to the first and last sale so
+    # partial months are not under-counted; summing across years handles leap Februaries
+    days = pd.date_range(created.min().normalize(), created.max().normalize(), freq='D')
+    per_year_month = pd.Series(1, index=days).groupby([days.year, days.month]).sum()
+    month_days = per_year_month.groupby(level=1).sum()
+
+    if len(month_days) < 2:
+        return None
+
+    # One grouped pass over (product, year, month)
+    grouped = df['quantity'].groupby(
+        [df['product_id'].to_numpy(), created.dt.year.to_numpy(), created.dt.month.to_numpy()]
+    ).sum()
+    quantity = grouped.groupby(level=[0, 2]).sum().unstack(fill_value=0)
+    quantity = quantity.reindex(columns=month_days.index, fill_value=0)
+    quantity.index = quantity.index.astype(np.int64)
+
+    # Style/description for display, from rows where both are populated
+    if 'Style Number' in df.columns and 'Description' in df.columns:
+        clean = df[
+            df['Style Number'].notna() & (df['Style Number'] != '') &
+            df['Description'].notna() & (df['Description'] != '')
+        ]
+        metadata = clean.groupby('product_id')[['Style Number', 'Description']].first()
+        metadata.index = metadata.index.astype(np.int64)
+    else:
+        metadata = pd.DataFrame(columns=['Style Number', 'Description'])
+
+    # Days each product was on sale per month: from its first sale to the end of the history
+    first_sale = created.groupby(df['product_id'].to_numpy()).min().dt.normalize()
+    first_sale.index = first_sale.index.astype(np.int64)
+    first_pos = days.searchsorted(first_sale.reindex(quantity.index).to_numpy())
+    in_month = (days.month.to_numpy()[None, :] == month_days.index.to_numpy()[:, None]).astype(np.int64)
+    days_from = np.cumsum(in_month[:, ::-1], axis=1)[:, ::-1]   # months x days: days >= d in each month
+    product_days = days_from[:, first_pos].T
+
+    return SeasonalProfile(month_days.astype(np.int64), quantity, metadata, product_days)
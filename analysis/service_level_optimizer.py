@@ -1,34 +1,91 @@
 import streamlit as st
 import numpy as np
+from functools import lru_cache
+from typing import Dict, Iterable, Optional
 from scipy import stats
 
+
+@lru_cache(maxsize=256)
+def z_score_for(service_level: float) -> float:
+    """Cached standard normal quantile for a service level"""
+    return float(stats.norm.ppf(service_level))
+
+
+@lru_cache(maxsize=256)
+def _loss_density(service_level: float) -> float:
+    """Cached standard normal density at the service level's z-score"""
+    return float(stats.norm.pdf(z_score_for(service_level)))
+
+
 class ServiceLevelOptimizer:
-    def __init__(self, target_service_level=0.975):
+    def __init__(self, target_service_level=0.975, vendor_service_levels: Optional[Dict[str, float]] = None):
         self.target_service_level = target_service_level
-        self.z_score = stats.norm.ppf(target_service_level)
-    
-    def calculate_optimal_stock(self, daily_demand, demand_std, lead_time, 
-                              holding_cost_per_unit=1.0, stockout_cost_per_unit=10.0):
+        self.z_score = z_score_for(target_service_level)
+        self.vendor_service_levels = dict(vendor_service_levels or {})
+
+    def service_level_for_vendor(self, vendor: str) -> float:
+        """Service level target for a vendor, falling back to the default target"""
+        return self.vendor_service_levels.get(vendor, self.target_service_level)
+
+    def z_score_for_vendor(self, vendor: str) -> float:
+        return z_score_for(self.service_level_for_vendor(vendor))
+
+    def service_levels_for_vendors(self, vendors: Iterable[str]) -> np.ndarray:
+        """Per-product service level targets from each product's vendor"""
+        return np.array([self.service_level_for_vendor(v) for v in vendors], dtype=np.float64)
+
+    def calculate_optimal_stock(self, daily_demand, demand_std, lead_time,
+                              holding_cost_per_unit=1.0, stockout_cost_per_unit=10.0,
+                              service_level=None):
         """Calculate optimal stock level using newsvendor model"""
-        
+
+        result = self.calculate_optimal_stock_batch(
+            daily_demand, demand_std, lead_time, service_level,
+            holding_cost_per_unit, stockout_cost_per_unit
+        )
+        return {key: float(value) for key, value in result.items()}
+
+    def calculate_optimal_stock_batch(self, daily_demand, demand_std, lead_time, service_levels=None,
+                                      holding_cost_per_unit=1.0, stockout_cost_per_unit=10.0) -> Dict[str, np.ndarray]:
+        """
+        Vectorized newsvendor model
+
+        All arguments broadcast against each other; service_levels is a scalar or per-product
+        array (defaults to the optimizer's target). Returns arrays keyed like calculate_optimal_stock.
+        """
+
+        daily_demand = np.asarray(daily_demand, dtype=np.float64)
+        demand_std = np.asarray(demand_std, dtype=np.float64)
+        lead_time = np.asarray(lead_time, dtype=np.float64)
+        if service_levels is None:
+            service_levels = self.target_service_level
+        service_levels = np.asarray(service_levels, dtype=np.float64)
+
+        # Only distinct service levels go through the normal quantile (cached across calls)
+        levels, inverse = np.unique(service_levels, return_inverse=True)
+        z_scores = np.array([z_score_for(float(level)) for level in levels])[inverse].reshape(service_levels.shape)
+        densities = np.array([_loss_density(float(level)) for level in levels])[inverse].reshape(service_levels.shape)
+
         # Lead time demand statistics
         ltd_mean = daily_demand * lead_time
         ltd_std = demand_std * np.sqrt(lead_time)
-        
+
         # Safety stock
-        safety_stock = self.z_score * ltd_std
-        
+        safety_stock = z_scores * ltd_std
+
         # Optimal stock level
         optimal_stock = ltd_mean + safety_stock
-        
+
         # Economic justification
-        critical_ratio = stockout_cost_per_unit / (stockout_cost_per_unit + holding_cost_per_unit)
-        economic_service_level = critical_ratio
-        
+        critical_ratio = np.asarray(stockout_cost_per_unit, dtype=np.float64) / (
+            np.asarray(stockout_cost_per_unit, dtype=np.float64) + np.asarray(holding_cost_per_unit, dtype=np.float64)
+        )
+        shape = np.broadcast(optimal_stock, critical_ratio).shape
+
         return {
-            'optimal_stock_level': optimal_stock,
-            'safety_stock': safety_stock,
-            'service_level': self.target_service_level,
-            'economic_service_level': economic_service_level,
-            'expected_stockouts_per_cycle': ltd_std * stats.norm.pdf(self.z_score)
+            'optimal_stock_level': np.broadcast_to(optimal_stock, shape),
+            'safety_stock': np.broadcast_to(safety_stock, shape),
+            'service_level': np.broadcast_to(service_levels, shape),
+            'economic_service_level': np.broadcast_to(critical_ratio, shape),
+            'expected_stockouts_per_cycle': np.broadcast_to(ltd_std * densities, shape)
         }
@@ -0,0 +1,269 @@
+"""
+Monte Carlo Stockout Simulation
+Draws thousands of daily demand paths per SKU from fitted demand distributions, with uncertain
+lead times and pending-order arrivals, and reports stockout probability and fill-rate distributions.
+Chunks of SKUs are simulated with NumPy across a process pool; results are reproducible per seed.
+"""
+import logging
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PATHS = 2000
+DEFAULT_CHUNK_SIZE = 100  # SKUs per worker task
+MAX_HORIZON_DAYS = 365
+# Below this many SKU-paths the process pool costs more than it saves
+PARALLEL_MIN_WORK = 200_000
+
+
+def fit_demand(orders_df: pd.DataFrame, key_column: str, keys: Sequence, analysis_days: int = 30,
+               as_of: Optional[datetime] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Mean and variance of daily demand per key over the analysis window (zero-sale days included)"""
+    n = len(keys)
+    if orders_df.empty or key_column not in orders_df.columns:
+        return np.zeros(n), np.zeros(n)
+
+    end = pd.Timestamp(as_of) if as_of is not None else orders_df['created_at'].max()
+    recent = orders_df[(orders_df['created_at'] > end - pd.Timedelta(days=analysis_days)) &
+                       (orders_df['created_at'] <= end)]
+    daily = recent.groupby([key_column, recent['created_at'].dt.floor('D')])['quantity'].sum()
+    totals = pd.DataFrame({'total': daily, 'squares': daily ** 2}).groupby(level=0).sum()
+    totals = totals.reindex(pd.Index(keys)).fillna(0)
+
+    days = max(1, analysis_days)
+    mean = totals['total'].to_numpy(dtype=np.float64) / days
+    variance = np.maximum(0.0, totals['squares'].to_numpy(dtype=np.float64) / days - mean ** 2)
+    return mean, variance
+
+
+def pending_arrivals(pending_orders: Iterable[Any], key_index: Dict[Any, int], key_func,
+                     as_of: Optional[datetime] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Pending lots as (sku_index, expected_arrival_day, quantity) arrays
+
+    key_func maps a pending order (dict or PendingOrder) to the key used in key_index.
+    Overdue lots are expected on day 0.
+    """
+    as_of = as_of or datetime.now()
+    sku, day, quantity = [], [], []
+    for order in pending_orders or []:
+        try:
+            index = key_index.get(key_func(order))
+            if index is None:
+                continue
+            if isinstance(order, dict):
+                qty = int(order.get('quantity', 0))
+                arrival = order.get('expected_arrival')
+            else:
+                qty = int(order.quantity)
+                arrival = order.expected_arrival
+            if isinstance(arrival, str):
+                arrival = datetime.fromisoformat(arrival)
+            if qty <= 0 or arrival is None:
+                continue
+            sku.append(index)
+            day.append(max(0, (arrival - as_of).days))
+            quantity.append(qty)
+        except (KeyError, TypeError, ValueError):
+            continue
+    return np.array(sku, dtype=np.int64), np.array(day, dtype=np.int64), np.array(quantity, dtype=np.int64)
+
+
+def projected_pending(inventory_df: pd.DataFrame, pending_orders: Iterable[Any], product_ids: List) -> np.ndarray:
+    """Pending units PendingOrderManager.project_inventory added to each product's inventory"""
+    from pending_orders.pending_index import PendingInventoryIndex
+
+    _, total_additions, _, _ = PendingInventoryIndex.build(pending_orders).inventory_additions(inventory_df)
+    by_product = pd.Series(total_additions, index=inventory_df['product_id'].to_numpy()).groupby(level=0).sum()
+    return by_product.reindex(product_ids).fillna(0).to_numpy(dtype=np.float64)
+
+
+def _simulate_chunk(on_hand: np.ndarray, demand_mean: np.ndarray, demand_var: np.ndarray,
+                    lead_time: np.ndarray, pending: Tuple[np.ndarray, np.ndarray, np.ndarray],
+                    n_paths: int, lead_time_cv: float, seed: np.random.SeedSequence) -> Dict[str, np.ndarray]:
+    """Simulate one chunk of SKUs; returns per-path fill rates and stockout days"""
+    rng = np.random.default_rng(seed)
+    n_skus = len(on_hand)
+
+    # Uncertain lead time: one gamma multiplier (mean 1) per SKU path, shared with pending arrivals
+    if lead_time_cv > 0:
+        shape = 1.0 / lead_time_cv ** 2
+        multiplier = rng.gamma(shape, 1.0 / shape, size=(n_skus, n_paths))
+    else:
+        multiplier = np.ones((n_skus, n_paths))
+    path_lead_time = np.maximum(1, np.rint(lead_time[:, None] * multiplier)).astype(np.int64)
+    horizon = int(min(MAX_HORIZON_DAYS, path_lead_time.max()))
+
+    pending_sku, pending_day, pending_qty = pending
+    pending_arrival = np.rint(pending_day[:, None] * multiplier[pending_sku]).astype(np.int64)
+
+    # Negative binomial (gamma-Poisson) where demand is overdispersed, Poisson otherwise
+    overdispersed = (demand_var > demand_mean) & (demand_mean > 0)
+    dispersion = np.where(overdispersed, demand_mean ** 2 / np.where(overdispersed, demand_var - demand_mean, 1.0), 1.0)
+
+    stock = np.repeat(on_hand[:, None].astype(np.int64), n_paths, axis=1)
+    demanded = np.zeros((n_skus, n_paths), dtype=np.int64)
+    sold = np.zeros((n_skus, n_paths), dtype=np.int64)
+    first_stockout = np.full((n_skus, n_paths), -1, dtype=np.int64)
+
+    for day in range(horizon):
+        if len(pending_sku):
+            np.add.at(stock, pending_sku, np.where(pending_arrival == day, pending_qty[:, None], 0))
+
+        rate = np.repeat(demand_mean[:, None], n_paths, axis=1)
+        if overdispersed.any():
+            rows = np.nonzero(overdispersed)[0]
+            rate[rows] = rng.gamma(dispersion[rows, None], (demand_mean[rows] / dispersion[rows])[:, None],
+                                   size=(len(rows), n_paths))
+        demand = rng.poisson(rate)
+
+        active = day < path_lead_time
+        demand = np.where(active, demand, 0)
+        filled = np.minimum(stock, demand)
+        stock -= filled
+        demanded += demand
+        sold += filled
+        first_stockout[(first_stockout < 0) & (filled < demand)] = day
+
+    fill_rate = np.where(demanded > 0, sold / np.maximum(demanded, 1), 1.0)
+    return {
+        'fill_rate': fill_rate,
+        'units_short': demanded - sold,
+        'first_stockout': first_stockout,
+        'lead_time': path_lead_time
+    }
+
+
+class StockoutSimulator:
+    """Vectorized Monte Carlo engine for per-SKU stockout risk over the replenishment lead time"""
+
+    def __init__(self, n_paths: int = DEFAULT_PATHS, seed: int = 0, lead_time_cv: float = 0.25,
+                 max_workers: Optional[int] = None, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self.n_paths = n_paths
+        self.seed = seed
+        self.lead_time_cv = lead_time_cv
+        self.max_workers = max_workers
+        self.chunk_size = chunk_size
+        self.last_fill_rates: Optional[np.ndarray] = None  # SKUs x paths from the latest run
+
+    def simulate(self, on_hand, demand_mean, demand_var, lead_time,
+                 pending: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None,
+                 sku_ids: Optional[Sequence] = None) -> pd.DataFrame:
+        """
+        Simulate every SKU and summarize its stockout risk
+
+        Args:
+            on_hand, demand_mean, demand_var, lead_time: per-SKU arrays
+            pending: (sku_index, expected_arrival_day, quantity) arrays from pending_arrivals
+            sku_ids: labels for the output rows
+
+        Returns:
+            One row per SKU with stockout_probability, fill-rate mean and percentiles,
+            expected_units_short, median_days_to_stockout and lead-time percentiles
+        """
+        on_hand = np.maximum(0, np.asarray(on_hand, dtype=np.float64)).astype(np.int64)
+        demand_mean = np.maximum(0.0, np.asarray(demand_mean, dtype=np.float64))
+        demand_var = np.maximum(0.0, np.asarray(demand_var, dtype=np.float64))
+        lead_time = np.maximum(1.0, np.asarray(lead_time, dtype=np.float64))
+        n_skus = len(on_hand)
+        if sku_ids is None:
+            sku_ids = np.arange(n_skus)
+        if pending is None:
+            pending = (np.zeros(0, dtype=np.int64),) * 3
+
+        starts = list(range(0, n_skus, max(1, self.chunk_size)))
+        seeds = np.random.SeedSequence(self.seed).spawn(len(starts))
+        tasks = []
+        for start, seed in zip(starts, seeds):
+            stop = min(n_skus, start + self.chunk_size)
+            in_chunk = (pending[0] >= start) & (pending[0] < stop)
+            chunk_pending = (pending[0][in_chunk] - start, pending[1][in_chunk], pending[2][in_chunk])
+            tasks.append((on_hand[start:stop], demand_mean[start:stop], demand_var[start:stop],
+                          lead_time[start:stop], chunk_pending, self.n_paths, self.lead_time_cv, seed))
+
+        results = self._run(tasks, n_skus)
+        if not results:
+            self.last_fill_rates = np.zeros((0, self.n_paths))
+            return pd.DataFrame(columns=['sku_id'])
+
+        fill_rate = np.concatenate([r['fill_rate'] for r in results])
+        units_short = np.concatenate([r['units_short'] for r in results])
+        first_stockout = np.concatenate([r['first_stockout'] for r in results])
+        path_lead_time = np.concatenate([r['lead_time'] for r in results])
+        self.last_fill_rates = fill_rate
+
+        stocked_out = first_stockout >= 0
+        stockout_days = np.where(stocked_out, first_stockout, np.nan)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)  # All-NaN rows for SKUs that never stock out
+            median_days = np.nanmedian(stockout_days, axis=1)
+
+        fill_percentiles = np.percentile(fill_rate, [5, 50, 95], axis=1)
+        lead_percentiles = np.percentile(path_lead_time, [50, 95], axis=1)
+        return pd.DataFrame({
+            'sku_id': list(sku_ids),
+            'stockout_probability': stocked_out.mean(axis=1),
+            'fill_rate_mean': fill_rate.mean(axis=1),
+            'fill_rate_p05': fill_percentiles[0],
+            'fill_rate_p50': fill_percentiles[1],
+            'fill_rate_p95': fill_percentiles[2],
+            'expected_units_short': units_short.mean(axis=1),
+            'median_days_to_stockout': median_days,
+            'lead_time_p50': lead_percentiles[0],
+            'lead_time_p95': lead_percentiles[1]
+        })
+
+    def _run(self, tasks: List[tuple], n_skus: int) -> List[Dict[str, np.ndarray]]:
+        """Run chunk tasks in a process pool when the work is large enough, inline otherwise"""
+        if len(tasks) > 1 and self.max_workers != 1 and n_skus * self.n_paths >= PARALLEL_MIN_WORK:
+            try:
+                with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+                    return list(executor.map(_simulate_chunk, *zip(*tasks)))
+            except Exception as e:
+                logger.warning(f"Parallel stockout simulation failed, running inline: {e}")
+        return [_simulate_chunk(*task) for task in tasks]
+
+    def simulate_products(self, insights, orders_df: pd.DataFrame, pending_orders: Optional[List] = None,
+                          brand_lead_times: Optional[Dict[str, int]] = None, default_lead_time: int = 14,
+                          analysis_days: int = 30,
+                          projected_inventory_df: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+        """
+        Stockout risk for product insights (InsightTable or ProductInsight list) using recent sales
+
+        projected_inventory_df: the inventory the insights were built from, when it already includes
+        pending_orders; those units are taken back out of on-hand so each lot only arrives once.
+        """
+        from models.insight_table import InsightTable
+
+        table = InsightTable.coerce(insights)
+        if not table:
+            return pd.DataFrame(columns=['sku_id'])
+
+        frame = table.to_frame()
+        product_ids = frame['product_id'].tolist()
+        demand_mean, demand_var = fit_demand(orders_df, 'product_id', product_ids, analysis_days)
+        brand_lead_times = brand_lead_times or {}
+        lead_time = frame['vendor'].map(lambda v: brand_lead_times.get(v, default_lead_time)).to_numpy(dtype=np.float64)
+
+        style_index = {str(style): i for i, style in enumerate(frame['style_number'])}
+        pending = pending_arrivals(
+            pending_orders, style_index,
+            lambda order: str(order.get('style_number', '') if isinstance(order, dict) else order.style_number)
+        )
+
+        on_hand = frame['current_inventory'].to_numpy(dtype=np.float64)
+        if projected_inventory_df is not None and pending_orders and 'product_id' in projected_inventory_df.columns:
+            on_hand = np.maximum(0.0, on_hand - projected_pending(projected_inventory_df, pending_orders, product_ids))
+
+        result = self.simulate(on_hand, demand_mean, demand_var, lead_time,
+                               pending, sku_ids=product_ids)
+        result.insert(1, 'style_number', frame['style_number'].to_numpy())
+        result.insert(2, 'vendor', frame['vendor'].to_numpy())
+        result.insert(3, 'days_until_stockout', frame['days_until_stockout'].to_numpy())
+        return result.rename(columns={'sku_id': 'product_id'})
@@ -8,8 +8,10 @@ from datetime import datetime, timedelta
 from typing import Dict, List, Tuple, Any, Optional
 import numpy as np
 import logging
+import time
 from scipy.optimize import linprog
 from models.data_models import ProductInsight, TransferRecommendation
+from analysis.transfer_lp import lane_cost_matrix, solve_transfer_lp, transfer_plan_cost
 
 logger = logging.getLogger(__name__)
 
@@ -21,6 +23,8 @@ class TransferOptimizer:
         self.holding_cost_per_unit_per_day = 0.003  # $0.003 per unit per day (roughly $1/year)
         self.stockout_cost_per_unit = 8.0  # Lost profit per stockout unit
         self.min_transfer_threshold = 2  # Minimum units to consider transferring
+        self.default_lead_time = 14  # Days of demand each store is stocked for
+        self.solver = 'lp'  # 'lp' (batched min-cost LP) or 'greedy' (legacy heuristic)
         
     def _default_transfer_costs(self):
         """Default transfer costs based on Hawaiian geography"""
@@ -63,6 +67,10 @@ class TransferOptimizer:
         """
         Advanced transfer optimization using economic modeling
         
+        With the default 'lp' solver every product is stacked into a batched min-cost
+        transportation LP (lane costs from transfer_costs, sources keep their safety stock,
+        no lane moving fewer than min_transfer_threshold units); 'greedy' runs the legacy heuristic.
+        
         Args:
             inventory_data: {location: {product_id: current_inventory}}
             demand_data: {location: {product_id: daily_demand}}
@@ -72,65 +80,150 @@ class TransferOptimizer:
             {product_id: [transfer_recommendations]}
         """
         
-        results = {}
-        
-        # Get all unique products and locations
-        all_products = set()
-        all_locations = set()
-        
-        for location, products in inventory_data.items():
-            all_locations.add(location)
-            all_products.update(products.keys())
-        
-        for location, products in demand_data.items():
-            all_locations.add(location)
-            all_products.update(products.keys())
-        
-        locations = sorted(list(all_locations))
+        st.info(f"🧮 Optimizing transfers for {len(self._all_products(inventory_data, demand_data))} products "
+                f"across {len(self._all_locations(inventory_data, demand_data))} locations")
         
-        st.info(f"🧮 Optimizing transfers for {len(all_products)} products across {len(locations)} locations")
-        
-        for product_id in all_products:
-            try:
-                # Get current state for this product
-                current_inventory = {loc: inventory_data.get(loc, {}).get(product_id, 0) for loc in locations}
-                daily_demand = {loc: demand_data.get(loc, {}).get(product_id, 0) for loc in locations}
-                
-                # Skip if no inventory or demand
-                total_inventory = sum(current_inventory.values())
-                total_demand = sum(daily_demand.values())
-                
-                if total_inventory < self.min_transfer_threshold or total_demand <= 0:
-                    continue
-                
-                # Get product insight for lead time and trend info
-                insight = product_insights.get(product_id)
-                lead_time = 14  # Default lead time
-                trend_multiplier = 1.0
-                
-                if insight:
-                    # Use brand-specific lead time if available
-                    lead_time = insight.reorder_timing  # This should be converted to days
-                    if insight.trend_classification in ['Trending Up', 'Hot Seller']:
-                        trend_multiplier = 1.2
-                    elif 'Declining' in insight.trend_classification:
-                        trend_multiplier = 0.8
-                
-                # Calculate optimal allocation using economic principles
-                optimal_transfers = self._solve_transfer_optimization(
-                    current_inventory, daily_demand, locations, 
-                    product_id, lead_time, trend_multiplier
-                )
-                
-                if optimal_transfers:
-                    results[product_id] = optimal_transfers
-                    
-            except Exception as e:
-                logger.warning(f"Transfer optimization failed for product {product_id}: {e}")
-                continue
+        return self._optimize(inventory_data, demand_data, product_insights, self.solver)
+    
+    def benchmark_solvers(self,
+                          inventory_data: Dict[str, Dict[str, int]],
+                          demand_data: Dict[str, Dict[str, float]],
+                          product_insights: Dict[str, ProductInsight]) -> Dict[str, Dict[str, float]]:
+        """
+        Run the greedy heuristic and the LP solver on the same data and compare plan cost
+        (transfer + remaining stockout) and runtime
+        """
+        products, locations, inventory, demand, trend = self._build_problem(inventory_data, demand_data, product_insights)
+        targets = self._target_inventory(demand, trend, self.default_lead_time)
+        lane_costs = self._lane_costs(locations)
+        location_index = {loc: i for i, loc in enumerate(locations)}
+        product_index = {product_id: i for i, product_id in enumerate(products)}
+        
+        report = {}
+        for solver in ('greedy', 'lp'):
+            start = time.perf_counter()
+            plan = self._optimize(inventory_data, demand_data, product_insights, solver)
+            elapsed = time.perf_counter() - start
+            
+            flows = np.zeros((len(products), len(locations), len(locations)), dtype=np.int64)
+            for product_id, transfers in plan.items():
+                for transfer in transfers:
+                    flows[product_index[product_id], location_index[transfer['from_location']],
+                          location_index[transfer['to_location']]] += transfer['quantity']
+            
+            report[solver] = {
+                'runtime_seconds': elapsed,
+                'products_with_transfers': len(plan),
+                **transfer_plan_cost(inventory, targets, flows, lane_costs, self.stockout_cost_per_unit)
+            }
+        return report
+    
+    def _optimize(self, inventory_data, demand_data, product_insights, solver: str) -> Dict[str, List[Dict]]:
+        products, locations, inventory, demand, trend = self._build_problem(inventory_data, demand_data, product_insights)
+        if not products:
+            return {}
+        lead_time = self.default_lead_time
+        
+        if solver != 'lp':
+            results = {}
+            for p, product_id in enumerate(products):
+                try:
+                    optimal_transfers = self._solve_transfer_optimization(
+                        dict(zip(locations, inventory[p])), dict(zip(locations, demand[p])), locations,
+                        product_id, lead_time, trend[p]
+                    )
+                    if optimal_transfers:
+                        results[product_id] = optimal_transfers
+                except Exception as e:
+                    logger.warning(f"Transfer optimization failed for product {product_id}: {e}")
+            return results
+        
+        # All products in one batched sparse LP (chunked), holding cost folded into lane cost
+        targets = self._target_inventory(demand, trend, lead_time)
+        lane_costs = self._lane_costs(locations)
+        holding_per_unit = self.holding_cost_per_unit_per_day * 30
+        flows = solve_transfer_lp(
+            inventory, targets, lane_costs + holding_per_unit, self.stockout_cost_per_unit,
+            min_transfer=self.min_transfer_threshold
+        )
         
+        results = {}
+        for p, i, j in zip(*np.nonzero(flows)):
+            quantity = int(flows[p, i, j])
+            transfer_cost = float(quantity * lane_costs[i, j])
+            net_benefit = quantity * self.stockout_cost_per_unit - transfer_cost - quantity * holding_per_unit
+            results.setdefault(products[p], []).append({
+                'from_location': locations[i],
+                'to_location': locations[j],
+                'quantity': quantity,
+                'transfer_cost': transfer_cost,
+                'net_benefit': net_benefit,
+                'benefit_per_unit': net_benefit / quantity,
+                'urgency_score': self._calculate_urgency_score(inventory[p, j], demand[p, j], lead_time)
+            })
+        
+        # Most beneficial transfers first, top 10 per product
+        for product_id, transfers in results.items():
+            transfers.sort(key=lambda x: x['benefit_per_unit'], reverse=True)
+            results[product_id] = transfers[:10]
         return results
     
+    def _build_problem(self, inventory_data, demand_data, product_insights):
+        """Products x locations inventory/demand matrices for products worth optimizing"""
+        locations = self._all_locations(inventory_data, demand_data)
+        products = list(self._all_products(inventory_data, demand_data))
+        
+        inventory = np.array([[inventory_data.get(loc, {}).get(p, 0) for loc in locations] for p in products],
+                             dtype=np.float64).reshape(len(products), len(locations))
+        demand = np.array([[demand_data.get(loc, {}).get(p, 0) for loc in locations] for p in products],
+                          dtype=np.float64).reshape(len(products), len(locations))
+        
+        # Skip if no inventory or demand
+        keep = (inventory.sum(axis=1) >= self.min_transfer_threshold) & (demand.sum(axis=1) > 0)
+        products = [p for p, k in zip(products, keep) if k]
+        inventory = inventory[keep]
+        demand = demand[keep]
+        
+        # Trend info from product insights
+        trend = np.ones(len(products))
+        for p, product_id in enumerate(products):
+            # Insights are keyed by int product_id while optimizer data uses str keys
+            insight = product_insights.get(product_id) or product_insights.get(self._as_int(product_id))
+            if insight:
+                if insight.trend_classification in ['Trending Up', 'Hot Seller']:
+                    trend[p] = 1.2
+                elif 'Declining' in insight.trend_classification:
+                    trend[p] = 0.8
+        
+        return products, locations, inventory, demand, trend
+    
+    def _target_inventory(self, demand: np.ndarray, trend: np.ndarray, lead_time: int) -> np.ndarray:
+        """Lead time demand plus safety stock (95% service level, 30% CV) for every product/location"""
+        adjusted = demand * trend[:, None]
+        safety_stock = 1.65 * np.sqrt(adjusted * lead_time * 0.3)
+        return np.maximum(0, adjusted * lead_time + safety_stock)
+    
+    def _lane_costs(self, locations: List[str]) -> np.ndarray:
+        return lane_cost_matrix(locations, self.transfer_costs, default_cost=1.0)
+    
+    @staticmethod
+    def _as_int(product_id):
+        try:
+            return int(product_id)
+        except (TypeError, ValueError):
+            return product_id
+    
+    @staticmethod
+    def _all_locations(inventory_data, demand_data) -> List[str]:
+        return sorted(set(inventory_data.keys()) | set(demand_data.keys()))
+    
+    @staticmethod
+    def _all_products(inventory_data, demand_data) -> set:
+        all_products = set()
+        for products in list(inventory_data.values()) + list(demand_data.values()):
+            all_products.update(products.keys())
+        return all_products
+    
     def _solve_transfer_optimization(self, 
                                    current_inventory: Dict[str, int],
                                    daily_demand: Dict[str, float], 
@@ -244,6 +337,7 @@ class TransferAnalysisEngine:
         self.location_config = location_config
         self.user_profile = user_profile
         self.min_transfer_qty = 2  # Minimum quantity to consider transferring
+        self.location_name_to_id = {name: int(loc_id) for loc_id, name in location_config.items()}
         
         # NEW: Initialize advanced transfer optimizer
         self.transfer_optimizer = TransferOptimizer()
@@ -271,22 +365,28 @@ class TransferAnalysisEngine:
         inventory_distribution = self._analyze_inventory_distribution(inventory_df)
         
         # Step 3: Prepare data for advanced optimization
+        # FIXED: The optimizer is keyed by variant so every recommendation moves stock of one variant
         inventory_data = self._prepare_inventory_data_for_optimization(inventory_distribution)
         demand_data = self._prepare_demand_data_for_optimization(location_demand)
         insights_lookup = {insight.product_id: insight for insight in insights}
+        lookups = self._build_recommendation_lookups(inventory_distribution, location_demand)
+        variant_insights = {
+            str(variant_id): insights_lookup[row['product_id']]
+            for variant_id, row in lookups['variant'].items() if row['product_id'] in insights_lookup
+        }
         
         # Step 4: NEW - Run advanced economic optimization
         st.info("🧠 Running advanced transfer optimization with economic modeling...")
         
         optimal_transfers = self.transfer_optimizer.optimize_transfers_economically(
-            inventory_data, demand_data, insights_lookup
+            inventory_data, demand_data, variant_insights
         )
         
         # Step 5: Convert optimization results to TransferRecommendation objects
-        for product_id, transfers in optimal_transfers.items():
+        for variant_id, transfers in optimal_transfers.items():
             for transfer in transfers:
                 recommendation = self._create_transfer_recommendation_from_optimization(
-                    product_id, transfer, inventory_distribution, location_demand, insights_lookup
+                    variant_id, transfer, lookups, insights_lookup
                 )
                 if recommendation:
                     recommendations.append(recommendation)
@@ -303,89 +403,75 @@ class TransferAnalysisEngine:
         return recommendations[:30]  # Limit to top 30 recommendations
     
     def _prepare_inventory_data_for_optimization(self, inventory_distribution: pd.DataFrame) -> Dict[str, Dict[str, int]]:
-        """Prepare inventory data in format needed for optimization"""
-        inventory_data = {}
+        """Prepare inventory data in format needed for optimization: {location: {variant_id: units}}"""
+        if inventory_distribution.empty:
+            return {}
         
-        for _, row in inventory_distribution.iterrows():
-            location = row['location_name']
-            product_id = str(row['product_id'])
-            inventory_qty = int(row['inventory_qty'])
-            
-            if location not in inventory_data:
-                inventory_data[location] = {}
-            
-            inventory_data[location][product_id] = inventory_qty
-        
-        return inventory_data
+        totals = inventory_distribution.groupby(['location_name', 'variant_id'], sort=False)['inventory_qty'].sum()
+        return self._nested_dict(totals, int)
     
     def _prepare_demand_data_for_optimization(self, location_demand: pd.DataFrame) -> Dict[str, Dict[str, float]]:
-        """Prepare demand data in format needed for optimization"""
-        demand_data = {}
-        
+        """Prepare demand data in format needed for optimization: {location: {variant_id: daily_demand}}"""
         if location_demand.empty:
-            return demand_data
+            return {}
         
-        for _, row in location_demand.iterrows():
-            location = row['Store Location']
-            product_id = str(row['product_id'])
-            daily_demand = float(row['daily_demand'])
-            
-            if location not in demand_data:
-                demand_data[location] = {}
-            
-            demand_data[location][product_id] = daily_demand
+        totals = location_demand.groupby(['Store Location', 'variant_id'], sort=False)['daily_demand'].sum()
+        return self._nested_dict(totals, float)
+    
+    @staticmethod
+    def _nested_dict(totals: pd.Series, cast) -> Dict[str, Dict[str, Any]]:
+        """{level0: {str(level1): value}} from a two-level grouped Series"""
+        nested = {}
+        for location, group in totals.groupby(level=0, sort=False):
+            item_ids = group.index.get_level_values(1).astype(str)
+            nested[location] = dict(zip(item_ids, (cast(v) for v in group.to_numpy())))
+        return nested
+    
+    def _build_recommendation_lookups(self, inventory_distribution: pd.DataFrame, location_demand: pd.DataFrame) -> Dict[str, Dict]:
+        """Per-variant hash lookups so each recommendation avoids scanning the full frames"""
+        lookups = {'variant': {}, 'inventory': {}, 'demand': {}}
         
-        return demand_data
+        if not inventory_distribution.empty:
+            first_rows = inventory_distribution.drop_duplicates('variant_id')
+            lookups['variant'] = dict(zip(first_rows['variant_id'], first_rows.to_dict('records')))
+            inventory = inventory_distribution.groupby(['variant_id', 'location_name'], sort=False)['inventory_qty'].sum()
+            lookups['inventory'] = dict(zip(inventory.index, inventory.astype(int)))
+        
+        if not location_demand.empty:
+            demand = location_demand.groupby(['variant_id', 'Store Location'], sort=False)['daily_demand'].sum()
+            lookups['demand'] = dict(zip(demand.index, demand.astype(float)))
+        
+        return lookups
     
     def _create_transfer_recommendation_from_optimization(
         self, 
-        product_id: str,
+        variant_id: str,
         transfer_data: Dict,
-        inventory_distribution: pd.DataFrame,
-        location_demand: pd.DataFrame,
+        lookups: Dict[str, Dict],
         insights_lookup: Dict
     ) -> Optional[TransferRecommendation]:
-        """Create TransferRecommendation from optimization results"""
+        """Create TransferRecommendation for one variant from optimization results"""
         
         try:
-            # Get product information
-            product_id_int = int(product_id)
-            product_info = inventory_distribution[inventory_distribution['product_id'] == product_id_int]
+            # Get variant information
+            variant_id_int = int(variant_id)
+            product_row = lookups['variant'].get(variant_id_int)
             
-            if product_info.empty:
+            if product_row is None:
                 return None
-            
-            product_row = product_info.iloc[0]
+            product_id_int = int(product_row['product_id'])
             
             # Get location information
             from_location = transfer_data['from_location']
             to_location = transfer_data['to_location']
             
             # Get inventory levels
-            from_inventory_row = inventory_distribution[
-                (inventory_distribution['product_id'] == product_id_int) &
-                (inventory_distribution['location_name'] == from_location)
-            ]
-            to_inventory_row = inventory_distribution[
-                (inventory_distribution['product_id'] == product_id_int) &
-                (inventory_distribution['location_name'] == to_location)
-            ]
-            
-            from_inventory = int(from_inventory_row.iloc[0]['inventory_qty']) if not from_inventory_row.empty else 0
-            to_inventory = int(to_inventory_row.iloc[0]['inventory_qty']) if not to_inventory_row.empty else 0
+            from_inventory = int(lookups['inventory'].get((variant_id_int, from_location), 0))
+            to_inventory = int(lookups['inventory'].get((variant_id_int, to_location), 0))
             
             # Get demand information
-            from_demand_row = location_demand[
-                (location_demand['product_id'] == product_id_int) &
-                (location_demand['Store Location'] == from_location)
-            ]
-            to_demand_row = location_demand[
-                (location_demand['product_id'] == product_id_int) &
-                (location_demand['Store Location'] == to_location)
-            ]
-            
-            from_daily_demand = float(from_demand_row.iloc[0]['daily_demand']) if not from_demand_row.empty else 0.0
-            to_daily_demand = float(to_demand_row.iloc[0]['daily_demand']) if not to_demand_row.empty else 0.0
+            from_daily_demand = float(lookups['demand'].get((variant_id_int, from_location), 0.0))
+            to_daily_demand = float(lookups['demand'].get((variant_id_int, to_location), 0.0))
             
             # Calculate days of stock
             from_days_stock = int(from_inventory / max(from_daily_demand, 0.1))
@@ -403,8 +489,8 @@ class TransferAnalysisEngine:
                 urgency = 'LOW'
             
             # Get location IDs
-            from_location_id = next((k for k, v in self.location_config.items() if v == from_location), 0)
-            to_location_id = next((k for k, v in self.location_config.items() if v == to_location), 0)
+            from_location_id = self.location_name_to_id.get(from_location, 0)
+            to_location_id = self.location_name_to_id.get(to_location, 0)
             
             # Generate reasoning
             net_benefit = transfer_data.get('net_benefit', 0)
@@ -420,7 +506,7 @@ class TransferAnalysisEngine:
                 style_number=str(product_row.get('style_number', 'Unknown')),
                 description=str(product_row.get('description', 'No description')),
                 vendor=str(product_row.get('vendor', 'Unknown')),
-                variant_id=int(product_row.get('variant_id', 0)),
+                variant_id=variant_id_int,
                 variant_title=str(product_row.get('variant_title', 'Unknown')),
                 
                 from_location_id=from_location_id,
@@ -482,33 +568,32 @@ class TransferAnalysisEngine:
         if inventory_df.empty:
             return pd.DataFrame()
         
-        # Melt inventory data to get location-specific inventory
-        location_cols = [col for col in inventory_df.columns if col.startswith('inventory_')]
-        
-        inventory_melted = []
-        
-        for _, row in inventory_df.iterrows():
-            for col in location_cols:
-                location_name = col.replace('inventory_', '').title()
-                location_id = None
-                
-                # Map location name back to ID
-                for loc_id, loc_name in self.location_config.items():
-                    if loc_name.lower() == location_name.lower():
-                        location_id = int(loc_id)  # Ensure it's an integer
-                        break
-
-                if location_id:
-                    inventory_melted.append({
-                        'product_id': int(row['product_id']),
-                        'variant_id': int(row['variant_id']),
-                        'style_number': str(row['style_number']),
-                        'description': str(row['description']),
-                        'vendor': str(row['vendor']),
-                        'variant_title': str(row['variant_title']),
-                        'location_id': int(location_id),  # Ensure it's an integer
-                        'location_name': location_name.title(),
-                        'inventory_qty': int(row[col] or 0)
-                    })
-        
-        return pd.DataFrame(inventory_melted)
+        # Map inventory_<name> columns back to location ids once
+        name_to_id = {name.lower(): int(loc_id) for loc_id, name in self.location_config.items()}
+        location_cols = [
+            col for col in inventory_df.columns
+            if col.startswith('inventory_') and col.replace('inventory_', '').lower() in name_to_id
+        ]
+        id_cols = ['product_id', 'variant_id', 'style_number', 'description', 'vendor', 'variant_title']
+        if not location_cols:
+            return pd.DataFrame(columns=id_cols + ['location_id', 'location_name', 'inventory_qty'])
+        
+        melted = inventory_df[id_cols + location_cols].reset_index(drop=True)
+        n_rows = len(melted)
+        melted['_row'] = np.arange(n_rows)
+        melted = melted.melt(id_vars=id_cols + ['_row'], value_vars=location_cols,
+                             var_name='inventory_column', value_name='inventory_qty')
+        
+        # Row-major order (each variant, then each location) as before
+        melted = melted.sort_values('_row', kind='stable').reset_index(drop=True)
+        
+        location_names = pd.Series({col: col.replace('inventory_', '').title() for col in location_cols})
+        melted['location_name'] = melted['inventory_column'].map(location_names)
+        melted['location_id'] = melted['location_name'].str.lower().map(name_to_id).astype(int)
+        melted['inventory_qty'] = pd.to_numeric(melted['inventory_qty'], errors='coerce').fillna(0).astype(int)
+        melted['product_id'] = melted['product_id'].astype(int)
+        melted['variant_id'] = melted['variant_id'].astype(int)
+        for col in ['style_number', 'description', 'vendor', 'variant_title']:
+            melted[col] = melted[col].astype(str)
+        
+        return melted[id_cols + ['location_id', 'location_name', 'inventory_qty']]
@@ -0,0 +1,187 @@
+"""
+Batched Transfer LP Solver
+Min-cost transportation problem for inter-store transfers, with many products stacked
+into one block-diagonal sparse problem per chunk and solved with scipy's HiGHS backend.
+Products whose LP plan ships a lane below the minimum lot are re-solved as a MILP with
+semi-integer lanes (0 or at least the minimum).
+"""
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy import sparse
+from scipy.optimize import Bounds, LinearConstraint, linprog, milp
+
+logger = logging.getLogger(__name__)
+
+# Products per LP; keeps each sparse problem small enough to solve in milliseconds
+DEFAULT_CHUNK_SIZE = 500
+# Products per minimum-lot MILP; branch and bound grows much faster than linearly with size
+MIN_LOT_CHUNK_SIZE = 20
+
+
+def lane_cost_matrix(locations: Sequence[str], transfer_costs: Dict[Tuple[str, str], float],
+                     default_cost: float = 1.0) -> np.ndarray:
+    """Per-unit cost for each (from, to) lane as an L x L matrix"""
+    n = len(locations)
+    costs = np.zeros((n, n))
+    for i, from_loc in enumerate(locations):
+        for j, to_loc in enumerate(locations):
+            if i != j:
+                costs[i, j] = transfer_costs.get((from_loc, to_loc), default_cost)
+    return costs
+
+
+def solve_transfer_lp(
+    inventory: np.ndarray,
+    targets: np.ndarray,
+    lane_costs: np.ndarray,
+    unit_benefit: float,
+    min_transfer: int = 2,
+    source_floor: Optional[np.ndarray] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> np.ndarray:
+    """
+    Optimal integer transfer quantities for many products at once
+
+    Args:
+        inventory: products x locations current stock
+        targets: products x locations target stock
+        lane_costs: locations x locations per-unit transfer cost (holding cost included)
+        unit_benefit: value of moving one unit into a shortage (avoided stockout)
+        min_transfer: smallest lot a lane may carry; enforced in the solve, so units a short lane
+            would have moved go over other lanes when that is cheaper than leaving them
+        source_floor: stock a source must keep (defaults to its target, i.e. its safety stock)
+
+    Returns:
+        products x locations x locations array of units to move from i to j
+    """
+    inventory = np.asarray(inventory, dtype=np.float64)
+    targets = np.asarray(targets, dtype=np.float64)
+    n_products, n_locations = inventory.shape
+    flows = np.zeros((n_products, n_locations, n_locations), dtype=np.int64)
+    if n_products == 0 or n_locations < 2:
+        return flows
+
+    floor = targets if source_floor is None else np.maximum(targets, source_floor)
+    # Integer supplies and needs keep the transportation LP's vertex solutions integral
+    supply = np.floor(np.maximum(0.0, inventory - floor))
+    need = np.ceil(np.maximum(0.0, targets - inventory) - 1e-9)
+
+    # Only lanes where moving a unit is worth more than it costs
+    lane_from, lane_to = np.nonzero(~np.eye(n_locations, dtype=bool) & (lane_costs < unit_benefit))
+    if len(lane_from) == 0:
+        return flows
+
+    # Products that could move at least min_transfer units along some lane
+    lane_capacity = np.minimum(supply[:, lane_from], need[:, lane_to])
+    active = np.nonzero((lane_capacity >= min_transfer).any(axis=1))[0]
+
+    lane_objective = lane_costs[lane_from, lane_to] - unit_benefit
+    for start in range(0, len(active), max(1, chunk_size)):
+        chunk = active[start:start + chunk_size]
+        chunk_flows = _solve_chunk(supply[chunk], need[chunk], lane_from, lane_to, lane_objective)
+        if chunk_flows is None:
+            chunk_flows = _greedy_chunk(supply[chunk], need[chunk], lane_from, lane_to, lane_objective, min_transfer)
+        elif min_transfer > 1:
+            # The LP optimum is also optimal with lot sizes wherever no lane falls short of them
+            short = np.nonzero(((chunk_flows > 0) & (chunk_flows < min_transfer)).any(axis=1))[0]
+            for lot_start in range(0, len(short), MIN_LOT_CHUNK_SIZE):
+                rows = short[lot_start:lot_start + MIN_LOT_CHUNK_SIZE]
+                lot_flows = _solve_chunk(supply[chunk[rows]], need[chunk[rows]], lane_from, lane_to,
+                                         lane_objective, min_transfer)
+                if lot_flows is None:
+                    lot_flows = _greedy_chunk(supply[chunk[rows]], need[chunk[rows]], lane_from, lane_to,
+                                              lane_objective, min_transfer)
+                chunk_flows[rows] = lot_flows
+        flows[chunk[:, None], lane_from[None, :], lane_to[None, :]] = chunk_flows
+
+    return flows
+
+
+def _solve_chunk(supply: np.ndarray, need: np.ndarray, lane_from: np.ndarray,
+                 lane_to: np.ndarray, lane_objective: np.ndarray, min_transfer: int = 1) -> Optional[np.ndarray]:
+    """Block-diagonal LP (MILP with a minimum lot) for a chunk of products; returns products x lanes flows"""
+    n_products, n_locations = supply.shape
+    n_lanes = len(lane_from)
+    n_vars = n_products * n_lanes
+
+    var_index = np.arange(n_vars)
+    product_of_var = var_index // n_lanes
+    lane_of_var = var_index % n_lanes
+
+    # Row blocks: [supply rows (product, from)] then [need rows (product, to)]
+    supply_rows = product_of_var * n_locations + lane_from[lane_of_var]
+    need_rows = n_products * n_locations + product_of_var * n_locations + lane_to[lane_of_var]
+    rows = np.concatenate([supply_rows, need_rows])
+    cols = np.concatenate([var_index, var_index])
+    A_ub = sparse.csr_matrix((np.ones(2 * n_vars), (rows, cols)), shape=(2 * n_products * n_locations, n_vars))
+    b_ub = np.concatenate([supply.ravel(), need.ravel()])
+    c = np.tile(lane_objective, n_products)
+
+    try:
+        if min_transfer > 1:
+            # Semi-integer lanes: 0 or min_transfer..capacity; lanes below the minimum stay at 0
+            capacity = np.minimum(supply[product_of_var, lane_from[lane_of_var]],
+                                  need[product_of_var, lane_to[lane_of_var]])
+            capacity[capacity < min_transfer] = 0
+            result = milp(c, constraints=LinearConstraint(A_ub, -np.inf, b_ub),
+                          integrality=np.where(capacity > 0, 3, 0),
+                          bounds=Bounds(np.minimum(capacity, min_transfer), capacity))
+        else:
+            result = linprog(c, A_ub=A_ub, b_ub=b_ub, bounds=(0, None), method='highs-ds')
+    except Exception as e:
+        logger.warning(f"Transfer LP failed, falling back to greedy allocation: {e}")
+        return None
+    if result.status != 0:
+        logger.warning(f"Transfer LP did not solve ({result.message}), falling back to greedy allocation")
+        return None
+
+    return np.rint(result.x).astype(np.int64).reshape(n_products, n_lanes)
+
+
+def _greedy_chunk(supply: np.ndarray, need: np.ndarray, lane_from: np.ndarray,
+                  lane_to: np.ndarray, lane_objective: np.ndarray, min_transfer: int = 1) -> np.ndarray:
+    """Cheapest-lane-first allocation, used when the LP cannot be solved"""
+    supply = supply.copy()
+    need = need.copy()
+    flows = np.zeros((supply.shape[0], len(lane_from)), dtype=np.int64)
+    for lane in np.argsort(lane_objective, kind='stable'):
+        qty = np.minimum(supply[:, lane_from[lane]], need[:, lane_to[lane]])
+        qty[qty < min_transfer] = 0
+        flows[:, lane] = qty
+        supply[:, lane_from[lane]] -= qty
+        need[:, lane_to[lane]] -= qty
+    return flows
+
+
+def transfer_plan_cost(
+    inventory: np.ndarray,
+    targets: np.ndarray,
+    flows: np.ndarray,
+    lane_costs: np.ndarray,
+    stockout_cost: float
+) -> Dict[str, float]:
+    """Total cost of a transfer plan: lane costs plus the stockout cost of any remaining shortfall"""
+    inventory = np.asarray(inventory, dtype=np.float64)
+    moved_out = flows.sum(axis=2)
+    moved_in = flows.sum(axis=1)
+    after = inventory - moved_out + moved_in
+    shortfall = np.maximum(0.0, np.ceil(np.asarray(targets) - 1e-9) - after).sum()
+    transfer_cost = float((flows * lane_costs[None, :, :]).sum())
+    return {
+        'transfer_cost': transfer_cost,
+        'shortfall_units': float(shortfall),
+        'stockout_cost': float(shortfall * stockout_cost),
+        'total_cost': transfer_cost + float(shortfall * stockout_cost),
+        'units_moved': int(flows.sum())
+    }
+
+
+def flows_to_transfers(flows: np.ndarray, locations: Sequence[str]) -> List[List[Tuple[str, str, int]]]:
+    """Per-product list of (from_location, to_location, quantity) for non-zero lanes"""
+    result = [[] for _ in range(flows.shape[0])]
+    products, from_idx, to_idx = np.nonzero(flows)
+    for p, i, j in zip(products.tolist(), from_idx.tolist(), to_idx.tolist()):
+        result[p].append((locations[i], locations[j], int(flows[p, i, j])))
+    return result
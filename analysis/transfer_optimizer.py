@@ -2,12 +2,14 @@ import streamlit as st
 import numpy as np
 from scipy.optimize import linprog
 from typing import Dict, List, Tuple
+from analysis.transfer_lp import lane_cost_matrix, solve_transfer_lp
 
 class TransferOptimizer:
     def __init__(self, transfer_costs: Dict[Tuple[str, str], float] = None):
         self.transfer_costs = transfer_costs or self._default_transfer_costs()
         self.holding_cost_per_unit = 0.1  # Daily holding cost
         self.stockout_cost_per_unit = 5.0  # Lost sale cost
+        self.min_transfer_qty = 1  # Smallest transfer worth making
     
     def _default_transfer_costs(self):
         """Default transfer costs based on distance"""
@@ -33,39 +35,30 @@ class TransferOptimizer:
         locations = list(inventory_data.keys())
         products = list(inventory_data[locations[0]].keys())
         
-        results = {}
+        # Current inventory and daily demand as products x locations matrices
+        current_inv = np.array([[inventory_data[loc].get(product, 0) for loc in locations] for product in products],
+                               dtype=np.float64).reshape(len(products), len(locations))
+        daily_demand = np.array([[demand_data.get(loc, {}).get(product, 0) for loc in locations] for product in products],
+                                dtype=np.float64).reshape(len(products), len(locations))
         
-        for product in products:
-            # Current inventory by location
-            current_inv = [inventory_data[loc].get(product, 0) for loc in locations]
-            # Daily demand by location  
-            daily_demand = [demand_data[loc].get(product, 0) for loc in locations]
-            
-            # Calculate optimal allocation
-            total_inventory = sum(current_inv)
-            total_demand = sum(daily_demand)
-            
-            if total_demand > 0:
-                # Optimal allocation proportional to demand
-                optimal_allocation = [(d / total_demand) * total_inventory for d in daily_demand]
-                
-                # Transfer recommendations
-                transfers = {}
-                for i, from_loc in enumerate(locations):
-                    for j, to_loc in enumerate(locations):
-                        if i != j:
-                            excess_at_i = current_inv[i] - optimal_allocation[i]
-                            shortage_at_j = optimal_allocation[j] - current_inv[j]
-                            
-                            if excess_at_i > 1 and shortage_at_j > 1:
-                                transfer_qty = min(excess_at_i, shortage_at_j, excess_at_i * 0.5)
-                                if transfer_qty >= 1:
-                                    transfers[(from_loc, to_loc)] = {
-                                        'quantity': int(transfer_qty),
-                                        'cost': transfer_qty * self.transfer_costs.get((from_loc, to_loc), 0),
-                                        'benefit': transfer_qty * self.stockout_cost_per_unit
-                                    }
-                
-                results[product] = transfers
+        # Optimal allocation proportional to demand
+        total_demand = daily_demand.sum(axis=1, keepdims=True)
+        has_demand = total_demand[:, 0] > 0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            optimal_allocation = np.where(total_demand > 0, daily_demand / total_demand, 0) * current_inv.sum(axis=1, keepdims=True)
+        
+        # One batched min-cost LP over all products
+        lane_costs = lane_cost_matrix(locations, self.transfer_costs, default_cost=0.0)
+        flows = solve_transfer_lp(current_inv, optimal_allocation, lane_costs, self.stockout_cost_per_unit,
+                                  min_transfer=self.min_transfer_qty)
+        
+        results = {product: {} for product, active in zip(products, has_demand) if active}
+        for p, i, j in zip(*np.nonzero(flows)):
+            transfer_qty = int(flows[p, i, j])
+            results[products[p]][(locations[i], locations[j])] = {
+                'quantity': transfer_qty,
+                'cost': float(transfer_qty * lane_costs[i, j]),
+                'benefit': transfer_qty * self.stockout_cost_per_unit
+            }
         
         return results
@@ -1,247 +1,221 @@
 """Variant demand analysis engine"""
 import pandas as pd
-import streamlit as st
 from datetime import datetime, timedelta
 from typing import Dict, List, Tuple, Any, Optional
 import numpy as np
 from models.data_models import ProductInsight, VariantDemand
+from models.insight_table import InsightTable
+from utils import progress
+
+# Columns a recent order line needs to count towards variant demand
+VARIANT_KEY_COLUMNS = ['product_id', 'variant_id', 'Store Location',
+                       'Style Number', 'Description', 'vendor', 'variant_title']
 
 class VariantDemandAnalyzer:
     """Analyzes demand patterns at the variant and store level"""
-    
+
+    # Days of supply each store is stocked up to
+    TARGET_DAYS = 30
+
     def __init__(self, location_config: Dict[int, str]):
         self.location_config = location_config
         self.location_name_to_id = {v: k for k, v in location_config.items()}
-    
+
     def analyze_variant_demand(
-        self, 
-        orders_df: pd.DataFrame, 
+        self,
+        orders_df: pd.DataFrame,
         inventory_df: pd.DataFrame,
         insights: List[ProductInsight],
         analysis_days: int = 30
     ) -> List[VariantDemand]:
-        """Analyze demand patterns for all variants with store-level distribution"""
-        
+        """
+        Analyze demand patterns for all variants with store-level distribution
+
+        Demand is pivoted once into a variant x store matrix and aligned with an
+        inventory matrix of the same shape, so recommendations and priority scores
+        are computed for every variant at once.
+        """
+
         if orders_df.empty or inventory_df.empty:
             return []
-        
-        st.info("🔍 Analyzing variant-level demand patterns...")
-        
-        # Create insights lookup
-        insights_lookup = {insight.product_id: insight for insight in insights}
-        
+
+        progress.info("🔍 Analyzing variant-level demand patterns...")
+
         # Filter to recent orders for demand calculation
         recent_cutoff = orders_df['created_at'].max() - pd.Timedelta(days=analysis_days)
         recent_orders = orders_df[orders_df['created_at'] >= recent_cutoff]
-        
+
         # Group by variant and store to calculate demand
         if recent_orders.empty:
-            st.warning("No recent orders found for variant analysis")
+            progress.warning("No recent orders found for variant analysis")
+            return []
+
+        recent_orders = recent_orders.dropna(subset=VARIANT_KEY_COLUMNS)
+        if recent_orders.empty:
             return []
-        
-        # Calculate demand by variant and store
-        variant_store_demand = recent_orders.groupby([
-            'product_id', 'variant_id', 'Store Location', 
-            'Style Number', 'Description', 'vendor', 'variant_title'
-        ]).agg({
-            'quantity': 'sum'
-        }).reset_index()
-        
-        # Calculate daily demand
-        variant_store_demand['daily_demand'] = variant_store_demand['quantity'] / analysis_days
-        
-        # Get unique variants
-        unique_variants = variant_store_demand[[
+
+        stores = list(self.location_config.values())
+
+        # One pivot: (product_id, variant_id) x store daily demand
+        demand_pivot = recent_orders.pivot_table(
+            index=['product_id', 'variant_id'], columns='Store Location',
+            values='quantity', aggfunc='sum', fill_value=0
+        ).reindex(columns=stores, fill_value=0) / analysis_days
+
+        # Variants as reported by their order lines (one entry per distinct metadata combination)
+        variants = recent_orders[[
             'product_id', 'variant_id', 'Style Number', 'Description', 'vendor', 'variant_title'
-        ]].drop_duplicates()
-        
-        variant_demands = []
-        
-        for _, variant_row in unique_variants.iterrows():
-            product_id = variant_row['product_id']
-            variant_id = variant_row['variant_id']
-            
-            # Get demand for this variant across all stores
-            variant_demand_data = variant_store_demand[
-                (variant_store_demand['product_id'] == product_id) &
-                (variant_store_demand['variant_id'] == variant_id)
-            ]
-            
-            # Get inventory for this variant
-            variant_inventory = inventory_df[
-                (inventory_df['product_id'] == product_id) &
-                (inventory_df['variant_id'] == variant_id)
-            ]
-            
-            if variant_inventory.empty:
-                continue
-            
-            variant_info = variant_inventory.iloc[0]
-            
-            # Parse color and size from variant title
-            variant_title = str(variant_info.get('variant_title', ''))
-            if ' / ' in variant_title:
-                color, size = variant_title.split(' / ', 1)
-            else:
-                color, size = variant_title, ''
-            
-            # Build store demand and inventory dictionaries
-            store_demand = {}
-            store_inventory = {}
-            total_current_inventory = 0
-            total_daily_demand = 0
-            
-            for store_name in self.location_config.values():
-                # Get demand for this store
-                store_demand_row = variant_demand_data[
-                    variant_demand_data['Store Location'] == store_name
-                ]
-                daily_demand = store_demand_row['daily_demand'].sum() if not store_demand_row.empty else 0
-                store_demand[store_name] = daily_demand
-                total_daily_demand += daily_demand
-                
-                # Get inventory for this store
-                inventory_column = f'inventory_{store_name.lower()}'
-                inventory_qty = variant_info.get(inventory_column, 0) or 0
-                store_inventory[store_name] = int(inventory_qty)
-                total_current_inventory += int(inventory_qty)
-            
-            # Calculate store-specific recommendations
-            store_recommended = self._calculate_store_recommendations(
-                store_demand, store_inventory, product_id, insights_lookup
-            )
-            
-            total_recommended = sum(store_recommended.values())
-            
-            # Calculate priority score
-            product_insight = insights_lookup.get(product_id)
-            priority_score = self._calculate_variant_priority(
-                product_insight, total_daily_demand, total_current_inventory
-            )
-            
-            # Create VariantDemand object
-            variant_demand = VariantDemand(
-                product_id=int(product_id),
-                variant_id=int(variant_id),
-                style_number=str(variant_row['Style Number']),
-                description=str(variant_row['Description']),
-                vendor=str(variant_row['vendor']),
-                variant_title=variant_title,
-                color=color,
-                size=size,
-                store_demand=store_demand,
-                store_inventory=store_inventory,
-                store_recommended=store_recommended,
-                total_recommended=total_recommended,
-                total_current_inventory=total_current_inventory,
-                total_daily_demand=total_daily_demand,
-                priority_score=priority_score
+        ]].drop_duplicates().sort_values(['product_id', 'variant_id'], kind='stable').reset_index(drop=True)
+
+        # First inventory row per variant, aligned to the variant list
+        inventory_first = inventory_df.drop_duplicates(['product_id', 'variant_id'], keep='first')
+        inventory_first = inventory_first.set_index(['product_id', 'variant_id'])
+        variant_keys = pd.MultiIndex.from_frame(variants[['product_id', 'variant_id']])
+        has_inventory = variant_keys.isin(inventory_first.index)
+        if not has_inventory.any():
+            progress.success("✅ Analyzed 0 variants")
+            return []
+
+        variants = variants[has_inventory].reset_index(drop=True)
+        variant_keys = variant_keys[has_inventory]
+        inventory_rows = inventory_first.reindex(variant_keys)
+
+        inventory_columns = [f'inventory_{store_name.lower()}' for store_name in stores]
+        inventory_matrix = (
+            inventory_rows.reindex(columns=inventory_columns)
+            .apply(pd.to_numeric, errors='coerce').fillna(0).to_numpy().astype(np.int64)
+        )
+        demand_matrix = demand_pivot.reindex(variant_keys).fillna(0).to_numpy(dtype=np.float64)
+
+        # Product-level inputs from insights
+        trend_multiplier, priority_points = self._insight_adjustments(insights, variants['product_id'].to_numpy())
+
+        recommended_matrix = self._store_recommendation_matrix(demand_matrix, inventory_matrix, trend_multiplier)
+        total_daily_demand = demand_matrix.sum(axis=1)
+        total_inventory = inventory_matrix.sum(axis=1)
+        total_recommended = recommended_matrix.sum(axis=1)
+        priority_scores = self._variant_priority_scores(total_daily_demand, total_inventory, priority_points)
+
+        # Parse color and size from the inventory variant title
+        variant_titles = inventory_rows['variant_title'].fillna('').astype(str) if 'variant_title' in inventory_rows.columns \
+            else pd.Series('', index=inventory_rows.index)
+        split_titles = variant_titles.str.split(' / ', n=1, expand=True).reindex(columns=[0, 1])
+        colors = split_titles[0].fillna('').tolist()
+        sizes = split_titles[1].fillna('').tolist()
+
+        # Highest priority first, then highest demand
+        order = np.lexsort((-total_daily_demand, -priority_scores))
+
+        demand_rows = demand_matrix.tolist()
+        inventory_values = inventory_matrix.tolist()
+        recommended_rows = recommended_matrix.tolist()
+        product_ids = variants['product_id'].to_numpy()
+        variant_ids = variants['variant_id'].to_numpy()
+        style_numbers = variants['Style Number'].astype(str).tolist()
+        descriptions = variants['Description'].astype(str).tolist()
+        vendors = variants['vendor'].astype(str).tolist()
+        titles = variant_titles.tolist()
+
+        variant_demands = [
+            VariantDemand(
+                product_id=int(product_ids[i]),
+                variant_id=int(variant_ids[i]),
+                style_number=style_numbers[i],
+                description=descriptions[i],
+                vendor=vendors[i],
+                variant_title=titles[i],
+                color=colors[i],
+                size=sizes[i],
+                store_demand=dict(zip(stores, demand_rows[i])),
+                store_inventory=dict(zip(stores, inventory_values[i])),
+                store_recommended=dict(zip(stores, recommended_rows[i])),
+                total_recommended=int(total_recommended[i]),
+                total_current_inventory=int(total_inventory[i]),
+                total_daily_demand=float(total_daily_demand[i]),
+                priority_score=int(priority_scores[i])
             )
-            
-            variant_demands.append(variant_demand)
-        
-        # Sort by priority score and total demand
-        variant_demands.sort(key=lambda x: (x.priority_score, x.total_daily_demand), reverse=True)
-        
-        st.success(f"✅ Analyzed {len(variant_demands)} variants")
+            for i in order
+        ]
+
+        progress.success(f"✅ Analyzed {len(variant_demands)} variants")
         return variant_demands
-    
-    def _calculate_store_recommendations(
-        self, 
-        store_demand: Dict[str, float], 
-        store_inventory: Dict[str, int],
-        product_id: int,
-        insights_lookup: Dict[int, ProductInsight]
-    ) -> Dict[str, int]:
-        """Calculate recommended quantities for each store"""
-        
-        # Get product insight for overall recommendation logic
-        product_insight = insights_lookup.get(product_id)
-        
-        # Base calculation: 30 days supply per store
-        target_days = 30
-        store_recommended = {}
-        total_demand = sum(store_demand.values())
-        
-        if total_demand == 0:
-            # No demand - minimal orders
-            for store_name in store_demand.keys():
-                store_recommended[store_name] = 0
-            return store_recommended
-        
-        # Calculate base recommendations
-        for store_name, daily_demand in store_demand.items():
-            current_inventory = store_inventory[store_name]
-            
-            if daily_demand > 0:
-                # Calculate needed inventory
-                target_inventory = daily_demand * target_days
-                needed = max(0, target_inventory - current_inventory)
-                
-                # Apply trend adjustments from product insight
-                if product_insight:
-                    if product_insight.trend_classification in ['Trending Up', 'Hot Seller']:
-                        needed *= 1.2  # 20% more for trending products
-                    elif 'Declining' in product_insight.trend_classification:
-                        needed *= 0.7  # 30% less for declining products
-                
-                # Minimum order logic
-                if needed > 0 and needed < 1:
-                    needed = 1  # Minimum 1 unit if any demand
-                elif needed > 0 and needed < 2 and daily_demand > 0.1:
-                    needed = 2  # Minimum 2 units for meaningful demand
-                
-                store_recommended[store_name] = int(needed)
-            else:
-                # No demand at this store
-                store_recommended[store_name] = 0
-        
-        return store_recommended
-    
-    def _calculate_variant_priority(
-        self, 
-        product_insight: Optional[ProductInsight], 
-        total_daily_demand: float,
-        total_current_inventory: int
-    ) -> int:
-        """Calculate priority score for variant (0-100)"""
-        
-        score = 0
-        
+
+    def _insight_adjustments(self, insights, product_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Per-variant trend multiplier and insight-based priority points for each product id"""
+
+        trend_multiplier = np.ones(len(product_ids))
+        priority_points = np.zeros(len(product_ids), dtype=np.int64)
+
+        table = InsightTable.coerce(insights)
+        if not len(table):
+            return trend_multiplier, priority_points
+
+        # Last insight wins for duplicated product ids
+        insight_ids = table.column('product_id')
+        _, last_positions = np.unique(insight_ids[::-1], return_index=True)
+        last_positions = len(insight_ids) - 1 - last_positions
+        lookup = pd.Series(last_positions, index=insight_ids[last_positions])
+        positions = lookup.reindex(product_ids).to_numpy()
+        matched = ~np.isnan(positions)
+        if not matched.any():
+            return trend_multiplier, priority_points
+        positions = positions[matched].astype(np.int64)
+
+        trends = table.column('trend_classification')[positions].astype(str)
+        priorities = table.column('reorder_priority')[positions]
+
+        trending = np.isin(trends, ['Trending Up', 'Hot Seller'])
+        declining = np.char.find(trends, 'Declining') >= 0
+        multiplier = np.where(trending, 1.2, np.where(declining, 0.7, 1.0))
+        trend_multiplier[matched] = multiplier
+
+        points = np.select(
+            [priorities == 'CRITICAL', priorities == 'HIGH', priorities == 'MEDIUM'], [30, 20, 10], 0
+        )
+        points += np.where(trending, 15, np.where(trends == 'New Strong Seller', 10, 0))
+        priority_points[matched] = points
+
+        return trend_multiplier, priority_points
+
+    def _store_recommendation_matrix(
+        self,
+        demand: np.ndarray,
+        inventory: np.ndarray,
+        trend_multiplier: np.ndarray
+    ) -> np.ndarray:
+        """Recommended quantities for every variant x store: 30 days supply less stock on hand"""
+
+        needed = np.maximum(0, demand * self.TARGET_DAYS - inventory) * trend_multiplier[:, None]
+
+        # Minimum order logic
+        needed = np.select(
+            [(needed > 0) & (needed < 1), (needed >= 1) & (needed < 2) & (demand > 0.1)], [1, 2], needed
+        )
+
+        # No demand at a store (or for the whole variant) means no order
+        needed = np.where(demand > 0, needed, 0)
+        return needed.astype(np.int64)
+
+    def _variant_priority_scores(
+        self,
+        total_daily_demand: np.ndarray,
+        total_current_inventory: np.ndarray,
+        priority_points: np.ndarray
+    ) -> np.ndarray:
+        """Priority score for each variant (0-100)"""
+
         # Base score from daily demand
-        if total_daily_demand >= 1.0:
-            score += 40
-        elif total_daily_demand >= 0.5:
-            score += 30
-        elif total_daily_demand >= 0.2:
-            score += 20
-        elif total_daily_demand > 0:
-            score += 10
-        
+        score = np.select(
+            [total_daily_demand >= 1.0, total_daily_demand >= 0.5, total_daily_demand >= 0.2, total_daily_demand > 0],
+            [40, 30, 20, 10], 0
+        )
+
         # Score from product insight
-        if product_insight:
-            if product_insight.reorder_priority == 'CRITICAL':
-                score += 30
-            elif product_insight.reorder_priority == 'HIGH':
-                score += 20
-            elif product_insight.reorder_priority == 'MEDIUM':
-                score += 10
-            
-            # Trend bonus
-            if product_insight.trend_classification in ['Trending Up', 'Hot Seller']:
-                score += 15
-            elif product_insight.trend_classification in ['New Strong Seller']:
-                score += 10
-        
+        score = score + priority_points
+
         # Inventory urgency
-        if total_daily_demand > 0:
-            days_of_stock = total_current_inventory / total_daily_demand
-            if days_of_stock <= 14:
-                score += 15
-            elif days_of_stock <= 30:
-                score += 10
-            elif days_of_stock <= 60:
-                score += 5
-        
-        return min(score, 100)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            days_of_stock = np.where(total_daily_demand > 0, total_current_inventory / total_daily_demand, np.inf)
+        score = score + np.select([days_of_stock <= 14, days_of_stock <= 30, days_of_stock <= 60], [15, 10, 5], 0)
 
+        return np.minimum(score, 100).astype(np.int64)
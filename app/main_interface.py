@@ -28,9 +28,14 @@ logger = logging.getLogger(__name__)
 from database.database_manager import DatabaseManager
 from auth.auth_manager import AuthenticationManager
 from models.data_models import UserProfile
+from models.insight_table import InsightTable
 from shopify.client import AdvancedShopifyClient
-from analysis.business_intelligence import EnhancedBusinessIntelligenceEngine
-from utils.data_processing import process_orders_fast, create_inventory_dataframe_fast, get_demo_profile
+from analysis.engine import AnalysisEngine, AnalysisError, AnalysisOptions, load_result, save_result
+from utils.data_processing import get_demo_profile
+from utils.jobs import DONE, QUEUED, Job, get_job_scheduler
+from utils.shared_data import DataHandle, get_shared_data_cache
+from utils.stage_cache import content_hash, get_stage_cache
+from utils import tracing
 
 # Optional imports with error handling
 try:
@@ -109,41 +114,70 @@ def safe_error_handler(func):
             return None
     return wrapper
 
-@safe_error_handler
-def integrate_pending_orders_if_enabled(inventory_df, user_profile, location_config):
-    """Integrate pending orders into inventory if enabled"""
+def pending_orders_for_analysis():
+    """Uploaded pending orders to include in the next analysis (None when none are uploaded)"""
     
-    # Check if pending orders are uploaded
-    pending_uploaded = st.session_state.get('pending_orders_uploaded', False)
+    if not st.session_state.get('pending_orders_uploaded', False):
+        return None
     
-    if not pending_uploaded:
-        return inventory_df
+    pending_orders = st.session_state.get('pending_orders', [])
+    if not isinstance(pending_orders, list) or not pending_orders:
+        return None
     
-    # Check if re-analysis is triggered
-    trigger_reanalysis = st.session_state.get('trigger_reanalysis_with_pending', False)
+    # Set flag to show pending orders are active and clear the trigger for next time
+    st.session_state['analysis_includes_pending'] = True
+    st.session_state['trigger_reanalysis_with_pending'] = False
+    return pending_orders
+
+def show_profile_overrides_editor(profile: Optional[UserProfile]) -> dict:
+    """Editors for the profile's service-level and forecast-model overrides; returns the edited mappings"""
+    from analysis.forecast_models import available_models
     
-    try:
-        pending_manager = PendingOrderManager(user_profile, location_config)
-        pending_orders = pending_manager.load_pending_orders()
-        
-        if pending_orders:
-            st.info(f"📦 Including {len(pending_orders)} pending order items in analysis...")
-            
-            # Use the inventory integration method
-            updated_inventory_df = pending_manager.debug_inventory_integration(inventory_df, pending_orders)
-            
-            # Set flag to show pending orders are active
-            st.session_state['analysis_includes_pending'] = True
-            
-            # Clear the trigger for next time
-            st.session_state['trigger_reanalysis_with_pending'] = False
-            
-            return updated_inventory_df
-                        
-    except Exception as e:
-        st.error(f"❌ Error integrating pending orders: {e}")
+    vendor_levels = dict(getattr(profile, 'vendor_service_levels', None) or {})
+    cluster_levels = dict(getattr(profile, 'cluster_service_levels', None) or {})
+    cluster_models = dict(getattr(profile, 'cluster_forecast_models', None) or {})
     
-    return inventory_df
+    with st.expander("🎯 Service Levels & Cluster Forecasting (optional)", expanded=False):
+        st.caption("Service levels are target in-stock probabilities (e.g. 0.95). Demand clusters are numbered 0-4; "
+                   "clustering only runs when a cluster override is set.")
+        vendor_df = st.data_editor(
+            pd.DataFrame({'Vendor': list(vendor_levels.keys()), 'Service Level': list(vendor_levels.values())},
+                         columns=['Vendor', 'Service Level']).astype({'Vendor': str, 'Service Level': float}),
+            num_rows="dynamic", key="vendor_service_levels_editor", use_container_width=True,
+            column_config={'Service Level': st.column_config.NumberColumn(min_value=0.5, max_value=0.999, step=0.005, format="%.3f")}
+        )
+        clusters = sorted(set(cluster_levels) | set(cluster_models))
+        cluster_df = st.data_editor(
+            pd.DataFrame({
+                'Cluster': clusters,
+                'Service Level': [cluster_levels.get(c) for c in clusters],
+                'Forecast Model': [cluster_models.get(c) for c in clusters],
+            }, columns=['Cluster', 'Service Level', 'Forecast Model']).astype({'Cluster': 'Int64', 'Service Level': float, 'Forecast Model': object}),
+            num_rows="dynamic", key="cluster_overrides_editor", use_container_width=True,
+            column_config={
+                'Cluster': st.column_config.NumberColumn(min_value=0, max_value=4, step=1),
+                'Service Level': st.column_config.NumberColumn(min_value=0.5, max_value=0.999, step=0.005, format="%.3f"),
+                'Forecast Model': st.column_config.SelectboxColumn(options=available_models()),
+            }
+        )
+    
+    overrides = {
+        'vendor_service_levels': {
+            str(row['Vendor']).strip(): float(row['Service Level'])
+            for _, row in vendor_df.iterrows()
+            if pd.notna(row['Vendor']) and str(row['Vendor']).strip() and pd.notna(row['Service Level'])
+        },
+        'cluster_service_levels': {},
+        'cluster_forecast_models': {},
+    }
+    for _, row in cluster_df.iterrows():
+        if pd.isna(row['Cluster']):
+            continue
+        if pd.notna(row['Service Level']):
+            overrides['cluster_service_levels'][int(row['Cluster'])] = float(row['Service Level'])
+        if isinstance(row['Forecast Model'], str) and row['Forecast Model']:
+            overrides['cluster_forecast_models'][int(row['Cluster'])] = row['Forecast Model']
+    return overrides
 
 def show_profile_management_tab(db_manager: DatabaseManager, user_id: str):
     """Profile management with comprehensive error handling"""
@@ -212,6 +246,9 @@ def show_profile_management_tab(db_manager: DatabaseManager, user_id: str):
             else:
                 sharpstock_info_box("Standard Hawaii locations will be configured after saving", "info")
         
+        # NEW: Optional service-level targets per vendor / demand cluster and forecast model per cluster
+        overrides = show_profile_overrides_editor(profile)
+        
         # Save button with error handling
         if st.button("💾 Save Store Configuration", type="primary", use_container_width=True):
             if shop_name and api_token:
@@ -246,7 +283,8 @@ def show_profile_management_tab(db_manager: DatabaseManager, user_id: str):
                         location_config=location_config,
                         default_lead_time=default_lead_time,
                         created_at=profile.created_at if profile else datetime.now(),
-                        last_cache_update=profile.last_cache_update if profile else None
+                        last_cache_update=profile.last_cache_update if profile else None,
+                        **overrides
                     )
                     
                     if db_manager.save_user_profile(new_profile):
@@ -415,6 +453,25 @@ def show_analysis_interface(db_manager: DatabaseManager, user_id: str, profile:
             st.error(f"❌ Credential setup error: {e}")
             return
         
+        # NEW: Open on the shop's latest analysis - shared with other sessions of this shop, else the
+        # persisted one (batch_runner.py or an earlier run); the button below refreshes it
+        if not st.session_state.get('data_fetched', False) and not st.session_state.get('demo_mode', False):
+            shared_cache = get_shared_data_cache()
+            handle = shared_cache.acquire(shop_name)
+            if handle is None:
+                precomputed = load_result(user_id)
+                if precomputed is not None:
+                    handle = shared_cache.put(shop_name, f"saved:{precomputed.completed_at.isoformat()}",
+                                              precomputed, size=precomputed.memory_size())
+            if handle is not None:
+                hold_shared_result(handle, profile)
+                st.session_state['precomputed_at'] = handle.value.completed_at
+        if st.session_state.get('precomputed_at'):
+            sharpstock_info_box(
+                f"🕒 Showing analysis precomputed {st.session_state['precomputed_at']:%Y-%m-%d %H:%M} - run the analysis to refresh now",
+                "info"
+            )
+        
         # Enhanced analysis configuration in sidebar
         with st.sidebar:
             try:
@@ -491,212 +548,182 @@ def show_analysis_interface(db_manager: DatabaseManager, user_id: str, profile:
                 sharpstock_info_box("❌ Please select at least one store location", "error")
                 return
             
-            # Professional loading screen with error handling
-            with st.spinner("⚡ Analyzing your data with AI..."):
-                start_time = time.time()
+            # Step 1: Initialize client with error handling
+            try:
+                client = AdvancedShopifyClient(shop_name, api_version, access_token, location_ids)
+            except Exception as e:
+                st.error(f"❌ Failed to initialize Shopify client: {e}")
+                return
+            
+            # Step 2: Load brand lead times safely
+            brand_lead_times = {}
+            try:
+                if not st.session_state.get('demo_mode', False):
+                    brand_lead_times = db_manager.get_brand_lead_times(user_id)
+            except Exception as e:
+                pass  # Continue with empty brand lead times
+            st.session_state['brand_lead_times'] = brand_lead_times  # NEW: Used by the network planner
+            
+            options = AnalysisOptions(
+                recent_start=datetime.combine(start_date, datetime.min.time()),
+                recent_end=datetime.combine(end_date, datetime.max.time()),
+                historical_years=historical_years,
+                use_cache=use_cache,
+                test_mode=test_mode,
+                safe_mode=safe_mode
+            )
+            pending_orders = pending_orders_for_analysis()
+            
+            # NEW: Steps 3-9 run as a background job the page polls, so reruns don't abandon the work.
+            # Sessions analyzing the same shop with the same settings share one job.
+            scheduler = get_job_scheduler()
+            job_key = f"{shop_name}:" + content_hash(
+                options, location_ids, brand_lead_times,
+                profile.default_lead_time if profile else None, pending_orders or [],
+                [getattr(profile, name, None) or {} for name in
+                 ('vendor_service_levels', 'cluster_service_levels', 'cluster_forecast_models')]
+            )
+            # Content-hashed stage memoization shared by this user's reruns and tabs
+            stage_cache = get_stage_cache(user_id if not st.session_state.get('demo_mode', False) else 'demo')
+            engine = AnalysisEngine(profile, location_config, brand_lead_times,
+                                    state=scheduler.state_for(job_key), stage_cache=stage_cache)
+            job = scheduler.submit(job_key, engine.run, client, options, user_id=user_id, db_manager=db_manager,
+                                   pending_orders=pending_orders, description=f"Analysis of {shop_name}")
+            if not st.session_state.get('demo_mode', False):
+                job.add_done_callback(lambda finished: _persist_analysis_job(finished, db_manager, user_id, profile))
+            st.session_state['analysis_job_id'] = job.id
+            st.session_state.pop('analysis_job_error', None)
+        
+        # NEW: Progress of a running analysis job; its result replaces the session's results when it finishes
+        if st.session_state.get('analysis_job_id'):
+            show_analysis_job_progress(profile, shop_name)
+            if not hasattr(st, 'fragment'):  # Older Streamlit: poll by rerunning the page
+                time.sleep(1)
+                st.rerun()
+        
+        job_error = st.session_state.get('analysis_job_error')
+        if job_error:
+            message, expected = job_error
+            if expected:
+                sharpstock_info_box(f"⚠️ {message}", "warning")
+            else:
+                st.error(f"❌ **Analysis Error:** {message}")
                 
-                try:
-                    # Step 1: Initialize client with error handling
-                    try:
-                        client = AdvancedShopifyClient(shop_name, api_version, access_token, location_ids)
-                    except Exception as e:
-                        st.error(f"❌ Failed to initialize Shopify client: {e}")
-                        return
-                    
-                    # Step 2: Load brand lead times safely
-                    brand_lead_times = {}
-                    try:
-                        if not st.session_state.get('demo_mode', False):
-                            brand_lead_times = db_manager.get_brand_lead_times(user_id)
-                    except Exception as e:
-                        pass  # Continue with empty brand lead times
-                    
-                    # Step 3: Initialize business intelligence engine
-                    try:
-                        bi_engine = EnhancedBusinessIntelligenceEngine(profile, brand_lead_times)
-                    except Exception as e:
-                        st.error(f"❌ Failed to initialize BI engine: {e}")
-                        return
-                    
-                    # Step 4: Fetch order data with comprehensive error handling
-                    recent_orders = []
-                    historical_orders = []
-                    
-                    try:
-                        recent_orders, historical_orders = client.fetch_comprehensive_orders(
-                            datetime.combine(start_date, datetime.min.time()),
-                            datetime.combine(end_date, datetime.max.time()),
-                            use_cache=use_cache,
-                            user_id=user_id,
-                            db_manager=db_manager,
-                            historical_years=historical_years
-                        )
-                        
-                        # Apply safe mode limits
-                        if safe_mode:
-                            if recent_orders and len(recent_orders) > 100:
-                                recent_orders = recent_orders[:100]
-                                st.info("🛡️ Safe mode: Limited to 100 recent orders")
-                            if historical_orders and len(historical_orders) > 200:
-                                historical_orders = historical_orders[:200]
-                                st.info("🛡️ Safe mode: Limited to 200 historical orders")
-                        
-                    except Exception as e:
-                        st.error(f"❌ Failed to fetch order data: {e}")
-                        return
-
-                    if not recent_orders and not historical_orders:
-                        sharpstock_info_box("⚠️ No order data found for analysis. Try adjusting your date range or check your API connection.", "warning")
-                        return
-                    
-                    # Step 5: Process order data safely
-                    recent_orders_df = pd.DataFrame()
-                    historical_orders_df = pd.DataFrame()
-                    
-                    try:
-                        if recent_orders:
-                            recent_orders_df = process_orders_fast(recent_orders, location_config)
-                    except Exception as e:
-                        st.warning(f"⚠️ Error processing recent orders: {e}")
-                    
-                    try:
-                        if historical_orders:
-                            historical_orders_df = process_orders_fast(historical_orders, location_config)
-                    except Exception as e:
-                        st.warning(f"⚠️ Error processing historical orders: {e}")
-                    
-                    # Combine for product identification
-                    all_orders_df = pd.DataFrame()
-                    try:
-                        if not recent_orders_df.empty and not historical_orders_df.empty:
-                            all_orders_df = pd.concat([recent_orders_df, historical_orders_df], ignore_index=True)
-                        elif not recent_orders_df.empty:
-                            all_orders_df = recent_orders_df.copy()
-                        elif not historical_orders_df.empty:
-                            all_orders_df = historical_orders_df.copy()
-                            
-                    except Exception as e:
-                        st.error(f"❌ Error combining order data: {e}")
-                        return
-                    
-                    if all_orders_df.empty:
-                        sharpstock_info_box("⚠️ No valid order data after processing", "warning")
-                        return
-                    
-                    # Step 6: Determine products to analyze
-                    try:
-                        if test_mode:
-                            top_products = all_orders_df.groupby('product_id')['quantity'].sum().sort_values(ascending=False).head(50).index.tolist()
-                            product_ids = top_products
-                            st.info("⚡ Quick test mode: Analyzing top 50 products")
-                        else:
-                            product_ids = all_orders_df['product_id'].unique().tolist()
-                            
-                    except Exception as e:
-                        st.error(f"❌ Error determining products: {e}")
-                        return
-                    
-                    # Step 7: Fetch variants and inventory
-                    variants_data = {}
-                    inventory_levels = {}
-                    
-                    try:
-                        variants_data, inventory_levels = client.fetch_variants_and_inventory(product_ids)
-                            
-                    except Exception as e:
-                        st.warning(f"⚠️ Error fetching variants/inventory: {e}")
-                        # Continue with empty data
-                    
-                    # Step 8: Create inventory dataframe
-                    inventory_df = pd.DataFrame()
-                    try:
-                        inventory_df = create_inventory_dataframe_fast(all_orders_df, variants_data, inventory_levels, location_config)
-                    except Exception as e:
-                        st.warning(f"⚠️ Error creating inventory dataframe: {e}")
-                    
-                    # Step 8.5: Integrate pending orders if enabled
-                    try:
-                        inventory_df = integrate_pending_orders_if_enabled(
-                            inventory_df, profile, location_config
-                        )
-                    except Exception as e:
-                        st.warning(f"⚠️ Error integrating pending orders: {e}")
-
-                    # Step 9: Run business intelligence analysis
-                    insights = []
-                    seasonal_insights = []
-                    summary_metrics = {}
-                    
-                    try:
-                        cached_historical_df = None
-                        if use_cache and user_id and db_manager:
-                            try:
-                                cached_historical_df = db_manager.load_cached_historical_data(user_id, historical_years)
-                            except Exception as e:
-                                pass  # Continue without cache
-
-                        insights, seasonal_insights, summary_metrics = bi_engine.analyze_comprehensive_performance(
-                            recent_orders_df, historical_orders_df, inventory_df, cached_historical_df
-                        )
-                        
-                    except Exception as e:
-                        st.warning(f"⚠️ Error in BI analysis: {e}")
-                        # Continue with empty results
-                    
-                    # Step 10: Update cache timestamp for non-demo users
-                    try:
-                        if not st.session_state.get('demo_mode', False) and historical_orders and profile:
-                            profile.last_cache_update = datetime.now()
-                            db_manager.save_user_profile(profile)
-                    except Exception as e:
-                        pass  # Continue without updating cache
-                    
-                    # Calculate analysis duration
-                    end_time = time.time()
-                    duration = end_time - start_time
-                    
-                    # Store results in session state
-                    st.session_state.update({
-                        'insights': insights,
-                        'seasonal_insights': seasonal_insights,
-                        'summary_metrics': summary_metrics,
-                        'recent_orders_df': recent_orders_df,
-                        'historical_orders_df': historical_orders_df,
-                        'inventory_df': inventory_df,
-                        'analysis_duration': duration,
-                        'data_fetched': True,
-                        'location_config': location_config,
-                        'user_profile': profile
-                    })
-                    
-                    # Clean success and immediate redirect
-                    st.rerun()
-                    
-                except Exception as e:
-                    st.error(f"❌ **Analysis Error:** {str(e)}")
-                    
-                    with st.expander("🔍 Troubleshooting Guide", expanded=False):
-                        st.markdown("""
-                        **Common Solutions:**
-                        1. **Try Safe Mode** - Processes minimal data to avoid errors
-                        2. **Use Quick Test Mode** - Analyze fewer products first
-                        3. **Verify API Credentials** - Check your settings in Profile tab
-                        4. **Check Internet Connection** - Ensure stable connectivity
-                        5. **Reduce Date Range** - Try a shorter analysis period
-                        6. **Clear Cache** - Reset cached data if issues persist
-                        """)
-                    return
+                with st.expander("🔍 Troubleshooting Guide", expanded=False):
+                    st.markdown("""
+                    **Common Solutions:**
+                    1. **Try Safe Mode** - Processes minimal data to avoid errors
+                    2. **Use Quick Test Mode** - Analyze fewer products first
+                    3. **Verify API Credentials** - Check your settings in Profile tab
+                    4. **Check Internet Connection** - Ensure stable connectivity
+                    5. **Reduce Date Range** - Try a shorter analysis period
+                    6. **Clear Cache** - Reset cached data if issues persist
+                    """)
         
         # Display results if analysis is complete
         if st.session_state.get('data_fetched', False):
             try:
-                display_analysis_results()
+                # NEW: Trace the page render too; shown with the analysis stages in the diagnostics panel
+                render_tracer = tracing.Tracer(sample_memory=False)
+                with tracing.use_tracer(render_tracer), tracing.span('render_results'):
+                    display_analysis_results()
+                st.session_state['render_trace'] = render_tracer.records()
+                show_diagnostics_panel()
             except Exception as e:
                 st.error(f"❌ Error displaying results: {e}")
                     
     except Exception as e:
         st.error(f"❌ Critical error in analysis interface: {e}")
 
+def _persist_analysis_job(job: Job, db_manager: DatabaseManager, user_id: str, profile: UserProfile):
+    """NEW: Runs on the job's worker thread when it finishes - persist the result and cache timestamp"""
+    if job.status != DONE:
+        return
+    save_result(user_id, job.result)  # Next session opens on this run
+    if not job.result.inputs.historical_orders_df.empty and profile:
+        profile.last_cache_update = datetime.now()
+        db_manager.save_user_profile(profile)
+
+def hold_shared_result(handle: DataHandle, profile: UserProfile):
+    """NEW: Point this session's results at shared analysis data and release what it held before"""
+    previous = st.session_state.get('analysis_handle')
+    st.session_state['analysis_handle'] = handle
+    st.session_state.update(handle.value.session_values())
+    st.session_state['user_profile'] = profile
+    if isinstance(previous, DataHandle) and previous is not handle:
+        previous.release()
+
+def take_job_result(job: Job, shop_name: str) -> Optional[DataHandle]:
+    """
+    NEW: Handle to a finished job's result in the shared data cache. The first poller moves the
+    result there and drops it from the job, so it only counts once (against the cache's cap).
+    """
+    cache = get_shared_data_cache()
+    handle = cache.acquire(shop_name, job.id)
+    result = job.result
+    if handle is None and result is not None:
+        handle = cache.put(shop_name, job.id, result, size=result.memory_size())
+    job.result = None
+    return handle
+
+def show_analysis_job_progress(profile: UserProfile, shop_name: str):
+    """NEW: Poll this session's analysis job; on completion load its result (or error) and rerun"""
+    job = get_job_scheduler().get(st.session_state.get('analysis_job_id'))
+    if job is None:
+        st.session_state.pop('analysis_job_id', None)
+        return
+    
+    if not job.finished:
+        status = "Queued" if job.status == QUEUED else (job.message or "Working")
+        st.progress(job.fraction)
+        st.caption(f"⚡ {job.description}: {status} ({job.elapsed:.0f}s)")
+        return
+    
+    st.session_state.pop('analysis_job_id', None)
+    if job.status == DONE:
+        # Sessions that shared the job also share its data
+        handle = take_job_result(job, shop_name)
+        if handle is not None:
+            hold_shared_result(handle, profile)
+            st.session_state.pop('precomputed_at', None)
+        else:
+            st.session_state['analysis_job_error'] = ("The analysis result is no longer cached - please run the analysis again.", True)
+    else:
+        st.session_state['analysis_job_error'] = (job.error, isinstance(job.exception, AnalysisError))
+    st.rerun()
+
+if hasattr(st, 'fragment'):
+    # Reruns only the progress panel every second instead of the whole page
+    show_analysis_job_progress = st.fragment(run_every=1)(show_analysis_job_progress)
+
+def show_diagnostics_panel():
+    """NEW: Per-stage time, rows, API traffic and memory of the last analysis run and page render"""
+    records = list(st.session_state.get('analysis_trace') or []) + list(st.session_state.get('render_trace') or [])
+    if not records:
+        return
+    
+    mb = 1024 * 1024
+    with st.expander("🩺 Pipeline Diagnostics", expanded=False):
+        stages = pd.DataFrame([{
+            'Stage': '\u2003' * r['depth'] + r['name'] + (f" ({r['period']})" if r.get('period') else ''),
+            'Seconds': round(r['duration'], 3),
+            'Rows': r.get('rows'),
+            'API Calls': r.get('api_calls'),
+            'Downloaded (MB)': round(r['bytes_downloaded'] / mb, 2) if r.get('bytes_downloaded') is not None else None,
+            'Peak RSS (MB)': round(r['peak_rss'] / mb, 1),
+            'RSS Change (MB)': round((r['rss_end'] - r['rss_start']) / mb, 1),
+        } for r in records])
+        st.dataframe(stages, use_container_width=True, hide_index=True)
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            st.download_button("⬇️ Trace (JSON)", tracing.to_json(records),
+                               file_name="sharpstock_trace.json", mime="application/json")
+        with col2:
+            st.download_button("⬇️ Chrome Trace", tracing.to_chrome_trace(records),
+                               file_name="sharpstock_trace_chrome.json", mime="application/json",
+                               help="Open in chrome://tracing or ui.perfetto.dev")
+
 @safe_error_handler
 def display_analysis_results():
     """Clean analysis results with sidebar navigation - NO LOADING MESSAGES"""
@@ -755,8 +782,9 @@ def display_analysis_results():
             # Quick stats in sidebar
             st.markdown("---")
             st.markdown("**📊 Quick Stats**")
-            critical_count = len([i for i in insights if hasattr(i, 'reorder_priority') and i.reorder_priority == 'CRITICAL'])
-            trending_count = len([i for i in insights if hasattr(i, 'trend_classification') and 'Trending' in i.trend_classification])
+            insight_table = InsightTable.coerce(insights)
+            critical_count = insight_table.count(reorder_priority='CRITICAL')
+            trending_count = int(insight_table.contains_mask('trend_classification', 'Trending', case=True).sum())
             
             st.metric("Products Analyzed", f"{len(insights):,}")
             st.metric("Critical Alerts", critical_count)
@@ -1239,14 +1267,14 @@ def display_order_sheets_page(insights, recent_orders_df, inventory_df, location
         st.markdown("### 2️⃣ Products to Reorder")
         
         # Filter insights for selected brand
-        brand_insights = [i for i in insights if i.vendor == selected_brand]
+        brand_insights = InsightTable.coerce(insights).filter(vendor=selected_brand)
         
         if not brand_insights:
             st.warning(f"No products found for {selected_brand}")
             return
         
         # Filter for products that actually need reordering
-        reorder_insights = [i for i in brand_insights if i.reorder_priority in ['CRITICAL', 'HIGH', 'MEDIUM']]
+        reorder_insights = brand_insights.filter(reorder_priority=['CRITICAL', 'HIGH', 'MEDIUM'])
         
         if not reorder_insights:
             st.info(f"No products currently need reordering for {selected_brand}")
@@ -1279,9 +1307,9 @@ def display_order_sheets_page(insights, recent_orders_df, inventory_df, location
         
         # Apply filters
         if priority_filter != "All":
-            reorder_insights = [i for i in reorder_insights if i.reorder_priority == priority_filter]
+            reorder_insights = reorder_insights.filter(reorder_priority=priority_filter)
         if timing_filter != "All":
-            reorder_insights = [i for i in reorder_insights if i.reorder_timing == timing_filter]
+            reorder_insights = reorder_insights.filter(reorder_timing=timing_filter)
         
         if not reorder_insights:
             st.warning("No products match the selected filters")
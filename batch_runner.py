@@ -0,0 +1,139 @@
+"""
+SharpStock Batch Runner
+Nightly precomputation for every configured shop: sync orders incrementally, run the full
+analysis headlessly and persist the result so the dashboard opens on it instantly.
+
+    python batch_runner.py                      # all shops, one worker per core
+    python batch_runner.py --users ID1 ID2 --workers 2 --days 30 --historical-years 2
+"""
+import argparse
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+
+# Load environment variables first (database and encryption settings)
+load_dotenv()
+
+logger = logging.getLogger("sharpstock.batch")
+
+API_VERSION = "2023-10"
+
+
+def precompute_shop(user_id: str, days: int = 30, historical_years: int = 2,
+                    use_cache: bool = True, test_mode: bool = False) -> Dict:
+    """Sync, analyze and persist one shop; runs in a worker process and never raises"""
+    # Imported here so each worker process initializes its own clients and caches
+    from analysis.engine import AnalysisEngine, AnalysisError, AnalysisOptions, save_result
+    from database.database_manager import DatabaseManager
+    from shopify.client import AdvancedShopifyClient
+    from utils.progress import LoggingSink, use_sink
+    from utils.stage_cache import get_stage_cache
+
+    start_time = time.time()
+    status = {'user_id': user_id, 'status': 'failed', 'insights': 0, 'duration': 0.0, 'message': ''}
+    sink = LoggingSink()
+    try:
+        with use_sink(sink):
+            db_manager = DatabaseManager()
+            profile = db_manager.load_user_profile(user_id)
+            if not profile or not profile.shop_name or not profile.encrypted_api_token:
+                status.update(status='skipped', message='store configuration incomplete')
+                return status
+
+            access_token = db_manager.decrypt_token(profile.encrypted_api_token)
+            location_config = profile.location_config
+            client = AdvancedShopifyClient(profile.shop_name, API_VERSION, access_token, list(location_config.keys()))
+            brand_lead_times = db_manager.get_brand_lead_times(user_id)
+
+            recent_end = datetime.now()
+            recent_start = recent_end - timedelta(days=days)
+
+            # Incremental sync: only orders since the last cached window are fetched
+            if use_cache:
+                client.sync_historical_orders(user_id, db_manager, recent_end - timedelta(days=365 * historical_years),
+                                              recent_start, historical_years, location_config)
+
+            engine = AnalysisEngine(profile, location_config, brand_lead_times,
+                                    sink=sink, state={}, stage_cache=get_stage_cache(user_id))
+            options = AnalysisOptions(recent_start=recent_start, recent_end=recent_end,
+                                      historical_years=historical_years, use_cache=use_cache, test_mode=test_mode)
+            result = engine.run(client, options, user_id=user_id, db_manager=db_manager)
+
+            if not save_result(user_id, result):
+                status['message'] = 'analysis finished but could not be saved'
+                return status
+
+            if not result.inputs.historical_orders_df.empty:
+                profile.last_cache_update = datetime.now()
+                db_manager.save_user_profile(profile)
+
+            status.update(status='ok', insights=len(result.insights))
+    except AnalysisError as e:
+        status['message'] = str(e)
+    except Exception as e:
+        logger.exception(f"Precomputation failed for {user_id}")
+        status['message'] = str(e)
+    finally:
+        status['duration'] = time.time() - start_time
+    return status
+
+
+def run_batch(user_ids: List[str], workers: Optional[int] = None, **shop_options) -> List[Dict]:
+    """Spread shops across a process pool; one failing shop doesn't stop the others"""
+    workers = max(1, min(workers or os.cpu_count() or 1, len(user_ids)))
+    if workers == 1:
+        return [precompute_shop(user_id, **shop_options) for user_id in user_ids]
+
+    statuses = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(precompute_shop, user_id, **shop_options): user_id for user_id in user_ids}
+        for future in as_completed(futures):
+            try:
+                statuses.append(future.result())
+            except Exception as e:  # Worker process died
+                statuses.append({'user_id': futures[future], 'status': 'failed', 'insights': 0,
+                                 'duration': 0.0, 'message': str(e)})
+    return statuses
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Precompute SharpStock analyses for all configured shops")
+    parser.add_argument("--users", nargs="+", help="Only these user ids (default: every saved profile)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: one per core)")
+    parser.add_argument("--days", type=int, default=30, help="Recent analysis window in days")
+    parser.add_argument("--historical-years", type=int, default=2, choices=[1, 2, 3, 4, 5])
+    parser.add_argument("--no-cache", action="store_true", help="Refetch all historical orders instead of syncing")
+    parser.add_argument("--test-mode", action="store_true", help="Analyze the top products only")
+    parser.add_argument("--log-level", default="INFO")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(processName)s %(name)s %(levelname)s %(message)s")
+
+    user_ids = args.users
+    if not user_ids:
+        from database.database_manager import DatabaseManager
+        user_ids = DatabaseManager().list_profile_user_ids()
+    if not user_ids:
+        logger.warning("No configured shops to precompute")
+        return 0
+
+    logger.info(f"Precomputing {len(user_ids)} shop(s)")
+    start_time = time.time()
+    statuses = run_batch(user_ids, args.workers, days=args.days, historical_years=args.historical_years,
+                         use_cache=not args.no_cache, test_mode=args.test_mode)
+
+    for status in sorted(statuses, key=lambda s: s['user_id']):
+        logger.info(f"{status['user_id']}: {status['status']} - {status['insights']} insights in "
+                    f"{status['duration']:.1f}s {status['message']}".rstrip())
+    failed = sum(1 for s in statuses if s['status'] == 'failed')
+    logger.info(f"Batch complete in {time.time() - start_time:.1f}s: {len(statuses) - failed} done, {failed} failed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,7 +1,6 @@
 #The DatabaseManager handles all database operations - user authentication, profile storage, caching, and encryption. 
 
 """Database management for user profiles and caching"""
-import streamlit as st
 import sqlite3
 import os
 import hashlib
@@ -21,6 +20,31 @@ except ImportError:
     SUPABASE_AVAILABLE = False
 
 from models.data_models import UserProfile, BrandLeadTime, CachedOrderData
+from utils import progress
+
+# NEW: Per-profile override mappings, stored as JSON text columns
+PROFILE_OVERRIDE_COLUMNS = ('vendor_service_levels', 'cluster_service_levels', 'cluster_forecast_models')
+
+
+def _dump_profile_overrides(profile: UserProfile) -> Dict[str, str]:
+    return {column: json.dumps(getattr(profile, column, None) or {}) for column in PROFILE_OVERRIDE_COLUMNS}
+
+
+def _load_profile_overrides(data: Dict[str, Any]) -> Dict[str, Dict]:
+    """JSON columns -> override dicts; cluster ids come back from JSON as strings"""
+    overrides = {}
+    for column in PROFILE_OVERRIDE_COLUMNS:
+        try:
+            value = data.get(column)
+            mapping = (json.loads(value) if isinstance(value, str) else value) or {}
+        except (TypeError, ValueError):
+            mapping = {}
+        if column.startswith('cluster_'):
+            mapping = {int(key): value for key, value in mapping.items()}
+        if column.endswith('service_levels'):
+            mapping = {key: float(value) for key, value in mapping.items()}
+        overrides[column] = mapping
+    return overrides
 
 # DATABASE MANAGER CLASS - From attempt1.txt
 class DatabaseManager:
@@ -34,12 +58,12 @@ class DatabaseManager:
         if self.supabase_url and self.supabase_key and SUPABASE_AVAILABLE:
             self.supabase: Client = create_client(self.supabase_url, self.supabase_key)
             self.use_supabase = True
-            st.info("🌐 Connected to Supabase (Production Mode)")
+            progress.info("🌐 Connected to Supabase (Production Mode)")
         else:
             # Fallback to SQLite for local development
             self.use_supabase = False
             self._init_sqlite()
-            st.info("💾 Using SQLite (Development Mode)")
+            progress.info("💾 Using SQLite (Development Mode)")
         
         # Initialize encryption with persistent key
         self._init_encryption()
@@ -54,7 +78,7 @@ class DatabaseManager:
             if isinstance(encryption_key, str):
                 encryption_key = encryption_key.encode()
             self.fernet = Fernet(encryption_key)
-            st.info("🔐 Using encryption key from environment")
+            progress.info("🔐 Using encryption key from environment")
             return
         
         # For local development, store key in a file
@@ -66,21 +90,21 @@ class DatabaseManager:
                 with open(key_file, "rb") as f:
                     encryption_key = f.read()
                 self.fernet = Fernet(encryption_key)
-                st.info("🔐 Loaded existing encryption key")
+                progress.info("🔐 Loaded existing encryption key")
             else:
                 # Generate new key and save it
                 encryption_key = Fernet.generate_key()
                 with open(key_file, "wb") as f:
                     f.write(encryption_key)
                 self.fernet = Fernet(encryption_key)
-                st.warning("🔐 Generated new encryption key - stored in encryption_key.key")
+                progress.warning("🔐 Generated new encryption key - stored in encryption_key.key")
                 
         except Exception as e:
             # Fallback: use session-based key (will be lost on restart)
             encryption_key = Fernet.generate_key()
             self.fernet = Fernet(encryption_key)
-            st.error(f"❌ Encryption key error: {e}")
-            st.warning("⚠️ Using temporary encryption key - tokens will be lost on restart")
+            progress.error(f"❌ Encryption key error: {e}")
+            progress.warning("⚠️ Using temporary encryption key - tokens will be lost on restart")
     
     def _init_sqlite(self):
         """Initialize SQLite database for local development"""
@@ -107,6 +131,9 @@ class DatabaseManager:
                 location_config TEXT NOT NULL,
                 default_lead_time INTEGER DEFAULT 14,
                 last_cache_update TIMESTAMP,
+                vendor_service_levels TEXT DEFAULT '{}',
+                cluster_service_levels TEXT DEFAULT '{}',
+                cluster_forecast_models TEXT DEFAULT '{}',
                 FOREIGN KEY (user_id) REFERENCES users (user_id)
             )
         """)
@@ -147,6 +174,16 @@ class DatabaseManager:
             else:
                 print(f"⚠️ Migration warning: {e}")
         
+        # MIGRATION: Add service-level / forecasting override columns (JSON) if they don't exist
+        for column in PROFILE_OVERRIDE_COLUMNS:
+            try:
+                cursor.execute(f"ALTER TABLE user_profiles ADD COLUMN {column} TEXT DEFAULT '{{}}'")
+                conn.commit()
+                print(f"✅ Migration: Added {column} column")
+            except sqlite3.OperationalError as e:
+                if "duplicate column name" not in str(e).lower():
+                    print(f"⚠️ Migration warning: {e}")
+        
         conn.commit()
         conn.close()
     
@@ -155,7 +192,7 @@ class DatabaseManager:
         try:
             return self.fernet.encrypt(token.encode()).decode()
         except Exception as e:
-            st.error(f"❌ Failed to encrypt token: {e}")
+            progress.error(f"❌ Failed to encrypt token: {e}")
             raise
     
     def decrypt_token(self, encrypted_token: str) -> str:
@@ -163,8 +200,8 @@ class DatabaseManager:
         try:
             return self.fernet.decrypt(encrypted_token.encode()).decode()
         except Exception as e:
-            st.error(f"❌ Failed to decrypt token: {e}")
-            st.info("💡 This usually means the encryption key has changed. Please re-enter your API token.")
+            progress.error(f"❌ Failed to decrypt token: {e}")
+            progress.info("💡 This usually means the encryption key has changed. Please re-enter your API token.")
             raise
     
     def create_user(self, username: str, email: str, password: str) -> str:
@@ -233,40 +270,52 @@ class DatabaseManager:
     def save_user_profile(self, profile: UserProfile) -> bool:
         """Save user profile to database"""
         if self.use_supabase:
+            row = {
+                "user_id": profile.user_id,
+                "shop_name": profile.shop_name,
+                "encrypted_api_token": profile.encrypted_api_token,
+                "location_config": json.dumps(profile.location_config),
+                "default_lead_time": profile.default_lead_time,
+                "last_cache_update": profile.last_cache_update.isoformat() if profile.last_cache_update else None
+            }
             try:
-                self.supabase.table("user_profiles").upsert({
-                    "user_id": profile.user_id,
-                    "shop_name": profile.shop_name,
-                    "encrypted_api_token": profile.encrypted_api_token,
-                    "location_config": json.dumps(profile.location_config),
-                    "default_lead_time": profile.default_lead_time,
-                    "last_cache_update": profile.last_cache_update.isoformat() if profile.last_cache_update else None
-                }).execute()
+                try:
+                    self.supabase.table("user_profiles").upsert({**row, **_dump_profile_overrides(profile)}).execute()
+                except Exception as e:
+                    # Deployments without the override columns (database/supabase_profile_overrides.sql)
+                    # still save the rest of the profile
+                    if not any(column in str(e) for column in PROFILE_OVERRIDE_COLUMNS):
+                        raise
+                    progress.warning("⚠️ Service-level overrides not saved: run database/supabase_profile_overrides.sql on Supabase")
+                    self.supabase.table("user_profiles").upsert(row).execute()
                 return True
             except Exception as e:
-                st.error(f"Failed to save profile: {str(e)}")
+                progress.error(f"Failed to save profile: {str(e)}")
                 return False
         else:
             # SQLite fallback
             conn = sqlite3.connect(self.db_path)
             cursor = conn.cursor()
             try:
+                overrides = _dump_profile_overrides(profile)
                 cursor.execute("""
                     INSERT OR REPLACE INTO user_profiles 
-                    (user_id, shop_name, encrypted_api_token, location_config, default_lead_time, last_cache_update)
-                    VALUES (?, ?, ?, ?, ?, ?)
+                    (user_id, shop_name, encrypted_api_token, location_config, default_lead_time, last_cache_update,
+                     vendor_service_levels, cluster_service_levels, cluster_forecast_models)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
                 """, (
                     profile.user_id,
                     profile.shop_name,
                     profile.encrypted_api_token,
                     json.dumps(profile.location_config),
                     profile.default_lead_time,
-                    profile.last_cache_update
+                    profile.last_cache_update,
+                    *(overrides[column] for column in PROFILE_OVERRIDE_COLUMNS)
                 ))
                 conn.commit()
                 return True
             except Exception as e:
-                st.error(f"Failed to save profile: {str(e)}")
+                progress.error(f"Failed to save profile: {str(e)}")
                 return False
             finally:
                 conn.close()
@@ -290,11 +339,12 @@ class DatabaseManager:
                         location_config=json.loads(data["location_config"]),
                         default_lead_time=data["default_lead_time"],
                         created_at=datetime.fromisoformat(data["created_at"]),
-                        last_cache_update=datetime.fromisoformat(data["last_cache_update"]) if data["last_cache_update"] else None
+                        last_cache_update=datetime.fromisoformat(data["last_cache_update"]) if data["last_cache_update"] else None,
+                        **_load_profile_overrides(data)
                     )
                 return None
             except Exception as e:
-                st.error(f"Failed to load profile: {str(e)}")
+                progress.error(f"Failed to load profile: {str(e)}")
                 return None
         else:
             # SQLite fallback
@@ -302,7 +352,8 @@ class DatabaseManager:
             cursor = conn.cursor()
             cursor.execute("""
                 SELECT u.username, u.email, p.shop_name, p.encrypted_api_token, 
-                       p.location_config, p.default_lead_time, p.last_cache_update, u.created_at
+                       p.location_config, p.default_lead_time, p.last_cache_update, u.created_at,
+                       p.vendor_service_levels, p.cluster_service_levels, p.cluster_forecast_models
                 FROM users u
                 JOIN user_profiles p ON u.user_id = p.user_id
                 WHERE u.user_id = ?
@@ -320,10 +371,33 @@ class DatabaseManager:
                     location_config=json.loads(result[4]),
                     default_lead_time=result[5],
                     created_at=datetime.fromisoformat(result[7]),
-                    last_cache_update=datetime.fromisoformat(result[6]) if result[6] else None
+                    last_cache_update=datetime.fromisoformat(result[6]) if result[6] else None,
+                    **_load_profile_overrides(dict(zip(PROFILE_OVERRIDE_COLUMNS, result[8:11])))
                 )
             return None
     
+    def list_profile_user_ids(self) -> List[str]:
+        """NEW: Users with a saved store profile (batch precomputation iterates these)"""
+        if self.use_supabase:
+            try:
+                response = self.supabase.table("user_profiles").select("user_id").execute()
+                return [row["user_id"] for row in response.data]
+            except Exception as e:
+                progress.error(f"Failed to list profiles: {str(e)}")
+                return []
+        else:
+            # SQLite fallback
+            conn = sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT p.user_id FROM user_profiles p
+                JOIN users u ON u.user_id = p.user_id
+                ORDER BY p.user_id
+            """)
+            results = cursor.fetchall()
+            conn.close()
+            return [row[0] for row in results]
+    
     def save_brand_lead_time(self, user_id: str, brand_name: str, lead_time_days: int) -> bool:
         """Save brand-specific lead time"""
         if self.use_supabase:
@@ -335,7 +409,7 @@ class DatabaseManager:
                 }).execute()
                 return True
             except Exception as e:
-                st.error(f"Failed to save brand lead time: {str(e)}")
+                progress.error(f"Failed to save brand lead time: {str(e)}")
                 return False
         else:
             # SQLite fallback
@@ -349,7 +423,7 @@ class DatabaseManager:
                 conn.commit()
                 return True
             except Exception as e:
-                st.error(f"Failed to save brand lead time: {str(e)}")
+                progress.error(f"Failed to save brand lead time: {str(e)}")
                 return False
             finally:
                 conn.close()
@@ -361,7 +435,7 @@ class DatabaseManager:
                 response = self.supabase.table("brand_lead_times").select("brand_name, lead_time_days").eq("user_id", user_id).execute()
                 return {item["brand_name"]: item["lead_time_days"] for item in response.data}
             except Exception as e:
-                st.error(f"Failed to load brand lead times: {str(e)}")
+                progress.error(f"Failed to load brand lead times: {str(e)}")
                 return {}
         else:
             # SQLite fallback
@@ -373,8 +447,9 @@ class DatabaseManager:
             return {brand: lead_time for brand, lead_time in results}
     
     def cache_historical_data(self, user_id: str, orders_df: pd.DataFrame, start_date: datetime, end_date: datetime, period_years: int) -> bool:
-        """Cache historical order data with period tracking"""
-        cache_id = hashlib.sha256(f"{user_id}{start_date}{end_date}{period_years}".encode()).hexdigest()[:16]
+        """Cache historical order data with period tracking (one row per user and period)"""
+        # FIXED: Key on the period only - date-based ids added a new row on every nightly sync
+        cache_id = hashlib.sha256(f"{user_id}{period_years}".encode()).hexdigest()[:16]
         pickled_data = pickle.dumps(orders_df)
         
         if self.use_supabase:
@@ -387,12 +462,20 @@ class DatabaseManager:
                     "order_data": encoded_data,
                     "data_start_date": start_date.date().isoformat(),
                     "data_end_date": end_date.date().isoformat(),
-                    "cache_period_years": period_years
+                    "cache_period_years": period_years,
+                    "cache_date": datetime.now().isoformat()
                 }).execute()
-                return True
             except Exception as e:
-                st.warning(f"Failed to cache data (large dataset): {str(e)}")
+                progress.warning(f"Failed to cache data (large dataset): {str(e)}")
                 return False
+            
+            # Drop rows left by superseded syncs of this period
+            try:
+                self.supabase.table("cached_orders").delete().eq("user_id", user_id).eq(
+                    "cache_period_years", period_years).neq("cache_id", cache_id).execute()
+            except Exception as e:
+                progress.warning(f"Failed to remove superseded cached orders: {str(e)}")
+            return True
         else:
             # SQLite fallback
             conn = sqlite3.connect(self.db_path)
@@ -403,10 +486,14 @@ class DatabaseManager:
                     (cache_id, user_id, order_data, data_start_date, data_end_date, cache_period_years)
                     VALUES (?, ?, ?, ?, ?, ?)
                 """, (cache_id, user_id, pickled_data, start_date.date(), end_date.date(), period_years))
+                cursor.execute("""
+                    DELETE FROM cached_orders
+                    WHERE user_id = ? AND cache_period_years = ? AND cache_id != ?
+                """, (user_id, period_years, cache_id))
                 conn.commit()
                 return True
             except Exception as e:
-                st.warning(f"Failed to cache data: {str(e)}")
+                progress.warning(f"Failed to cache data: {str(e)}")
                 return False
             finally:
                 conn.close()
@@ -426,7 +513,7 @@ class DatabaseManager:
                     return pickle.loads(pickled_data)
                 return None
             except Exception as e:
-                st.warning(f"Failed to load cached data: {str(e)}")
+                progress.warning(f"Failed to load cached data: {str(e)}")
                 return None
         else:
             # SQLite fallback
@@ -465,7 +552,7 @@ class DatabaseManager:
                 response = self.supabase.table("cached_orders").select("cache_period_years, cache_date, data_start_date, data_end_date").eq("user_id", user_id).order("cache_period_years").execute()
                 return response.data
             except Exception as e:
-                st.warning(f"Failed to load cache info: {str(e)}")
+                progress.warning(f"Failed to load cache info: {str(e)}")
                 return []
         else:
             # SQLite fallback
@@ -0,0 +1,5 @@
+-- Service-level / forecasting override columns on user_profiles (JSON text, like location_config).
+-- SQLite databases are migrated automatically by DatabaseManager._init_sqlite.
+ALTER TABLE user_profiles ADD COLUMN IF NOT EXISTS vendor_service_levels TEXT DEFAULT '{}';
+ALTER TABLE user_profiles ADD COLUMN IF NOT EXISTS cluster_service_levels TEXT DEFAULT '{}';
+ALTER TABLE user_profiles ADD COLUMN IF NOT EXISTS cluster_forecast_models TEXT DEFAULT '{}';
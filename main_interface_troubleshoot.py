@@ -338,7 +338,10 @@ def show_profile_management_tab(db_manager: DatabaseManager, user_id: str):
                         location_config=location_config,
                         default_lead_time=default_lead_time,
                         created_at=profile.created_at if profile else datetime.now(),
-                        last_cache_update=profile.last_cache_update if profile else None
+                        last_cache_update=profile.last_cache_update if profile else None,
+                        vendor_service_levels=getattr(profile, 'vendor_service_levels', {}) if profile else {},
+                        cluster_service_levels=getattr(profile, 'cluster_service_levels', {}) if profile else {},
+                        cluster_forecast_models=getattr(profile, 'cluster_forecast_models', {}) if profile else {}
                     )
                     
                     if db_manager.save_user_profile(new_profile):
@@ -772,7 +775,8 @@ def show_analysis_interface(db_manager: DatabaseManager, user_id: str, profile:
                         'analysis_duration': duration,
                         'data_fetched': True,
                         'location_config': location_config,
-                        'user_profile': profile
+                        'user_profile': profile,
+                        'analysis_data_version': None  # Pages re-hash the new data once
                     })
                     
                     # Clean success and immediate redirect
@@ -1976,7 +1980,8 @@ def _run_comprehensive_analysis(db_manager, user_id, profile):
             'analysis_duration': time.time() - time.time(),  # Will be updated with actual duration
             'data_fetched': True,
             'location_config': location_config,
-            'user_profile': profile
+            'user_profile': profile,
+            'analysis_data_version': None  # Pages re-hash the new data once
         })
         
         enterprise_alert("✅ Analysis completed successfully!", "success")
@@ -1,7 +1,7 @@
 #These are data models - they define the structure of the data objects
 
 """Data models for Shopify Intelligence Platform"""
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime
 from typing import Dict, List, Optional, Tuple, Any
 
@@ -60,6 +60,10 @@ class UserProfile:
     default_lead_time: int
     created_at: datetime
     last_cache_update: Optional[datetime] = None
+    # NEW: Optional service-level / forecasting overrides (vendor -> target, cluster -> target/model)
+    vendor_service_levels: Dict[str, float] = field(default_factory=dict)
+    cluster_service_levels: Dict[int, float] = field(default_factory=dict)
+    cluster_forecast_models: Dict[int, str] = field(default_factory=dict)
 
 @dataclass
 class BrandLeadTime:
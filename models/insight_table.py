@@ -0,0 +1,311 @@
+"""
+Columnar storage for ProductInsight results
+Keeps one NumPy array per field instead of one dataclass per product, with
+lightweight row views so existing pages can keep using insight.attribute access
+"""
+from dataclasses import fields
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+from models.data_models import ProductInsight
+
+INSIGHT_FIELDS = tuple(f.name for f in fields(ProductInsight))
+
+# Column dtypes - anything not listed is stored as an object (string) array
+NUMERIC_DTYPES = {
+    'product_id': np.int64,
+    'recent_daily_demand': np.float64,
+    'recent_total_sales': np.int64,
+    'recent_revenue': np.float64,
+    'recent_days': np.int64,
+    'historical_daily_demand': np.float64,
+    'historical_total_sales': np.int64,
+    'historical_revenue': np.float64,
+    'historical_days': np.int64,
+    'velocity_change': np.float64,
+    'current_inventory': np.int64,
+    'days_until_stockout': np.int64,
+    'inventory_turnover': np.float64,
+    'recommended_qty': np.int64,
+}
+
+PRIORITY_RANK = {'CRITICAL': 4, 'HIGH': 3, 'MEDIUM': 2, 'LOW': 1}
+
+
+class InsightRow:
+    """Read-only view of one row in an InsightTable with the ProductInsight interface"""
+
+    __slots__ = ('_table', '_pos')
+
+    def __init__(self, table: 'InsightTable', pos: int):
+        self._table = table
+        self._pos = pos
+
+    def to_insight(self) -> ProductInsight:
+        """Materialize this row as a ProductInsight dataclass"""
+        return ProductInsight(**{name: getattr(self, name) for name in INSIGHT_FIELDS})
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (InsightRow, ProductInsight)):
+            return all(getattr(self, name) == getattr(other, name) for name in INSIGHT_FIELDS)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"InsightRow(product_id={self.product_id}, style_number={self.style_number!r}, reorder_priority={self.reorder_priority!r})"
+
+
+def _make_field_property(name: str) -> property:
+    def getter(row: InsightRow):
+        value = row._table._columns[name][row._pos]
+        return value.item() if isinstance(value, np.generic) else value
+    getter.__name__ = name
+    return property(getter)
+
+
+for _name in INSIGHT_FIELDS:
+    setattr(InsightRow, _name, _make_field_property(_name))
+
+
+class InsightTable:
+    """Struct-of-arrays container for product insights with vectorized filter, sort and top-k"""
+
+    __slots__ = ('_columns', '_length')
+
+    def __init__(self, columns: Dict[str, np.ndarray]):
+        self._columns = columns
+        self._length = len(next(iter(columns.values()))) if columns else 0
+
+    # ------------------------------------------------------------------
+    # Construction
+    # ------------------------------------------------------------------
+    @classmethod
+    def empty(cls) -> 'InsightTable':
+        return cls({name: np.empty(0, dtype=NUMERIC_DTYPES.get(name, object)) for name in INSIGHT_FIELDS})
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict[str, Any]]) -> 'InsightTable':
+        """Build a table from dicts keyed by ProductInsight field names"""
+        records = list(records)
+        if not records:
+            return cls.empty()
+
+        columns = {}
+        for name in INSIGHT_FIELDS:
+            values = [record[name] for record in records]
+            columns[name] = _to_array(name, values)
+        return cls(columns)
+
+    @classmethod
+    def from_insights(cls, insights: Iterable[Union[ProductInsight, InsightRow]]) -> 'InsightTable':
+        """Build a table from ProductInsight objects (or row views)"""
+        insights = list(insights)
+        if not insights:
+            return cls.empty()
+
+        columns = {}
+        for name in INSIGHT_FIELDS:
+            columns[name] = _to_array(name, [getattr(insight, name) for insight in insights])
+        return cls(columns)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> 'InsightTable':
+        """Build a table from a DataFrame with ProductInsight columns"""
+        if df is None or df.empty:
+            return cls.empty()
+        return cls({name: _to_array(name, df[name].to_numpy()) for name in INSIGHT_FIELDS})
+
+    @classmethod
+    def coerce(cls, insights) -> 'InsightTable':
+        """Return insights as an InsightTable, converting lists of ProductInsight when needed"""
+        if isinstance(insights, InsightTable):
+            return insights
+        if insights is None:
+            return cls.empty()
+        return cls.from_insights(insights)
+
+    @classmethod
+    def concat(cls, tables: Sequence['InsightTable']) -> 'InsightTable':
+        tables = [t for t in tables if len(t)]
+        if not tables:
+            return cls.empty()
+        return cls({name: np.concatenate([t._columns[name] for t in tables]) for name in INSIGHT_FIELDS})
+
+    # ------------------------------------------------------------------
+    # Conversion
+    # ------------------------------------------------------------------
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame({name: self._columns[name] for name in INSIGHT_FIELDS})
+
+    def to_insights(self) -> List[ProductInsight]:
+        return [row.to_insight() for row in self]
+
+    def column(self, name: str) -> np.ndarray:
+        """Direct access to the underlying array for a field"""
+        return self._columns[name]
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory footprint of the stored columns"""
+        total = 0
+        for values in self._columns.values():
+            total += values.nbytes
+            if values.dtype == object:
+                total += sum(len(v) for v in values if isinstance(v, str))
+        return total
+
+    # ------------------------------------------------------------------
+    # Sequence protocol (keeps List[ProductInsight] callers working)
+    # ------------------------------------------------------------------
+    def __len__(self) -> int:
+        return self._length
+
+    def __bool__(self) -> bool:
+        return self._length > 0
+
+    def __iter__(self) -> Iterator[InsightRow]:
+        for pos in range(self._length):
+            yield InsightRow(self, pos)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return self.take(np.arange(self._length)[key])
+        if isinstance(key, (int, np.integer)):
+            pos = int(key)
+            if pos < 0:
+                pos += self._length
+            if pos < 0 or pos >= self._length:
+                raise IndexError("InsightTable index out of range")
+            return InsightRow(self, pos)
+        if isinstance(key, np.ndarray) and key.dtype == bool:
+            return self.where(key)
+        return self.take(np.asarray(key, dtype=np.int64))
+
+    def __repr__(self) -> str:
+        return f"InsightTable({self._length} products)"
+
+    # ------------------------------------------------------------------
+    # Vectorized operations
+    # ------------------------------------------------------------------
+    def take(self, positions: np.ndarray) -> 'InsightTable':
+        return InsightTable({name: values[positions] for name, values in self._columns.items()})
+
+    def where(self, mask: np.ndarray) -> 'InsightTable':
+        return InsightTable({name: values[mask] for name, values in self._columns.items()})
+
+    def mask(self, **criteria) -> np.ndarray:
+        """
+        Boolean mask for equality criteria; list/tuple/set values match any member
+
+        Example: table.mask(reorder_priority=['CRITICAL', 'HIGH'], vendor='Birkenstock')
+        """
+        result = np.ones(self._length, dtype=bool)
+        for name, value in criteria.items():
+            values = self._columns[name]
+            if isinstance(value, (list, tuple, set, frozenset)):
+                result &= np.isin(values, list(value))
+            else:
+                result &= values == value
+        return result
+
+    def filter(self, **criteria) -> 'InsightTable':
+        return self.where(self.mask(**criteria))
+
+    def count(self, **criteria) -> int:
+        return int(self.mask(**criteria).sum())
+
+    def contains_mask(self, name: str, substring: str, case: bool = False) -> np.ndarray:
+        values = self._columns[name].astype(str)
+        if not case:
+            return np.char.find(np.char.lower(values), substring.lower()) >= 0
+        return np.char.find(values, substring) >= 0
+
+    def search(self, term: str, columns: Sequence[str] = ('style_number', 'description')) -> 'InsightTable':
+        """Case-insensitive substring search across text columns"""
+        if not term or not self._length:
+            return self
+        result = np.zeros(self._length, dtype=bool)
+        for name in columns:
+            result |= self.contains_mask(name, term)
+        return self.where(result)
+
+    def unique(self, name: str) -> List[Any]:
+        return [v.item() if isinstance(v, np.generic) else v for v in pd.unique(self._columns[name])]
+
+    def sort_by(self, keys: Union[str, Sequence[str]], ascending: Union[bool, Sequence[bool]] = True) -> 'InsightTable':
+        """Stable multi-key sort; the first key is the primary one"""
+        if isinstance(keys, str):
+            keys = [keys]
+        if isinstance(ascending, bool):
+            ascending = [ascending] * len(keys)
+
+        order = self.sort_order(keys, ascending)
+        return self.take(order)
+
+    def sort_order(self, keys: Sequence[str], ascending: Sequence[bool]) -> np.ndarray:
+        # np.lexsort treats the last key as primary
+        sort_keys = []
+        for name, asc in zip(reversed(keys), reversed(ascending)):
+            values = self._sortable(name)
+            sort_keys.append(values if asc else -values)
+        return np.lexsort(sort_keys) if sort_keys else np.arange(self._length)
+
+    def sort_by_priority(self) -> 'InsightTable':
+        """Default ordering: highest reorder priority first, then highest recent demand"""
+        return self.sort_by(['priority_rank', 'recent_daily_demand'], ascending=[False, False])
+
+    def top_k(self, name: str, k: int, largest: bool = True) -> 'InsightTable':
+        """Return the k rows with the largest (or smallest) values of a column, in order"""
+        if k <= 0 or not self._length:
+            return self.take(np.empty(0, dtype=np.int64))
+        values = self._sortable(name)
+        if not largest:
+            values = -values
+        if k < self._length:
+            candidates = np.argpartition(-values, k - 1)[:k]
+        else:
+            candidates = np.arange(self._length)
+        order = candidates[np.argsort(-values[candidates], kind='stable')]
+        return self.take(order)
+
+    def _sortable(self, name: str) -> np.ndarray:
+        if name == 'priority_rank':
+            return self.priority_rank()
+        values = self._columns[name]
+        if values.dtype == object:
+            # Rank strings so they can be negated for descending order
+            _, codes = np.unique(values.astype(str), return_inverse=True)
+            return codes.astype(np.float64)
+        return values.astype(np.float64)
+
+    def priority_rank(self) -> np.ndarray:
+        ranks = np.zeros(self._length, dtype=np.float64)
+        priorities = self._columns['reorder_priority']
+        for label, rank in PRIORITY_RANK.items():
+            ranks[priorities == label] = rank
+        return ranks
+
+    def sum(self, name: str, mask: Optional[np.ndarray] = None) -> float:
+        values = self._columns[name]
+        if mask is not None:
+            values = values[mask]
+        total = values.sum() if len(values) else 0
+        return total.item() if isinstance(total, np.generic) else total
+
+    def mean(self, name: str, mask: Optional[np.ndarray] = None, default: float = 0.0) -> float:
+        values = self._columns[name]
+        if mask is not None:
+            values = values[mask]
+        return float(values.mean()) if len(values) else default
+
+
+def _to_array(name: str, values) -> np.ndarray:
+    dtype = NUMERIC_DTYPES.get(name)
+    if dtype is not None:
+        return np.asarray(values, dtype=dtype)
+    array = np.empty(len(values), dtype=object)
+    array[:] = [str(v) for v in values]
+    return array
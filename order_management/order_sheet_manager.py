@@ -21,22 +21,6 @@ class OrderSheetManager:
         """Add a variant to the order sheet"""
         brand = variant_demand.vendor
         
-        # Create order sheet item
-        order_item = OrderSheetItem(
-            product_id=variant_demand.product_id,
-            variant_id=variant_demand.variant_id,
-            style_number=variant_demand.style_number,
-            description=variant_demand.description,
-            color=variant_demand.color,
-            size=variant_demand.size,
-            vendor=brand,
-            qty_hilo=variant_demand.store_recommended.get('Hilo', 0),
-            qty_kailua=variant_demand.store_recommended.get('Kailua', 0),
-            qty_kapaa=variant_demand.store_recommended.get('Kapaa', 0),
-            qty_wailuku=variant_demand.store_recommended.get('Wailuku', 0),
-            priority='HIGH' if variant_demand.priority_score >= 70 else 'MEDIUM' if variant_demand.priority_score >= 40 else 'LOW'
-        )
-        
         if brand not in self.selected_items:
             self.selected_items[brand] = []
         
@@ -46,16 +30,58 @@ class OrderSheetManager:
         
         if existing_item:
             # Update existing item
-            existing_item.qty_hilo = variant_demand.store_recommended.get('Hilo', 0)
-            existing_item.qty_kailua = variant_demand.store_recommended.get('Kailua', 0)
-            existing_item.qty_kapaa = variant_demand.store_recommended.get('Kapaa', 0)
-            existing_item.qty_wailuku = variant_demand.store_recommended.get('Wailuku', 0)
+            self._apply_store_quantities(existing_item, variant_demand)
             return False  # Item updated
         else:
             # Add new item
-            self.selected_items[brand].append(order_item)
+            self.selected_items[brand].append(self._build_order_item(variant_demand))
             return True  # Item added
     
+    def add_variants_to_order(self, variant_demands: List[VariantDemand]) -> int:
+        """Add many variants at once; returns the number of new items (existing ones are updated)"""
+        added_count = 0
+        existing_by_brand: Dict[str, Dict[int, OrderSheetItem]] = {}
+        
+        for variant_demand in variant_demands:
+            brand = variant_demand.vendor
+            if brand not in existing_by_brand:
+                self.selected_items.setdefault(brand, [])
+                existing_by_brand[brand] = {item.variant_id: item for item in self.selected_items[brand]}
+            existing = existing_by_brand[brand]
+            
+            existing_item = existing.get(variant_demand.variant_id)
+            if existing_item:
+                self._apply_store_quantities(existing_item, variant_demand)
+            else:
+                order_item = self._build_order_item(variant_demand)
+                self.selected_items[brand].append(order_item)
+                existing[variant_demand.variant_id] = order_item
+                added_count += 1
+        
+        return added_count
+    
+    def _build_order_item(self, variant_demand: VariantDemand) -> OrderSheetItem:
+        return OrderSheetItem(
+            product_id=variant_demand.product_id,
+            variant_id=variant_demand.variant_id,
+            style_number=variant_demand.style_number,
+            description=variant_demand.description,
+            color=variant_demand.color,
+            size=variant_demand.size,
+            vendor=variant_demand.vendor,
+            qty_hilo=variant_demand.store_recommended.get('Hilo', 0),
+            qty_kailua=variant_demand.store_recommended.get('Kailua', 0),
+            qty_kapaa=variant_demand.store_recommended.get('Kapaa', 0),
+            qty_wailuku=variant_demand.store_recommended.get('Wailuku', 0),
+            priority='HIGH' if variant_demand.priority_score >= 70 else 'MEDIUM' if variant_demand.priority_score >= 40 else 'LOW'
+        )
+    
+    def _apply_store_quantities(self, item: OrderSheetItem, variant_demand: VariantDemand):
+        item.qty_hilo = variant_demand.store_recommended.get('Hilo', 0)
+        item.qty_kailua = variant_demand.store_recommended.get('Kailua', 0)
+        item.qty_kapaa = variant_demand.store_recommended.get('Kapaa', 0)
+        item.qty_wailuku = variant_demand.store_recommended.get('Wailuku', 0)
+    
     def remove_variant_from_order(self, variant_id: int, brand: str) -> bool:
         """Remove a variant from the order sheet"""
         if brand in self.selected_items:
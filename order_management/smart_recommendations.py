@@ -1,234 +1,286 @@
 """Smart recommendation algorithms for order sheet generation - PRODUCTION"""
 import streamlit as st
 import pandas as pd
-from typing import Dict, List, Any
+import numpy as np
+from typing import Dict, List, Any, Optional, Sequence
 from models.data_models import OrderSheetItem, ProductInsight, VariantDemand
+from models.insight_table import InsightTable
 from order_management.order_sheet_manager import OrderSheetManager
 
+# Fallback product recommendation when no insight is available
+DEFAULT_PRODUCT_RECOMMENDATION = 20
+
+# Days of supply targeted for variants with store-level demand
+TARGET_SUPPLY_DAYS = 45
+
+
+def allocate_smart_recommendations(
+    product_ids: Sequence[int],
+    orders_df: pd.DataFrame,
+    inventory_df: pd.DataFrame,
+    location_config: Dict[int, str],
+    insights: Optional[Dict[int, Any]] = None,
+    analysis_days: int = 30
+) -> pd.DataFrame:
+    """
+    Store-level recommendations for every variant of many products at once
+
+    Returns the inventory rows of the requested products (in inventory order) with one
+    'rec_<store>' column per configured store and a 'rec_total' column.
+    """
+    insights = insights or {}
+    stores = list(location_config.values())
+
+    variants = inventory_df[inventory_df['product_id'].isin(list(product_ids))].reset_index(drop=True)
+    if variants.empty:
+        return variants
+
+    n = len(variants)
+    product_col = variants['product_id'].to_numpy()
+    variant_keys = pd.MultiIndex.from_arrays([product_col, variants['variant_id'].to_numpy()])
+
+    # Recent sales pivoted once into (product, variant) x store
+    recent_cutoff = orders_df['created_at'].max() - pd.Timedelta(days=analysis_days)
+    recent_orders = orders_df[
+        orders_df['product_id'].isin(list(product_ids)) &
+        (orders_df['created_at'] >= recent_cutoff)
+    ]
+    if recent_orders.empty:
+        sales_pivot = pd.DataFrame(index=pd.MultiIndex.from_arrays([[], []]))
+        product_sales = pd.Series(dtype=float)
+    else:
+        sales_pivot = recent_orders.groupby(['product_id', 'variant_id', 'Store Location'])['quantity'].sum().unstack(fill_value=0)
+        product_sales = recent_orders.groupby('product_id')['quantity'].sum()
+
+    sales_by_variant = sales_pivot.reindex(variant_keys).fillna(0)
+    variant_sales = sales_by_variant.sum(axis=1).to_numpy(dtype=np.float64)
+    unknown_sales = (sales_by_variant['Unknown'].to_numpy(dtype=np.float64)
+                     if 'Unknown' in sales_by_variant.columns else np.zeros(n))
+    store_sales = sales_by_variant.reindex(columns=stores, fill_value=0).to_numpy(dtype=np.float64)
+    product_total_sales = product_sales.reindex(product_col).fillna(0).to_numpy(dtype=np.float64)
+
+    inventory = (
+        variants.reindex(columns=[f'inventory_{store.lower()}' for store in stores])
+        .apply(pd.to_numeric, errors='coerce').fillna(0).to_numpy(dtype=np.float64)
+    )
+
+    # Product-level inputs broadcast to variants
+    variant_counts = variants.groupby('product_id')['product_id'].transform('size').to_numpy()
+    product_recommendation = np.array([
+        insights[pid].recommended_qty if insights.get(pid) is not None else DEFAULT_PRODUCT_RECOMMENDATION
+        for pid in product_col
+    ], dtype=np.int64)
+    priorities = np.array([getattr(insights.get(pid), 'reorder_priority', '') for pid in product_col], dtype=object)
+    trends = np.array([str(getattr(insights.get(pid), 'trend_classification', '')) for pid in product_col])
+
+    # Variant share of product sales (equal split when the product has no recent sales)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        proportion = np.where(product_total_sales > 0, variant_sales / product_total_sales, 1.0 / variant_counts)
+    base_recommendation = np.maximum(1, (product_recommendation * proportion).astype(np.int64))
+    base_col = base_recommendation[:, None]
+
+    # Case 1: every sale attributed to the 'Unknown' store - allocate inversely to inventory share
+    total_inventory = inventory.sum(axis=1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        need_factor = np.where(total_inventory > 0, np.maximum(0.1, 1 - inventory / total_inventory), 0.25)
+    unknown_alloc = np.maximum(0, (base_col * need_factor).astype(np.int64))
+    critical = np.isin(priorities, ['CRITICAL', 'HIGH'])[:, None]
+    unknown_alloc = np.where((unknown_alloc == 0) & critical & (inventory < 3), 1, unknown_alloc)
+
+    # Case 2: no recent sales for the whole product - insight-based distribution by stock level
+    per_variant = np.maximum(1, product_recommendation // np.maximum(variant_counts, 1))[:, None]
+    no_sales_alloc = np.select(
+        [inventory == 0, inventory < 3, inventory < 6],
+        [np.maximum(2, per_variant), np.maximum(1, per_variant), np.maximum(1, per_variant // 2)],
+        0
+    )
+
+    # Case 3: product sells but this variant does not - small top-up where stock is very low
+    conservative = np.maximum(1, product_recommendation // (variant_counts * 2))[:, None]
+    idle_variant_alloc = np.where(inventory < 2, np.maximum(1, conservative // 4), 0)
+
+    # Case 4: store-level demand, 45 days of supply with per-store minimums
+    store_daily = np.where(store_sales > 0, store_sales / analysis_days, 0)
+    needed = np.maximum(0, store_daily * TARGET_SUPPLY_DAYS - inventory)
+    needed = np.select(
+        [(needed > 0) & (needed < 1) & (store_daily > 0.03),
+         (needed > 0) & (needed < 2) & (store_daily > 0.1),
+         (needed > 0) & (needed < 3) & (store_daily > 0.2)],
+        [1, 2, 3], needed
+    )
+    no_store_demand = np.where((variant_sales[:, None] >= 5) & (inventory < 2), 1, 0)
+    demand_alloc = np.where(store_daily > 0, np.where(needed > 0, needed.astype(np.int64), 0), no_store_demand)
+
+    all_unknown = ((variant_sales > 0) & (unknown_sales == variant_sales))[:, None]
+    product_idle = (product_total_sales == 0)[:, None]
+    variant_idle = (variant_sales == 0)[:, None]
+    recommendations = np.select(
+        [all_unknown, product_idle, variant_idle],
+        [unknown_alloc, no_sales_alloc, idle_variant_alloc],
+        demand_alloc
+    ).astype(np.int64)
+
+    # Selling variants always get at least a minimal spread across stores
+    undistributed = (recommendations.sum(axis=1) == 0) & (variant_sales > 0)
+    if undistributed.any():
+        recommendations[undistributed] = np.maximum(1, base_recommendation[undistributed] // 4)[:, None]
+
+    # Trend multipliers from the product insight
+    trend_multiplier = np.where(
+        np.isin(trends, ['Trending Up', 'Hot Seller']), 1.3,
+        np.where(np.char.find(trends, 'Declining') >= 0, 0.7, 1.0)
+    )
+    recommendations = (recommendations * trend_multiplier[:, None]).astype(np.int64)
+
+    for i, store in enumerate(stores):
+        variants[f'rec_{store.lower()}'] = recommendations[:, i]
+    variants['rec_total'] = recommendations.sum(axis=1)
+    return variants
+
+
+def _allocations_to_variant_demands(
+    allocations: pd.DataFrame,
+    location_config: Dict[int, str],
+    style_numbers: Dict[int, str],
+    brands: Dict[int, str]
+) -> List[VariantDemand]:
+    """VariantDemand objects for every allocated variant with a positive total"""
+    stores = list(location_config.values())
+    rec_columns = [f'rec_{store.lower()}' for store in stores]
+
+    selected = allocations[allocations['rec_total'] > 0]
+    variant_demands = []
+    for record, quantities in zip(selected.to_dict('records'), selected[rec_columns].to_numpy().tolist()):
+        product_id = int(record['product_id'])
+        variant_title = record.get('variant_title', 'Unknown')
+
+        # Parse color and size from variant_title or individual fields
+        color = str(record.get('color', ''))
+        size = str(record.get('size', ''))
+        if not color and not size:
+            if ' / ' in str(variant_title):
+                color, size = str(variant_title).split(' / ', 1)
+            else:
+                color = str(variant_title)
+                size = ''
+
+        variant_demands.append(VariantDemand(
+            product_id=product_id,
+            variant_id=int(record['variant_id']),
+            style_number=style_numbers.get(product_id, str(record.get('style_number', ''))),
+            description=str(record.get('description', '')),
+            vendor=brands.get(product_id, 'Unknown'),
+            variant_title=str(variant_title),
+            color=color,
+            size=size,
+            store_demand={},  # Not needed for order creation
+            store_inventory={},  # Not needed for order creation
+            store_recommended=dict(zip(stores, quantities)),  # THE KEY - actual smart recommendations
+            total_recommended=int(record['rec_total']),
+            total_current_inventory=0,  # Not needed for order creation
+            total_daily_demand=0,  # Not needed for order creation
+            priority_score=0  # Not needed for order creation
+        ))
+    return variant_demands
+
+
 def add_all_variants_for_product_with_smart_recommendations(
-    product_id: int, 
+    product_id: int,
     style_number: str,
     brand: str,
-    orders_df: pd.DataFrame, 
-    inventory_df: pd.DataFrame, 
-    location_config: Dict[int, str], 
+    orders_df: pd.DataFrame,
+    inventory_df: pd.DataFrame,
+    location_config: Dict[int, str],
     order_manager: OrderSheetManager,
     product_insight: ProductInsight = None,
     analysis_days: int = 30
 ) -> int:
     """Add all variants with SMART store-specific recommendations based on actual demand patterns"""
-    
+
     # Get all variants for this product
-    product_variants = inventory_df[inventory_df['product_id'] == product_id]
-    
-    if product_variants.empty:
+    variant_count = int((inventory_df['product_id'] == product_id).sum())
+
+    if variant_count == 0:
         st.warning(f"No variants found for {style_number}")
         return 0
-    
-    # Calculate recent demand patterns by variant and store
-    recent_cutoff = orders_df['created_at'].max() - pd.Timedelta(days=analysis_days)
-    recent_orders = orders_df[
-        (orders_df['product_id'] == product_id) & 
-        (orders_df['created_at'] >= recent_cutoff)
-    ]
-    
+
     # Get total product recommendation from insight
-    total_product_recommendation = product_insight.recommended_qty if product_insight else 20
-    total_product_recent_sales = recent_orders['quantity'].sum()
-    
+    total_product_recommendation = product_insight.recommended_qty if product_insight else DEFAULT_PRODUCT_RECOMMENDATION
+
     # Show progress info
-    st.info(f"🔍 Analyzing {len(product_variants)} variants for {style_number} (Total recommendation: {total_product_recommendation} units)")
-    
-    added_count = 0
-    
-    for _, variant_row in product_variants.iterrows():
-        variant_id = variant_row['variant_id']
-        variant_title = variant_row.get('variant_title', 'Unknown')
-        
-        # Calculate variant-specific demand by store
-        variant_orders = recent_orders[recent_orders['variant_id'] == variant_id]
-        variant_recent_sales = variant_orders['quantity'].sum()
-        
-        # Determine variant proportion
-        if total_product_recent_sales > 0:
-            variant_proportion = variant_recent_sales / total_product_recent_sales
-        else:
-            # If no recent sales, distribute equally among variants
-            variant_proportion = 1.0 / len(product_variants)
-        
-        # Calculate base recommendation for this variant
-        variant_base_recommendation = max(1, int(total_product_recommendation * variant_proportion))
-        
-        # Calculate store-specific recommendations
-        store_recommendations = {}
-        
-        # Check for Unknown store issue and handle it
-        unknown_store_sales = 0
-        if not variant_orders.empty and 'Unknown' in variant_orders['Store Location'].values:
-            unknown_store_sales = variant_orders[variant_orders['Store Location'] == 'Unknown']['quantity'].sum()
-        
-        # If all sales are attributed to "Unknown" store, distribute intelligently
-        if variant_recent_sales > 0 and unknown_store_sales == variant_recent_sales:
-            # All sales are "Unknown" - distribute based on inventory levels and business logic
-            total_current_inventory = sum([variant_row.get(f'inventory_{store.lower()}', 0) for store in location_config.values()])
-            
-            for store_name in location_config.values():
-                inventory_col = f'inventory_{store_name.lower()}'
-                current_inventory = variant_row.get(inventory_col, 0) or 0
-                
-                # Calculate need based on inventory levels and total recommendation
-                if total_current_inventory > 0:
-                    inventory_proportion = current_inventory / total_current_inventory
-                    # Invert proportion so low inventory gets more allocation
-                    need_factor = max(0.1, 1 - inventory_proportion)
-                else:
-                    need_factor = 0.25  # Equal distribution if no inventory data
-                
-                # Calculate recommendation based on product total and need factor
-                recommended = max(0, int(variant_base_recommendation * need_factor))
-                
-                # Apply minimum logic for critical items
-                if recommended == 0 and product_insight and product_insight.reorder_priority in ['CRITICAL', 'HIGH']:
-                    if current_inventory < 3:
-                        recommended = 1  # Minimum 1 for critical items with low inventory
-                
-                store_recommendations[store_name] = recommended
-        
-        else:
-            # Normal logic: Use store-specific sales data
-            if total_product_recent_sales == 0:
-                # No recent sales for entire product - use insight-based distribution
-                base_per_variant = max(1, total_product_recommendation // max(len(product_variants), 1))
-                
-                for store_name in location_config.values():
-                    inventory_col = f'inventory_{store_name.lower()}'
-                    current_inventory = variant_row.get(inventory_col, 0) or 0
-                    
-                    # Smart allocation based on inventory levels
-                    if current_inventory == 0:
-                        store_recommendations[store_name] = max(2, base_per_variant)
-                    elif current_inventory < 3:
-                        store_recommendations[store_name] = max(1, base_per_variant)
-                    elif current_inventory < 6:
-                        store_recommendations[store_name] = max(1, base_per_variant // 2)
-                    else:
-                        store_recommendations[store_name] = 0
-                        
-            elif variant_recent_sales == 0:
-                # This specific variant has no recent sales, but product overall does
-                conservative_allocation = max(1, total_product_recommendation // (len(product_variants) * 2))
-                
-                for store_name in location_config.values():
-                    inventory_col = f'inventory_{store_name.lower()}'
-                    current_inventory = variant_row.get(inventory_col, 0) or 0
-                    
-                    # Only allocate if inventory is very low
-                    if current_inventory < 2:
-                        store_recommendations[store_name] = max(1, conservative_allocation // 4)
-                    else:
-                        store_recommendations[store_name] = 0
-            
-            else:
-                # Normal demand-based logic
-                for store_name in location_config.values():
-                    # Get current inventory for this store
-                    inventory_col = f'inventory_{store_name.lower()}'
-                    current_inventory = variant_row.get(inventory_col, 0) or 0
-                    
-                    # Get recent sales for this store and variant
-                    store_variant_orders = variant_orders[variant_orders['Store Location'] == store_name]
-                    store_recent_sales = store_variant_orders['quantity'].sum()
-                    store_daily_demand = store_recent_sales / analysis_days if store_recent_sales > 0 else 0
-                    
-                    if store_daily_demand > 0:
-                        # Calculate target inventory (45 days supply for active variants)
-                        target_inventory = store_daily_demand * 45
-                        needed = max(0, target_inventory - current_inventory)
-                        
-                        # Apply minimum order logic
-                        if needed > 0:
-                            if needed < 1 and store_daily_demand > 0.03:
-                                needed = 1
-                            elif needed < 2 and store_daily_demand > 0.1:
-                                needed = 2
-                            elif needed < 3 and store_daily_demand > 0.2:
-                                needed = 3
-                            
-                            store_recommendations[store_name] = int(needed)
-                        else:
-                            store_recommendations[store_name] = 0
-                    else:
-                        # No recent demand at this store for this variant
-                        if variant_recent_sales >= 5 and current_inventory < 2:
-                            store_recommendations[store_name] = 1
-                        else:
-                            store_recommendations[store_name] = 0
-        
-        # Ensure at least some distribution if variant has overall demand
-        total_distributed = sum(store_recommendations.values())
-        if total_distributed == 0 and variant_recent_sales > 0:
-            # If no distribution but variant sells, give minimal equal distribution
-            per_store = max(1, variant_base_recommendation // 4)
-            store_recommendations = {store: per_store for store in location_config.values()}
-        
-        # Apply trend multipliers from product insight
-        if product_insight:
-            if product_insight.trend_classification in ['Trending Up', 'Hot Seller']:
-                multiplier = 1.3
-                for store in store_recommendations:
-                    store_recommendations[store] = int(store_recommendations[store] * multiplier)
-            elif 'Declining' in product_insight.trend_classification:
-                multiplier = 0.7
-                for store in store_recommendations:
-                    store_recommendations[store] = int(store_recommendations[store] * multiplier)
-        
-        # Create and add to order manager
-        final_total = sum(store_recommendations.values())
-        
-        if final_total > 0:
-            # Parse color and size from variant_title or individual fields
-            color = str(variant_row.get('color', ''))
-            size = str(variant_row.get('size', ''))
-            if not color and not size:
-                # Try to parse from variant_title
-                if ' / ' in str(variant_title):
-                    color, size = str(variant_title).split(' / ', 1)
-                else:
-                    color = str(variant_title)
-                    size = ''
-            
-            # Create VariantDemand object with proper recommendations
-            variant_demand = VariantDemand(
-                product_id=int(product_id),
-                variant_id=int(variant_row['variant_id']),
-                style_number=style_number,
-                description=str(variant_row.get('description', '')),
-                vendor=brand,
-                variant_title=str(variant_title),
-                color=color,
-                size=size,
-                store_demand={},  # Not needed for order creation
-                store_inventory={},  # Not needed for order creation
-                store_recommended=store_recommendations,  # THE KEY - actual smart recommendations
-                total_recommended=final_total,
-                total_current_inventory=0,  # Not needed for order creation
-                total_daily_demand=0,  # Not needed for order creation
-                priority_score=0  # Not needed for order creation
-            )
-            
-            # Use the order manager's add method
-            was_added = order_manager.add_variant_to_order(variant_demand)
-            if was_added:
-                added_count += 1
-    
+    st.info(f"🔍 Analyzing {variant_count} variants for {style_number} (Total recommendation: {total_product_recommendation} units)")
+
+    allocations = allocate_smart_recommendations(
+        [product_id], orders_df, inventory_df, location_config,
+        {product_id: product_insight}, analysis_days
+    )
+    variant_demands = _allocations_to_variant_demands(
+        allocations, location_config, {int(product_id): style_number}, {int(product_id): brand}
+    )
+    added_count = order_manager.add_variants_to_order(variant_demands)
+
     # Show final summary
     total_recommended_units = sum([
-        item.qty_hilo + item.qty_kailua + item.qty_kapaa + item.qty_wailuku 
+        item.qty_hilo + item.qty_kailua + item.qty_kapaa + item.qty_wailuku
         for item in order_manager.selected_items.get(brand, [])
         if item.product_id == product_id
     ])
-    
+
     st.success(f"✅ Smart recommendations complete!")
     st.info(f"📦 {style_number}: Added {added_count} variants with {total_recommended_units} total units")
-    
-    return added_count
\ No newline at end of file
+
+    return added_count
+
+
+def add_products_with_smart_recommendations(
+    insights,
+    orders_df: pd.DataFrame,
+    inventory_df: pd.DataFrame,
+    location_config: Dict[int, str],
+    order_manager: OrderSheetManager,
+    analysis_days: int = 30
+) -> Dict[str, int]:
+    """Add all variants of many products in one allocation pass"""
+
+    table = InsightTable.coerce(insights)
+    if not table:
+        return {'products': 0, 'variants_added': 0, 'total_units': 0}
+
+    insights_by_product = {int(insight.product_id): insight for insight in table}
+    allocations = allocate_smart_recommendations(
+        list(insights_by_product), orders_df, inventory_df, location_config,
+        insights_by_product, analysis_days
+    )
+    if allocations.empty:
+        return {'products': len(insights_by_product), 'variants_added': 0, 'total_units': 0}
+
+    variant_demands = _allocations_to_variant_demands(
+        allocations, location_config,
+        {pid: insight.style_number for pid, insight in insights_by_product.items()},
+        {pid: insight.vendor for pid, insight in insights_by_product.items()}
+    )
+    added_count = order_manager.add_variants_to_order(variant_demands)
+
+    return {
+        'products': len(insights_by_product),
+        'variants_added': added_count,
+        'total_units': int(sum(v.total_recommended for v in variant_demands))
+    }
+
+
+def add_priority_products_for_vendor(
+    vendor: str,
+    insights,
+    orders_df: pd.DataFrame,
+    inventory_df: pd.DataFrame,
+    location_config: Dict[int, str],
+    order_manager: OrderSheetManager,
+    priorities: Sequence[str] = ('CRITICAL',),
+    analysis_days: int = 30
+) -> Dict[str, int]:
+    """Bulk add every product of a vendor with the given reorder priorities (e.g. all CRITICAL)"""
+
+    selected = InsightTable.coerce(insights).filter(vendor=vendor, reorder_priority=list(priorities))
+    return add_products_with_smart_recommendations(
+        selected, orders_df, inventory_df, location_config, order_manager, analysis_days
+    )
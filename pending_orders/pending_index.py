@@ -0,0 +1,211 @@
+"""
+Pending Order Lookup Index
+Pre-aggregates pending orders once per analysis so per-product lookups are O(1)
+"""
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from models.data_models import PendingOrder
+
+# Expected-arrival buckets in days from the index reference date: (label, upper bound inclusive)
+ARRIVAL_BUCKETS = [
+    ('overdue', -1),
+    ('0-7 days', 7),
+    ('8-14 days', 14),
+    ('15-30 days', 30),
+    ('31+ days', None),
+]
+
+# Inventory columns tried, in order, when matching a pending style to inventory rows
+INVENTORY_STYLE_COLUMNS = ['style_number', 'Style Number', 'sku', 'product_id']
+
+
+class PendingInventoryIndex:
+    """Hash index of pending order quantities by style, variant, location and arrival bucket"""
+
+    def __init__(self, as_of: Optional[datetime] = None):
+        self.as_of = as_of or datetime.now()
+        self.by_style: Dict[str, int] = defaultdict(int)
+        self.by_style_variant: Dict[Tuple[str, str], int] = defaultdict(int)
+        self.by_style_location: Dict[Tuple[str, str], int] = defaultdict(int)
+        self.by_variant_location: Dict[Tuple[str, str], Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.arrivals_by_style: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.by_brand: Dict[str, int] = defaultdict(int)
+        self.by_location: Dict[str, int] = defaultdict(int)
+        self.total_units = 0
+        self.total_lines = 0
+
+    @classmethod
+    def build(cls, pending_orders: Iterable[Union[PendingOrder, Dict[str, Any]]],
+              as_of: Optional[datetime] = None) -> 'PendingInventoryIndex':
+        """Build the index from PendingOrder objects or their session-state dict form"""
+        index = cls(as_of)
+        for order in pending_orders or []:
+            try:
+                index._add(order)
+            except (KeyError, TypeError, ValueError):
+                continue
+        return index
+
+    def _add(self, order: Union[PendingOrder, Dict[str, Any]]):
+        if isinstance(order, dict):
+            style = str(order.get('style_number', ''))
+            variant = str(order.get('variant_info', '') or '')
+            location = str(order.get('location_name', '') or '')
+            brand = str(order.get('brand', '') or '') or 'Unknown'
+            quantity = int(order.get('quantity', 0))
+            arrival = order.get('expected_arrival')
+            if isinstance(arrival, str):
+                arrival = datetime.fromisoformat(arrival)
+        else:
+            style = str(order.style_number)
+            variant = str(order.variant_info or '')
+            location = str(order.location_name or '')
+            brand = order.brand or 'Unknown'
+            quantity = int(order.quantity)
+            arrival = order.expected_arrival
+
+        self.by_style[style] += quantity
+        self.by_style_variant[(style, variant)] += quantity
+        self.by_style_location[(style, location)] += quantity
+        self.by_variant_location[(style, variant)][location] += quantity
+        self.arrivals_by_style[style][self._arrival_bucket(arrival)] += quantity
+        self.by_brand[brand] += quantity
+        self.by_location[location] += quantity
+        self.total_units += quantity
+        self.total_lines += 1
+
+    def _arrival_bucket(self, arrival: Optional[datetime]) -> str:
+        if arrival is None:
+            return ARRIVAL_BUCKETS[-1][0]
+        days_out = (arrival - self.as_of).days
+        for label, upper in ARRIVAL_BUCKETS:
+            if upper is None or days_out <= upper:
+                return label
+        return ARRIVAL_BUCKETS[-1][0]
+
+    def __len__(self) -> int:
+        return self.total_lines
+
+    def __bool__(self) -> bool:
+        return self.total_lines > 0
+
+    def styles(self) -> List[str]:
+        return list(self.by_style.keys())
+
+    def quantity_for_style(self, style_number) -> int:
+        return self.by_style.get(str(style_number), 0)
+
+    def quantity_for_variant(self, style_number, variant_info: str) -> int:
+        return self.by_style_variant.get((str(style_number), str(variant_info or '')), 0)
+
+    def quantity_for_location(self, style_number, location_name: str) -> int:
+        return self.by_style_location.get((str(style_number), str(location_name)), 0)
+
+    def arrivals_for_style(self, style_number, within_days: Optional[int] = None) -> Any:
+        """
+        Pending quantities for a style grouped by expected-arrival bucket.
+        With within_days, returns the units expected to land within that many days instead.
+        """
+        buckets = self.arrivals_by_style.get(str(style_number), {})
+        if within_days is None:
+            return dict(buckets)
+        total = 0
+        for label, upper in ARRIVAL_BUCKETS:
+            if upper is not None and upper <= within_days:
+                total += buckets.get(label, 0)
+        return total
+
+    def variant_location_quantities(self) -> Dict[Tuple[str, str], Dict[str, int]]:
+        """{(style_number, variant_info): {location_name: quantity}} for inventory integration"""
+        return {key: dict(locations) for key, locations in self.by_variant_location.items()}
+
+    def inventory_additions(
+        self,
+        inventory_df: pd.DataFrame,
+        style_columns: List[str] = INVENTORY_STYLE_COLUMNS,
+        keep_style_matches: bool = True,
+        log: Optional[Callable[[str], None]] = None
+    ) -> Tuple[Dict[str, np.ndarray], np.ndarray, int, int]:
+        """
+        Pending units to add to each inventory row, per 'inventory_<location>' column.
+
+        Styles match exactly on the first style column that has them; a variant then narrows
+        the rows by case-insensitive substring match on variant_title. With keep_style_matches,
+        a variant that matches no row falls back to all rows of the style.
+
+        Returns (additions by column, total additions per row, style groups matched, column updates)
+        """
+        n_rows = len(inventory_df)
+
+        style_lookups = {}
+        for style_col in style_columns:
+            if style_col in inventory_df.columns:
+                style_values = inventory_df[style_col].astype(str).to_numpy()
+                style_lookups[style_col] = pd.Series(style_values).groupby(style_values).indices
+
+        variant_titles = None
+        if 'variant_title' in inventory_df.columns:
+            variant_titles = np.char.lower(inventory_df['variant_title'].astype(str).to_numpy().astype(str))
+
+        additions: Dict[str, np.ndarray] = {}
+        total_additions = np.zeros(n_rows, dtype=np.int64)
+        matches_found = 0
+        updates_made = 0
+
+        for (style_number, variant_info), location_quantities in self.variant_location_quantities().items():
+            positions = None
+            for style_col, lookup in style_lookups.items():
+                positions = lookup.get(str(style_number))
+                if positions is not None and len(positions):
+                    if log:
+                        log(f"  ✅ Found {len(positions)} matches using column '{style_col}'")
+                    break
+
+            if positions is None or not len(positions):
+                if log:
+                    log(f"  ❌ No inventory matches found for style {style_number}")
+                continue
+
+            matches_found += 1
+
+            if variant_info and variant_info.strip() and variant_titles is not None:
+                variant_positions = positions[np.char.find(variant_titles[positions], variant_info.lower()) >= 0]
+                if len(variant_positions) or not keep_style_matches:
+                    positions = variant_positions
+                    if log and len(positions):
+                        log(f"    ✅ Narrowed to {len(positions)} variant matches")
+
+            if not len(positions):
+                continue
+
+            for location_name, qty_to_add in location_quantities.items():
+                inventory_col = f'inventory_{location_name.lower()}'
+                if inventory_col not in inventory_df.columns:
+                    if log:
+                        log(f"    ❌ Column '{inventory_col}' not found in inventory")
+                    continue
+
+                if inventory_col not in additions:
+                    additions[inventory_col] = np.zeros(n_rows, dtype=np.int64)
+                additions[inventory_col][positions] += qty_to_add
+                total_additions[positions] += qty_to_add
+                updates_made += len(positions)
+
+                if log:
+                    log(f"    📈 {inventory_col}: +{qty_to_add} on {len(positions)} rows")
+
+        return additions, total_additions, matches_found, updates_made
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'total_units': self.total_units,
+            'total_styles': len(self.by_style),
+            'by_brand': dict(self.by_brand),
+            'by_location': dict(self.by_location),
+            'total_orders': self.total_lines
+        }
@@ -12,6 +12,7 @@ import logging
 from openpyxl import load_workbook
 
 from models.data_models import PendingOrder, UserProfile
+from pending_orders.pending_index import INVENTORY_STYLE_COLUMNS, PendingInventoryIndex
 
 logger = logging.getLogger(__name__)
 
@@ -377,49 +378,58 @@ class PendingOrderManager:
         if not pending_orders:
             return current_inventory_df.copy()
         
-        # Create a copy of current inventory
+        # Pre-aggregate pending orders once, then apply them column-wise
+        pending_index = PendingInventoryIndex.build(pending_orders)
+        projected_inventory_df, _, _ = self._apply_pending_index(
+            current_inventory_df, pending_index, style_columns=['style_number'], keep_style_matches=False
+        )
+        
+        return projected_inventory_df
+    
+    def project_inventory(self, current_inventory_df: pd.DataFrame, pending_orders: List) -> pd.DataFrame:
+        """
+        NEW: Same matching as debug_inventory_integration without any UI output (headless runs).
+        Accepts PendingOrder objects or their session-state dict form.
+        """
+        if current_inventory_df.empty or not pending_orders:
+            return current_inventory_df.copy()
+
+        projected_inventory_df, _, _ = self._apply_pending_index(
+            current_inventory_df,
+            PendingInventoryIndex.build(pending_orders),
+            style_columns=INVENTORY_STYLE_COLUMNS,
+            keep_style_matches=True
+        )
+        return projected_inventory_df
+
+    def _apply_pending_index(
+        self,
+        current_inventory_df: pd.DataFrame,
+        pending_index: PendingInventoryIndex,
+        style_columns: List[str],
+        keep_style_matches: bool,
+        log=None
+    ) -> Tuple[pd.DataFrame, int, int]:
+        """
+        Add indexed pending quantities to the per-location inventory columns
+        (matching in PendingInventoryIndex.inventory_additions).
+        
+        Returns (projected_inventory_df, style_groups_matched, column_updates_made)
+        """
+        
         projected_inventory_df = current_inventory_df.copy()
+        additions, total_additions, matches_found, updates_made = pending_index.inventory_additions(
+            projected_inventory_df, style_columns, keep_style_matches, log
+        )
         
-        # Group pending orders by style number and variant
-        pending_grouped = {}
-        for order in pending_orders:
-            key = (order.style_number, order.variant_info)
-            if key not in pending_grouped:
-                pending_grouped[key] = {}
-            
-            location_name = order.location_name
-            if location_name not in pending_grouped[key]:
-                pending_grouped[key][location_name] = 0
-            
-            pending_grouped[key][location_name] += order.quantity
+        # Apply all additions in one pass per column
+        for inventory_col, added in additions.items():
+            projected_inventory_df[inventory_col] = projected_inventory_df[inventory_col].fillna(0) + added
         
-        # Apply pending orders to inventory
-        for (style_number, variant_info), location_quantities in pending_grouped.items():
-            # Find matching inventory rows
-            matching_rows = projected_inventory_df[
-                projected_inventory_df['style_number'].astype(str) == str(style_number)
-            ]
-            
-            if variant_info:
-                # Try to match variant info
-                matching_rows = matching_rows[
-                    matching_rows['variant_title'].astype(str).str.contains(variant_info, case=False, na=False)
-                ]
-            
-            if not matching_rows.empty:
-                # Update inventory for matching rows
-                for idx in matching_rows.index:
-                    for location_name, qty_to_add in location_quantities.items():
-                        inventory_col = f'inventory_{location_name.lower()}'
-                        if inventory_col in projected_inventory_df.columns:
-                            current_val = projected_inventory_df.loc[idx, inventory_col] or 0
-                            projected_inventory_df.loc[idx, inventory_col] = current_val + qty_to_add
-                            
-                            # Update total inventory
-                            total_current = projected_inventory_df.loc[idx, 'total_inventory'] or 0
-                            projected_inventory_df.loc[idx, 'total_inventory'] = total_current + qty_to_add
+        if additions and 'total_inventory' in projected_inventory_df.columns:
+            projected_inventory_df['total_inventory'] = projected_inventory_df['total_inventory'].fillna(0) + total_additions
         
-        return projected_inventory_df
+        return projected_inventory_df, matches_found, updates_made
     
     def save_pending_orders(self, pending_orders: List[PendingOrder]) -> bool:
         """Save pending orders to session state for persistence during analysis"""
@@ -557,36 +567,7 @@ class PendingOrderManager:
         if not pending_orders:
             return {}
         
-        # Group by brand and location
-        by_brand = {}
-        by_location = {}
-        total_units = 0
-        total_styles = set()
-        
-        for order in pending_orders:
-            # By brand
-            brand = order.brand or 'Unknown'
-            if brand not in by_brand:
-                by_brand[brand] = 0
-            by_brand[brand] += order.quantity
-            
-            # By location
-            location = order.location_name
-            if location not in by_location:
-                by_location[location] = 0
-            by_location[location] += order.quantity
-            
-            # Totals
-            total_units += order.quantity
-            total_styles.add(order.style_number)
-        
-        return {
-            'total_units': total_units,
-            'total_styles': len(total_styles),
-            'by_brand': by_brand,
-            'by_location': by_location,
-            'total_orders': len(pending_orders)
-        }
+        return PendingInventoryIndex.build(pending_orders).summary()
     
     def debug_inventory_integration(self, current_inventory_df: pd.DataFrame, pending_orders: List[PendingOrder]) -> pd.DataFrame:
         """DEBUG: Detailed logging of inventory integration process"""
@@ -619,93 +600,21 @@ class PendingOrderManager:
         for i, order in enumerate(pending_orders[:5]):  # Show first 5
             st.write(f"  {i+1}. Style: {order.style_number}, Location: {order.location_name}, Qty: {order.quantity}")
         
-        # Create a copy of current inventory
-        projected_inventory_df = current_inventory_df.copy()
-        
         # Group pending orders by style number and variant
-        pending_grouped = {}
         st.write("🔄 **Grouping Pending Orders...**")
-        
-        for order in pending_orders:
-            key = (order.style_number, order.variant_info)
-            if key not in pending_grouped:
-                pending_grouped[key] = {}
-            
-            location_name = order.location_name
-            if location_name not in pending_grouped[key]:
-                pending_grouped[key][location_name] = 0
-            
-            pending_grouped[key][location_name] += order.quantity
-            st.write(f"  Added: {order.style_number} → {location_name}: {order.quantity} units")
+        pending_index = PendingInventoryIndex.build(pending_orders)
+        pending_grouped = pending_index.variant_location_quantities()
         
         st.write(f"📊 **Grouped into {len(pending_grouped)} unique style/variant combinations**")
         
         # Apply pending orders to inventory
-        matches_found = 0
-        updates_made = 0
-        
-        for (style_number, variant_info), location_quantities in pending_grouped.items():
-            st.write(f"🔍 **Processing: {style_number} ({variant_info})**")
-            
-            # Find matching inventory rows
-            # Try different column names for style number
-            style_cols_to_try = ['style_number', 'Style Number', 'sku', 'product_id']
-            matching_rows = pd.DataFrame()
-            
-            for style_col in style_cols_to_try:
-                if style_col in projected_inventory_df.columns:
-                    matching_rows = projected_inventory_df[
-                        projected_inventory_df[style_col].astype(str) == str(style_number)
-                    ]
-                    if not matching_rows.empty:
-                        st.write(f"  ✅ Found {len(matching_rows)} matches using column '{style_col}'")
-                        break
-            
-            if matching_rows.empty:
-                st.write(f"  ❌ No inventory matches found for style {style_number}")
-                # Show what styles ARE in inventory for comparison
-                if 'style_number' in projected_inventory_df.columns:
-                    available_styles = projected_inventory_df['style_number'].unique()[:10]
-                    st.write(f"  📋 Available styles (first 10): {list(available_styles)}")
-                continue
-            
-            matches_found += 1
-            
-            # If variant info exists, try to narrow down further
-            if variant_info and variant_info.strip():
-                st.write(f"  🎯 Filtering by variant: '{variant_info}'")
-                variant_cols_to_try = ['variant_title', 'variant_info', 'color_size']
-                
-                for variant_col in variant_cols_to_try:
-                    if variant_col in projected_inventory_df.columns:
-                        variant_matches = matching_rows[
-                            matching_rows[variant_col].astype(str).str.contains(variant_info, case=False, na=False)
-                        ]
-                        if not variant_matches.empty:
-                            matching_rows = variant_matches
-                            st.write(f"    ✅ Narrowed to {len(matching_rows)} variant matches")
-                            break
-            
-            # Update inventory for matching rows
-            for idx in matching_rows.index:
-                for location_name, qty_to_add in location_quantities.items():
-                    inventory_col = f'inventory_{location_name.lower()}'
-                    
-                    if inventory_col in projected_inventory_df.columns:
-                        current_val = projected_inventory_df.loc[idx, inventory_col] or 0
-                        new_val = current_val + qty_to_add
-                        projected_inventory_df.loc[idx, inventory_col] = new_val
-                        
-                        st.write(f"    📈 {inventory_col}: {current_val} → {new_val} (+{qty_to_add})")
-                        updates_made += 1
-                        
-                        # Update total inventory
-                        if 'total_inventory' in projected_inventory_df.columns:
-                            total_current = projected_inventory_df.loc[idx, 'total_inventory'] or 0
-                            projected_inventory_df.loc[idx, 'total_inventory'] = total_current + qty_to_add
-                            st.write(f"    📈 total_inventory: {total_current} → {total_current + qty_to_add}")
-                    else:
-                        st.write(f"    ❌ Column '{inventory_col}' not found in inventory")
+        projected_inventory_df, matches_found, updates_made = self._apply_pending_index(
+            current_inventory_df,
+            pending_index,
+            style_columns=INVENTORY_STYLE_COLUMNS,
+            keep_style_matches=True,
+            log=st.write
+        )
         
         st.write(f"✅ **Integration Summary:**")
         st.write(f"  📊 Pending order groups processed: {len(pending_grouped)}")
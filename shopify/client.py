@@ -1,7 +1,6 @@
 """Enhanced Shopify API client with optimized data fetching"""
 import requests
 import pandas as pd
-import streamlit as st
 import time
 import logging
 from datetime import datetime, timedelta
@@ -16,6 +15,7 @@ logger = logging.getLogger(__name__)
 
 from database.database_manager import DatabaseManager
 from utils.data_processing import process_orders_fast, create_inventory_dataframe_fast
+from utils import progress
 
 # SHOPIFY CLIENT
 class AdvancedShopifyClient:
@@ -42,6 +42,19 @@ class AdvancedShopifyClient:
         self.request_delay = 0.08  # Faster requests (12.5 per second)
         self.cache = {}  # Simple caching
         self.lock = threading.Lock()
+        
+        # NEW: Running request totals for pipeline tracing (worker threads included)
+        self.request_stats = {'api_calls': 0, 'bytes_downloaded': 0}
+        self.session.hooks['response'].append(self._count_response)
+    
+    def _count_response(self, response, *args, **kwargs):
+        with self.lock:
+            self.request_stats['api_calls'] += 1
+            self.request_stats['bytes_downloaded'] += len(response.content or b'')
+    
+    def request_totals(self) -> Dict[str, int]:
+        with self.lock:
+            return dict(self.request_stats)
     
     def _make_request_fast(self, url: str, cache_key: str = None) -> Optional[Dict]:
         """Ultra-fast request method with minimal overhead - from basic.txt"""
@@ -84,13 +97,13 @@ class AdvancedShopifyClient:
         if use_cache and user_id and db_manager:
             cached_historical = db_manager.load_cached_historical_data(user_id, historical_years)
             if cached_historical is not None and not cached_historical.empty:
-                st.success(f"📚 Using cached {historical_years}-year historical data")
+                progress.success(f"📚 Using cached {historical_years}-year historical data")
         
         # Calculate historical period based on selected years
         historical_start = recent_end - timedelta(days=365 * historical_years)
         
         # Simple progress indicator
-        with st.spinner(f"Fetching comprehensive order data ({historical_years} years historical)..."):
+        with progress.stage(f"Fetching comprehensive order data ({historical_years} years historical)..."):
             # Step 1: Fetch recent orders
             recent_orders = self._fetch_orders_period(recent_start, recent_end, "recent")
             
@@ -108,11 +121,46 @@ class AdvancedShopifyClient:
                         36727390261: 'Kapaa', 1223720986: 'Wailuku'
                     })
                     if db_manager.cache_historical_data(user_id, historical_df, historical_start, recent_start, historical_years):
-                        st.success(f"💾 {historical_years}-year historical data cached successfully")
+                        progress.success(f"💾 {historical_years}-year historical data cached successfully")
         
-        st.success(f"✅ Data collection complete: {len(recent_orders)} recent orders, {len(historical_orders)} {historical_years}-year historical orders")
+        progress.success(f"✅ Data collection complete: {len(recent_orders)} recent orders, {len(historical_orders)} {historical_years}-year historical orders")
         return recent_orders, historical_orders
     
+    def sync_historical_orders(self, user_id: str, db_manager: DatabaseManager, historical_start: datetime,
+                               historical_end: datetime, historical_years: int,
+                               location_config: Dict[int, str]) -> Optional[pd.DataFrame]:
+        """
+        NEW: Bring the cached historical orders up to historical_end by fetching only the gap
+        since the cache was written, then re-cache the window. Without a cache, fetch it all.
+        """
+        cached = db_manager.load_cached_historical_data(user_id, historical_years)
+        periods = [p for p in db_manager.get_available_cache_periods(user_id)
+                   if p.get('cache_period_years') == historical_years and p.get('data_end_date')]
+        cached_end = max(pd.to_datetime(p['data_end_date']) for p in periods) if periods else None
+
+        if cached is not None and not cached.empty and cached_end is not None:
+            if cached_end >= pd.Timestamp(historical_end).normalize():
+                return cached
+            gap_orders = self._fetch_orders_period(cached_end.to_pydatetime(), historical_end, "incremental historical")
+            frames = [cached, process_orders_fast(gap_orders, location_config)]
+        else:
+            frames = [process_orders_fast(self._fetch_orders_period(historical_start, historical_end, f"{historical_years}-year historical"),
+                                          location_config)]
+
+        frames = [df for df in frames if not df.empty]
+        if not frames:
+            return cached
+        historical_df = pd.concat(frames, ignore_index=True)
+        key_columns = [c for c in ('order_id', 'product_id', 'variant_id') if c in historical_df.columns]
+        historical_df = historical_df.drop_duplicates(subset=key_columns or None, keep='last')
+        created_at = pd.to_datetime(historical_df['created_at'], utc=True).dt.tz_localize(None)
+        historical_df = historical_df[(created_at >= pd.Timestamp(historical_start)) & (created_at <= pd.Timestamp(historical_end))]
+        historical_df = historical_df.reset_index(drop=True)
+
+        if db_manager.cache_historical_data(user_id, historical_df, historical_start, historical_end, historical_years):
+            progress.success(f"💾 {historical_years}-year historical data synced ({len(historical_df)} order lines)")
+        return historical_df
+
     def _fetch_orders_period(self, start_date: datetime, end_date: datetime, period_name: str) -> List[Dict]:
         """Fetch orders for a specific period - optimized from basic.txt"""
         orders = []
@@ -128,12 +176,11 @@ class AdvancedShopifyClient:
         
         url = f'{self.base_url}/orders.json?{urlencode(params)}'
         
-        progress_bar = st.progress(0)
-        status_text = st.empty()
+        progress_bar = progress.progress_bar()
         page = 1
         
         while url and page < 150:  # Safety limit
-            status_text.text(f"📦 Fetching {period_name} orders - page {page}...")
+            progress_bar.update(min(1.0, page * 0.01), f"📦 Fetching {period_name} orders - page {page}...")
             
             cache_key = f"{period_name}_orders_{hash(url)}"
             data = self._make_request_fast(url, cache_key)
@@ -163,17 +210,13 @@ class AdvancedShopifyClient:
                 break
             
             page += 1
-            progress_bar.progress(min(1.0, page * 0.01))
             
             # Show progress update every 10 pages
             if page % 10 == 0:
-                status_text.text(f"📦 {period_name} orders: {len(orders)} fetched...")
+                progress_bar.update(min(1.0, page * 0.01), f"📦 {period_name} orders: {len(orders)} fetched...")
         
-        progress_bar.progress(1.0)
-        status_text.text(f"✅ {period_name} orders: {len(orders)} total")
-        time.sleep(0.5)
-        progress_bar.empty()
-        status_text.empty()
+        progress_bar.update(1.0, f"✅ {period_name} orders: {len(orders)} total")
+        progress_bar.close()
         
         return orders
 
@@ -183,24 +226,18 @@ class AdvancedShopifyClient:
         This is the key fix that was missing in attempt1.txt
         """
         
-        progress_container = st.container()
-        with progress_container:
-            overall_progress = st.progress(0)
-            status_text = st.empty()
+        overall_progress = progress.progress_bar()
         
         # Step 1: Fetch variants using the EXACT working method from basic.txt
-        status_text.text("🏷️ Fetching product variants...")
+        overall_progress.update(0.0, "🏷️ Fetching product variants...")
         variants_data = self._fetch_all_variants_ultra_fast_WORKING(product_ids)
-        overall_progress.progress(0.6)
         
         # Step 2: Fetch inventory using the EXACT working method from basic.txt
-        status_text.text("📦 Fetching inventory levels...")
+        overall_progress.update(0.6, "📦 Fetching inventory levels...")
         inventory_levels = self._fetch_inventory_ultra_fast_WORKING(variants_data)
-        overall_progress.progress(1.0)
         
-        status_text.text("✅ Variants and inventory complete!")
-        time.sleep(0.5)
-        progress_container.empty()
+        overall_progress.update(1.0, "✅ Variants and inventory complete!")
+        overall_progress.close()
         
         return variants_data, inventory_levels
 
@@ -211,7 +248,7 @@ class AdvancedShopifyClient:
         # Convert to set for O(1) lookup
         target_products = set(product_ids)
         
-        st.info("🚀 Fetching variants using proven working method...")
+        progress.info("🚀 Fetching variants using proven working method...")
         
         # STRATEGY 1: Try bulk fetch first (fastest possible) - EXACT from basic.txt
         try:
@@ -223,13 +260,13 @@ class AdvancedShopifyClient:
                     if product_id in target_products:
                         variants_data[product_id].append(variant)
                 
-                st.success(f"⚡ Bulk fetched {sum(len(v) for v in variants_data.values())} variants!")
+                progress.success(f"⚡ Bulk fetched {sum(len(v) for v in variants_data.values())} variants!")
                 return variants_data
         except Exception as e:
             logger.warning(f"Bulk fetch failed: {e}")
         
         # STRATEGY 2: Individual fetching - EXACT from basic.txt
-        st.info("⚡ Using individual product fetching...")
+        progress.info("⚡ Using individual product fetching...")
         
         def fetch_product_variants(product_id: int) -> Tuple[int, List[Dict]]:
             """Fetch variants for one product - minimal fields only"""
@@ -307,10 +344,10 @@ class AdvancedShopifyClient:
                     item_to_variant[inv_item_id] = variant['id']
         
         if not inventory_items:
-            st.warning("⚠️ No inventory items found - variants may not have inventory_item_id")
+            progress.warning("⚠️ No inventory items found - variants may not have inventory_item_id")
             return variant_inventory_levels
         
-        st.info(f"📦 Found {len(inventory_items)} inventory items to fetch")
+        progress.info(f"📦 Found {len(inventory_items)} inventory items to fetch")
         
         # Same batching logic as basic.txt
         batch_size = 40
@@ -335,7 +372,7 @@ class AdvancedShopifyClient:
                 data = self._make_request_fast(f"{url}?{urlencode(params)}", cache_key)
                 
                 if data and 'inventory_levels' in data:
-                    st.info(f"📦 Batch {batch_num}: Got {len(data['inventory_levels'])} inventory records")
+                    logger.debug(f"Inventory batch {batch_num}: {len(data['inventory_levels'])} records")
                     
                     for item in data['inventory_levels']:
                         inv_item_id = item.get('inventory_item_id')
@@ -348,13 +385,12 @@ class AdvancedShopifyClient:
                                 batch_results[variant_id] = {}
                             batch_results[variant_id][location_id] = available
                 else:
-                    st.warning(f"⚠️ Batch {batch_num}: No inventory data returned")
+                    logger.warning(f"Inventory batch {batch_num}: no inventory data returned")
                 
                 return batch_results
                 
             except Exception as e:
                 logger.error(f"Inventory batch {batch_num} failed: {e}")
-                st.error(f"❌ Batch {batch_num} failed: {e}")
                 return {}
         
         # Same parallel processing as basic.txt
@@ -381,7 +417,7 @@ class AdvancedShopifyClient:
                 except Exception as e:
                     logger.error(f"Inventory batch failed: {e}")
         
-        st.success(f"⚡ Fetched inventory for {len(variant_inventory_levels)} variants")
+        progress.success(f"⚡ Fetched inventory for {len(variant_inventory_levels)} variants")
         return variant_inventory_levels
 
 
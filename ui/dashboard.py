@@ -8,6 +8,7 @@ import plotly.express as px
 import plotly.graph_objects as go
 from typing import Dict, List, Any
 from models.data_models import ProductInsight, SeasonalInsight, UserProfile
+from models.insight_table import InsightTable
 from ui.components import (
     sharpstock_section_header,
     sharpstock_metric_card,
@@ -186,18 +187,21 @@ def display_reorder_recommendations_native(insights: List[ProductInsight]):
             key="reorder_timing_filter"
         )
     
+    insights = InsightTable.coerce(insights)
+    
     with col3:
-        vendor_options = ["All"] + sorted(list(set([i.vendor for i in insights if i.vendor != 'Unknown'])))
+        vendor_options = ["All"] + sorted(v for v in insights.unique('vendor') if v != 'Unknown')
         vendor_filter = st.selectbox("🏷️ Brand Filter", vendor_options, key="reorder_vendor_filter")
     
-    # Apply filters
-    filtered_insights = insights
+    # Apply filters in a single vectorized pass
+    criteria = {}
     if priority_filter != "All":
-        filtered_insights = [i for i in filtered_insights if i.reorder_priority == priority_filter]
+        criteria['reorder_priority'] = priority_filter
     if timing_filter != "All":
-        filtered_insights = [i for i in filtered_insights if i.reorder_timing == timing_filter]
+        criteria['reorder_timing'] = timing_filter
     if vendor_filter != "All":
-        filtered_insights = [i for i in filtered_insights if i.vendor == vendor_filter]
+        criteria['vendor'] = vendor_filter
+    filtered_insights = insights.filter(**criteria)
     
     if not filtered_insights:
         sharpstock_info_box("No products match the selected filters.", "warning")
@@ -7,7 +7,9 @@ import pandas as pd
 import plotly.express as px
 from datetime import datetime, timedelta
 from typing import Dict, List, Any
+import logging
 
+from models.insight_table import InsightTable
 from ui.components import (
     sharpstock_page_header,
     sharpstock_metric_card_enhanced,
@@ -18,6 +20,8 @@ from ui.components import (
     sharpstock_enhanced_table
 )
 
+logger = logging.getLogger(__name__)
+
 def display_dashboard_page():
     """Main dashboard/landing page"""
     
@@ -40,6 +44,7 @@ def display_dashboard_page():
     
     # Main dashboard content
     _show_dashboard_overview()
+    _show_roi_section()
     _show_best_sellers_section()
     _show_quick_actions()
 
@@ -125,14 +130,14 @@ def _show_dashboard_overview():
     """Show main dashboard overview with key metrics"""
     
     # Get analysis data
-    insights = st.session_state.get('insights', [])
+    insights = InsightTable.coerce(st.session_state.get('insights', []))
     summary_metrics = st.session_state.get('summary_metrics', {})
     recent_orders_df = st.session_state.get('recent_orders_df', pd.DataFrame())
     
     # Calculate key metrics
-    critical_alerts = len([i for i in insights if hasattr(i, 'reorder_priority') and i.reorder_priority == 'CRITICAL'])
-    high_alerts = len([i for i in insights if hasattr(i, 'reorder_priority') and i.reorder_priority == 'HIGH'])
-    trending_up = len([i for i in insights if hasattr(i, 'trend_classification') and 'Trending' in i.trend_classification])
+    critical_alerts = insights.count(reorder_priority='CRITICAL')
+    high_alerts = insights.count(reorder_priority='HIGH')
+    trending_up = int(insights.contains_mask('trend_classification', 'Trending', case=True).sum())
     
     total_revenue = summary_metrics.get('total_recent_revenue', 0)
     revenue_growth = summary_metrics.get('revenue_growth_rate', 0)
@@ -192,6 +197,43 @@ def _show_dashboard_overview():
             "warning"
         )
 
+def _show_roi_section():
+    """NEW: Savings estimate computed live from the current insights and inventory"""
+    
+    insights = InsightTable.coerce(st.session_state.get('insights', []))
+    if len(insights) == 0:
+        return
+    
+    try:
+        from analysis.roi_calculator import ROICalculator
+        roi = ROICalculator().roi_from_insights(
+            insights,
+            st.session_state.get('inventory_df', pd.DataFrame()),
+            st.session_state.get('recent_orders_df', pd.DataFrame())
+        )
+    except Exception as e:
+        logger.warning(f"ROI estimate unavailable: {e}")
+        return
+    
+    totals = roi['totals']
+    with st.expander(f"💵 Estimated Annual Savings: ${totals.get('total_savings', 0):,.0f}", expanded=False):
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Holding Cost Savings", f"${totals.get('annual_holding_savings', 0):,.0f}",
+                    f"${totals.get('excess_value', 0):,.0f} excess stock")
+        col2.metric("Stockout Margin Protected", f"${totals.get('gross_margin_saved', 0):,.0f}",
+                    f"{totals.get('units_prevented', 0):,.0f} units")
+        col3.metric("Inventory Value", f"${totals.get('inventory_value', 0):,.0f}")
+        
+        money = ['annual_holding_savings', 'gross_margin_saved', 'total_savings']
+        tab_vendor, tab_store = st.tabs(["By Vendor", "By Store"])
+        with tab_vendor:
+            sharpstock_enhanced_table(roi['by_vendor'].head(20)[['vendor'] + money].round(0), "Savings by Vendor")
+        with tab_store:
+            if not roi['by_store'].empty:
+                sharpstock_enhanced_table(roi['by_store'][['store'] + money].round(0), "Savings by Store")
+            else:
+                st.info("No per-store inventory available")
+
 def _show_best_sellers_section():
     """Enhanced best sellers section"""
     
@@ -394,16 +436,16 @@ def _show_quick_actions():
 def get_dashboard_insights_summary():
     """Get summary of insights for dashboard display"""
     
-    insights = st.session_state.get('insights', [])
+    insights = InsightTable.coerce(st.session_state.get('insights', []))
     if not insights:
         return {}
     
     return {
         'total_products': len(insights),
-        'critical_alerts': len([i for i in insights if i.reorder_priority == 'CRITICAL']),
-        'high_alerts': len([i for i in insights if i.reorder_priority == 'HIGH']),
-        'trending_up': len([i for i in insights if 'Trending' in i.trend_classification]),
-        'declining': len([i for i in insights if 'Declining' in i.trend_classification]),
-        'avg_daily_demand': sum([i.recent_daily_demand for i in insights]) / len(insights),
-        'total_inventory': sum([i.current_inventory for i in insights])
+        'critical_alerts': insights.count(reorder_priority='CRITICAL'),
+        'high_alerts': insights.count(reorder_priority='HIGH'),
+        'trending_up': int(insights.contains_mask('trend_classification', 'Trending', case=True).sum()),
+        'declining': int(insights.contains_mask('trend_classification', 'Declining', case=True).sum()),
+        'avg_daily_demand': insights.mean('recent_daily_demand'),
+        'total_inventory': insights.sum('current_inventory')
     }
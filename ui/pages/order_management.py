@@ -8,6 +8,7 @@ from datetime import datetime
 from typing import List, Dict, Any
 
 from models.data_models import ProductInsight, OrderSheetItem
+from models.insight_table import InsightTable
 from ui.components import (
     sharpstock_page_header,
     sharpstock_metric_card_enhanced,
@@ -79,7 +80,7 @@ def _show_brand_analysis(brand: str, insights: List[ProductInsight], orders_df:
     """Show analysis for selected brand"""
     
     # Filter insights for selected brand
-    brand_insights = [i for i in insights if i.vendor == brand]
+    brand_insights = InsightTable.coerce(insights).filter(vendor=brand)
     
     if not brand_insights:
         sharpstock_alert_banner(f"No products found for {brand}", "warning")
@@ -93,17 +94,17 @@ def _show_brand_analysis(brand: str, insights: List[ProductInsight], orders_df:
     _show_reorder_candidates(brand, brand_insights, orders_df, inventory_df, location_config, order_manager)
     _show_current_order_sheet(brand, order_manager, location_config)
 
-def _show_brand_metrics(brand: str, brand_insights: List[ProductInsight]):
+def _show_brand_metrics(brand: str, brand_insights: InsightTable):
     """Show key metrics for the selected brand"""
     
     total_products = len(brand_insights)
-    critical_alerts = len([i for i in brand_insights if i.reorder_priority == 'CRITICAL'])
-    high_alerts = len([i for i in brand_insights if i.reorder_priority == 'HIGH'])
-    medium_alerts = len([i for i in brand_insights if i.reorder_priority == 'MEDIUM'])
+    critical_alerts = brand_insights.count(reorder_priority='CRITICAL')
+    high_alerts = brand_insights.count(reorder_priority='HIGH')
+    medium_alerts = brand_insights.count(reorder_priority='MEDIUM')
     
-    trending_up = len([i for i in brand_insights if 'Trending' in i.trend_classification])
-    total_recommended = sum([i.recommended_qty for i in brand_insights if i.reorder_priority in ['CRITICAL', 'HIGH', 'MEDIUM']])
-    total_current_inventory = sum([i.current_inventory for i in brand_insights])
+    trending_up = int(brand_insights.contains_mask('trend_classification', 'Trending', case=True).sum())
+    total_recommended = brand_insights.sum('recommended_qty', brand_insights.mask(reorder_priority=['CRITICAL', 'HIGH', 'MEDIUM']))
+    total_current_inventory = brand_insights.sum('current_inventory')
     
     col1, col2, col3, col4 = st.columns(4)
     
@@ -144,14 +145,14 @@ def _show_brand_metrics(brand: str, brand_insights: List[ProductInsight]):
             "success"
         )
 
-def _show_reorder_candidates(brand: str, brand_insights: List[ProductInsight], orders_df: pd.DataFrame,
+def _show_reorder_candidates(brand: str, brand_insights: InsightTable, orders_df: pd.DataFrame,
                            inventory_df: pd.DataFrame, location_config: Dict[int, str], order_manager):
     """Show products that need reordering for this brand"""
     
     st.markdown("### 🎯 Reorder Candidates")
     
     # Filter for products that need reordering
-    reorder_candidates = [i for i in brand_insights if i.reorder_priority in ['CRITICAL', 'HIGH', 'MEDIUM']]
+    reorder_candidates = brand_insights.filter(reorder_priority=['CRITICAL', 'HIGH', 'MEDIUM'])
     
     if not reorder_candidates:
         sharpstock_alert_banner(f"No products currently need reordering for {brand}", "success")
@@ -183,29 +184,44 @@ def _show_reorder_candidates(brand: str, brand_insights: List[ProductInsight], o
         )
     
     # Apply filters
-    filtered_candidates = reorder_candidates
+    criteria = {}
     if priority_filter != "All":
-        filtered_candidates = [i for i in filtered_candidates if i.reorder_priority == priority_filter]
+        criteria['reorder_priority'] = priority_filter
     if timing_filter != "All":
-        filtered_candidates = [i for i in filtered_candidates if i.reorder_timing == timing_filter]
+        criteria['reorder_timing'] = timing_filter
+    filtered_candidates = reorder_candidates.filter(**criteria)
     
     # Apply sorting
     if sort_by == "Priority":
-        priority_order = {'CRITICAL': 0, 'HIGH': 1, 'MEDIUM': 2, 'LOW': 3}
-        filtered_candidates.sort(key=lambda x: priority_order.get(x.reorder_priority, 4))
+        filtered_candidates = filtered_candidates.sort_by('priority_rank', ascending=False)
     elif sort_by == "Daily Demand":
-        filtered_candidates.sort(key=lambda x: x.recent_daily_demand, reverse=True)
+        filtered_candidates = filtered_candidates.sort_by('recent_daily_demand', ascending=False)
     elif sort_by == "Recommended Qty":
-        filtered_candidates.sort(key=lambda x: x.recommended_qty, reverse=True)
+        filtered_candidates = filtered_candidates.sort_by('recommended_qty', ascending=False)
     elif sort_by == "Style Number":
-        filtered_candidates.sort(key=lambda x: x.style_number)
+        filtered_candidates = filtered_candidates.sort_by('style_number')
     
     if not filtered_candidates:
         sharpstock_alert_banner("No products match the selected filters", "info")
         return
     
     st.markdown(f"**📋 {len(filtered_candidates)} products need reordering:**")
-    
+
+    # NEW: Bulk add every CRITICAL product for this brand in one allocation pass
+    critical_count = reorder_candidates.count(reorder_priority='CRITICAL')
+    if critical_count and st.button(f"🔴 Add All CRITICAL ({critical_count})", key=f"add_all_critical_{brand}"):
+        from order_management.smart_recommendations import add_priority_products_for_vendor
+
+        with st.spinner(f"🧠 Allocating {critical_count} CRITICAL products for {brand}..."):
+            result = add_priority_products_for_vendor(
+                brand, brand_insights, orders_df, inventory_df, location_config, order_manager
+            )
+        if result['variants_added'] > 0:
+            st.success(f"✅ Added {result['variants_added']} variants across {result['products']} products ({result['total_units']} total units)")
+            st.rerun()
+        else:
+            st.warning("⚠️ No variants found or already added")
+
     # Display products with enhanced interface
     for idx, insight in enumerate(filtered_candidates[:20]):  # Limit to 20 for performance
         _display_reorder_candidate(insight, idx, orders_df, inventory_df, location_config, order_manager, brand)
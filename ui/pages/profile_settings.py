@@ -179,7 +179,10 @@ def _handle_store_config_save(db_manager: DatabaseManager, user_id: str, profile
                 location_config=location_config,
                 default_lead_time=default_lead_time,
                 created_at=profile.created_at if profile else datetime.now(),
-                last_cache_update=profile.last_cache_update if profile else None
+                last_cache_update=profile.last_cache_update if profile else None,
+                vendor_service_levels=getattr(profile, 'vendor_service_levels', {}) if profile else {},
+                cluster_service_levels=getattr(profile, 'cluster_service_levels', {}) if profile else {},
+                cluster_forecast_models=getattr(profile, 'cluster_forecast_models', {}) if profile else {}
             )
             
             if db_manager.save_user_profile(new_profile):
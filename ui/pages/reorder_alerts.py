@@ -7,6 +7,8 @@ import pandas as pd
 from typing import List, Dict, Any
 
 from models.data_models import ProductInsight
+from models.insight_table import InsightTable
+from utils.stage_cache import session_data_version
 from ui.components import (
     sharpstock_page_header,
     sharpstock_metric_card_enhanced,
@@ -24,13 +26,13 @@ def display_reorder_alerts_page():
         show_back_button=True
     )
     
-    insights = st.session_state.get('insights', [])
+    insights = InsightTable.coerce(st.session_state.get('insights', []))
     if not insights:
         sharpstock_alert_banner("No analysis data available. Please run analysis first.", "warning")
         return
     
     # Filter for alerts only
-    alerts = [i for i in insights if i.reorder_priority in ['CRITICAL', 'HIGH']]
+    alerts = insights.filter(reorder_priority=['CRITICAL', 'HIGH'])
     
     if not alerts:
         _show_no_alerts()
@@ -41,6 +43,9 @@ def display_reorder_alerts_page():
     
     # Show alert categories
     _show_alert_categories(alerts)
+    
+    # NEW: Probabilistic stockout risk for the alerted products
+    _show_stockout_simulation(alerts)
 
 def _show_no_alerts():
     """Show when there are no alerts"""
@@ -57,8 +62,8 @@ def _show_no_alerts():
         """, unsafe_allow_html=True)
     
     # Show medium priority items if any
-    insights = st.session_state.get('insights', [])
-    medium_priority = [i for i in insights if i.reorder_priority == 'MEDIUM']
+    insights = InsightTable.coerce(st.session_state.get('insights', []))
+    medium_priority = insights.filter(reorder_priority='MEDIUM')
     
     if medium_priority:
         st.markdown("---")
@@ -67,16 +72,16 @@ def _show_no_alerts():
         
         _display_alert_list(medium_priority[:10], show_actions=False)
 
-def _show_alerts_overview(alerts: List[ProductInsight]):
+def _show_alerts_overview(alerts: InsightTable):
     """Show overview metrics for alerts"""
     
-    critical_alerts = [i for i in alerts if i.reorder_priority == 'CRITICAL']
-    high_alerts = [i for i in alerts if i.reorder_priority == 'HIGH']
+    critical_alerts = alerts.filter(reorder_priority='CRITICAL')
+    high_alerts = alerts.filter(reorder_priority='HIGH')
     
     # Calculate totals
-    total_recommended_qty = sum([i.recommended_qty for i in alerts])
-    total_current_inventory = sum([i.current_inventory for i in alerts])
-    avg_days_stockout = sum([i.days_until_stockout for i in alerts if i.days_until_stockout < 999]) / max(len([i for i in alerts if i.days_until_stockout < 999]), 1)
+    total_recommended_qty = alerts.sum('recommended_qty')
+    total_current_inventory = alerts.sum('current_inventory')
+    avg_days_stockout = alerts.mean('days_until_stockout', alerts.column('days_until_stockout') < 999)
     
     # Metrics
     col1, col2, col3, col4 = st.columns(4)
@@ -124,11 +129,11 @@ def _show_alerts_overview(alerts: List[ProductInsight]):
             "error"
         )
 
-def _show_alert_categories(alerts: List[ProductInsight]):
+def _show_alert_categories(alerts: InsightTable):
     """Show alerts organized by priority"""
     
-    critical_alerts = [i for i in alerts if i.reorder_priority == 'CRITICAL']
-    high_alerts = [i for i in alerts if i.reorder_priority == 'HIGH']
+    critical_alerts = alerts.filter(reorder_priority='CRITICAL')
+    high_alerts = alerts.filter(reorder_priority='HIGH')
     
     # Tabs for different priority levels
     if critical_alerts:
@@ -152,7 +157,75 @@ def _show_alert_categories(alerts: List[ProductInsight]):
         st.caption("These products should be ordered soon")
         _display_alert_list(high_alerts, priority="HIGH")
 
-def _display_alert_list(alerts: List[ProductInsight], priority: str = "", show_actions: bool = True):
+STOCKOUT_SIMULATION_KEY = 'stockout_simulation'
+
+def _show_stockout_simulation(alerts: InsightTable):
+    """Monte Carlo stockout risk over each product's replenishment lead time"""
+    
+    st.markdown("### 🎲 Stockout Risk Simulation")
+    st.caption("Simulates demand paths with uncertain lead times and pending arrivals to estimate stockout probability and fill rate.")
+    
+    n_paths = st.select_slider("Simulated paths per product", options=[500, 1000, 2000, 5000], value=1000,
+                               key="stockout_sim_paths")
+    includes_pending = bool(st.session_state.get('analysis_includes_pending', False))
+    sim_key = (session_data_version(st.session_state, st.session_state.get('recent_orders_df'),
+                                    st.session_state.get('inventory_df')),
+               len(alerts), n_paths, includes_pending)
+    cached = st.session_state.get(STOCKOUT_SIMULATION_KEY)
+    
+    if st.button("▶️ Run Simulation", key="run_stockout_simulation"):
+        with st.spinner(f"Simulating {n_paths:,} demand paths for {len(alerts)} products..."):
+            try:
+                from analysis.stockout_simulation import StockoutSimulator
+                
+                user_profile = st.session_state.get('user_profile')
+                pending_orders = []
+                projected_inventory_df = None
+                if includes_pending:
+                    # The analysis inventory already holds these lots; simulate them as arrivals instead
+                    pending_orders = st.session_state.get('pending_orders', [])
+                    projected_inventory_df = st.session_state.get('inventory_df')
+                
+                result = StockoutSimulator(n_paths=n_paths, seed=0).simulate_products(
+                    alerts,
+                    st.session_state.get('recent_orders_df', pd.DataFrame()),
+                    pending_orders,
+                    st.session_state.get('brand_lead_times', {}),
+                    getattr(user_profile, 'default_lead_time', 14) or 14,
+                    projected_inventory_df=projected_inventory_df
+                )
+                cached = {'key': sim_key, 'result': result}
+                st.session_state[STOCKOUT_SIMULATION_KEY] = cached
+            except Exception as e:
+                st.error(f"❌ Stockout simulation failed: {e}")
+                return
+    
+    if not cached or cached.get('key') != sim_key or cached['result'].empty:
+        return
+    
+    result = cached['result'].sort_values('stockout_probability', ascending=False)
+    at_risk = result[result['stockout_probability'] >= 0.5]
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        sharpstock_metric_card_enhanced("Likely Stockouts", str(len(at_risk)), "≥50% probability before restock", "🎯", "error")
+    with col2:
+        sharpstock_metric_card_enhanced("Avg Fill Rate", f"{result['fill_rate_mean'].mean():.1%}", "Across simulated paths", "📈", "primary")
+    with col3:
+        sharpstock_metric_card_enhanced("Expected Lost Units", f"{result['expected_units_short'].sum():,.0f}", "Before replenishment arrives", "📉", "warning")
+    
+    display = result.assign(
+        stockout_probability=(result['stockout_probability'] * 100).round(1),
+        fill_rate_p05=(result['fill_rate_p05'] * 100).round(1),
+        fill_rate_mean=(result['fill_rate_mean'] * 100).round(1),
+        expected_units_short=result['expected_units_short'].round(1)
+    )[['style_number', 'vendor', 'days_until_stockout', 'stockout_probability', 'fill_rate_mean',
+       'fill_rate_p05', 'expected_units_short', 'median_days_to_stockout', 'lead_time_p95']]
+    display.columns = ['Style', 'Vendor', 'Days to Stockout', 'Stockout %', 'Fill Rate %',
+                       'Fill Rate P5 %', 'Expected Units Short', 'Median Days to Stockout', 'Lead Time P95']
+    sharpstock_enhanced_table(display, "Simulated Stockout Risk")
+
+def _display_alert_list(alerts: InsightTable, priority: str = "", show_actions: bool = True):
     """Display list of alerts with enhanced formatting"""
     
     if not alerts:
@@ -160,7 +233,9 @@ def _display_alert_list(alerts: List[ProductInsight], priority: str = "", show_a
         return
     
     # Sort by urgency (days until stockout, then by daily demand)
-    sorted_alerts = sorted(alerts, key=lambda x: (x.days_until_stockout, -x.recent_daily_demand))
+    sorted_alerts = InsightTable.coerce(alerts).sort_by(
+        ['days_until_stockout', 'recent_daily_demand'], ascending=[True, False]
+    )
     
     # Enhanced display
     for idx, insight in enumerate(sorted_alerts):
@@ -263,12 +338,12 @@ def _add_to_order_sheet(insight: ProductInsight):
 def show_alerts_summary():
     """Show summary widget for other pages"""
     
-    insights = st.session_state.get('insights', [])
+    insights = InsightTable.coerce(st.session_state.get('insights', []))
     if not insights:
         return
     
-    critical_count = len([i for i in insights if i.reorder_priority == 'CRITICAL'])
-    high_count = len([i for i in insights if i.reorder_priority == 'HIGH'])
+    critical_count = insights.count(reorder_priority='CRITICAL')
+    high_count = insights.count(reorder_priority='HIGH')
     
     if critical_count > 0 or high_count > 0:
         col1, col2 = st.columns([3, 1])
@@ -286,25 +361,20 @@ def show_alerts_summary():
                 st.rerun()
 
 # Filter and search functions
-def filter_alerts_by_vendor(alerts: List[ProductInsight], vendor: str = "All"):
+def filter_alerts_by_vendor(alerts: InsightTable, vendor: str = "All") -> InsightTable:
     """Filter alerts by vendor"""
+    alerts = InsightTable.coerce(alerts)
     if vendor == "All":
         return alerts
-    return [i for i in alerts if i.vendor == vendor]
+    return alerts.filter(vendor=vendor)
 
-def filter_alerts_by_timing(alerts: List[ProductInsight], timing: str = "All"):
+def filter_alerts_by_timing(alerts: InsightTable, timing: str = "All") -> InsightTable:
     """Filter alerts by timing"""
+    alerts = InsightTable.coerce(alerts)
     if timing == "All":
         return alerts
-    return [i for i in alerts if i.reorder_timing == timing]
+    return alerts.filter(reorder_timing=timing)
 
-def search_alerts(alerts: List[ProductInsight], search_term: str):
+def search_alerts(alerts: InsightTable, search_term: str) -> InsightTable:
     """Search alerts by style number or description"""
-    if not search_term:
-        return alerts
-    
-    search_term = search_term.lower()
-    return [
-        i for i in alerts 
-        if search_term in i.style_number.lower() or search_term in i.description.lower()
-    ]
+    return InsightTable.coerce(alerts).search(search_term)
@@ -2,11 +2,14 @@
 SharpStock Transfer Recommendations Page
 Optimize inventory distribution across store locations
 """
+import heapq
 import streamlit as st
 import pandas as pd
+import numpy as np
 from typing import List, Dict, Any
 
 from models.data_models import ProductInsight, TransferRecommendation
+from utils.stage_cache import content_hash, session_data_version
 from ui.components import (
     sharpstock_page_header,
     sharpstock_metric_card_enhanced,
@@ -51,6 +54,9 @@ def display_transfer_recommendations_page():
         _show_transfer_analytics(recommendations, location_config)
     else:
         _show_no_transfers_needed()
+    
+    # NEW: Joint transfer / reorder / hold plan across the whole store network
+    _show_network_plan(orders_df, inventory_df, location_config, user_profile)
 
 def _show_transfer_settings():
     """Show transfer analysis settings"""
@@ -122,93 +128,143 @@ def _generate_transfer_recommendations(orders_df: pd.DataFrame, inventory_df: pd
 
 def _generate_basic_transfer_recommendations(orders_df: pd.DataFrame, inventory_df: pd.DataFrame, 
                                            location_config: Dict[int, str]) -> List[Dict]:
-    """Generate basic transfer recommendations as fallback"""
+    """
+    Generate basic transfer recommendations as fallback
+    
+    Works on a product x location days-of-stock matrix, evaluates every location pair
+    at once and keeps the top 50 with a heap. Results are cached per
+    (analysis_days, min_qty) so moving a slider back and forth does not rescan the catalog.
+    """
     
-    recommendations = []
     analysis_days = st.session_state.get('transfer_analysis_days', 30)
     min_transfer_qty = st.session_state.get('transfer_min_qty', 3)
     
+    cache = _get_basic_transfer_cache(orders_df, inventory_df, location_config)
+    result_key = (analysis_days, min_transfer_qty)
+    if result_key not in cache['results']:
+        if analysis_days not in cache['matrices']:
+            cache['matrices'][analysis_days] = _build_transfer_matrices(
+                orders_df, inventory_df, location_config, analysis_days
+            )
+        cache['results'][result_key] = _select_basic_transfers(
+            cache['matrices'][analysis_days], min_transfer_qty, BASIC_TRANSFER_LIMIT
+        )
+    
+    return list(cache['results'][result_key])
+
+# Number of basic recommendations kept
+BASIC_TRANSFER_LIMIT = 50
+BASIC_TRANSFER_CACHE_KEY = 'basic_transfer_cache'
+
+def _get_basic_transfer_cache(orders_df: pd.DataFrame, inventory_df: pd.DataFrame,
+                              location_config: Dict[int, str]) -> Dict[str, Any]:
+    """Session cache of transfer matrices and results, reset whenever the analysis data changes"""
+    
+    # FIXED: Key on the data's version - object ids are reused once the old frames are freed
+    data_key = (session_data_version(st.session_state, orders_df, inventory_df), tuple(location_config.items()))
+    cache = st.session_state.get(BASIC_TRANSFER_CACHE_KEY)
+    if not cache or cache.get('data_key') != data_key:
+        cache = {'data_key': data_key, 'matrices': {}, 'results': {}}
+        st.session_state[BASIC_TRANSFER_CACHE_KEY] = cache
+    return cache
+
+def _build_transfer_matrices(orders_df: pd.DataFrame, inventory_df: pd.DataFrame,
+                             location_config: Dict[int, str], analysis_days: int) -> Dict[str, Any]:
+    """Product x location inventory, daily demand and days-of-stock matrices"""
+    
+    locations = list(location_config.values())
+    
     # Get recent orders for demand calculation
     recent_cutoff = orders_df['created_at'].max() - pd.Timedelta(days=analysis_days)
     recent_orders = orders_df[orders_df['created_at'] >= recent_cutoff]
     
-    # Analyze each product
-    for product_id in inventory_df['product_id'].unique():
-        product_inventory = inventory_df[inventory_df['product_id'] == product_id]
-        product_orders = recent_orders[recent_orders['product_id'] == product_id]
-        
-        if product_inventory.empty:
-            continue
-        
-        # Get product info
-        product_info = product_inventory.iloc[0]
-        style_number = product_info.get('style_number', 'Unknown')
-        description = product_info.get('description', 'Unknown')
-        vendor = product_info.get('vendor', 'Unknown')
-        
-        # Calculate demand and inventory by location
-        location_data = {}
-        for location_id, location_name in location_config.items():
-            inventory_col = f'inventory_{location_name.lower()}'
-            current_inventory = product_info.get(inventory_col, 0) or 0
-            
-            # Calculate demand for this location
-            location_orders = product_orders[product_orders['Store Location'] == location_name]
-            total_sold = location_orders['quantity'].sum() if not location_orders.empty else 0
-            daily_demand = total_sold / analysis_days if total_sold > 0 else 0
-            days_of_stock = current_inventory / daily_demand if daily_demand > 0 else 999
-            
-            location_data[location_name] = {
-                'inventory': current_inventory,
-                'daily_demand': daily_demand,
-                'days_of_stock': days_of_stock,
-                'location_id': location_id
-            }
-        
-        # Find transfer opportunities
-        for from_location, from_data in location_data.items():
-            for to_location, to_data in location_data.items():
-                if from_location == to_location:
-                    continue
-                
-                # Check if transfer makes sense
-                if (from_data['days_of_stock'] > 60 and  # Source has excess
-                    to_data['days_of_stock'] < 30 and    # Destination needs stock
-                    from_data['inventory'] >= min_transfer_qty and  # Sufficient quantity
-                    to_data['daily_demand'] > 0):        # Destination has demand
-                    
-                    # Calculate transfer quantity
-                    excess_qty = max(0, from_data['inventory'] - (from_data['daily_demand'] * 45))
-                    needed_qty = max(0, (to_data['daily_demand'] * 45) - to_data['inventory'])
-                    transfer_qty = min(excess_qty, needed_qty, from_data['inventory'] // 2)
-                    
-                    if transfer_qty >= min_transfer_qty:
-                        urgency = "URGENT" if to_data['days_of_stock'] < 14 else "HIGH" if to_data['days_of_stock'] < 30 else "MEDIUM"
-                        
-                        recommendations.append({
-                            'product_id': product_id,
-                            'style_number': style_number,
-                            'description': description,
-                            'vendor': vendor,
-                            'from_location': from_location,
-                            'to_location': to_location,
-                            'from_inventory': from_data['inventory'],
-                            'to_inventory': to_data['inventory'],
-                            'from_days_stock': from_data['days_of_stock'],
-                            'to_days_stock': to_data['days_of_stock'],
-                            'transfer_qty': int(transfer_qty),
-                            'urgency': urgency,
-                            'potential_impact': transfer_qty * to_data['daily_demand'] * 30,  # 30-day impact
-                            'reasoning': f"Transfer {int(transfer_qty)} units from {from_location} ({from_data['days_of_stock']:.0f} days stock) to {to_location} ({to_data['days_of_stock']:.0f} days stock)"
-                        })
-    
-    # Sort by urgency and potential impact
-    recommendations.sort(key=lambda x: (
-        {'URGENT': 0, 'HIGH': 1, 'MEDIUM': 2, 'LOW': 3}.get(x['urgency'], 4),
-        -x['potential_impact']
-    ))
-    
-    return recommendations[:50]  # Limit to top 50 recommendations
+    # First inventory row carries each product's info and stock levels
+    products = inventory_df.drop_duplicates('product_id').reset_index(drop=True)
+    inventory = (
+        products.reindex(columns=[f'inventory_{name.lower()}' for name in locations])
+        .apply(pd.to_numeric, errors='coerce').fillna(0).to_numpy(dtype=np.float64)
+    )
+    
+    sold = (
+        recent_orders.groupby(['product_id', 'Store Location'])['quantity'].sum()
+        .unstack(fill_value=0)
+        .reindex(index=products['product_id'], columns=locations, fill_value=0)
+        .fillna(0).to_numpy(dtype=np.float64)
+    )
+    daily_demand = np.where(sold > 0, sold / analysis_days, 0.0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        days_of_stock = np.where(daily_demand > 0, inventory / daily_demand, 999.0)
+    
+    return {
+        'locations': locations,
+        'product_ids': products['product_id'].to_numpy(),
+        'style_numbers': products.get('style_number', pd.Series('Unknown', index=products.index)).to_numpy(),
+        'descriptions': products.get('description', pd.Series('Unknown', index=products.index)).to_numpy(),
+        'vendors': products.get('vendor', pd.Series('Unknown', index=products.index)).to_numpy(),
+        'inventory': inventory,
+        'daily_demand': daily_demand,
+        'days_of_stock': days_of_stock
+    }
+
+def _select_basic_transfers(matrices: Dict[str, Any], min_transfer_qty: int, limit: int) -> List[Dict]:
+    """Pairwise excess/shortage over all location pairs, top-k by urgency then impact"""
+    
+    inventory = matrices['inventory']
+    daily_demand = matrices['daily_demand']
+    days_of_stock = matrices['days_of_stock']
+    locations = matrices['locations']
+    if inventory.size == 0:
+        return []
+    
+    # Axis 1 = source location, axis 2 = destination location
+    excess = np.maximum(0, inventory - daily_demand * 45)[:, :, None]
+    needed = np.maximum(0, daily_demand * 45 - inventory)[:, None, :]
+    transfer_qty = np.minimum(np.minimum(excess, needed), np.floor_divide(inventory, 2)[:, :, None])
+    
+    candidates = (
+        (days_of_stock[:, :, None] > 60) &               # Source has excess
+        (days_of_stock[:, None, :] < 30) &               # Destination needs stock
+        (inventory[:, :, None] >= min_transfer_qty) &    # Sufficient quantity
+        (daily_demand[:, None, :] > 0) &                 # Destination has demand
+        (transfer_qty >= min_transfer_qty) &
+        ~np.eye(len(locations), dtype=bool)[None, :, :]
+    )
+    products, from_idx, to_idx = np.nonzero(candidates)
+    if len(products) == 0:
+        return []
+    
+    to_days = days_of_stock[products, to_idx]
+    quantities = transfer_qty[products, from_idx, to_idx]
+    impact = quantities * daily_demand[products, to_idx] * 30  # 30-day impact
+    urgency_rank = np.where(to_days < 14, 0, np.where(to_days < 30, 1, 2))
+    
+    # Heap top-k by urgency then impact; candidate order breaks ties as before
+    top = heapq.nsmallest(limit, range(len(products)), key=lambda k: (urgency_rank[k], -impact[k], k))
+    
+    urgency_labels = ['URGENT', 'HIGH', 'MEDIUM']
+    recommendations = []
+    for k in top:
+        p, i, j = products[k], from_idx[k], to_idx[k]
+        qty = int(quantities[k])
+        from_days = float(days_of_stock[p, i])
+        recommendations.append({
+            'product_id': matrices['product_ids'][p].item(),
+            'style_number': matrices['style_numbers'][p],
+            'description': matrices['descriptions'][p],
+            'vendor': matrices['vendors'][p],
+            'from_location': locations[i],
+            'to_location': locations[j],
+            'from_inventory': inventory[p, i].item(),
+            'to_inventory': inventory[p, j].item(),
+            'from_days_stock': from_days,
+            'to_days_stock': float(to_days[k]),
+            'transfer_qty': qty,
+            'urgency': urgency_labels[urgency_rank[k]],
+            'potential_impact': float(impact[k]),
+            'reasoning': f"Transfer {qty} units from {locations[i]} ({from_days:.0f} days stock) to {locations[j]} ({to_days[k]:.0f} days stock)"
+        })
+    
+    return recommendations
 
 def _show_transfer_overview(recommendations: List[Dict], location_config: Dict[int, str]):
     """Show transfer recommendations overview"""
@@ -470,6 +526,92 @@ def _show_transfer_analytics(recommendations: List[Dict], location_config: Dict[
         
         sharpstock_enhanced_table(brand_data, "Brand Transfer Summary")
 
+NETWORK_PLAN_KEY = 'network_plan'
+
+def _show_network_plan(orders_df: pd.DataFrame, inventory_df: pd.DataFrame,
+                       location_config: Dict[int, str], user_profile):
+    """Network-wide replenishment plan: transfer, reorder or hold for every variant and store"""
+    
+    st.markdown("### 🌐 Network Replenishment Plan")
+    st.caption("Transfers and reorders decided together to minimize holding, stockout and transfer cost across all stores.")
+    
+    analysis_days = st.session_state.get('transfer_analysis_days', 30)
+    min_transfer_qty = st.session_state.get('transfer_min_qty', 3)
+    includes_pending = bool(st.session_state.get('analysis_includes_pending', False))
+    plan_key = (session_data_version(st.session_state, orders_df, inventory_df),
+                content_hash(location_config,
+                             st.session_state.get('pending_orders', []) if includes_pending else None,
+                             st.session_state.get('brand_lead_times', {})),
+                analysis_days, min_transfer_qty, includes_pending)
+    cached = st.session_state.get(NETWORK_PLAN_KEY)
+    
+    if st.button("🧮 Build Network Plan", key="build_network_plan"):
+        with st.spinner("Optimizing replenishment across all stores..."):
+            try:
+                from analysis.network_planner import NetworkReplenishmentPlanner
+                from pending_orders.pending_index import PendingInventoryIndex
+                
+                default_lead_time = getattr(user_profile, 'default_lead_time', 14) or 14
+                planner = NetworkReplenishmentPlanner(
+                    location_config, st.session_state.get('brand_lead_times', {}), default_lead_time
+                )
+                planner.min_transfer_qty = min_transfer_qty
+                
+                pending_index = None
+                if includes_pending:
+                    pending_index = PendingInventoryIndex.build(st.session_state.get('pending_orders', []))
+                
+                # The analysis inventory is already projected with the pending orders
+                plan = planner.plan(orders_df, inventory_df, analysis_days, pending_index,
+                                    inventory_includes_pending=includes_pending)
+                cached = {'key': plan_key, 'plan': plan}
+                st.session_state[NETWORK_PLAN_KEY] = cached
+            except Exception as e:
+                st.error(f"❌ Error building network plan: {e}")
+                return
+    
+    if not cached or cached.get('key') != plan_key:
+        return
+    
+    plan = cached['plan']
+    summary = plan.get('summary', {})
+    if not summary:
+        st.warning("⚠️ Network plan could not be built for the current data.")
+        return
+    
+    plan_cost = summary['plan_cost']
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        sharpstock_metric_card_enhanced("Units Transferred", f"{summary['units_transferred']:,}", "Between stores", "🔄", "primary")
+    with col2:
+        sharpstock_metric_card_enhanced("Units Reordered", f"{summary['units_reordered']:,}", "From vendors", "📦", "info")
+    with col3:
+        sharpstock_metric_card_enhanced("Plan Cost", f"${plan_cost['total_cost']:,.0f}", "Holding + stockout + transfer + reorder", "💰", "warning")
+    with col4:
+        savings = summary['hold_everything_cost'] - plan_cost['total_cost']
+        sharpstock_metric_card_enhanced("vs. Holding", f"${savings:,.0f}", "Cost avoided vs. no action", "📉", "success")
+    
+    decisions = plan['decisions']
+    actionable = decisions[decisions['action'] != 'HOLD']
+    if actionable.empty:
+        st.info("All variants are adequately stocked - hold everywhere.")
+        return
+    
+    action_filter = st.multiselect(
+        "Actions", ['TRANSFER_IN', 'TRANSFER_OUT', 'REORDER'],
+        default=['TRANSFER_IN', 'REORDER'], key="network_plan_actions"
+    )
+    shown = actionable[actionable['action'].isin(action_filter)]
+    sharpstock_enhanced_table(shown.head(500), f"Network Plan ({len(shown):,} decisions)")
+    
+    st.download_button(
+        "📥 Download Network Plan (CSV)",
+        decisions.to_csv(index=False),
+        file_name="network_replenishment_plan.csv",
+        mime="text/csv",
+        key="download_network_plan"
+    )
+
 def _show_no_transfers_needed():
     """Show when no transfers are recommended"""
     
@@ -4,10 +4,10 @@ Fixes list index out of range errors
 """
 import pandas as pd
 import numpy as np
-import streamlit as st
 from datetime import datetime
 from typing import Dict, List, Any
 from models.data_models import UserProfile
+from utils import progress
 
 def process_orders_fast(orders: List[Dict], location_config: Dict[int, str]) -> pd.DataFrame:
     """
@@ -366,18 +366,18 @@ def create_inventory_dataframe_fast(orders_df: pd.DataFrame, variants_data: Dict
                 except Exception as e:
                     error_count += 1
                     if error_count < 5:
-                        st.warning(f"⚠️ Error processing variant {variant_idx}: {str(e)[:100]}")
+                        progress.warning(f"⚠️ Error processing variant {variant_idx}: {str(e)[:100]}")
                     continue
                     
         except Exception as e:
             error_count += 1
             if error_count < 5:
-                st.warning(f"⚠️ Error processing product {product_id}: {str(e)[:100]}")
+                progress.warning(f"⚠️ Error processing product {product_id}: {str(e)[:100]}")
             continue
     
     # Create DataFrame safely
     if not inventory_data:
-        st.warning("⚠️ No inventory data found")
+        progress.warning("⚠️ No inventory data found")
         return pd.DataFrame()
     
     try:
@@ -385,7 +385,7 @@ def create_inventory_dataframe_fast(orders_df: pd.DataFrame, variants_data: Dict
         
         # Validate DataFrame
         if df.empty:
-            st.warning("⚠️ Created empty inventory DataFrame")
+            progress.warning("⚠️ Created empty inventory DataFrame")
             return df
         
         # Clean up data
@@ -395,12 +395,12 @@ def create_inventory_dataframe_fast(orders_df: pd.DataFrame, variants_data: Dict
         total_inventory_sum = df['total_inventory'].sum() if 'total_inventory' in df.columns else 0
         variants_with_inventory = (df['total_inventory'] > 0).sum() if 'total_inventory' in df.columns else 0
         
-        st.success(f"📊 Inventory processed: {len(df)} variants ({variants_with_inventory:,} with inventory), Total: {total_inventory_sum:,} units")
+        progress.success(f"📊 Inventory processed: {len(df)} variants ({variants_with_inventory:,} with inventory), Total: {total_inventory_sum:,} units")
         
         return df
         
     except Exception as e:
-        st.error(f"❌ Error creating inventory DataFrame: {e}")
+        progress.error(f"❌ Error creating inventory DataFrame: {e}")
         return pd.DataFrame()
 
 def get_demo_profile() -> UserProfile:
@@ -423,7 +423,7 @@ def get_demo_profile() -> UserProfile:
             last_cache_update=None
         )
     except Exception as e:
-        st.error(f"❌ Error creating demo profile: {e}")
+        progress.error(f"❌ Error creating demo profile: {e}")
         # Return minimal profile
         return UserProfile(
             user_id="demo_user_123",
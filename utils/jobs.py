@@ -0,0 +1,176 @@
+"""
+Background Jobs
+Long-running fetch and analysis work runs on a local worker pool instead of the Streamlit
+script thread, so widget interactions and reruns no longer abandon it. Sessions poll jobs by
+id; a job submitted while an identical one (same key, e.g. shop + settings) is still queued or
+running is shared instead of duplicated. Workers are threads because results and per-key
+state stay in this server process.
+"""
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from utils import progress
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 2
+MAX_FINISHED_JOBS = 16    # Finished jobs kept for polling (pollers may hand results off and drop them)
+EVENT_HISTORY = 50
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+
+_scheduler: Optional['JobScheduler'] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_job_scheduler() -> 'JobScheduler':
+    """Process-wide scheduler shared by all sessions"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = JobScheduler()
+        return _scheduler
+
+
+class Job:
+    """One unit of background work; progress fields update while it runs"""
+
+    def __init__(self, key: str, description: str = ""):
+        self.id = uuid.uuid4().hex[:12]
+        self.key = key
+        self.description = description
+        self.status = QUEUED
+        self.fraction = 0.0
+        self.message = ""
+        self.events = deque(maxlen=EVENT_HISTORY)
+        self.result: Any = None
+        self.exception: Optional[Exception] = None
+        self.submitted_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._callbacks: List[Callable[['Job'], None]] = []
+        self._callbacks_run = False
+        self._lock = threading.Lock()
+
+    @property
+    def finished(self) -> bool:
+        """Done or failed, and every done callback has run (so pollers may take the result)"""
+        return self._callbacks_run
+
+    @property
+    def error(self) -> Optional[str]:
+        return str(self.exception) if self.exception is not None else None
+
+    @property
+    def elapsed(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+    def add_done_callback(self, callback: Callable[['Job'], None]):
+        """Call callback(job) once the job finishes (immediately if it already has)"""
+        with self._lock:
+            if self.status not in (DONE, FAILED):
+                self._callbacks.append(callback)
+                return
+        self._run_callback(callback)
+
+    def recent_messages(self, limit: int = 5) -> List[str]:
+        with self._lock:
+            messages = [e.message for e in self.events if e.message and e.kind != 'progress']
+        return messages[-limit:]
+
+    def _on_event(self, event: progress.ProgressEvent):
+        with self._lock:
+            self.events.append(event)
+            if event.fraction is not None:
+                self.fraction = event.fraction
+            if event.message and event.kind != 'stage_end':
+                self.message = event.message
+
+    def _finish(self, status: str, result: Any = None, exception: Optional[Exception] = None):
+        with self._lock:
+            self.status, self.result, self.exception = status, result, exception
+            self.fraction = 1.0 if status == DONE else self.fraction
+            self.finished_at = time.time()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            self._run_callback(callback)
+        self._callbacks_run = True
+
+    def _run_callback(self, callback: Callable[['Job'], None]):
+        try:
+            callback(self)
+        except Exception as e:
+            logger.warning(f"Job {self.id} callback failed: {e}")
+
+
+class JobScheduler:
+    """Local queue + worker pool; jobs with the same key share one run while active"""
+
+    def __init__(self, max_workers: int = DEFAULT_WORKERS, max_finished: int = MAX_FINISHED_JOBS):
+        self.max_finished = max_finished
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="sharpstock-job")
+        self._jobs: 'OrderedDict[str, Job]' = OrderedDict()
+        self._active: Dict[str, Job] = {}
+        self._states: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, key: str, func: Callable, *args, description: str = "", **kwargs) -> Job:
+        """Queue func(*args, **kwargs), or join the queued/running job with the same key"""
+        with self._lock:
+            job = self._active.get(key)
+            if job is not None:
+                return job
+            job = Job(key, description)
+            self._jobs[job.id] = job
+            self._active[key] = job
+        self._executor.submit(self._run, job, func, args, kwargs)
+        return job
+
+    def get(self, job_id: Optional[str]) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id) if job_id else None
+
+    def active_job(self, key: str) -> Optional[Job]:
+        with self._lock:
+            return self._active.get(key)
+
+    def state_for(self, key: str) -> Dict[str, Any]:
+        """Mutable state carried between successive jobs with the same key (LRU-bounded)"""
+        with self._lock:
+            state = self._states.setdefault(key, {})
+            self._states.move_to_end(key)
+            while len(self._states) > self.max_finished:
+                self._states.popitem(last=False)
+            return state
+
+    def jobs(self) -> List[Job]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def _run(self, job: Job, func: Callable, args: tuple, kwargs: dict):
+        job.status, job.started_at = RUNNING, time.time()
+        try:
+            with progress.use_sink(progress.CallbackSink(job._on_event)):
+                result = func(*args, **kwargs)
+        except Exception as e:
+            logger.exception(f"Job {job.id} ({job.description or job.key}) failed")
+            self._retire(job)
+            job._finish(FAILED, exception=e)
+        else:
+            self._retire(job)
+            job._finish(DONE, result=result)
+
+    def _retire(self, job: Job):
+        with self._lock:
+            if self._active.get(job.key) is job:
+                del self._active[job.key]
+            finished = [job_id for job_id, j in self._jobs.items() if j.finished]
+            for job_id in finished[:max(0, len(finished) - self.max_finished + 1)]:
+                del self._jobs[job_id]
@@ -0,0 +1,192 @@
+"""
+Progress Reporting
+Status messages, stages (spinners) and progress bars go through a pluggable sink so the
+fetch and analysis pipeline runs the same under Streamlit, a CLI or a worker process.
+Inside a Streamlit script run the Streamlit adapter is used; elsewhere messages are logged.
+"""
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Callable, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ProgressEvent:
+    """One progress update; kind is info/success/warning/error/stage_start/stage_end/progress"""
+    kind: str
+    message: str = ""
+    fraction: Optional[float] = None
+    elapsed: Optional[float] = None
+    timestamp: float = field(default_factory=time.time)
+
+
+class ProgressBar:
+    """Handle for one progress bar; update() takes a 0-1 fraction and optional status text"""
+
+    def __init__(self, sink: 'ProgressSink'):
+        self.sink = sink
+
+    def update(self, fraction: float, message: str = ""):
+        self.sink.emit(ProgressEvent('progress', message, min(1.0, max(0.0, fraction))))
+
+    def close(self):
+        pass
+
+
+class ProgressSink:
+    """Base sink: subclasses implement emit(); messages, stages and bars all become events"""
+
+    def emit(self, event: ProgressEvent):
+        raise NotImplementedError
+
+    def info(self, message: str):
+        self.emit(ProgressEvent('info', message))
+
+    def success(self, message: str):
+        self.emit(ProgressEvent('success', message))
+
+    def warning(self, message: str):
+        self.emit(ProgressEvent('warning', message))
+
+    def error(self, message: str):
+        self.emit(ProgressEvent('error', message))
+
+    @contextmanager
+    def stage(self, message: str) -> Iterator[None]:
+        start = time.perf_counter()
+        self.emit(ProgressEvent('stage_start', message))
+        try:
+            yield
+        finally:
+            self.emit(ProgressEvent('stage_end', message, elapsed=time.perf_counter() - start))
+
+    def progress_bar(self) -> ProgressBar:
+        return ProgressBar(self)
+
+
+class LoggingSink(ProgressSink):
+    """Headless default: messages go to the log, progress ticks at debug level"""
+
+    LEVELS = {'warning': logging.WARNING, 'error': logging.ERROR, 'progress': logging.DEBUG}
+
+    def emit(self, event: ProgressEvent):
+        if event.kind == 'stage_end':
+            logger.info(f"{event.message} done in {event.elapsed:.2f}s")
+        elif event.kind == 'progress':
+            logger.debug(f"{event.fraction:.0%} {event.message}")
+        elif event.message:
+            logger.log(self.LEVELS.get(event.kind, logging.INFO), event.message)
+
+
+class CallbackSink(ProgressSink):
+    """Forwards every event to a callable (job trackers, CLI printers, tests)"""
+
+    def __init__(self, callback: Callable[[ProgressEvent], None]):
+        self.callback = callback
+
+    def emit(self, event: ProgressEvent):
+        try:
+            self.callback(event)
+        except Exception as e:
+            logger.warning(f"Progress callback failed: {e}")
+
+
+class NullSink(ProgressSink):
+    """Discards everything (benchmarks)"""
+
+    def emit(self, event: ProgressEvent):
+        pass
+
+
+class StreamlitProgressBar(ProgressBar):
+    def __init__(self, sink: 'ProgressSink'):
+        import streamlit as st
+        super().__init__(sink)
+        self.bar = st.progress(0)
+        self.text = st.empty()
+
+    def update(self, fraction: float, message: str = ""):
+        self.bar.progress(min(1.0, max(0.0, fraction)))
+        if message:
+            self.text.text(message)
+
+    def close(self):
+        self.bar.empty()
+        self.text.empty()
+
+
+class StreamlitSink(ProgressSink):
+    """Streamlit adapter: st.info/success/warning/error, st.spinner and st.progress"""
+
+    def emit(self, event: ProgressEvent):
+        import streamlit as st
+        if event.kind in ('info', 'success', 'warning', 'error'):
+            getattr(st, event.kind)(event.message)
+
+    @contextmanager
+    def stage(self, message: str) -> Iterator[None]:
+        import streamlit as st
+        with st.spinner(message):
+            yield
+
+    def progress_bar(self) -> ProgressBar:
+        return StreamlitProgressBar(self)
+
+
+_current_sink: ContextVar[Optional[ProgressSink]] = ContextVar('progress_sink', default=None)
+_logging_sink = LoggingSink()
+_streamlit_sink = StreamlitSink()
+
+
+def _in_streamlit_script() -> bool:
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        return get_script_run_ctx(suppress_warning=True) is not None
+    except Exception:
+        return False
+
+
+def get_sink() -> ProgressSink:
+    """The sink set by use_sink(), else Streamlit inside a script run, else logging"""
+    sink = _current_sink.get()
+    if sink is not None:
+        return sink
+    return _streamlit_sink if _in_streamlit_script() else _logging_sink
+
+
+@contextmanager
+def use_sink(sink: Optional[ProgressSink]) -> Iterator[ProgressSink]:
+    """Route progress from this context (and code it calls) to sink"""
+    token = _current_sink.set(sink)
+    try:
+        yield get_sink()
+    finally:
+        _current_sink.reset(token)
+
+
+def info(message: str):
+    get_sink().info(message)
+
+
+def success(message: str):
+    get_sink().success(message)
+
+
+def warning(message: str):
+    get_sink().warning(message)
+
+
+def error(message: str):
+    get_sink().error(message)
+
+
+def stage(message: str):
+    return get_sink().stage(message)
+
+
+def progress_bar() -> ProgressBar:
+    return get_sink().progress_bar()
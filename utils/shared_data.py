@@ -0,0 +1,122 @@
+"""
+Shared Data Cache
+Process-wide cache of analysis data keyed by (shop, data version). Sessions looking at the
+same shop hold reference-counted handles to one copy instead of each keeping its own. Entries
+no session references are evicted least-recently-used once the memory cap is exceeded.
+Cached values are shared between sessions and must be treated as read-only.
+"""
+import logging
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from utils.stage_cache import estimate_size
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MEMORY_CAP = 1024 * 1024 * 1024   # all shops' shared analysis data (finished jobs hand their results over)
+
+_cache: Optional['SharedDataCache'] = None
+_cache_lock = threading.Lock()
+
+
+def get_shared_data_cache() -> 'SharedDataCache':
+    """Process-wide shared data cache used by all sessions"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = SharedDataCache()
+        return _cache
+
+
+class DataHandle:
+    """A session's reference to a cached value; released explicitly or when garbage-collected"""
+
+    def __init__(self, cache: 'SharedDataCache', shop: str, version: str, value: Any):
+        self.shop = shop
+        self.version = version
+        self.value = value
+        self._finalizer = weakref.finalize(self, cache._release, (shop, version))
+
+    @property
+    def released(self) -> bool:
+        return not self._finalizer.alive
+
+    def release(self):
+        self._finalizer()
+
+
+class _Entry:
+    __slots__ = ('value', 'size', 'refs')
+
+    def __init__(self, value: Any, size: int):
+        self.value = value
+        self.size = size
+        self.refs = 0
+
+
+class SharedDataCache:
+    """Reference-counted LRU of per-shop data versions under a memory cap"""
+
+    def __init__(self, memory_cap: int = DEFAULT_MEMORY_CAP):
+        self.memory_cap = memory_cap
+        self.memory_used = 0
+        self._entries: 'OrderedDict[Tuple[str, str], _Entry]' = OrderedDict()
+        self._latest: Dict[str, str] = {}
+        self._lock = threading.RLock()  # Handle finalizers may run during a locked section
+
+    def put(self, shop: str, version: str, value: Any, size: Optional[int] = None) -> DataHandle:
+        """Cache value as the latest version of shop's data and return a handle to it"""
+        key = (shop, version)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = _Entry(value, estimate_size(value) if size is None else size)
+                self._entries[key] = entry
+                self.memory_used += entry.size
+            self._latest[shop] = version
+            return self._acquire_entry(key, entry)
+
+    def acquire(self, shop: str, version: Optional[str] = None) -> Optional[DataHandle]:
+        """Handle to a cached version of shop's data (the latest when version is None)"""
+        with self._lock:
+            version = version or self._latest.get(shop)
+            entry = self._entries.get((shop, version)) if version else None
+            if entry is None:
+                return None
+            return self._acquire_entry((shop, version), entry)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'memory_used': self.memory_used,
+                'memory_cap': self.memory_cap,
+                'references': sum(entry.refs for entry in self._entries.values()),
+            }
+
+    def _acquire_entry(self, key: Tuple[str, str], entry: _Entry) -> DataHandle:
+        entry.refs += 1
+        self._entries.move_to_end(key)
+        self._evict()
+        return DataHandle(self, key[0], key[1], entry.value)
+
+    def _release(self, key: Tuple[str, str]):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.refs = max(0, entry.refs - 1)
+                self._evict()
+
+    def _evict(self):
+        # Only unreferenced entries can go; referenced ones may keep usage above the cap
+        for key in [k for k, e in self._entries.items() if e.refs == 0]:
+            if self.memory_used <= self.memory_cap:
+                break
+            entry = self._entries.pop(key)
+            self.memory_used -= entry.size
+            if self._latest.get(key[0]) == key[1]:
+                del self._latest[key[0]]
+        if self.memory_used > self.memory_cap:
+            logger.debug(f"Shared data cache over cap with referenced entries: {self.memory_used} bytes")
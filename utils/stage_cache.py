@@ -0,0 +1,287 @@
+"""
+Stage Memoization Cache
+Content-hashed memoization of analysis pipeline stages across Streamlit reruns and
+browser tabs. Each user gets an in-process LRU with a memory budget, backed by a
+local-disk LRU so results also survive a process restart.
+"""
+import hashlib
+import logging
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from dataclasses import is_dataclass, asdict
+from typing import Any, Callable, Dict, MutableMapping, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MEMORY_BUDGET = 256 * 1024 * 1024   # per user, in process
+DEFAULT_DISK_BUDGET = 1024 * 1024 * 1024    # per user, on local disk
+CACHE_DIR = os.path.join(".sharpstock_cache", "stages")
+
+# Bump when a stage's output format changes so stale disk entries are ignored
+CACHE_FORMAT_VERSION = 1
+
+_caches: Dict[str, 'StageCache'] = {}
+_caches_lock = threading.Lock()
+
+
+def get_stage_cache(user_id: Optional[str]) -> 'StageCache':
+    """Process-wide stage cache for a user, shared by all of that user's sessions"""
+    user_key = str(user_id or 'anonymous')
+    with _caches_lock:
+        cache = _caches.get(user_key)
+        if cache is None:
+            cache = StageCache(user_key)
+            _caches[user_key] = cache
+        return cache
+
+
+def content_hash(*values: Any) -> str:
+    """Stable hash of stage inputs (DataFrames, arrays, containers and scalars)"""
+    hasher = hashlib.blake2b(digest_size=20)
+    for value in values:
+        _update_hash(hasher, value)
+    return hasher.hexdigest()
+
+
+def session_data_version(state: MutableMapping, *values: Any) -> str:
+    """
+    The 'analysis_data_version' an analysis result stored in state. Results stored without
+    one are hashed from values on first use and the version kept in state.
+    """
+    version = state.get('analysis_data_version')
+    if not version:
+        version = content_hash(*values)
+        state['analysis_data_version'] = version
+    return version
+
+
+def _update_hash(hasher, value: Any):
+    if isinstance(value, pd.DataFrame):
+        hasher.update(b'df')
+        hasher.update(repr((list(value.columns), [str(t) for t in value.dtypes], value.shape)).encode())
+        if not value.empty:
+            hasher.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+    elif isinstance(value, pd.Series):
+        hasher.update(b'series')
+        hasher.update(repr((value.name, str(value.dtype), len(value))).encode())
+        hasher.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+    elif isinstance(value, np.ndarray):
+        hasher.update(b'nd')
+        hasher.update(repr((value.dtype.str, value.shape)).encode())
+        if value.dtype == object:
+            hasher.update(pickle.dumps(value.tolist(), protocol=4))
+        else:
+            hasher.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, dict):
+        hasher.update(b'dict')
+        for key in sorted(value, key=repr):
+            _update_hash(hasher, key)
+            _update_hash(hasher, value[key])
+    elif isinstance(value, (list, tuple)):
+        hasher.update(b'seq%d' % len(value))
+        # Plain JSON-like payloads (e.g. API order lists) hash fastest as one pickle
+        try:
+            hasher.update(pickle.dumps(value, protocol=4))
+        except Exception:
+            for item in value:
+                _update_hash(hasher, item)
+    elif is_dataclass(value) and not isinstance(value, type):
+        hasher.update(type(value).__name__.encode())
+        _update_hash(hasher, asdict(value))
+    elif value is None or isinstance(value, (str, int, float, bool)):
+        hasher.update(repr(value).encode())
+    else:
+        hasher.update(pickle.dumps(value, protocol=4))
+
+
+def estimate_size(value: Any) -> int:
+    """Approximate in-memory size of a cached stage result"""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, (pd.Series, pd.Index)):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if hasattr(value, 'nbytes'):
+        return int(value.nbytes)
+    if isinstance(value, (list, tuple)) and value and len(value) <= 16:
+        return sum(estimate_size(item) for item in value)
+    try:
+        return len(pickle.dumps(value, protocol=4))
+    except Exception:
+        return 1024
+
+
+def _detach(value: Any) -> Any:
+    """Hand out copies of DataFrames so callers cannot mutate cached results"""
+    if isinstance(value, pd.DataFrame):
+        return value.copy()
+    if isinstance(value, tuple):
+        return tuple(_detach(item) for item in value)
+    return value
+
+
+class StageCache:
+    """LRU memoization of pipeline stages for one user, in memory and on local disk"""
+
+    def __init__(self, user_key: str, memory_budget: int = DEFAULT_MEMORY_BUDGET,
+                 disk_budget: int = DEFAULT_DISK_BUDGET, cache_dir: Optional[str] = CACHE_DIR):
+        self.user_key = user_key
+        self.memory_budget = memory_budget
+        self.disk_budget = disk_budget
+        self.disk_dir = None
+        if cache_dir:
+            self.disk_dir = os.path.join(cache_dir, hashlib.sha1(user_key.encode()).hexdigest()[:16])
+        self._entries: 'OrderedDict[Tuple[str, str], Tuple[Any, int]]' = OrderedDict()
+        self._memory_used = 0
+        self._lock = threading.RLock()
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0}
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+    def memoize(self, stage: str, func: Callable, *args, key_extra: Any = None,
+                should_cache: Optional[Callable[[Any], bool]] = None, **kwargs) -> Any:
+        """
+        Return func(*args, **kwargs), reusing a previous result when the stage inputs hash
+        the same. key_extra carries state the function reads from outside its arguments.
+        """
+        try:
+            key = content_hash(CACHE_FORMAT_VERSION, stage, args, kwargs, key_extra)
+        except Exception as e:
+            logger.warning(f"Could not hash inputs for stage {stage}, running uncached: {e}")
+            return func(*args, **kwargs)
+
+        found, value = self.get(stage, key)
+        if found:
+            return _detach(value)
+
+        value = func(*args, **kwargs)
+        if should_cache is None or should_cache(value):
+            self.put(stage, key, value)
+        return _detach(value)
+
+    def get(self, stage: str, key: str) -> Tuple[bool, Any]:
+        with self._lock:
+            entry = self._entries.get((stage, key))
+            if entry is not None:
+                self._entries.move_to_end((stage, key))
+                self.stats['memory_hits'] += 1
+                return True, entry[0]
+
+        value = self._read_disk(stage, key)
+        if value is not None:
+            self.stats['disk_hits'] += 1
+            self._put_memory(stage, key, value)
+            return True, value
+
+        self.stats['misses'] += 1
+        return False, None
+
+    def put(self, stage: str, key: str, value: Any):
+        self._put_memory(stage, key, value)
+        self._write_disk(stage, key, value)
+
+    def clear(self, include_disk: bool = False):
+        with self._lock:
+            self._entries.clear()
+            self._memory_used = 0
+        if include_disk and self.disk_dir and os.path.isdir(self.disk_dir):
+            for name in os.listdir(self.disk_dir):
+                try:
+                    os.remove(os.path.join(self.disk_dir, name))
+                except OSError:
+                    pass
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'memory_used_mb': self._memory_used / (1024 * 1024),
+                'memory_budget_mb': self.memory_budget / (1024 * 1024),
+                **self.stats
+            }
+
+    # ------------------------------------------------------------------
+    # In-process LRU
+    # ------------------------------------------------------------------
+    def _put_memory(self, stage: str, key: str, value: Any):
+        size = estimate_size(value)
+        if size > self.memory_budget:
+            return
+        with self._lock:
+            old = self._entries.pop((stage, key), None)
+            if old is not None:
+                self._memory_used -= old[1]
+            self._entries[(stage, key)] = (value, size)
+            self._memory_used += size
+            while self._memory_used > self.memory_budget and self._entries:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._memory_used -= evicted_size
+                self.stats['evictions'] += 1
+
+    # ------------------------------------------------------------------
+    # Local-disk LRU (file mtime is the recency clock)
+    # ------------------------------------------------------------------
+    def _disk_path(self, stage: str, key: str) -> Optional[str]:
+        if not self.disk_dir:
+            return None
+        return os.path.join(self.disk_dir, f"{stage}-{key}.pkl")
+
+    def _read_disk(self, stage: str, key: str) -> Any:
+        path = self._disk_path(stage, key)
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+            os.utime(path, None)
+            return value
+        except Exception as e:
+            logger.warning(f"Discarding unreadable stage cache file {path}: {e}")
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+
+    def _write_disk(self, stage: str, key: str, value: Any):
+        path = self._disk_path(stage, key)
+        if not path:
+            return
+        try:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+            self._enforce_disk_budget()
+        except Exception as e:
+            logger.warning(f"Could not persist stage {stage} to disk: {e}")
+
+    def _enforce_disk_budget(self):
+        files = []
+        for name in os.listdir(self.disk_dir):
+            if not name.endswith('.pkl'):
+                continue
+            path = os.path.join(self.disk_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.disk_budget:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
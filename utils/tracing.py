@@ -0,0 +1,191 @@
+"""
+Pipeline Tracing
+Spans per pipeline step with wall time, rows processed, API calls, bytes downloaded and
+resident memory (start, end and sampled peak). Tracing is off unless a Tracer is active
+(use_tracer), so span() costs almost nothing otherwise. Finished traces are plain records
+that export to JSON or the Chrome trace format (chrome://tracing, Perfetto).
+"""
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+MEMORY_SAMPLE_INTERVAL = 0.05   # seconds between RSS samples while spans are open
+
+try:
+    _PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+except (AttributeError, ValueError, OSError):
+    _PAGE_SIZE = 4096
+
+
+def current_rss() -> int:
+    """Resident set size of this process in bytes (0 when it cannot be read)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        # No /proc: fall back to the process peak (bytes on macOS, kilobytes elsewhere)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+    except Exception:
+        return 0
+
+
+class Span:
+    """One timed step; set() records attributes, counters are summed into it on exit"""
+
+    def __init__(self, name: str, parent: Optional['Span'], attrs: Dict[str, Any]):
+        self.name = name
+        self.parent = parent
+        self.depth = parent.depth + 1 if parent is not None else 0
+        self.attrs = dict(attrs)
+        self.thread = threading.current_thread().name
+        self.start = time.time()
+        self.duration = 0.0
+        self.rss_start = self.rss_end = self.peak_rss = current_rss()
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def add(self, name: str, value: float = 1):
+        self.attrs[name] = self.attrs.get(name, 0) + value
+
+    def record(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'parent': self.parent.name if self.parent is not None else None,
+            'depth': self.depth,
+            'thread': self.thread,
+            'start': self.start,
+            'duration': self.duration,
+            'rss_start': self.rss_start,
+            'rss_end': self.rss_end,
+            'peak_rss': self.peak_rss,
+            **self.attrs,
+        }
+
+
+class Tracer:
+    """Collects the spans of one run; a background thread samples RSS for open spans"""
+
+    def __init__(self, sample_memory: bool = True):
+        self.sample_memory = sample_memory
+        self.spans: List[Span] = []
+        self._open: List[Span] = []
+        self._lock = threading.Lock()
+        self._sampler: Optional[threading.Thread] = None
+
+    def _opened(self, span: Span):
+        with self._lock:
+            self._open.append(span)
+            if self.sample_memory and (self._sampler is None or not self._sampler.is_alive()):
+                self._sampler = threading.Thread(target=self._sample, name="trace-rss-sampler", daemon=True)
+                self._sampler.start()
+
+    def _closed(self, span: Span):
+        span.rss_end = current_rss()
+        with self._lock:
+            span.peak_rss = max(span.peak_rss, span.rss_end)
+            self._open.remove(span)
+            self.spans.append(span)
+
+    def _sample(self):
+        while True:
+            time.sleep(MEMORY_SAMPLE_INTERVAL)
+            rss = current_rss()
+            with self._lock:
+                if not self._open:
+                    self._sampler = None
+                    return
+                for span in self._open:
+                    span.peak_rss = max(span.peak_rss, rss)
+
+    def records(self) -> List[Dict[str, Any]]:
+        """Finished spans in start order"""
+        with self._lock:
+            return [span.record() for span in sorted(self.spans, key=lambda s: s.start)]
+
+
+_current_tracer: ContextVar[Optional[Tracer]] = ContextVar('tracer', default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar('trace_span', default=None)
+
+
+@contextmanager
+def use_tracer(tracer: Optional[Tracer]) -> Iterator[Optional[Tracer]]:
+    """Record spans from this context (and code it calls) into tracer"""
+    tracer_token = _current_tracer.set(tracer)
+    span_token = _current_span.set(None)
+    try:
+        yield tracer
+    finally:
+        _current_span.reset(span_token)
+        _current_tracer.reset(tracer_token)
+
+
+@contextmanager
+def span(name: str, counters: Optional[Callable[[], Dict[str, float]]] = None, **attrs) -> Iterator[Optional[Span]]:
+    """
+    Time a pipeline step. counters, when given, returns running totals (e.g. a client's API
+    calls and bytes); the span records how much they grew while it was open.
+    """
+    tracer = _current_tracer.get()
+    if tracer is None:
+        yield None
+        return
+    current = Span(name, _current_span.get(), attrs)
+    baseline = dict(counters()) if counters else {}
+    tracer._opened(current)
+    token = _current_span.set(current)
+    started = time.perf_counter()
+    try:
+        yield current
+    finally:
+        current.duration = time.perf_counter() - started
+        _current_span.reset(token)
+        if counters:
+            for key, value in counters().items():
+                current.add(key, value - baseline.get(key, 0))
+        tracer._closed(current)
+
+
+def set_attrs(**attrs):
+    """Attach attributes (e.g. rows=len(df)) to the innermost open span"""
+    current = _current_span.get()
+    if current is not None:
+        current.set(**attrs)
+
+
+def to_json(records: List[Dict[str, Any]]) -> str:
+    return json.dumps({'spans': records}, indent=2, default=str)
+
+
+def to_chrome_trace(records: List[Dict[str, Any]]) -> str:
+    """Chrome trace-event JSON: one complete ('X') event per span plus an RSS counter track"""
+    if not records:
+        return json.dumps({'traceEvents': []})
+    origin = min(r['start'] for r in records)
+    threads = {name: i + 1 for i, name in enumerate(dict.fromkeys(r['thread'] for r in records))}
+    base_keys = {'name', 'start', 'duration', 'thread'}
+    events = [{'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': tid, 'args': {'name': name}}
+              for name, tid in threads.items()]
+    for r in records:
+        ts = (r['start'] - origin) * 1e6
+        events.append({
+            'name': r['name'], 'cat': 'pipeline', 'ph': 'X', 'pid': 1, 'tid': threads[r['thread']],
+            'ts': ts, 'dur': r['duration'] * 1e6,
+            'args': {k: v for k, v in r.items() if k not in base_keys},
+        })
+        events.append({'name': 'rss', 'ph': 'C', 'pid': 1, 'ts': ts, 'args': {'bytes': r['rss_start']}})
+        events.append({'name': 'rss', 'ph': 'C', 'pid': 1, 'ts': ts + r['duration'] * 1e6,
+                       'args': {'bytes': r['rss_end']}})
+    return json.dumps({'traceEvents': events, 'displayTimeUnit': 'ms'}, default=str)